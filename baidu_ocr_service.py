@@ -3,11 +3,11 @@ import re
 import time
 from typing import Any, Dict, List, Optional
 
-import requests
+from http_client import http
 
 
 class BaiduOcrClient:
-    """百度 OCR 轻量封装：自动获取/缓存 access_token。"""
+    """百度 OCR 轻量封装：自动获取/缓存 access_token；请求走共享异步 HTTP 客户端。"""
 
     def __init__(self, api_key: str, secret_key: str, timeout: int = 8) -> None:
         self.api_key = (api_key or "").strip()
@@ -19,7 +19,7 @@ class BaiduOcrClient:
     def available(self) -> bool:
         return bool(self.api_key and self.secret_key)
 
-    def _get_access_token(self) -> str:
+    async def _get_access_token(self) -> str:
         now = time.time()
         if self._access_token and now < self._expire_at - 60:
             return self._access_token
@@ -29,7 +29,7 @@ class BaiduOcrClient:
             "client_id": self.api_key,
             "client_secret": self.secret_key,
         }
-        resp = requests.post(url, params=params, timeout=self.timeout)
+        resp = await http.post(url, params=params, timeout=self.timeout)
         resp.raise_for_status()
         data = resp.json() or {}
         token = (data.get("access_token") or "").strip()
@@ -51,7 +51,7 @@ class BaiduOcrClient:
                 s = parts[1]
         return s
 
-    def ocr_text_lines(self, image_base64: str) -> List[str]:
+    async def ocr_text_lines(self, image_base64: str) -> List[str]:
         if not self.available():
             raise RuntimeError("未配置百度 OCR API Key/Secret")
         payload_image = self._normalize_image_base64(image_base64)
@@ -59,7 +59,7 @@ class BaiduOcrClient:
             return []
         # 先做一次 base64 合法性检查，避免无效图片请求 OCR。
         base64.b64decode(payload_image, validate=True)
-        token = self._get_access_token()
+        token = await self._get_access_token()
         url = f"https://aip.baidubce.com/rest/2.0/ocr/v1/accurate_basic?access_token={token}"
         data = {
             "image": payload_image,
@@ -67,7 +67,7 @@ class BaiduOcrClient:
             "paragraph": "false",
             "probability": "true",
         }
-        resp = requests.post(
+        resp = await http.post(
             url,
             data=data,
             headers={"Content-Type": "application/x-www-form-urlencoded"},
@@ -83,12 +83,12 @@ class BaiduOcrClient:
                 lines.append(text)
         return lines
 
-    def ocr_text_lines_from_bytes(self, image_bytes: bytes) -> List[str]:
+    async def ocr_text_lines_from_bytes(self, image_bytes: bytes) -> List[str]:
         """文件字节 OCR：内部转 base64 后复用同一识别逻辑。"""
         if not image_bytes:
             return []
         payload = base64.b64encode(image_bytes).decode("ascii")
-        return self.ocr_text_lines(payload)
+        return await self.ocr_text_lines(payload)
 
 
 def _normalize_text(s: str) -> str:
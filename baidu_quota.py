@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+"""
+百度地图 AK 配额控制：多个 AK 组成的池，按 (AK, 服务) 做令牌桶限流与日用量统计，每次调用挑有余量的 AK。
+- QPS：每个 (AK, 服务) 一个令牌桶，保证突发请求（如探子批量上报）不触发百度 QPS 超限；
+- 日配额：按服务配置每个 AK 的日配额，按本地日期计数，零点清零；百度返回配额 / 权限类状态时该 AK 在该服务上暂停使用
+  （天配额超限停到次日零点，AK 无效 / 无权限停 10 分钟；并发超限不停用，只让该 AK 的令牌桶冷却 1 秒），调用方换下一个 AK 重试；
+- 用量计数：acquire 时先计入（预占，避免并发请求一起越过日配额），请求没有送达或被百度按 AK 配额 / 权限拒绝
+  （网络异常、响应无法解析、取消、配额超限、AK 无效等，百度不计费）时由 record / refund 退回；其余状态（含地址无法解析等业务失败）照常计数；
+- 优先级：实时评估新单（realtime）可用全部配额；其余调用（normal，如人工推荐、路线预览、后台刷新）
+  只能用到日配额与 QPS 的 (1 - 预留比例)，批量工作用尽配额时不拖垮实时评估。
+当前调用的优先级放在 contextvars 中（见 quota_priority），随请求的协程及其派生任务传递，不需逐层传参。
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class TokenBucket:
+    """
+    令牌桶：rate 为每秒补充的令牌数（即 QPS），capacity 为允许的瞬时突发量。
+    acquire 采用「先预占、再等待」方式：令牌不足时余额记为负数，按欠额 / rate 等待，
+    多个并发调用者按到达顺序依次排队，不会饿死；线程与协程下均可使用。
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = max(0.1, float(rate))
+        self.capacity = max(1.0, float(capacity if capacity is not None else rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.throttled = 0
+        self.waited_seconds = 0.0
+
+    def configure(self, rate: float, capacity: Optional[float] = None) -> None:
+        with self._lock:
+            self._refill()
+            self.rate = max(0.1, float(rate))
+            self.capacity = max(1.0, float(capacity if capacity is not None else rate))
+            self._tokens = min(self._tokens, self.capacity)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, tokens: float = 1.0) -> float:
+        """现在预占 tokens 个令牌需要等待的秒数（只查看，不预占）。"""
+        with self._lock:
+            self._refill()
+            return max(0.0, tokens - self._tokens) / self.rate
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """预占令牌并返回需要等待的秒数（0 表示可立即发出）。"""
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+            self.acquired += 1
+            if self._tokens >= 0:
+                return 0.0
+            wait = -self._tokens / self.rate
+            self.throttled += 1
+            self.waited_seconds += wait
+            return wait
+
+    def drain(self, seconds: float) -> None:
+        """清空令牌并欠下 seconds 秒的额度（百度报并发超限时用），之后的调用至少等 seconds 秒。"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, -float(seconds) * self.rate)
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            self._refill()
+            return {
+                "rate": self.rate,
+                "capacity": self.capacity,
+                "available_tokens": round(self._tokens, 2),
+                "acquired": self.acquired,
+                "throttled": self.throttled,
+                "waited_seconds": round(self.waited_seconds, 3),
+            }
+
+
+PRIORITY_REALTIME = "realtime"
+PRIORITY_NORMAL = "normal"
+PRIORITIES = (PRIORITY_REALTIME, PRIORITY_NORMAL)
+
+# 百度返回的 AK 级失败状态：并发超限令牌桶冷却；天配额超限（4、3xx）停到次日零点；AK 无效 / 无权限（3、5、101、102、2xx）停用一段时间
+QPS_EXCEEDED_STATUSES = frozenset({401, 402})
+QPS_COOLDOWN_SECONDS = 1.0
+DENIED_STATUSES = frozenset({3, 5, 101, 102})
+DENIED_COOLDOWN_SECONDS = 600.0
+
+_current_priority: contextvars.ContextVar[str] = contextvars.ContextVar("baidu_quota_priority", default=PRIORITY_NORMAL)
+
+
+def current_priority() -> str:
+    return _current_priority.get()
+
+
+@contextmanager
+def quota_priority(priority: str) -> Iterator[None]:
+    """在 with 块内（含其中创建的协程任务）发出的百度请求按 priority 调度。"""
+    token = _current_priority.set(priority if priority in PRIORITIES else PRIORITY_NORMAL)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def parse_ak_list(value: str) -> List[str]:
+    """AK 列表：逗号、分号或空白分隔。"""
+    return [ak for ak in (value or "").replace(",", " ").replace(";", " ").split() if ak]
+
+
+def parse_daily_quota(spec: str) -> Dict[str, int]:
+    """
+    每个 AK 的日配额：单个数字表示各服务相同，或按服务给出，如 "geocoding=5000,routematrix=3000,direction=3000"。
+    键 "*" 为未单独给出的服务的配额；0 或未配置表示不限（只靠百度返回的天配额超限状态停用）。无法解析的项忽略。
+    """
+    spec = (spec or "").strip()
+    if not spec:
+        return {}
+    try:
+        return {"*": max(0, int(spec))}
+    except ValueError:
+        pass
+    out: Dict[str, int] = {}
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if not name:
+            continue
+        try:
+            out[name] = max(0, int(value))
+        except ValueError:
+            continue
+    return out
+
+
+def _next_midnight(now: float) -> float:
+    t = time.localtime(now)
+    return time.mktime((t.tm_year, t.tm_mon, t.tm_mday + 1, 0, 0, 0, 0, 0, -1))
+
+
+class AkQuotaExhausted(Exception):
+    """池中没有可用于该服务、该优先级的 AK（均已停用或用到日配额）。"""
+
+    def __init__(self, service: str, priority: str) -> None:
+        super().__init__(f"百度 AK 配额已用尽或暂不可用（服务 {service}，优先级 {priority}）")
+        self.service = service
+        self.priority = priority
+
+
+class _AkUsage:
+    """单个 (AK, 服务) 的限流桶与当日用量。normal_bucket 按 QPS × (1 - 预留比例) 限制非实时调用。"""
+
+    def __init__(self, qps: float, normal_qps: float) -> None:
+        self.bucket = TokenBucket(qps)
+        self.normal_bucket = TokenBucket(normal_qps)
+        self.used = 0
+        self.used_by_priority: Dict[str, int] = {p: 0 for p in PRIORITIES}
+        self.ok = 0
+        self.errors = 0
+        self.failures: Dict[int, int] = {}
+        self.blocked_until = 0.0
+        self.blocked_reason = ""
+
+
+class BaiduAkPool:
+    """
+    百度 AK 池：acquire 按服务与优先级挑一个未停用、未用到日配额、排队最短的 AK（同等时选当日用量比例最低的），
+    预占令牌并等待后返回；调用方拿到百度响应后用 record 回报状态，AK 级失败时换 AK 重试（acquire 的 exclude）。
+    """
+
+    def __init__(
+        self,
+        aks: Iterable[str],
+        qps: float = 10.0,
+        daily_quota: Optional[Dict[str, int]] = None,
+        realtime_reserve: float = 0.2,
+    ) -> None:
+        self._lock = threading.Lock()
+        self._usage: Dict[Tuple[str, str], _AkUsage] = {}
+        self._day = time.strftime("%Y-%m-%d")
+        self.rejected: Dict[str, int] = {p: 0 for p in PRIORITIES}
+        self.aks: List[str] = []
+        self.configure(aks, qps, daily_quota, realtime_reserve)
+
+    def configure(
+        self,
+        aks: Iterable[str],
+        qps: float,
+        daily_quota: Optional[Dict[str, int]] = None,
+        realtime_reserve: float = 0.2,
+    ) -> None:
+        """更新 AK 列表（去重保序）、每个 AK 每个服务的 QPS、日配额与实时预留比例；已有的用量计数保留。"""
+        with self._lock:
+            unique: List[str] = []
+            for ak in aks:
+                ak = (ak or "").strip()
+                if ak and ak not in unique:
+                    unique.append(ak)
+            self.aks = unique
+            self.qps = max(0.1, float(qps))
+            self.daily_quota = dict(daily_quota or {})
+            self.realtime_reserve = min(0.9, max(0.0, float(realtime_reserve)))
+            for usage in self._usage.values():
+                usage.bucket.configure(self.qps)
+                usage.normal_bucket.configure(self._normal_qps())
+
+    def _normal_qps(self) -> float:
+        return self.qps * (1.0 - self.realtime_reserve)
+
+    def _quota(self, service: str) -> int:
+        return int(self.daily_quota.get(service, self.daily_quota.get("*", 0)))
+
+    def _daily_limit(self, service: str, priority: str) -> int:
+        """该优先级当日可用到的计数上限，0 为不限。"""
+        quota = self._quota(service)
+        if not quota or priority == PRIORITY_REALTIME:
+            return quota
+        return int(quota * (1.0 - self.realtime_reserve))
+
+    def _get_usage(self, ak: str, service: str) -> _AkUsage:
+        usage = self._usage.get((ak, service))
+        if usage is None:
+            usage = _AkUsage(self.qps, self._normal_qps())
+            self._usage[(ak, service)] = usage
+        return usage
+
+    def _roll_day(self) -> None:
+        """跨零点：清空当日计数，解除天配额停用（百度配额零点重置）。"""
+        today = time.strftime("%Y-%m-%d")
+        if today == self._day:
+            return
+        self._day = today
+        for usage in self._usage.values():
+            usage.used = 0
+            usage.used_by_priority = {p: 0 for p in PRIORITIES}
+            if usage.blocked_reason == "daily_quota":
+                usage.blocked_until = 0.0
+                usage.blocked_reason = ""
+
+    async def acquire(self, service: str, priority: Optional[str] = None, exclude: Iterable[str] = ()) -> str:
+        """挑选 AK、预占当日用量并等待令牌，返回 AK；没有可用 AK 时抛 AkQuotaExhausted。"""
+        priority = priority or current_priority()
+        excluded = set(exclude)
+        with self._lock:
+            self._roll_day()
+            now = time.time()
+            limit = self._daily_limit(service, priority)
+            quota = self._quota(service)
+            best: Optional[Tuple[Tuple[float, float, int], str, _AkUsage]] = None
+            for index, ak in enumerate(self.aks):
+                if ak in excluded:
+                    continue
+                usage = self._get_usage(ak, service)
+                if usage.blocked_until > now or (limit and usage.used >= limit):
+                    continue
+                wait = usage.bucket.wait_time()
+                if priority != PRIORITY_REALTIME:
+                    wait = max(wait, usage.normal_bucket.wait_time())
+                rank = (round(wait, 3), usage.used / quota if quota else 0.0, index)
+                if best is None or rank < best[0]:
+                    best = (rank, ak, usage)
+            if best is None:
+                self.rejected[priority] = self.rejected.get(priority, 0) + 1
+                raise AkQuotaExhausted(service, priority)
+            _, ak, usage = best
+            usage.used += 1
+            usage.used_by_priority[priority] = usage.used_by_priority.get(priority, 0) + 1
+            normal_wait = usage.normal_bucket.reserve() if priority != PRIORITY_REALTIME else 0.0
+        # 非实时调用先在自己的桶里排队，再进共享桶；实时调用只排共享桶，不被批量工作的积压挡住
+        if normal_wait > 0:
+            await asyncio.sleep(normal_wait)
+        await usage.bucket.acquire()
+        return ak
+
+    def _refund(self, usage: _AkUsage, priority: str) -> None:
+        usage.used = max(0, usage.used - 1)
+        usage.used_by_priority[priority] = max(0, usage.used_by_priority.get(priority, 0) - 1)
+
+    def refund(self, ak: str, service: str, priority: Optional[str] = None) -> None:
+        """acquire 拿到 AK 后请求没有发出 / 被取消时退回预占的当日用量（priority 须与 acquire 时一致，默认取当前优先级）。"""
+        with self._lock:
+            self._roll_day()
+            self._refund(self._get_usage(ak, service), priority or current_priority())
+
+    def record(self, ak: str, service: str, status: Optional[int], priority: Optional[str] = None) -> bool:
+        """
+        回报一次调用结果：status 为百度响应的 status，None 表示网络异常 / 响应无法解析。
+        没有得到有效响应或 AK 级失败时退回 acquire 预占的当日用量（priority 须与 acquire 时一致，默认取当前优先级）。
+        返回 True 表示是该 AK 的配额 / 权限问题（已暂停该 AK 在该服务上的使用），调用方应换 AK 重试。
+        """
+        priority = priority or current_priority()
+        with self._lock:
+            self._roll_day()
+            usage = self._get_usage(ak, service)
+            if status is None:
+                usage.errors += 1
+                self._refund(usage, priority)
+                return False
+            try:
+                code = int(status)
+            except (TypeError, ValueError):
+                usage.errors += 1
+                self._refund(usage, priority)
+                return False
+            if code == 0:
+                usage.ok += 1
+                return False
+            usage.failures[code] = usage.failures.get(code, 0) + 1
+            now = time.time()
+            if code in QPS_EXCEEDED_STATUSES:
+                usage.bucket.drain(QPS_COOLDOWN_SECONDS)
+            elif code == 4 or 300 <= code < 400:
+                usage.blocked_until, usage.blocked_reason = _next_midnight(now), "daily_quota"
+            elif code in DENIED_STATUSES or 200 <= code < 300:
+                usage.blocked_until, usage.blocked_reason = now + DENIED_COOLDOWN_SECONDS, "denied"
+            else:
+                return False
+            self._refund(usage, priority)
+            return True
+
+    def stats(self) -> Dict[str, object]:
+        """按「AK 前 6 位/服务」汇总当日用量、剩余配额、失败状态与限流桶，避免在接口中暴露完整 AK。"""
+        with self._lock:
+            self._roll_day()
+            now = time.time()
+            usage_items = sorted(self._usage.items())
+            out: Dict[str, object] = {
+                "aks": len(self.aks),
+                "day": self._day,
+                "qps": self.qps,
+                "daily_quota": dict(self.daily_quota),
+                "realtime_reserve": self.realtime_reserve,
+                "rejected": dict(self.rejected),
+            }
+            per_ak: Dict[str, object] = {}
+            for (ak, service), usage in usage_items:
+                quota = self._quota(service)
+                per_ak[f"{ak[:6]}***/{service}"] = {
+                    "used_today": usage.used,
+                    "used_by_priority": dict(usage.used_by_priority),
+                    "daily_quota": quota or None,
+                    "remaining": max(0, quota - usage.used) if quota else None,
+                    "ok": usage.ok,
+                    "errors": usage.errors,
+                    "failures": {str(k): v for k, v in sorted(usage.failures.items())},
+                    "blocked_seconds": round(max(0.0, usage.blocked_until - now), 1),
+                    "blocked_reason": usage.blocked_reason if usage.blocked_until > now else "",
+                    "rate_limit": usage.bucket.stats(),
+                    "normal_rate_limit": usage.normal_bucket.stats(),
+                }
+        out["usage"] = per_ak
+        return out
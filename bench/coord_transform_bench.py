@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+基准：坐标系批量转换，逐点 math 循环 vs coord_transform 的 NumPy 向量化实现。
+在国内范围内随机生成 N 个点（默认 10 万），对比各方向耗时，并检查：
+- 向量化正向结果与逐点实现一致；
+- 反向（迭代求逆）与正向往返误差（度）。
+用法：在项目根目录执行 python bench/coord_transform_bench.py [--points 100000] [--seed 7] [--repeat 3]
+"""
+import argparse
+import math
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import coord_transform as ct  # noqa: E402
+
+_A = 6378245.0
+_EE = 0.00669342162296594323
+_X_PI = math.pi * 3000.0 / 180.0
+
+
+def _scalar_transform_lat(x: float, y: float) -> float:
+    ret = -100.0 + 2.0 * x + 3.0 * y + 0.2 * y * y + 0.1 * x * y + 0.2 * math.sqrt(abs(x))
+    ret += (20.0 * math.sin(6.0 * x * math.pi) + 20.0 * math.sin(2.0 * x * math.pi)) * 2.0 / 3.0
+    ret += (20.0 * math.sin(y * math.pi) + 40.0 * math.sin(y / 3.0 * math.pi)) * 2.0 / 3.0
+    ret += (160.0 * math.sin(y / 12.0 * math.pi) + 320.0 * math.sin(y * math.pi / 30.0)) * 2.0 / 3.0
+    return ret
+
+
+def _scalar_transform_lng(x: float, y: float) -> float:
+    ret = 300.0 + x + 2.0 * y + 0.1 * x * x + 0.1 * x * y + 0.1 * math.sqrt(abs(x))
+    ret += (20.0 * math.sin(6.0 * x * math.pi) + 20.0 * math.sin(2.0 * x * math.pi)) * 2.0 / 3.0
+    ret += (20.0 * math.sin(x * math.pi) + 40.0 * math.sin(x / 3.0 * math.pi)) * 2.0 / 3.0
+    ret += (150.0 * math.sin(x / 12.0 * math.pi) + 300.0 * math.sin(x / 30.0 * math.pi)) * 2.0 / 3.0
+    return ret
+
+
+def scalar_wgs84_to_bd09(lat: float, lng: float):
+    """逐点参考实现（WGS84→GCJ02→BD09），与改造前的标量写法同构。"""
+    x, y = lng - 105.0, lat - 35.0
+    rad_lat = lat / 180.0 * math.pi
+    magic = 1.0 - _EE * math.sin(rad_lat) ** 2
+    sqrt_magic = math.sqrt(magic)
+    glat = lat + _scalar_transform_lat(x, y) * 180.0 / ((_A * (1.0 - _EE)) / (magic * sqrt_magic) * math.pi)
+    glng = lng + _scalar_transform_lng(x, y) * 180.0 / (_A / sqrt_magic * math.cos(rad_lat) * math.pi)
+    z = math.sqrt(glng * glng + glat * glat) + 0.00002 * math.sin(glat * _X_PI)
+    theta = math.atan2(glat, glng) + 0.000003 * math.cos(glng * _X_PI)
+    return z * math.sin(theta) + 0.006, z * math.cos(theta) + 0.0065
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="坐标系批量转换基准")
+    parser.add_argument("--points", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+    pts = np.column_stack((rng.uniform(18.0, 53.0, args.points), rng.uniform(74.0, 134.0, args.points)))
+    pts_list = pts.tolist()
+
+    scalar_ms = []
+    for _ in range(args.repeat):
+        scalar_out, ms = timed(lambda p: [scalar_wgs84_to_bd09(lat, lng) for lat, lng in p], pts_list)
+        scalar_ms.append(ms)
+    vector_ms = []
+    for _ in range(args.repeat):
+        vector_out, ms = timed(ct.convert_array, pts, ct.WGS84, ct.BD09)
+        vector_ms.append(ms)
+    diff = float(np.abs(np.asarray(scalar_out) - vector_out).max())
+    s, v = statistics.median(scalar_ms), statistics.median(vector_ms)
+    print(f"点数 {args.points}：WGS84→BD09 逐点 {s:.1f} ms / 向量化 {v:.1f} ms，加速 {s / v:.1f}x，结果最大差 {diff:.2e} 度")
+
+    print("方向 | 向量化 ms(中位) | 往返最大误差(度)")
+    for src, dst in ((ct.WGS84, ct.GCJ02), (ct.GCJ02, ct.BD09), (ct.WGS84, ct.BD09)):
+        forward = ct.convert_array(pts, src, dst)
+        for a, b, data in ((src, dst, pts), (dst, src, forward)):
+            ms_list = []
+            for _ in range(args.repeat):
+                out, ms = timed(ct.convert_array, data, a, b)
+                ms_list.append(ms)
+            err = float(np.abs(out - (forward if b == dst else pts)).max())
+            print(f"{a}→{b} | {statistics.median(ms_list):.1f} | {err:.2e}")
+
+
+if __name__ == "__main__":
+    main()
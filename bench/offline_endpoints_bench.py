@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+基准 / 压测：evaluate_new_order、current_route_preview、manual_candidates_recommend 三个端点完全离线地跑在路网 fixture 上。
+- 路网请求走 ReplayMapProvider：只读 fixture、不发网络请求，按 --latency 注入每类调用的延迟（可加 --jitter 抖动）；
+- 鉴权、司机订单 / 位置读取、Bark / Realtime 推送替换为进程内桩，不依赖 Supabase；
+- 每轮开始前清空地理编码 / 路网耗时 / 路线几何缓存，轮与轮之间可比；默认跑两轮回放并比较响应摘要，检查确定性。
+fixture 来源二选一：
+- --fixtures 指定线上以 MAP_PROVIDER=record 录下的文件（地址取自其中的地理编码记录）；
+- --synthesize N 先在上海范围内生成 N 个地名，用离线估算服务（固定按 12 点）跑一遍同样的请求录成 fixture，再回放。
+用法：在项目根目录执行
+python bench/offline_endpoints_bench.py [--synthesize 60 | --fixtures map_fixtures.json.gz] [--requests 20] [--concurrency 4] [--latency 30] [--rounds 2]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 缓存库放临时目录，不碰项目目录下的线上缓存；须在导入 smartdiaodu 之前设置
+_TMP_DIR = tempfile.mkdtemp(prefix="smartdiaodu_bench_")
+os.environ["MAP_CACHE_DB_PATH"] = os.path.join(_TMP_DIR, "cache.sqlite3")
+os.environ["MAP_PROVIDER"] = "baidu"
+os.environ.pop("MAP_LOCAL_FALLBACK", None)
+
+from fastapi.security import HTTPAuthorizationCredentials  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+
+import smartdiaodu as sd  # noqa: E402
+from map_fixtures import FixtureStore, RecordingMapProvider, ReplayMapProvider, parse_latency_spec  # noqa: E402
+from map_provider import LocalMapProvider  # noqa: E402
+
+ENDPOINTS = ("evaluate_new_order", "current_route_preview", "manual_candidates_recommend")
+# 摘要比较时忽略的字段：耗时、求解统计等每次运行都会变的内容
+_VOLATILE_KEYS = {"solve_ms", "candidate_solve_ms", "solver_stats", "baseline_solver_stats", "baidu_calls", "matrix_stats", "stats"}
+
+# 桩数据：司机 id → 已分配订单 / 当前位置
+_DRIVER_ORDERS = {}
+_DRIVER_LOC = {}
+
+
+async def _stub_driver_id(credentials):
+    return credentials.credentials
+
+
+async def _stub_orders(driver_id):
+    return _DRIVER_ORDERS.get(driver_id, [])
+
+
+async def _stub_loc(driver_id):
+    return _DRIVER_LOC.get(driver_id)
+
+
+async def _stub_push(*args, **kwargs):
+    return None
+
+
+def install_stubs() -> None:
+    sd._require_driver_id_from_token = _stub_driver_id
+    sd._get_assigned_orders_for_driver = _stub_orders
+    sd._get_driver_current_loc = _stub_loc
+    sd.push_to_bark = _stub_push
+    sd.push_to_supabase_realtime = _stub_push
+
+
+def synthetic_gazetteer(count: int, rng: random.Random):
+    """上海范围内的 count 个地名与 BD09 坐标（地名等长，避免包含匹配串到别的地名）。"""
+    return [
+        (f"基准站点{i:04d}", f"{rng.uniform(31.0, 31.4):.6f},{rng.uniform(121.2, 121.7):.6f}")
+        for i in range(count)
+    ]
+
+
+def build_workload(addresses, count: int, rng: random.Random):
+    """每个端点 count 个请求；地址从 addresses 中按种子抽取。"""
+    work = {name: [] for name in ENDPOINTS}
+    for i in range(count):
+        loc, p1, d1, d2, p3, d3 = rng.sample(addresses, 6)
+        work["evaluate_new_order"].append(
+            sd.EvaluateRequest(
+                current_state=sd.CurrentState(driver_loc=loc, pickups=[p1], deliveries=[d1, d2]),
+                new_order=sd.NewOrder(pickup=p3, delivery=d3, price=str(40 + i % 30)),
+            )
+        )
+        driver = f"bench-{i}"
+        _DRIVER_ORDERS[driver] = [{"pickup": p1, "delivery": d1}, {"pickup": "", "delivery": d2}]
+        _DRIVER_LOC[driver] = loc
+        work["current_route_preview"].append((driver, {"current_state": {}, "tactics": 13}))
+        picks = rng.sample(addresses, 8)
+        candidates = [sd.ManualCandidate(pickup=picks[2 * j], delivery=picks[2 * j + 1], price=60.0) for j in range(4)]
+        work["manual_candidates_recommend"].append((driver, sd.ManualRecommendRequest(candidates=candidates, select_count=2, tactics=13)))
+    return work
+
+
+def _request() -> Request:
+    return Request({"type": "http", "method": "POST", "path": "/current_route_preview", "query_string": b"", "headers": []})
+
+
+async def call_endpoint(name: str, item):
+    if name == "evaluate_new_order":
+        return await sd.evaluate_new_order(item)
+    driver, body = item
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=driver)
+    if name == "current_route_preview":
+        return await sd.current_route_preview(_request(), body, credentials=credentials)
+    return await sd.manual_candidates_recommend(body, credentials=credentials)
+
+
+def reset_state() -> None:
+    """清空缓存与评估去重状态，让每一轮从同样的冷启动开始。"""
+    sd._geocode_cache.clear()
+    sd._duration_leg_cache.clear()
+    sd._route_geometry_cache.clear()
+    sd.pushed_orders_cache.clear()
+    sd.pending_response.clear()
+    sd.abandoned_fingerprints.clear()
+
+
+def _stable(value):
+    if isinstance(value, dict):
+        return {k: _stable(v) for k, v in value.items() if k not in _VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [_stable(v) for v in value]
+    return value
+
+
+async def run_pass(work, concurrency: int):
+    """按端点依次跑完全部请求（同端点内 concurrency 路并发），返回 {端点: (耗时列表, 错误数, 响应摘要)}。"""
+    reset_state()
+    sem = asyncio.Semaphore(max(1, concurrency))
+    out = {}
+    for name in ENDPOINTS:
+        items = work[name]
+        latencies = [0.0] * len(items)
+        results = [None] * len(items)
+
+        async def one(idx, item):
+            async with sem:
+                started = time.perf_counter()
+                try:
+                    results[idx] = _stable(await call_endpoint(name, item))
+                except Exception as e:  # noqa: BLE001 - 基准只统计失败数与原因
+                    results[idx] = {"error": type(e).__name__, "detail": str(getattr(e, "detail", e))}
+                latencies[idx] = (time.perf_counter() - started) * 1000
+
+        await asyncio.gather(*(one(i, item) for i, item in enumerate(items)))
+        errors = sum(1 for r in results if isinstance(r, dict) and "error" in r)
+        digest = hashlib.sha256(json.dumps(results, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:12]
+        out[name] = (latencies, errors, digest, results)
+    return out
+
+
+def _percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def report(title: str, result) -> None:
+    print(title)
+    print("端点 | 请求 | 失败 | 平均 ms | p50 ms | p95 ms | 响应摘要")
+    for name in ENDPOINTS:
+        latencies, errors, digest, results = result[name]
+        print(
+            f"{name} | {len(latencies)} | {errors} | {statistics.mean(latencies):.1f} | "
+            f"{_percentile(latencies, 0.5):.1f} | {_percentile(latencies, 0.95):.1f} | {digest}"
+        )
+        first_error = next((r for r in results if isinstance(r, dict) and "error" in r), None)
+        if first_error:
+            print(f"  首个失败: {first_error['error']} {first_error['detail']}")
+
+
+async def main_async(args) -> None:
+    install_stubs()
+    rng = random.Random(args.seed)
+    if args.synthesize:
+        path = args.fixtures or os.path.join(_TMP_DIR, "fixtures.json.gz")
+        entries = synthetic_gazetteer(args.synthesize, rng)
+        addresses = [name for name, _ in entries]
+        work = build_workload(addresses, args.requests, rng)
+        store = FixtureStore(path)
+        sd._map_provider = RecordingMapProvider(LocalMapProvider(extra_entries=entries, hour=12), store)
+        report("录制（离线估算服务）", await run_pass(work, args.concurrency))
+        store.save()
+        print(f"fixture 已写入 {path}: {store.stats()['entries']}")
+    else:
+        path = args.fixtures or sd.MAP_FIXTURE_PATH
+        if not os.path.isfile(path):
+            raise SystemExit(f"fixture 文件不存在: {path}（可先用 --synthesize N 生成）")
+        store = FixtureStore(path)
+        addresses = sorted(store.keys("geocode"))
+        if len(addresses) < 8:
+            raise SystemExit(f"fixture 中地理编码记录不足 8 条: {path}")
+        work = build_workload(addresses, args.requests, rng)
+
+    replay_store = FixtureStore(path)
+    digests = []
+    for round_no in range(1, max(1, args.rounds) + 1):
+        provider = ReplayMapProvider(replay_store, parse_latency_spec(args.latency), jitter_ms=args.jitter, seed=args.seed)
+        sd._map_provider = provider
+        result = await run_pass(work, args.concurrency)
+        report(f"回放第 {round_no} 轮（注入延迟 {args.latency or 0} ms，抖动 {args.jitter} ms）", result)
+        print(f"  路网调用 {provider.calls}，未命中 {provider.misses}")
+        digests.append(tuple(result[name][2] for name in ENDPOINTS))
+    if len(digests) > 1:
+        same = all(d == digests[0] for d in digests)
+        print("各轮响应一致" if same else "各轮响应不一致（求解按剩余时延预算限时，注入延迟 / 抖动或机器负载会改变 OR-Tools 的可用时间）")
+    sd.solver_pool.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="三个调度端点的离线回放基准")
+    parser.add_argument("--fixtures", default="", help="fixture 路径；不给时读 MAP_FIXTURE_PATH，--synthesize 时写临时目录")
+    parser.add_argument("--synthesize", type=int, default=0, help="生成 N 个合成地名并先录制 fixture")
+    parser.add_argument("--requests", type=int, default=20, help="每个端点的请求数")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", default="30", help='注入延迟（毫秒），如 "30" 或 "geocode=20,routematrix=80,direction=150"')
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
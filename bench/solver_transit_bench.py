@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+基准：OR-Tools 求解时，Python 回调转移函数 vs 原生矩阵转移函数（RegisterTransitMatrix）。
+在 5 / 9 / 15 / 25 个节点的随机矩阵上各跑两种写法，对比：
+- solve_pdp_route 的 OR-Tools 实现（首解 + 局部搜索到局部最优）耗时；
+- solve_pdp_route_flexible 的 OR-Tools 实现（GLS，按规模限时并自适应停止）得到的总耗时。
+精确 DP 不参与对比（直接调用 OR-Tools 内部实现）。
+用法：在项目根目录执行 python bench/solver_transit_bench.py [--seed 7] [--repeat 3] [--skip-gls]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from route_solver import _solve_pdp_route_flexible_ortools, _solve_pdp_route_ortools  # noqa: E402
+
+SIZES = (5, 9, 15, 25)
+
+
+def random_matrix(num_nodes: int, rng: random.Random):
+    """平面随机点的近似驾车耗时（秒）：欧氏距离 × 系数 + 少量非对称扰动。"""
+    pts = [(rng.uniform(0, 60), rng.uniform(0, 60)) for _ in range(num_nodes)]
+    matrix = []
+    for i, a in enumerate(pts):
+        row = []
+        for j, b in enumerate(pts):
+            if i == j:
+                row.append(0)
+            else:
+                d = ((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2) ** 0.5
+                row.append(int(d * 75) + rng.randint(0, 120))
+        matrix.append(row)
+    return matrix
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OR-Tools 转移函数基准")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-gls", action="store_true", help="跳过 GLS 对比（每个规模每种写法至多数秒）")
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    print("节点数 | 回调 ms(中位) | 矩阵 ms(中位) | 加速比 | GLS 总耗时 回调/矩阵(秒)")
+    for n in SIZES:
+        matrix = random_matrix(n, rng)
+        num_pairs = (n - 1) // 2
+        pairs = [(i + 1, i + 1 + num_pairs) for i in range(num_pairs)]
+
+        callback_ms, native_ms = [], []
+        for _ in range(max(1, args.repeat)):
+            _, ms = timed(_solve_pdp_route_ortools, matrix, num_pairs, native_transit=False)
+            callback_ms.append(ms)
+            _, ms = timed(_solve_pdp_route_ortools, matrix, num_pairs, native_transit=True)
+            native_ms.append(ms)
+        cb, nv = statistics.median(callback_ms), statistics.median(native_ms)
+
+        gls = "-"
+        if not args.skip_gls:
+            (_, cb_total), _ = timed(_solve_pdp_route_flexible_ortools, matrix, pairs, native_transit=False)
+            (_, nv_total), _ = timed(_solve_pdp_route_flexible_ortools, matrix, pairs, native_transit=True)
+            gls = f"{cb_total}/{nv_total}"
+        print(f"{n:>6} | {cb:>12.1f} | {nv:>12.1f} | {cb / max(nv, 1e-6):>5.1f}x | {gls}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+熔断器：外部服务（百度地图各接口）变慢或频繁失败时快速失败，不让每个请求都等满超时。
+- closed：统计滑动窗口内的失败率与慢调用率，样本数达到 min_calls 且任一比率超过阈值时转 open；
+- open：直接拒绝（抛 CircuitOpenError，状态码 503），调用方走降级路径；open_seconds 后转 half_open；
+- half_open：放行 probe_calls 个探测请求，全部成功且不慢则回 closed（清空窗口），任一失败或慢则重新 open。
+线程与协程下均可使用；check 放行时返回通行证（放行时的状态代数、是否探测），每次放行的调用都必须带着它用 record 回报结果
+或用 release 归还，否则半开探测名额不会释放。状态每转换一次代数加一：在旧状态下放行、转换后才结束的调用结果直接丢弃，
+closed 时放行的慢请求不会被当成半开探测结果，也不会计入重新闭合后的窗口。
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, NamedTuple, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """熔断中拒绝调用。带 status_code / detail，与 HTTPException、MapProviderError 的判断方式一致。"""
+
+    status_code = 503
+
+    def __init__(self, name: str, retry_after: float) -> None:
+        self.name = name
+        self.retry_after = max(0.0, retry_after)
+        self.detail = f"{name} 服务熔断中（近期失败或超时过多），约 {self.retry_after:.0f} 秒后探测恢复"
+        super().__init__(self.detail)
+
+
+class Permit(NamedTuple):
+    """check 放行的通行证：放行时的状态代数与是否占用半开探测名额。"""
+
+    generation: int
+    probe: bool
+
+
+class CircuitBreaker:
+    """单个接口的熔断器，状态转换见模块说明。"""
+
+    def __init__(
+        self,
+        name: str,
+        error_rate: float = 0.5,
+        slow_ms: float = 3000.0,
+        slow_rate: float = 0.5,
+        min_calls: int = 5,
+        window_seconds: float = 30.0,
+        open_seconds: float = 30.0,
+        probe_calls: int = 1,
+    ) -> None:
+        self.name = name
+        self._lock = threading.Lock()
+        # 窗口内每次调用：(结束时刻, 是否失败, 是否慢)
+        self._window: Deque[Tuple[float, bool, bool]] = deque()
+        self._state = CLOSED
+        self._generation = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.opened = 0
+        self.rejected = 0
+        self.last_open_reason = ""
+        self.configure(error_rate, slow_ms, slow_rate, min_calls, window_seconds, open_seconds, probe_calls)
+
+    def configure(
+        self,
+        error_rate: float = 0.5,
+        slow_ms: float = 3000.0,
+        slow_rate: float = 0.5,
+        min_calls: int = 5,
+        window_seconds: float = 30.0,
+        open_seconds: float = 30.0,
+        probe_calls: int = 1,
+    ) -> None:
+        with self._lock:
+            self.error_rate = min(1.0, max(0.01, float(error_rate)))
+            self.slow_ms = max(1.0, float(slow_ms))
+            self.slow_rate = min(1.0, max(0.01, float(slow_rate)))
+            self.min_calls = max(1, int(min_calls))
+            self.window_seconds = max(1.0, float(window_seconds))
+            self.open_seconds = max(0.1, float(open_seconds))
+            self.probe_calls = max(1, int(probe_calls))
+
+    def _trim(self, now: float) -> None:
+        while self._window and self._window[0][0] < now - self.window_seconds:
+            self._window.popleft()
+
+    def _transition(self, state: str) -> None:
+        self._state = state
+        self._generation += 1
+
+    def _open(self, now: float, reason: str) -> None:
+        self._transition(OPEN)
+        self._opened_at = now
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.opened += 1
+        self.last_open_reason = reason
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def is_open(self) -> bool:
+        """
+        此刻发起的调用是否会被拒绝（open，或 half_open 且探测名额已占满），供调用方提前走降级路径。
+        half_open 还有探测名额时返回 False，让调用方照常请求，探测流量才能进来。
+        """
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            return state == OPEN or (state == HALF_OPEN and self._probes_in_flight >= self.probe_calls)
+
+    def check(self) -> Permit:
+        """调用前检查：放行则返回通行证（half_open 时占一个探测名额），拒绝时抛 CircuitOpenError。"""
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            if state == CLOSED:
+                return Permit(self._generation, False)
+            if state == HALF_OPEN and self._probes_in_flight < self.probe_calls:
+                self._probes_in_flight += 1
+                return Permit(self._generation, True)
+            self.rejected += 1
+            retry_after = self.open_seconds - (now - self._opened_at) if state == OPEN else 0.0
+        raise CircuitOpenError(self.name, retry_after)
+
+    def release(self, permit: Permit) -> None:
+        """放行后并未实际发出调用（如没有可用 AK）或调用被取消时调用，归还半开探测名额，不计入统计。"""
+        with self._lock:
+            self._current_state(time.monotonic())
+            if permit.probe and permit.generation == self._generation:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def record(self, permit: Permit, ok: bool, elapsed_ms: float) -> None:
+        """
+        回报一次已放行调用的结果：ok 为是否成功，elapsed_ms 为耗时（超过 slow_ms 记为慢调用）。
+        放行后状态已转换（代数不同）的结果丢弃。
+        """
+        slow = elapsed_ms >= self.slow_ms
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            if permit.generation != self._generation:
+                return
+            if state == HALF_OPEN:
+                if not permit.probe:
+                    return
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if not ok or slow:
+                    self._open(now, "探测失败" if not ok else f"探测耗时 {elapsed_ms:.0f} ms")
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.probe_calls:
+                    self._transition(CLOSED)
+                    self._window.clear()
+                return
+            if state == OPEN:
+                return
+            self._window.append((now, not ok, slow))
+            self._trim(now)
+            total = len(self._window)
+            if total < self.min_calls:
+                return
+            failures = sum(1 for _, failed, _ in self._window if failed)
+            slows = sum(1 for _, _, is_slow in self._window if is_slow)
+            if failures / total >= self.error_rate:
+                self._open(now, f"失败率 {failures}/{total}")
+            elif slows / total >= self.slow_rate:
+                self._open(now, f"慢调用率 {slows}/{total}（>= {self.slow_ms:.0f} ms）")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            self._trim(now)
+            total = len(self._window)
+            return {
+                "state": state,
+                "window_calls": total,
+                "window_failures": sum(1 for _, failed, _ in self._window if failed),
+                "window_slow": sum(1 for _, _, is_slow in self._window if is_slow),
+                "opened": self.opened,
+                "rejected": self.rejected,
+                "last_open_reason": self.last_open_reason,
+                "retry_after_seconds": round(max(0.0, self.open_seconds - (now - self._opened_at)), 1) if state == OPEN else 0.0,
+            }
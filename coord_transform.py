@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+坐标系转换：WGS84（GPS 原始坐标）/ GCJ02（国测局）/ BD09（百度），六个方向全部支持，NumPy 向量化批量计算。
+- 正向（WGS84→GCJ02→BD09）为公开公式的闭式计算；
+- 反向（BD09→GCJ02→WGS84）没有闭式解，先用常见近似公式得初值，再做不动点迭代直到正向结果与输入差小于 1e-9 度（约 0.1 毫米）；
+- 境外坐标（粗略矩形判断）不做 GCJ02 偏移，与百度 / 高德的处理一致；
+- 批量接口 convert_points 接受 [[lat, lng], ...]，单点接口 convert_point 返回 (lat, lng)。
+点的格式与其余模块一致：[lat, lng]。
+"""
+import math
+from typing import Sequence, Tuple
+
+import numpy as np
+
+WGS84 = "wgs84"
+GCJ02 = "gcj02"
+BD09 = "bd09"
+COORD_TYPES = (WGS84, GCJ02, BD09)
+
+# 克拉索夫斯基椭球参数（GCJ02 偏移公式使用）
+_A = 6378245.0
+_EE = 0.00669342162296594323
+_X_PI = math.pi * 3000.0 / 180.0
+
+# 反向迭代的收敛阈值（度）与最大迭代次数；通常 2~3 次即收敛
+INVERSE_TOLERANCE_DEG = 1e-9
+INVERSE_MAX_ITERATIONS = 10
+
+
+def _transform_lat(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    ret = -100.0 + 2.0 * x + 3.0 * y + 0.2 * y * y + 0.1 * x * y + 0.2 * np.sqrt(np.abs(x))
+    ret += (20.0 * np.sin(6.0 * x * math.pi) + 20.0 * np.sin(2.0 * x * math.pi)) * 2.0 / 3.0
+    ret += (20.0 * np.sin(y * math.pi) + 40.0 * np.sin(y / 3.0 * math.pi)) * 2.0 / 3.0
+    ret += (160.0 * np.sin(y / 12.0 * math.pi) + 320.0 * np.sin(y * math.pi / 30.0)) * 2.0 / 3.0
+    return ret
+
+
+def _transform_lng(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    ret = 300.0 + x + 2.0 * y + 0.1 * x * x + 0.1 * x * y + 0.1 * np.sqrt(np.abs(x))
+    ret += (20.0 * np.sin(6.0 * x * math.pi) + 20.0 * np.sin(2.0 * x * math.pi)) * 2.0 / 3.0
+    ret += (20.0 * np.sin(x * math.pi) + 40.0 * np.sin(x / 3.0 * math.pi)) * 2.0 / 3.0
+    ret += (150.0 * np.sin(x / 12.0 * math.pi) + 300.0 * np.sin(x / 30.0 * math.pi)) * 2.0 / 3.0
+    return ret
+
+
+def out_of_china(lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+    """粗略判断是否在国境外（境外不做 GCJ02 偏移）。"""
+    return (lng < 72.004) | (lng > 137.8347) | (lat < 0.8293) | (lat > 55.8271)
+
+
+def _gcj02_offset(lat: np.ndarray, lng: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """WGS84 点对应的 GCJ02 偏移量 (dlat, dlng)，单位度；境外为 0。"""
+    x = lng - 105.0
+    y = lat - 35.0
+    rad_lat = lat / 180.0 * math.pi
+    magic = 1.0 - _EE * np.sin(rad_lat) ** 2
+    sqrt_magic = np.sqrt(magic)
+    dlat = _transform_lat(x, y) * 180.0 / ((_A * (1.0 - _EE)) / (magic * sqrt_magic) * math.pi)
+    dlng = _transform_lng(x, y) * 180.0 / (_A / sqrt_magic * np.cos(rad_lat) * math.pi)
+    outside = out_of_china(lat, lng)
+    return np.where(outside, 0.0, dlat), np.where(outside, 0.0, dlng)
+
+
+def wgs84_to_gcj02(lat: np.ndarray, lng: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    dlat, dlng = _gcj02_offset(lat, lng)
+    return lat + dlat, lng + dlng
+
+
+def gcj02_to_wgs84(lat: np.ndarray, lng: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """GCJ02→WGS84：以 gcj - offset(gcj) 为初值，迭代 wgs -= (forward(wgs) - gcj) 至收敛。"""
+    dlat, dlng = _gcj02_offset(lat, lng)
+    wlat, wlng = lat - dlat, lng - dlng
+    for _ in range(INVERSE_MAX_ITERATIONS):
+        glat, glng = wgs84_to_gcj02(wlat, wlng)
+        elat, elng = glat - lat, glng - lng
+        wlat, wlng = wlat - elat, wlng - elng
+        if float(np.max(np.abs(elat), initial=0.0)) < INVERSE_TOLERANCE_DEG and float(np.max(np.abs(elng), initial=0.0)) < INVERSE_TOLERANCE_DEG:
+            break
+    return wlat, wlng
+
+
+def gcj02_to_bd09(lat: np.ndarray, lng: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    z = np.sqrt(lng * lng + lat * lat) + 0.00002 * np.sin(lat * _X_PI)
+    theta = np.arctan2(lat, lng) + 0.000003 * np.cos(lng * _X_PI)
+    return z * np.sin(theta) + 0.006, z * np.cos(theta) + 0.0065
+
+
+def _bd09_to_gcj02_approx(lat: np.ndarray, lng: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    x = lng - 0.0065
+    y = lat - 0.006
+    z = np.sqrt(x * x + y * y) - 0.00002 * np.sin(y * _X_PI)
+    theta = np.arctan2(y, x) - 0.000003 * np.cos(x * _X_PI)
+    return z * np.sin(theta), z * np.cos(theta)
+
+
+def bd09_to_gcj02(lat: np.ndarray, lng: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """BD09→GCJ02：常见近似公式误差约 1e-6 度，再迭代修正到与 gcj02_to_bd09 严格互逆。"""
+    glat, glng = _bd09_to_gcj02_approx(lat, lng)
+    for _ in range(INVERSE_MAX_ITERATIONS):
+        blat, blng = gcj02_to_bd09(glat, glng)
+        elat, elng = blat - lat, blng - lng
+        glat, glng = glat - elat, glng - elng
+        if float(np.max(np.abs(elat), initial=0.0)) < INVERSE_TOLERANCE_DEG and float(np.max(np.abs(elng), initial=0.0)) < INVERSE_TOLERANCE_DEG:
+            break
+    return glat, glng
+
+
+def wgs84_to_bd09(lat: np.ndarray, lng: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    return gcj02_to_bd09(*wgs84_to_gcj02(lat, lng))
+
+
+def bd09_to_wgs84(lat: np.ndarray, lng: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    return gcj02_to_wgs84(*bd09_to_gcj02(lat, lng))
+
+
+# 各方向的转换函数；同坐标系为恒等
+_CONVERTERS = {
+    (WGS84, GCJ02): wgs84_to_gcj02,
+    (GCJ02, WGS84): gcj02_to_wgs84,
+    (GCJ02, BD09): gcj02_to_bd09,
+    (BD09, GCJ02): bd09_to_gcj02,
+    (WGS84, BD09): wgs84_to_bd09,
+    (BD09, WGS84): bd09_to_wgs84,
+}
+
+
+def normalize_coord_type(value: str) -> str:
+    """坐标系名称归一：wgs84 / wgs84ll / gps → wgs84，gcj02 / gcj02ll / amap → gcj02，bd09 / bd09ll / baidu → bd09。"""
+    v = (value or "").strip().lower()
+    if v in ("wgs84", "wgs84ll", "gps"):
+        return WGS84
+    if v in ("gcj02", "gcj02ll", "amap"):
+        return GCJ02
+    if v in ("bd09", "bd09ll", "baidu"):
+        return BD09
+    raise ValueError(f"不支持的坐标系: {value}，可选 {', '.join(COORD_TYPES)}")
+
+
+def convert_array(points: np.ndarray, src: str, dst: str) -> np.ndarray:
+    """(N, 2) 的 [lat, lng] 数组整体转换，返回新的 float64 数组。"""
+    src, dst = normalize_coord_type(src), normalize_coord_type(dst)
+    arr = np.asarray(points, dtype=np.float64)
+    if arr.size == 0:
+        return arr.reshape(0, 2)
+    if arr.ndim != 2 or arr.shape[1] != 2:
+        raise ValueError(f"坐标数组须为 (N, 2) 的 [lat, lng]，实际形状 {arr.shape}")
+    if src == dst:
+        return arr.copy()
+    lat, lng = _CONVERTERS[(src, dst)](arr[:, 0], arr[:, 1])
+    return np.column_stack((lat, lng))
+
+
+def convert_points(points: Sequence[Sequence[float]], src: str, dst: str) -> list:
+    """批量转换 [[lat, lng], ...]，返回同样格式的列表（原生 float）。"""
+    return convert_array(np.asarray(points, dtype=np.float64).reshape(-1, 2), src, dst).tolist()
+
+
+def convert_point(lat: float, lng: float, src: str, dst: str) -> Tuple[float, float]:
+    """单点转换，返回 (lat, lng)。"""
+    (out_lat, out_lng), = convert_array(np.array([[lat, lng]], dtype=np.float64), src, dst).tolist()
+    return out_lat, out_lng
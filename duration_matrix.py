@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+耗时矩阵值类型：NumPy int32 方阵，在取数、切子矩阵、求解、无解诊断之间传递，替代逐元素 Python 对象的 List[List[int]]。
+- 按节点下标切子矩阵（np.ix_ 一次完成，不逐格拷贝）；
+- 内容哈希（digest / __hash__），可直接做缓存键；
+- 向量化统计：非对角线零边数、最小边、最大边；
+- 交给求解进程池时整块内存序列化，每次求解在入口 tolist() 一次转成 OR-Tools / DP 需要的原生 int（整表 O(n²) 转换）；
+- 插入预筛、路线累计耗时等只读少量格子的调用直接按下标读底层数组（as_array），不做整表转换。
+兼容旧写法：len(m)、m[i][j]、for row in m 仍可用（返回原生 int），新代码请用 m[i, j]。
+"""
+import hashlib
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+
+class DurationMatrix:
+    """
+    只读的 n×n 耗时方阵（秒，int32）。构造时若传入的已是 C 连续 int32 数组则不拷贝（矩阵接管该数组并置为只读），
+    其余输入（二维列表、其他 dtype）转换一次。
+    """
+
+    __slots__ = ("_data", "_digest")
+
+    def __init__(self, data: Any) -> None:
+        arr = np.ascontiguousarray(data, dtype=np.int32)
+        if arr.size == 0:
+            arr = arr.reshape(0, 0)
+        if arr.ndim != 2 or arr.shape[0] != arr.shape[1]:
+            raise ValueError(f"耗时矩阵须为方阵，实际形状 {arr.shape}")
+        arr.flags.writeable = False
+        self._data = arr
+        self._digest: Optional[str] = None
+
+    @property
+    def array(self) -> np.ndarray:
+        """底层只读 int32 数组（不拷贝）。"""
+        return self._data
+
+    @property
+    def size(self) -> int:
+        return int(self._data.shape[0])
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, key: Union[int, Tuple[int, int]]) -> Union[int, List[int]]:
+        if isinstance(key, tuple):
+            return int(self._data[key])
+        return self._data[key].tolist()
+
+    def __iter__(self) -> Iterator[List[int]]:
+        return iter(self._data.tolist())
+
+    def tolist(self) -> List[List[int]]:
+        return self._data.tolist()
+
+    def submatrix(self, nodes: Sequence[int]) -> "DurationMatrix":
+        """按节点下标切子矩阵：sub[a, b] = self[nodes[a], nodes[b]]。"""
+        idx = np.asarray(nodes, dtype=np.intp)
+        return DurationMatrix(self._data[np.ix_(idx, idx)])
+
+    def edge_stats(self) -> Dict[str, int]:
+        """非对角线边的统计：zero_edges（<= 0 的边数）/ min_edge / max_edge，供无解诊断判断矩阵是否异常。"""
+        n = self.size
+        edges = self._data[~np.eye(n, dtype=bool)]
+        if edges.size == 0:
+            return {"zero_edges": 0, "min_edge": 0, "max_edge": 0}
+        return {
+            "zero_edges": int(np.count_nonzero(edges <= 0)),
+            "min_edge": int(edges.min()),
+            "max_edge": int(edges.max()),
+        }
+
+    def digest(self) -> str:
+        """内容哈希（形状 + 数据），同内容矩阵结果相同。"""
+        if self._digest is None:
+            h = hashlib.blake2b(digest_size=16)
+            h.update(str(self._data.shape).encode())
+            h.update(self._data.tobytes())
+            self._digest = h.hexdigest()
+        return self._digest
+
+    def __hash__(self) -> int:
+        return hash(self.digest())
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, DurationMatrix):
+            return NotImplemented
+        return self._data.shape == other._data.shape and bool(np.array_equal(self._data, other._data))
+
+    def __reduce__(self) -> Tuple[Any, Tuple[np.ndarray]]:
+        return (DurationMatrix, (self._data,))
+
+    def __repr__(self) -> str:
+        return f"DurationMatrix(n={self.size}, digest={self.digest()[:8]})"
+
+
+# 求解层与进程池接受的矩阵类型
+MatrixLike = Union[DurationMatrix, List[List[int]]]
+
+
+def as_rows(matrix: MatrixLike) -> List[List[int]]:
+    """DurationMatrix / ndarray 转为原生 int 的二维列表；已是列表则原样返回。整表拷贝，仅在每次求解入口调用一次。"""
+    tolist = getattr(matrix, "tolist", None)
+    return tolist() if callable(tolist) else matrix
+
+
+def as_array(matrix: MatrixLike) -> np.ndarray:
+    """取二维数组：DurationMatrix / ndarray 不拷贝，二维列表转换一次。只读少量格子时用它代替 as_rows。"""
+    data = getattr(matrix, "array", matrix)
+    return data if isinstance(data, np.ndarray) else np.asarray(data, dtype=np.int32)
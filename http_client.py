@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+共享 HTTP 客户端：百度地图 / 百度 OCR / Supabase / Bark 统一走这里。
+- 异步：基于 httpx.AsyncClient，长连接池复用 TCP/TLS，不阻塞 uvicorn 事件循环；
+- 限流：全局连接上限 + 按域名并发上限（避免单一上游占满连接池）；
+- 超时与重试：按请求超时，连接类错误与 429/5xx 指数退避重试（非幂等请求仅重试连接失败）。
+另提供同步版本 sync_request，仅用于模块导入时（事件循环尚未运行）加载 app_config。
+"""
+import asyncio
+import logging
+import random
+import threading
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+# httpx 默认在 INFO 级别打印完整 URL（含百度 AK），这里压到 WARNING
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+DEFAULT_TIMEOUT_SECONDS = 5.0
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 20
+KEEPALIVE_EXPIRY_SECONDS = 30.0
+PER_HOST_LIMIT = 10
+MAX_RETRIES = 2
+BACKOFF_BASE_SECONDS = 0.2
+BACKOFF_MAX_SECONDS = 2.0
+
+# 视为可重试的上游状态码（限流与网关类错误）
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+_IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+HTTPError = httpx.HTTPError
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS,
+    )
+
+
+class AsyncHttpClient:
+    """进程内共享的异步 HTTP 客户端；按事件循环懒创建，换循环（如脚本多次 asyncio.run）时自动重建。"""
+
+    def __init__(self, per_host_limit: int = PER_HOST_LIMIT) -> None:
+        self.per_host_limit = max(1, int(per_host_limit))
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._host_sems: Dict[str, asyncio.Semaphore] = {}
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+
+    def _ensure_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop or self._client.is_closed:
+            self._client = httpx.AsyncClient(limits=_limits(), timeout=DEFAULT_TIMEOUT_SECONDS)
+            self._loop = loop
+            self._host_sems = {}
+        return self._client
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        sem = self._host_sems.get(host)
+        if sem is None:
+            sem = asyncio.Semaphore(self.per_host_limit)
+            self._host_sems[host] = sem
+        return sem
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        params: Optional[Dict[str, Any]] = None,
+        json: Any = None,
+        data: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+    ) -> httpx.Response:
+        """
+        发送请求并返回响应（不对 4xx 抛错，由调用方按业务判断）。
+        连接失败 / 超时 / 429 / 5xx 按指数退避重试；非幂等方法只重试「未发出」的连接类错误。
+        重试用尽仍失败时抛 httpx.HTTPError。
+        """
+        client = self._ensure_client()
+        method = method.upper()
+        max_retries = MAX_RETRIES if retries is None else max(0, int(retries))
+        idempotent = method in _IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            self.requests += 1
+            try:
+                async with self._host_semaphore(url):
+                    resp = await client.request(
+                        method,
+                        url,
+                        params=params,
+                        json=json,
+                        data=data,
+                        headers=headers,
+                        timeout=timeout if timeout is not None else DEFAULT_TIMEOUT_SECONDS,
+                    )
+                if idempotent and resp.status_code in RETRY_STATUS_CODES and attempt < max_retries:
+                    logger.warning("HTTP %s %s 返回 %s，准备重试(%s/%s)", method, _short(url), resp.status_code, attempt + 1, max_retries)
+                else:
+                    return resp
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                if attempt >= max_retries:
+                    self.failures += 1
+                    raise
+                logger.warning("HTTP %s %s 连接失败: %s，准备重试(%s/%s)", method, _short(url), e, attempt + 1, max_retries)
+            except httpx.TransportError as e:
+                if not idempotent or attempt >= max_retries:
+                    self.failures += 1
+                    raise
+                logger.warning("HTTP %s %s 传输异常: %s，准备重试(%s/%s)", method, _short(url), e, attempt + 1, max_retries)
+            attempt += 1
+            self.retries += 1
+            delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** (attempt - 1)))
+            await asyncio.sleep(delay * (0.5 + random.random() / 2))
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def patch(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("PATCH", url, **kwargs)
+
+    async def aclose(self) -> None:
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+        self._loop = None
+        self._host_sems = {}
+
+    def stats(self) -> Dict[str, int]:
+        return {"requests": self.requests, "retries": self.retries, "failures": self.failures}
+
+
+def _short(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.netloc}{parts.path}"
+
+
+http = AsyncHttpClient()
+
+_sync_client: Optional[httpx.Client] = None
+_sync_lock = threading.Lock()
+
+
+def sync_request(
+    method: str,
+    url: str,
+    *,
+    params: Optional[Dict[str, Any]] = None,
+    json: Any = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[float] = None,
+) -> httpx.Response:
+    """同步请求（共享连接池），仅用于启动阶段；请求处理路径请用 http.request。"""
+    global _sync_client
+    with _sync_lock:
+        if _sync_client is None:
+            _sync_client = httpx.Client(limits=_limits(), timeout=DEFAULT_TIMEOUT_SECONDS)
+    return _sync_client.request(
+        method.upper(),
+        url,
+        params=params,
+        json=json,
+        headers=headers,
+        timeout=timeout if timeout is not None else DEFAULT_TIMEOUT_SECONDS,
+    )
@@ -0,0 +1,532 @@
+# -*- coding: utf-8 -*-
+"""
+地图数据缓存：进程内 LRU + SQLite 落盘，带 TTL、容量上限与命中统计。
+用于减少百度地图接口（地理编码等）的重复调用；进程重启后仍可命中磁盘缓存。
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def normalize_address(address: str) -> str:
+    """
+    地址归一化，作为缓存键：全角转半角、去空白、去首尾标点、英文小写。
+    例：「 如东县 掘港镇（荣生豪景）」与「如东县掘港镇(荣生豪景)」视为同一地址。
+    """
+    s = unicodedata.normalize("NFKC", address or "")
+    s = re.sub(r"\s+", "", s)
+    s = s.strip(" ,.;:，。；：、-")
+    return s.lower()
+
+
+class SqliteLruCache:
+    """
+    两级缓存：内存 OrderedDict 做 LRU，SQLite 表做持久层。
+    - 值以 JSON 存储，读出后原样返回；
+    - 每条记录带过期时间（expires_at），可按条覆盖默认 TTL；
+    - 内存与磁盘均受 max_entries 限制，超出时淘汰最久未用 / 最早写入的记录。
+    db_path 为空时仅用内存（磁盘不可写时也会自动降级为仅内存）。
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        db_path: str = "",
+        ttl_seconds: int = 7 * 24 * 3600,
+        max_entries: int = 5000,
+    ) -> None:
+        if not re.match(r"^[A-Za-z_][A-Za-z0-9_]*$", namespace or ""):
+            raise ValueError(f"非法缓存命名空间: {namespace!r}")
+        self.namespace = namespace
+        self.db_path = (db_path or "").strip()
+        self.ttl_seconds = max(1, int(ttl_seconds))
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.RLock()
+        self._mem: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.sets = 0
+        self.evictions = 0
+        if self.db_path:
+            self._open_db()
+
+    def _open_db(self) -> None:
+        try:
+            parent = os.path.dirname(os.path.abspath(self.db_path))
+            if parent and not os.path.isdir(parent):
+                os.makedirs(parent, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.namespace} ("
+                "k TEXT PRIMARY KEY, v TEXT NOT NULL, expires_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.namespace}_updated ON {self.namespace}(updated_at)")
+            conn.commit()
+            self._conn = conn
+        except sqlite3.Error as e:
+            logger.warning("缓存 %s 打开磁盘存储失败（%s），仅使用内存缓存", self.namespace, e)
+            self._conn = None
+
+    def configure(self, ttl_seconds: Optional[int] = None, max_entries: Optional[int] = None) -> None:
+        """运行时调整 TTL 与容量（如 app_config 变更后）。"""
+        with self._lock:
+            if ttl_seconds is not None:
+                self.ttl_seconds = max(1, int(ttl_seconds))
+            if max_entries is not None:
+                self.max_entries = max(1, int(max_entries))
+                self._trim_memory()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """按键读取；过期视为未命中。先查内存，未命中再查磁盘并回填内存。"""
+        now = time.time()
+        with self._lock:
+            item = self._mem.get(key)
+            if item is not None:
+                value, expires_at = item
+                if expires_at > now:
+                    self._mem.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._mem[key]
+                self.expired += 1
+            # 内存里已记过一次过期的键，磁盘上同一条过期记录不再重复计数
+            value = self._disk_get(key, now, count_expired=item is None)
+            if value is not _MISSING:
+                self.hits += 1
+                self.disk_hits += 1
+                return value
+            self.misses += 1
+            return default
+
+    def get_stale(self, key: str) -> Any:
+        """按键读取，过期记录也返回（磁盘尚未清理掉的），不计入命中统计；供上游服务不可用时降级使用。无记录返回 None。"""
+        with self._lock:
+            item = self._mem.get(key)
+            if item is not None:
+                return item[0]
+            if self._conn is None:
+                return None
+            try:
+                row = self._conn.execute(f"SELECT v FROM {self.namespace} WHERE k = ?", (key,)).fetchone()
+            except sqlite3.Error:
+                return None
+        if not row:
+            return None
+        try:
+            return json.loads(row[0])
+        except ValueError:
+            return None
+
+    def peek_expires_at(self, key: str) -> Optional[float]:
+        """返回键的过期时间戳（不计入命中统计）；不存在时返回 None。"""
+        with self._lock:
+            item = self._mem.get(key)
+            if item is not None:
+                return item[1]
+            if self._conn is None:
+                return None
+            try:
+                row = self._conn.execute(
+                    f"SELECT expires_at FROM {self.namespace} WHERE k = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error:
+                return None
+            return float(row[0]) if row else None
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[int] = None) -> None:
+        """写入键值；ttl_seconds 为空时用默认 TTL。"""
+        now = time.time()
+        ttl = self.ttl_seconds if ttl_seconds is None else max(1, int(ttl_seconds))
+        expires_at = now + ttl
+        with self._lock:
+            self._mem[key] = (value, expires_at)
+            self._mem.move_to_end(key)
+            self.sets += 1
+            self._trim_memory()
+            self._disk_set(key, value, expires_at, now)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._mem.pop(key, None)
+            if self._conn is not None:
+                try:
+                    self._conn.execute(f"DELETE FROM {self.namespace} WHERE k = ?", (key,))
+                    self._conn.commit()
+                except sqlite3.Error as e:
+                    logger.warning("缓存 %s 删除失败: %s", self.namespace, e)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            if self._conn is not None:
+                try:
+                    self._conn.execute(f"DELETE FROM {self.namespace}")
+                    self._conn.commit()
+                except sqlite3.Error as e:
+                    logger.warning("缓存 %s 清空失败: %s", self.namespace, e)
+
+    def items(self, include_expired: bool = False) -> List[Tuple[str, Any]]:
+        """全部记录的 (键, 值) 快照（有磁盘时读磁盘，否则读内存），不计入命中统计；供离线估算模型校准等批量读取。"""
+        now = time.time()
+        with self._lock:
+            if self._conn is None:
+                return [(k, v) for k, (v, exp) in self._mem.items() if include_expired or exp > now]
+            try:
+                rows = self._conn.execute(
+                    f"SELECT k, v FROM {self.namespace}" + ("" if include_expired else " WHERE expires_at > ?"),
+                    () if include_expired else (now,),
+                ).fetchall()
+            except sqlite3.Error as e:
+                logger.warning("缓存 %s 批量读取失败: %s", self.namespace, e)
+                return []
+        out: List[Tuple[str, Any]] = []
+        for k, v in rows:
+            try:
+                out.append((k, json.loads(v)))
+            except ValueError:
+                continue
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        """命中统计，供 /cache_stats 展示与容量规划。"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "memory_entries": len(self._mem),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "persistent": self._conn is not None,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "sets": self.sets,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _trim_memory(self) -> None:
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_get(self, key: str, now: float, count_expired: bool = True) -> Any:
+        if self._conn is None:
+            return _MISSING
+        try:
+            row = self._conn.execute(
+                f"SELECT v, expires_at FROM {self.namespace} WHERE k = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("缓存 %s 读盘失败: %s", self.namespace, e)
+            return _MISSING
+        if not row:
+            return _MISSING
+        if float(row[1]) <= now:
+            if count_expired:
+                self.expired += 1
+            return _MISSING
+        try:
+            value = json.loads(row[0])
+        except ValueError:
+            return _MISSING
+        self._mem[key] = (value, float(row[1]))
+        self._trim_memory()
+        return value
+
+    def _disk_set(self, key: str, value: Any, expires_at: float, now: float) -> None:
+        if self._conn is None:
+            return
+        try:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.namespace} (k, v, expires_at, updated_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at, now),
+            )
+            self._disk_writes += 1
+            # 每 100 次写入做一次磁盘清理：删过期记录并按写入时间裁剪到容量上限
+            if self._disk_writes % 100 == 0:
+                self._conn.execute(f"DELETE FROM {self.namespace} WHERE expires_at <= ?", (now,))
+                self._conn.execute(
+                    f"DELETE FROM {self.namespace} WHERE k IN ("
+                    f"SELECT k FROM {self.namespace} ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning("缓存 %s 写盘失败: %s", self.namespace, e)
+
+
+class GeocodeCache(SqliteLruCache):
+    """地理编码缓存：键为归一化地址，值为 "lat,lng"（BD09）。"""
+
+    def __init__(self, db_path: str = "", ttl_seconds: int = 30 * 24 * 3600, max_entries: int = 5000) -> None:
+        super().__init__("geocode_cache", db_path=db_path, ttl_seconds=ttl_seconds, max_entries=max_entries)
+
+    def get_coord(self, address: str) -> Optional[str]:
+        key = normalize_address(address)
+        if not key:
+            return None
+        value = self.get(key)
+        return value if isinstance(value, str) else None
+
+    def set_coord(self, address: str, coord: str) -> None:
+        key = normalize_address(address)
+        if key and coord:
+            self.set(key, coord)
+
+    def iter_coords(self, include_expired: bool = False) -> List[Tuple[str, str]]:
+        """已缓存的 (归一化地址, "lat,lng")。"""
+        return [(k, v) for k, v in self.items(include_expired) if isinstance(v, str)]
+
+
+def grid_cell(lat: float, lng: float, cell_meters: float) -> str:
+    """
+    经纬度所在网格单元的键：纬向按 cell_meters 等分成行，经向按该行中心纬度下的经度跨度等分成列，单元约 cell_meters 见方。
+    键里带单元边长，调整精度后旧键自然失效、不会串用。
+    """
+    size = max(1.0, float(cell_meters))
+    dlat = size / 111320.0
+    row = math.floor(lat / dlat)
+    dlng = size / (111320.0 * max(0.01, math.cos(math.radians((row + 0.5) * dlat))))
+    col = math.floor(lng / dlng)
+    return f"{size:g}:{row}:{col}"
+
+
+class ReverseGeocodeCache(SqliteLruCache):
+    """
+    逆地理编码缓存：键为 BD09 坐标所在的网格单元（见 grid_cell），值为地址字符串。
+    司机停车或缓行时反复上报几乎相同的定位，同一单元内只解析一次。
+    """
+
+    def __init__(
+        self,
+        db_path: str = "",
+        ttl_seconds: int = 7 * 24 * 3600,
+        max_entries: int = 20000,
+        cell_meters: float = 40.0,
+    ) -> None:
+        super().__init__("reverse_geocode_cache", db_path=db_path, ttl_seconds=ttl_seconds, max_entries=max_entries)
+        self.cell_meters = max(1.0, float(cell_meters))
+
+    def cell_key(self, lat: float, lng: float) -> str:
+        return grid_cell(lat, lng, self.cell_meters)
+
+    def get_address(self, lat: float, lng: float) -> Optional[str]:
+        value = self.get(self.cell_key(lat, lng))
+        return value if isinstance(value, str) and value else None
+
+    def set_address(self, lat: float, lng: float, address: str) -> None:
+        if address:
+            self.set(self.cell_key(lat, lng), address)
+
+    def stats(self) -> Dict[str, Any]:
+        out = super().stats()
+        out["cell_meters"] = self.cell_meters
+        return out
+
+
+def normalize_coord(coord: str) -> str:
+    """坐标串 "lat,lng" 归一化为 6 位小数，避免浮点格式差异导致缓存键不一致。"""
+    try:
+        a, b = (coord or "").split(",", 1)
+        return f"{float(a):.6f},{float(b):.6f}"
+    except (ValueError, TypeError):
+        return (coord or "").strip()
+
+
+# 路况时段（本地时间的小时）：早晚高峰仅工作日生效，夜间每天生效
+RUSH_HOURS = (7, 8, 17, 18)
+NIGHT_HOURS = (22, 23, 0, 1, 2, 3, 4, 5)
+
+
+def time_bucket(ts: Optional[float] = None) -> str:
+    """耗时所属的时段桶（星期 + 小时，如 w0h08 为周一 8 点），路况随工作日/周末与时段变化，不同桶的耗时分开缓存。"""
+    t = time.localtime(ts if ts is not None else time.time())
+    return f"w{t.tm_wday}h{t.tm_hour:02d}"
+
+
+def parse_time_bucket(bucket: str) -> Tuple[int, int]:
+    """time_bucket 的逆：返回 (星期 0-6, 小时 0-23)；无法解析时按 (0, 12) 处理（视为工作日白天）。"""
+    m = re.match(r"^w(\d)h(\d{2})$", bucket or "")
+    if not m:
+        return 0, 12
+    return int(m.group(1)), int(m.group(2))
+
+
+class DurationLegCache(SqliteLruCache):
+    """
+    两点驾车耗时（单条腿）缓存：键为 (起点坐标, 终点坐标, tactics, 时段桶)，值为秒数。
+    新鲜度按时段桶区分：工作日早晚高峰路况变化快用 rush_ttl_seconds，夜间用 night_ttl_seconds，其余用默认 ttl_seconds。
+    每条腿的查询次数会被记录，供后台刷新在过期前重新拉取最热的腿（hot_legs_due）。
+    """
+
+    # 热度记录条数上限，超出时丢弃较冷的一半
+    HOT_TRACK_MAX = 20000
+
+    def __init__(
+        self,
+        db_path: str = "",
+        ttl_seconds: int = 30 * 60,
+        max_entries: int = 50000,
+        rush_ttl_seconds: int = 10 * 60,
+        night_ttl_seconds: int = 6 * 3600,
+    ) -> None:
+        super().__init__("duration_leg_cache", db_path=db_path, ttl_seconds=ttl_seconds, max_entries=max_entries)
+        self.rush_ttl_seconds = max(1, int(rush_ttl_seconds))
+        self.night_ttl_seconds = max(1, int(night_ttl_seconds))
+        self.rush_hours = frozenset(RUSH_HOURS)
+        self.night_hours = frozenset(NIGHT_HOURS)
+        self._lookups: Dict[str, int] = {}
+        self.refreshed = 0
+
+    def configure_freshness(
+        self,
+        rush_ttl_seconds: Optional[int] = None,
+        night_ttl_seconds: Optional[int] = None,
+        rush_hours: Optional[Iterable[int]] = None,
+        night_hours: Optional[Iterable[int]] = None,
+    ) -> None:
+        """运行时调整各时段的新鲜度（白天默认值仍由 configure(ttl_seconds=...) 调整）。"""
+        with self._lock:
+            if rush_ttl_seconds is not None:
+                self.rush_ttl_seconds = max(1, int(rush_ttl_seconds))
+            if night_ttl_seconds is not None:
+                self.night_ttl_seconds = max(1, int(night_ttl_seconds))
+            if rush_hours is not None:
+                self.rush_hours = frozenset(int(h) for h in rush_hours)
+            if night_hours is not None:
+                self.night_hours = frozenset(int(h) for h in night_hours)
+
+    def bucket_ttl_seconds(self, bucket: str) -> int:
+        """时段桶对应的新鲜度（秒）。"""
+        weekday, hour = parse_time_bucket(bucket)
+        if weekday < 5 and hour in self.rush_hours:
+            return self.rush_ttl_seconds
+        if hour in self.night_hours:
+            return self.night_ttl_seconds
+        return self.ttl_seconds
+
+    @staticmethod
+    def leg_key(origin: str, dest: str, tactics: int, bucket: str) -> str:
+        return f"{tactics}|{bucket}|{normalize_coord(origin)}|{normalize_coord(dest)}"
+
+    @staticmethod
+    def parse_leg_key(key: str) -> Optional[Tuple[str, str, int, str]]:
+        """leg_key 的逆：返回 (起点坐标, 终点坐标, tactics, 时段桶)；格式不符时返回 None。"""
+        parts = key.split("|")
+        if len(parts) != 4:
+            return None
+        try:
+            return parts[2], parts[3], int(parts[0]), parts[1]
+        except ValueError:
+            return None
+
+    def get_leg(self, origin: str, dest: str, tactics: int, bucket: str) -> Optional[int]:
+        key = self.leg_key(origin, dest, tactics, bucket)
+        with self._lock:
+            self._lookups[key] = self._lookups.get(key, 0) + 1
+            if len(self._lookups) > self.HOT_TRACK_MAX:
+                keep = sorted(self._lookups.items(), key=lambda kv: kv[1], reverse=True)[: self.HOT_TRACK_MAX // 2]
+                self._lookups = dict(keep)
+        value = self.get(key)
+        return int(value) if isinstance(value, (int, float)) else None
+
+    def get_leg_stale(self, origin: str, dest: str, tactics: int, bucket: str) -> Optional[int]:
+        """同 get_leg，但已过期的腿也返回（不计入热门统计与命中率）。"""
+        value = self.get_stale(self.leg_key(origin, dest, tactics, bucket))
+        return int(value) if isinstance(value, (int, float)) else None
+
+    def set_leg(self, origin: str, dest: str, tactics: int, bucket: str, seconds: int) -> None:
+        self.set(self.leg_key(origin, dest, tactics, bucket), int(seconds), ttl_seconds=self.bucket_ttl_seconds(bucket))
+
+    def iter_legs(self, include_expired: bool = False) -> List[Tuple[str, str, int, str, int]]:
+        """已缓存的腿：[(起点坐标, 终点坐标, tactics, 时段桶, 秒数)]。"""
+        out: List[Tuple[str, str, int, str, int]] = []
+        for key, value in self.items(include_expired):
+            parsed = self.parse_leg_key(key)
+            if parsed is not None and isinstance(value, (int, float)):
+                out.append((parsed[0], parsed[1], parsed[2], parsed[3], int(value)))
+        return out
+
+    def hot_legs_due(
+        self,
+        bucket: str,
+        refresh_ahead_seconds: float,
+        limit: int,
+        min_lookups: int = 2,
+    ) -> List[Tuple[str, str, int]]:
+        """
+        当前时段桶内、查询次数 >= min_lookups 且将在 refresh_ahead_seconds 内过期（或已过期）的腿，按热度降序取前 limit 条。
+        返回 [(起点坐标, 终点坐标, tactics)]；其他时段桶的热度记录顺带清掉（桶已过，不再刷新）。
+        """
+        deadline = time.time() + max(0.0, float(refresh_ahead_seconds))
+        with self._lock:
+            self._lookups = {k: v for k, v in self._lookups.items() if f"|{bucket}|" in k}
+            hot = sorted(
+                ((k, v) for k, v in self._lookups.items() if v >= min_lookups), key=lambda kv: kv[1], reverse=True
+            )
+        due: List[Tuple[str, str, int]] = []
+        for key, _ in hot:
+            if len(due) >= max(0, int(limit)):
+                break
+            expires_at = self.peek_expires_at(key)
+            if expires_at is not None and expires_at > deadline:
+                continue
+            parsed = self.parse_leg_key(key)
+            if parsed is not None:
+                due.append((parsed[0], parsed[1], parsed[2]))
+        return due
+
+    def stats(self) -> Dict[str, Any]:
+        out = super().stats()
+        with self._lock:
+            out.update(
+                {
+                    "rush_ttl_seconds": self.rush_ttl_seconds,
+                    "night_ttl_seconds": self.night_ttl_seconds,
+                    "tracked_legs": len(self._lookups),
+                    "refreshed": self.refreshed,
+                }
+            )
+        return out
+
+
+class RouteGeometryCache(SqliteLruCache):
+    """
+    驾车路线几何缓存：键为 (途经坐标序列, tactics, 车牌, cartype)，值为 {paths, durations, steps}（未抽稀的原始点列）。
+    同一路线在不同缩放级别下抽稀结果不同，故缓存原始几何，抽稀在取出后进行。键做摘要，避免长坐标串与明文车牌落盘。
+    """
+
+    def __init__(self, db_path: str = "", ttl_seconds: int = 30 * 60, max_entries: int = 500) -> None:
+        super().__init__("route_geometry_cache", db_path=db_path, ttl_seconds=ttl_seconds, max_entries=max_entries)
+
+    @staticmethod
+    def route_key(coords: List[str], tactics: Optional[int], plate_number: Optional[str], cartype: Optional[int]) -> str:
+        seq = ";".join(normalize_coord(c) for c in coords)
+        raw = f"{tactics}|{(plate_number or '').strip().upper()}|{cartype}|{seq}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get_route(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self.get(key)
+        return value if isinstance(value, dict) and "paths" in value else None
+
+    def set_route(self, key: str, paths: List[Any], durations: List[int], steps: List[Any]) -> None:
+        self.set(key, {"paths": paths, "durations": durations, "steps": steps})
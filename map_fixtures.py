@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+路网请求录制 / 回放：把真实百度结果录成压缩 fixture，离线时确定性回放，供求解器与缓存调优的基准、压测复现。
+- 录制（RecordingMapProvider）：包装真实路网服务，成功结果按与请求拆分方式无关的键记下：
+  地理编码按归一化地址，逆地理编码按 6 位小数坐标，耗时矩阵拆成单条腿 (tactics, 起点, 终点)，
+  驾车路线按路线键（与路线几何缓存同一摘要，不含明文车牌）。矩阵按腿存储，回放时缓存命中情况、分块方式不同也能拼出同样结果；
+- 存储（FixtureStore）：gzip 压缩的单个 JSON 文件，写临时文件后原子替换；
+- 回放（ReplayMapProvider）：只读 fixture、不发网络请求；每类调用注入固定延迟（可加按种子确定的抖动）模拟真实耗时，
+  未录到的请求抛 503（可再用 FallbackMapProvider 接离线估算补齐）。
+"""
+import asyncio
+import gzip
+import json
+import logging
+import os
+import random
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from map_cache import RouteGeometryCache, normalize_address, normalize_coord
+from map_provider import MapProvider, MapProviderError, RouteResult
+
+logger = logging.getLogger(__name__)
+
+FIXTURE_VERSION = 1
+SECTIONS = ("geocode", "reverse_geocode", "routematrix", "direction")
+# 录制时每新增多少条记录落盘一次（进程退出时另有一次）
+FLUSH_EVERY = 500
+
+
+def leg_fixture_key(origin: str, dest: str, tactics: int) -> str:
+    return f"{int(tactics)}|{normalize_coord(origin)}|{normalize_coord(dest)}"
+
+
+def point_fixture_key(lat: float, lng: float) -> str:
+    return f"{lat:.6f},{lng:.6f}"
+
+
+def route_fixture_key(
+    coords: List[List[float]],
+    tactics: Optional[int],
+    plate_number: Optional[str],
+    cartype: Optional[int],
+) -> str:
+    return RouteGeometryCache.route_key([f"{c[0]},{c[1]}" for c in coords], tactics, plate_number, cartype)
+
+
+def parse_latency_spec(spec: str) -> Dict[str, float]:
+    """
+    注入延迟配置（毫秒）：单个数字表示四类调用相同，或按类给出，如 "geocode=20,routematrix=80,direction=150"。
+    未给出的类为 0；无法解析的项忽略。
+    """
+    out = {section: 0.0 for section in SECTIONS}
+    spec = (spec or "").strip()
+    if not spec:
+        return out
+    try:
+        value = max(0.0, float(spec))
+        return {section: value for section in SECTIONS}
+    except ValueError:
+        pass
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if name in out:
+            try:
+                out[name] = max(0.0, float(value))
+            except ValueError:
+                continue
+    return out
+
+
+class FixtureStore:
+    """fixture 存储：四个分区各是一张 键 → 结果 的表，整体以 gzip JSON 落盘。线程安全。"""
+
+    def __init__(self, path: str, flush_every: int = FLUSH_EVERY) -> None:
+        self.path = path
+        self.flush_every = max(1, int(flush_every))
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict[str, Any]] = {section: {} for section in SECTIONS}
+        self._dirty = 0
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def load(self) -> None:
+        """读取 fixture 文件；文件不存在时为空表，格式错误时记日志并保持空表。"""
+        if not self.path or not os.path.isfile(self.path):
+            return
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("读取路网 fixture 失败 %s: %s", self.path, e)
+            return
+        with self._lock:
+            for section in SECTIONS:
+                table = raw.get(section)
+                if isinstance(table, dict):
+                    self._data[section] = table
+
+    def save(self) -> None:
+        """有未落盘的新记录时写盘（先写临时文件再替换，中途失败不损坏原文件）。"""
+        with self._lock:
+            if not self._dirty or not self.path:
+                return
+            payload = {"version": FIXTURE_VERSION, **{s: dict(t) for s, t in self._data.items()}}
+            self._dirty = 0
+        tmp = f"{self.path}.tmp"
+        try:
+            with gzip.open(tmp, "wt", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning("写入路网 fixture 失败 %s: %s", self.path, e)
+
+    def get(self, section: str, key: str) -> Any:
+        with self._lock:
+            value = self._data[section].get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, section: str, key: str, value: Any) -> None:
+        self.put_many(section, [(key, value)])
+
+    def put_many(self, section: str, items: List[Tuple[str, Any]]) -> None:
+        """批量写入（如一次矩阵的全部腿），攒够 flush_every 条才落盘一次。"""
+        with self._lock:
+            table = self._data[section]
+            for key, value in items:
+                table[key] = value
+            self._dirty += len(items)
+            flush = self._dirty >= self.flush_every
+        if flush:
+            self.save()
+
+    def keys(self, section: str) -> List[str]:
+        with self._lock:
+            return list(self._data[section].keys())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "path": self.path,
+                "entries": {s: len(t) for s, t in self._data.items()},
+                "hits": self.hits,
+                "misses": self.misses,
+                "unsaved": self._dirty,
+            }
+
+
+class RecordingMapProvider(MapProvider):
+    """录制：透传给 inner，成功结果写入 store。名称与是否可缓存沿用 inner。"""
+
+    def __init__(self, inner: MapProvider, store: FixtureStore) -> None:
+        self.inner = inner
+        self.store = store
+        self.name = inner.name
+        self.cacheable = inner.cacheable
+
+    async def geocode(self, address: str, stats: Optional[Dict[str, Any]] = None) -> str:
+        coord = await self.inner.geocode(address, stats=stats)
+        self.store.put("geocode", normalize_address(address), coord)
+        return coord
+
+    async def reverse_geocode(self, lat: float, lng: float, stats: Optional[Dict[str, Any]] = None) -> str:
+        address = await self.inner.reverse_geocode(lat, lng, stats=stats)
+        self.store.put("reverse_geocode", point_fixture_key(lat, lng), address)
+        return address
+
+    async def routematrix(
+        self,
+        origins: List[str],
+        destinations: List[str],
+        tactics: int,
+        stats: Optional[Dict[str, Any]] = None,
+    ) -> np.ndarray:
+        call_stats: Dict[str, Any] = stats if stats is not None else {}
+        rows = await self.inner.routematrix(origins, destinations, tactics, stats=call_stats)
+        if call_stats.get("tactics_fallback"):
+            # 所选策略不支持、实际按 11 取得的耗时不能录成该 tactics 的腿
+            return rows
+        self.store.put_many(
+            "routematrix",
+            [
+                (leg_fixture_key(origin, dest, tactics), int(rows[i, j]))
+                for i, origin in enumerate(origins)
+                for j, dest in enumerate(destinations)
+                if normalize_coord(origin) != normalize_coord(dest)
+            ],
+        )
+        return rows
+
+    async def driving_route(
+        self,
+        coords: List[List[float]],
+        tactics: Optional[int] = None,
+        plate_number: Optional[str] = None,
+        cartype: Optional[int] = None,
+        stats: Optional[Dict[str, Any]] = None,
+    ) -> RouteResult:
+        paths, durations, steps = await self.inner.driving_route(
+            coords, tactics=tactics, plate_number=plate_number, cartype=cartype, stats=stats
+        )
+        if paths:
+            self.store.put(
+                "direction",
+                route_fixture_key(coords, tactics, plate_number, cartype),
+                {"paths": paths, "durations": durations, "steps": steps},
+            )
+        return paths, durations, steps
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name, "mode": "record", "inner": self.inner.stats(), "fixtures": self.store.stats()}
+
+
+class ReplayMapProvider(MapProvider):
+    """
+    回放：按录制时的键查 fixture 返回结果，注入延迟后返回；查不到抛 503。
+    回放的是百度真实结果，与百度实现一样可写入缓存（cacheable），缓存行为与线上一致。
+    """
+
+    name = "replay"
+    cacheable = True
+
+    def __init__(
+        self,
+        store: FixtureStore,
+        latency_ms: Optional[Dict[str, float]] = None,
+        jitter_ms: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.store = store
+        self.latency_ms = {section: 0.0 for section in SECTIONS}
+        self.latency_ms.update(latency_ms or {})
+        self.jitter_ms = max(0.0, float(jitter_ms))
+        self._rng = random.Random(seed)
+        self.calls: Dict[str, int] = {section: 0 for section in SECTIONS}
+        self.misses: Dict[str, int] = {section: 0 for section in SECTIONS}
+
+    async def _delay(self, section: str) -> None:
+        self.calls[section] += 1
+        delay = self.latency_ms.get(section, 0.0)
+        if self.jitter_ms:
+            delay += self._rng.uniform(0.0, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+    def _miss(self, section: str, what: str) -> MapProviderError:
+        self.misses[section] += 1
+        return MapProviderError(503, f"回放 fixture 中无此记录（{section}）: {what}")
+
+    async def geocode(self, address: str, stats: Optional[Dict[str, Any]] = None) -> str:
+        self._mark(stats)
+        await self._delay("geocode")
+        coord = self.store.get("geocode", normalize_address(address))
+        if not isinstance(coord, str):
+            raise self._miss("geocode", address)
+        return coord
+
+    async def reverse_geocode(self, lat: float, lng: float, stats: Optional[Dict[str, Any]] = None) -> str:
+        self._mark(stats)
+        await self._delay("reverse_geocode")
+        key = point_fixture_key(lat, lng)
+        address = self.store.get("reverse_geocode", key)
+        if not isinstance(address, str):
+            raise self._miss("reverse_geocode", key)
+        return address
+
+    async def routematrix(
+        self,
+        origins: List[str],
+        destinations: List[str],
+        tactics: int,
+        stats: Optional[Dict[str, Any]] = None,
+    ) -> np.ndarray:
+        self._mark(stats)
+        await self._delay("routematrix")
+        rows = np.zeros((len(origins), len(destinations)), dtype=np.int32)
+        missing: List[Tuple[str, str]] = []
+        for i, origin in enumerate(origins):
+            for j, dest in enumerate(destinations):
+                if normalize_coord(origin) == normalize_coord(dest):
+                    continue
+                value = self.store.get("routematrix", leg_fixture_key(origin, dest, tactics))
+                if value is None:
+                    missing.append((origin, dest))
+                else:
+                    rows[i, j] = int(value)
+        if missing:
+            raise self._miss("routematrix", f"{len(missing)} 条腿，如 {missing[0][0]} → {missing[0][1]}")
+        return rows
+
+    async def driving_route(
+        self,
+        coords: List[List[float]],
+        tactics: Optional[int] = None,
+        plate_number: Optional[str] = None,
+        cartype: Optional[int] = None,
+        stats: Optional[Dict[str, Any]] = None,
+    ) -> RouteResult:
+        self._mark(stats)
+        await self._delay("direction")
+        value = self.store.get("direction", route_fixture_key(coords, tactics, plate_number, cartype))
+        if not isinstance(value, dict):
+            raise self._miss("direction", f"{len(coords)} 个站点")
+        return value.get("paths") or [], value.get("durations") or [], value.get("steps") or []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "latency_ms": dict(self.latency_ms),
+            "jitter_ms": self.jitter_ms,
+            "calls": dict(self.calls),
+            "misses": dict(self.misses),
+            "fixtures": self.store.stats(),
+        }
@@ -0,0 +1,526 @@
+# -*- coding: utf-8 -*-
+"""
+路网服务抽象：地理编码 / 逆地理编码 / 路网耗时矩阵 / 驾车路线四类调用统一为 MapProvider 接口，按配置切换实现。
+- 百度实现（BaiduMapProvider）在 smartdiaodu 中，复用原有的请求、AK 限流、分块与策略降级，成功结果写回缓存；
+- LocalMapProvider：离线替身，不发任何网络请求。地名表（gazetteer CSV）做地理编码，
+  球面距离 × 绕行系数 ÷ 分距离段车速 × 时段系数估算耗时（SpeedProfile，可用已缓存的百度耗时校准），
+  供压测、基准与百度不可用时兜底；
+- FallbackMapProvider：主服务判定为不可用（5xx / 网络异常 / 配额耗尽）时改用备用服务，并在 stats 中标记 degraded；
+- LazyMapProvider：首次调用时才构建内部服务，离线估算只作兜底时不在启动时加载。
+坐标一律为 BD09：单点 "lat,lng"，点列 [lat, lng]。估算结果不可写入百度结果的缓存（见 cacheable）。
+"""
+import abc
+import argparse
+import asyncio
+import csv
+import logging
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from map_cache import NIGHT_HOURS, RUSH_HOURS, normalize_address, parse_time_bucket
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_METERS = 6371008.8
+
+# 逆地理编码：最近地名在该距离内时返回「xx附近」，否则返回坐标串
+REVERSE_GEOCODE_MAX_METERS = 500.0
+# 离线地理编码的包含匹配：地名至少这么多字、且至少占地址这么大比例才算命中，
+# 避免「上海市浦东新区xx路」因含「上海」「浦东新区」之类的短地名被定位到区县 / 城市中心
+GAZETTEER_MIN_MATCH_CHARS = 4
+GAZETTEER_MIN_MATCH_RATIO = 0.3
+
+RouteResult = Tuple[List[List[List[float]]], List[int], List[Dict[str, Any]]]
+
+
+class MapProviderError(Exception):
+    """路网服务调用失败；status_code 沿用 HTTP 语义：4xx 为请求本身无解（如地址无法解析），5xx 为服务不可用。"""
+
+    def __init__(self, status_code: int, detail: str) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def parse_coord(coord: str) -> Tuple[float, float]:
+    """ "lat,lng" → (lat, lng)。"""
+    a, b = (coord or "").split(",", 1)
+    return float(a), float(b)
+
+
+def _coord_array(coords: Sequence[str]) -> np.ndarray:
+    return np.array([parse_coord(c) for c in coords], dtype=np.float64).reshape(-1, 2)
+
+
+def _haversine(lat1: np.ndarray, lng1: np.ndarray, lat2: np.ndarray, lng2: np.ndarray) -> np.ndarray:
+    lat1, lng1, lat2, lng2 = np.radians(lat1), np.radians(lng1), np.radians(lat2), np.radians(lng2)
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def haversine_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """(N, 2) 与 (M, 2) 的 [lat, lng] 两两球面距离（米），返回 (N, M)。"""
+    return _haversine(a[:, 0][:, None], a[:, 1][:, None], b[:, 0][None, :], b[:, 1][None, :])
+
+
+def haversine_pairs(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """(N, 2) 与 (N, 2) 的 [lat, lng] 逐对球面距离（米），返回 (N,)。"""
+    return _haversine(a[:, 0], a[:, 1], b[:, 0], b[:, 1])
+
+
+class SpeedProfile:
+    """
+    离线耗时估算模型：耗时 = 起步耗时 + 直线距离 × 绕行系数 ÷ 所在距离段车速 × 时段系数。
+    默认值按城区 / 城郊 / 国道 / 高速的经验车速给出；calibrate 可用已缓存的百度耗时（距离, 秒数, 小时）拟合各段车速与各小时系数。
+    """
+
+    # (距离上限米, 车速 m/s)：约 18 / 29 / 43 / 65 km/h
+    DEFAULT_BANDS: Tuple[Tuple[float, float], ...] = ((2000.0, 5.0), (8000.0, 8.0), (30000.0, 12.0), (math.inf, 18.0))
+    DETOUR_FACTOR = 1.35
+    OVERHEAD_SECONDS = 60.0
+    RUSH_FACTOR = 1.3
+    NIGHT_FACTOR = 0.85
+
+    def __init__(
+        self,
+        bands: Optional[Sequence[Tuple[float, float]]] = None,
+        hour_factors: Optional[Sequence[float]] = None,
+        detour_factor: float = DETOUR_FACTOR,
+        overhead_seconds: float = OVERHEAD_SECONDS,
+        samples: int = 0,
+    ) -> None:
+        self.bands = tuple((float(limit), max(0.5, float(speed))) for limit, speed in (bands or self.DEFAULT_BANDS))
+        if hour_factors is None:
+            hour_factors = [
+                self.RUSH_FACTOR if h in RUSH_HOURS else self.NIGHT_FACTOR if h in NIGHT_HOURS else 1.0 for h in range(24)
+            ]
+        self.hour_factors = [float(f) for f in hour_factors]
+        self.detour_factor = float(detour_factor)
+        self.overhead_seconds = float(overhead_seconds)
+        self.samples = int(samples)
+        self._limits = np.array([limit for limit, _ in self.bands])
+        self._speeds = np.array([speed for _, speed in self.bands])
+
+    def _band_index(self, meters: np.ndarray) -> np.ndarray:
+        return np.minimum(np.searchsorted(self._limits, meters, side="left"), len(self.bands) - 1)
+
+    def estimate(self, meters: np.ndarray, hour: int) -> np.ndarray:
+        """直线距离（米，任意形状数组）→ 估算驾车秒数（同形状 int32）；距离不足 1 米视为同一点，耗时 0。"""
+        meters = np.asarray(meters, dtype=np.float64)
+        speed = self._speeds[self._band_index(meters)]
+        seconds = (self.overhead_seconds + meters * self.detour_factor / speed) * self.hour_factors[int(hour) % 24]
+        return np.where(meters < 1.0, 0, np.rint(seconds)).astype(np.int32)
+
+    @classmethod
+    def calibrate(cls, samples: Iterable[Tuple[float, float, int]], min_samples: int = 30) -> "SpeedProfile":
+        """
+        用实测样本 (直线距离米, 驾车秒数, 小时) 拟合：各距离段车速取中位数，各小时系数取「实测 / 未乘时段系数的估算」中位数（限制在 0.6~2.0）。
+        某段 / 某小时样本不足时沿用默认值；总样本不足 min_samples 时直接返回默认模型。
+        """
+        data = np.array([s for s in samples if s[0] >= 100.0 and s[1] > cls.OVERHEAD_SECONDS], dtype=np.float64).reshape(-1, 3)
+        if len(data) < min_samples:
+            return cls(samples=len(data))
+        meters, seconds, hours = data[:, 0], data[:, 1], data[:, 2].astype(np.int64) % 24
+        default = cls()
+        band_idx = default._band_index(meters)
+        speeds = meters * cls.DETOUR_FACTOR / (seconds - cls.OVERHEAD_SECONDS)
+        per_band = max(5, min_samples // len(default.bands))
+        bands = []
+        for i, (limit, speed) in enumerate(default.bands):
+            in_band = speeds[band_idx == i]
+            bands.append((limit, float(np.median(in_band)) if len(in_band) >= per_band else speed))
+        fitted = cls(bands=bands, hour_factors=[1.0] * 24)
+        ratios = seconds / np.maximum(1, fitted.estimate(meters, 12))
+        per_hour = max(3, min_samples // 24)
+        factors = []
+        for h in range(24):
+            at_hour = ratios[hours == h]
+            factors.append(float(np.clip(np.median(at_hour), 0.6, 2.0)) if len(at_hour) >= per_hour else default.hour_factors[h])
+        return cls(bands=bands, hour_factors=factors, samples=len(data))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "samples": self.samples,
+            "bands_kmh": [[None if math.isinf(limit) else limit, round(speed * 3.6, 1)] for limit, speed in self.bands],
+            "hour_factors": [round(f, 3) for f in self.hour_factors],
+            "detour_factor": self.detour_factor,
+            "overhead_seconds": self.overhead_seconds,
+        }
+
+
+def leg_samples(legs: Iterable[Tuple[str, str, str, int]]) -> List[Tuple[float, float, int]]:
+    """(起点坐标, 终点坐标, 时段桶, 秒数) → SpeedProfile.calibrate 所需的 (直线距离米, 秒数, 小时)。"""
+    origins: List[str] = []
+    dests: List[str] = []
+    rest: List[Tuple[int, int]] = []
+    for origin, dest, bucket, seconds in legs:
+        try:
+            parse_coord(origin), parse_coord(dest)
+        except (ValueError, TypeError):
+            continue
+        origins.append(origin)
+        dests.append(dest)
+        rest.append((int(seconds), parse_time_bucket(bucket)[1]))
+    if not rest:
+        return []
+    meters = haversine_pairs(_coord_array(origins), _coord_array(dests))
+    return [(float(m), float(sec), hour) for m, (sec, hour) in zip(meters, rest)]
+
+
+def load_gazetteer(path: str) -> List[Tuple[str, str]]:
+    """
+    读取地名表 CSV（UTF-8，表头 address,lat,lng，坐标为 BD09），返回 [(地名, "lat,lng")]。
+    文件不存在时返回空表；坐标无法解析的行跳过。
+    """
+    if not path or not os.path.isfile(path):
+        return []
+    entries: List[Tuple[str, str]] = []
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            name = (row.get("address") or "").strip()
+            try:
+                lat, lng = float(row.get("lat") or ""), float(row.get("lng") or "")
+            except ValueError:
+                continue
+            if name:
+                entries.append((name, f"{lat},{lng}"))
+    return entries
+
+
+def write_gazetteer(path: str, entries: Iterable[Tuple[str, str]]) -> int:
+    """把 [(地名, "lat,lng")] 写成地名表 CSV，返回写入行数。"""
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["address", "lat", "lng"])
+        for name, coord in entries:
+            try:
+                lat, lng = parse_coord(coord)
+            except (ValueError, TypeError):
+                continue
+            writer.writerow([name, lat, lng])
+            count += 1
+    return count
+
+
+class MapProvider(abc.ABC):
+    """路网服务接口。各方法传入 stats 时回填 provider（实际提供结果的服务名）与 cacheable（结果能否写入缓存）。"""
+
+    name = "base"
+    # 结果能否写入百度结果的缓存（估算值不能）
+    cacheable = True
+
+    def _mark(self, stats: Optional[Dict[str, Any]]) -> None:
+        if stats is not None:
+            stats["provider"] = self.name
+            stats["cacheable"] = self.cacheable
+
+    @abc.abstractmethod
+    async def geocode(self, address: str, stats: Optional[Dict[str, Any]] = None) -> str:
+        """地址 → "lat,lng"。"""
+
+    @abc.abstractmethod
+    async def reverse_geocode(self, lat: float, lng: float, stats: Optional[Dict[str, Any]] = None) -> str:
+        """BD09 经纬度 → 地址字符串。"""
+
+    @abc.abstractmethod
+    async def routematrix(
+        self,
+        origins: List[str],
+        destinations: List[str],
+        tactics: int,
+        stats: Optional[Dict[str, Any]] = None,
+    ) -> np.ndarray:
+        """origins × destinations 的驾车耗时（秒），返回 int32 数组 rows[i, j]。"""
+
+    @abc.abstractmethod
+    async def driving_route(
+        self,
+        coords: List[List[float]],
+        tactics: Optional[int] = None,
+        plate_number: Optional[str] = None,
+        cartype: Optional[int] = None,
+        stats: Optional[Dict[str, Any]] = None,
+    ) -> RouteResult:
+        """途经站点序列 → (各备选路线点列, 各路线秒数, 首条路线分段)，与 fetch_driving_route_path 返回值一致。"""
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name}
+
+
+class LocalMapProvider(MapProvider):
+    """
+    离线路网服务：地名表查坐标、球面距离估算耗时、站点直连作为路线几何。全部在本进程内计算，不发网络请求。
+    地名匹配顺序：归一化后完全相同 → 地址中包含的最长地名（如「xx小区3号楼」命中「xx小区」），
+    包含匹配的地名须不少于 GAZETTEER_MIN_MATCH_CHARS 字且占地址长度不低于 GAZETTEER_MIN_MATCH_RATIO，否则视为无此地址。
+    """
+
+    name = "local"
+    cacheable = False
+
+    def __init__(
+        self,
+        gazetteer_path: str = "",
+        extra_entries: Iterable[Tuple[str, str]] = (),
+        profile: Optional[SpeedProfile] = None,
+        hour: Optional[int] = None,
+    ) -> None:
+        self.gazetteer_path = gazetteer_path
+        self.profile = profile or SpeedProfile()
+        # 固定按某小时估算（基准需要结果与运行时刻无关）；None 为按当前时刻
+        self.hour = hour
+        self._names: Dict[str, str] = {}
+        self._display: Dict[str, str] = {}
+        for name, coord in list(load_gazetteer(gazetteer_path)) + list(extra_entries):
+            key = normalize_address(name)
+            try:
+                parse_coord(coord)
+            except (ValueError, TypeError):
+                continue
+            if key and key not in self._names:
+                self._names[key] = coord
+                self._display[key] = name
+        # 包含匹配按地名长度降序，优先命中更具体的地名；过短的地名（城市、区县名等）不参与包含匹配
+        self._by_length = sorted((k for k in self._names if len(k) >= GAZETTEER_MIN_MATCH_CHARS), key=len, reverse=True)
+        self._points = _coord_array(list(self._names.values())) if self._names else np.zeros((0, 2))
+        self._point_names = list(self._names.keys())
+        self.calls: Dict[str, int] = {"geocode": 0, "reverse_geocode": 0, "routematrix": 0, "driving_route": 0}
+        self.geocode_misses = 0
+
+    def _hour(self) -> int:
+        return time.localtime().tm_hour if self.hour is None else int(self.hour) % 24
+
+    def lookup(self, address: str) -> Optional[str]:
+        """地名表查坐标，查不到返回 None。"""
+        key = normalize_address(address)
+        if not key:
+            return None
+        coord = self._names.get(key)
+        if coord is not None:
+            return coord
+        for name in self._by_length:
+            if len(name) < len(key) * GAZETTEER_MIN_MATCH_RATIO:
+                break
+            if name in key:
+                return self._names[name]
+        return None
+
+    async def geocode(self, address: str, stats: Optional[Dict[str, Any]] = None) -> str:
+        self._mark(stats)
+        self.calls["geocode"] += 1
+        coord = self.lookup(address)
+        if coord is None:
+            self.geocode_misses += 1
+            raise MapProviderError(400, f"地址无法解析: {address}，原因: 离线地名表中无此地址")
+        return coord
+
+    async def reverse_geocode(self, lat: float, lng: float, stats: Optional[Dict[str, Any]] = None) -> str:
+        self._mark(stats)
+        self.calls["reverse_geocode"] += 1
+        if len(self._points):
+            meters = haversine_matrix(np.array([[lat, lng]], dtype=np.float64), self._points)[0]
+            i = int(np.argmin(meters))
+            if meters[i] <= REVERSE_GEOCODE_MAX_METERS:
+                return f"{self._display[self._point_names[i]]}附近"
+        return f"{lat:.5f},{lng:.5f}"
+
+    async def routematrix(
+        self,
+        origins: List[str],
+        destinations: List[str],
+        tactics: int,
+        stats: Optional[Dict[str, Any]] = None,
+    ) -> np.ndarray:
+        self._mark(stats)
+        self.calls["routematrix"] += 1
+        try:
+            meters = haversine_matrix(_coord_array(origins), _coord_array(destinations))
+        except (ValueError, TypeError) as e:
+            raise MapProviderError(400, f"路网矩阵获取失败: 坐标格式错误 {e!s}") from e
+        return self.profile.estimate(meters, self._hour())
+
+    async def driving_route(
+        self,
+        coords: List[List[float]],
+        tactics: Optional[int] = None,
+        plate_number: Optional[str] = None,
+        cartype: Optional[int] = None,
+        stats: Optional[Dict[str, Any]] = None,
+    ) -> RouteResult:
+        self._mark(stats)
+        self.calls["driving_route"] += 1
+        if not coords or len(coords) < 2:
+            return [], [], []
+        pts = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        legs = haversine_pairs(pts[:-1], pts[1:])
+        seconds = int(self.profile.estimate(legs, self._hour()).sum())
+        path = [[float(lat), float(lng)] for lat, lng in pts]
+        return [path], [seconds], []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "gazetteer_path": self.gazetteer_path,
+            "gazetteer_entries": len(self._names),
+            "calls": dict(self.calls),
+            "geocode_misses": self.geocode_misses,
+            "speed_profile": self.profile.to_dict(),
+        }
+
+
+class LazyMapProvider(MapProvider):
+    """
+    首次调用时才用 factory 构建的路网服务。离线估算服务构建时要加载整个地理编码缓存、读取耗时腿校准车速模型，
+    只作兜底时按需构建，百度正常时不付出这部分启动开销与内存。
+    """
+
+    def __init__(self, factory: Callable[[], MapProvider], name: str, cacheable: bool = False) -> None:
+        self.factory = factory
+        self.name = name
+        self.cacheable = cacheable
+        self._inner: Optional[MapProvider] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> MapProvider:
+        with self._lock:
+            if self._inner is None:
+                started = time.perf_counter()
+                self._inner = self.factory()
+                logger.info("路网服务 %s 已按需构建，用时 %.0f ms", self.name, (time.perf_counter() - started) * 1000)
+            return self._inner
+
+    async def geocode(self, address: str, stats: Optional[Dict[str, Any]] = None) -> str:
+        return await self.get().geocode(address, stats=stats)
+
+    async def reverse_geocode(self, lat: float, lng: float, stats: Optional[Dict[str, Any]] = None) -> str:
+        return await self.get().reverse_geocode(lat, lng, stats=stats)
+
+    async def routematrix(
+        self,
+        origins: List[str],
+        destinations: List[str],
+        tactics: int,
+        stats: Optional[Dict[str, Any]] = None,
+    ) -> np.ndarray:
+        return await self.get().routematrix(origins, destinations, tactics, stats=stats)
+
+    async def driving_route(
+        self,
+        coords: List[List[float]],
+        tactics: Optional[int] = None,
+        plate_number: Optional[str] = None,
+        cartype: Optional[int] = None,
+        stats: Optional[Dict[str, Any]] = None,
+    ) -> RouteResult:
+        return await self.get().driving_route(
+            coords, tactics=tactics, plate_number=plate_number, cartype=cartype, stats=stats
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            inner = self._inner
+        return inner.stats() if inner is not None else {"name": self.name, "built": False}
+
+
+def default_should_fallback(error: BaseException) -> bool:
+    """服务不可用才切备用：带 status_code 的按 >= 500 判断，其余异常（网络错误等）一律视为不可用。"""
+    status = getattr(error, "status_code", None)
+    return status is None or int(status) >= 500
+
+
+class FallbackMapProvider(MapProvider):
+    """
+    主备组合：先调 primary，异常且 should_fallback(异常) 为真时改调 fallback，stats 中回填 degraded / degraded_reason。
+    请求本身无解（如地址无法解析）的异常原样抛出，不切备用；已切备用而备用返回 4xx 时改抛 503（主服务不可用，不是请求错误）。
+    """
+
+    def __init__(
+        self,
+        primary: MapProvider,
+        fallback: MapProvider,
+        should_fallback: Callable[[BaseException], bool] = default_should_fallback,
+    ) -> None:
+        self.primary = primary
+        self.fallback = fallback
+        self.should_fallback = should_fallback
+        self.name = primary.name
+        self.fallbacks: Dict[str, int] = {"geocode": 0, "reverse_geocode": 0, "routematrix": 0, "driving_route": 0}
+
+    async def _call(self, method: str, stats: Optional[Dict[str, Any]], *args: Any, **kwargs: Any) -> Any:
+        try:
+            return await getattr(self.primary, method)(*args, stats=stats, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if not self.should_fallback(e):
+                raise
+            self.fallbacks[method] += 1
+            logger.warning("%s.%s 不可用，改用 %s: %s", self.primary.name, method, self.fallback.name, e)
+            try:
+                result = await getattr(self.fallback, method)(*args, stats=stats, **kwargs)
+            except MapProviderError as fe:
+                # 走到备用说明主服务不可用：备用答不上来（如离线地名表中无此地址）不代表请求本身无解，仍按服务不可用
+                if fe.status_code < 500:
+                    raise MapProviderError(
+                        503, f"{getattr(e, 'detail', None) or e}（{self.fallback.name} 兜底也失败: {fe.detail}）"
+                    ) from fe
+                raise
+            if stats is not None:
+                stats["degraded"] = True
+                stats["degraded_reason"] = str(getattr(e, "detail", None) or e)
+            return result
+
+    async def geocode(self, address: str, stats: Optional[Dict[str, Any]] = None) -> str:
+        return await self._call("geocode", stats, address)
+
+    async def reverse_geocode(self, lat: float, lng: float, stats: Optional[Dict[str, Any]] = None) -> str:
+        return await self._call("reverse_geocode", stats, lat, lng)
+
+    async def routematrix(
+        self,
+        origins: List[str],
+        destinations: List[str],
+        tactics: int,
+        stats: Optional[Dict[str, Any]] = None,
+    ) -> np.ndarray:
+        return await self._call("routematrix", stats, origins, destinations, tactics)
+
+    async def driving_route(
+        self,
+        coords: List[List[float]],
+        tactics: Optional[int] = None,
+        plate_number: Optional[str] = None,
+        cartype: Optional[int] = None,
+        stats: Optional[Dict[str, Any]] = None,
+    ) -> RouteResult:
+        return await self._call("driving_route", stats, coords, tactics=tactics, plate_number=plate_number, cartype=cartype)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "primary": self.primary.stats(),
+            "fallback": self.fallback.stats(),
+            "fallbacks": dict(self.fallbacks),
+        }
+
+
+def main() -> None:
+    """命令行：从地图缓存库导出地名表，供离线模式使用。"""
+    from map_cache import GeocodeCache
+
+    parser = argparse.ArgumentParser(description="从地理编码缓存导出离线地名表（address,lat,lng）")
+    parser.add_argument("--cache", default="smartdiaodu_cache.sqlite3", help="地图缓存 SQLite 路径")
+    parser.add_argument("--out", default="gazetteer.csv", help="输出 CSV 路径")
+    args = parser.parse_args()
+    cache = GeocodeCache(db_path=args.cache)
+    count = write_gazetteer(args.out, cache.iter_coords(include_expired=True))
+    print(f"已导出 {count} 条地名到 {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+驾车路线几何：百度 direction/v2/driving 返回结果的解析与折线抽稀。
+- 单遍解析：每个 step 的 path 只拆一次，同时得到整条路线点列与带路名的分段；
+- Douglas–Peucker 抽稀：按地图缩放级别换算容差（约 1 像素），在 NumPy 上迭代计算，
+  点列通常可缩减一个数量级，前端画线观感不变；
+- 紧凑传输格式：Google encoded polyline（差分 + 变长 ASCII），前端 web/map-route.js 的 M.decodePolyline 解码；
+- 导出到其他坐标系（WGS84 / GCJ02）：整条几何一次批量转换（见 coord_transform）。
+点的格式统一为 [lat, lng]（BD09）。
+"""
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from coord_transform import convert_points, normalize_coord_type
+
+# 百度地图缩放级别 z 下约 2^(18-z) 米/像素；抽稀容差默认取 1 像素
+DEFAULT_ZOOM = 14
+MIN_ZOOM = 3
+MAX_ZOOM = 21
+SIMPLIFY_PIXELS = 1.0
+
+_METERS_PER_DEG_LAT = 110540.0
+_METERS_PER_DEG_LNG = 111320.0
+
+
+def _parse_path_points(path_str: str) -> List[List[float]]:
+    """解析单个 step 的 path 字符串（"lng,lat;lng,lat;..."，个别返回为 lat,lng）为 [lat, lng] 列表。"""
+    points: List[List[float]] = []
+    for part in path_str.split(";"):
+        seg = part.split(",")
+        if len(seg) < 2:
+            continue
+        try:
+            a, b = float(seg[0]), float(seg[1])
+        except ValueError:
+            continue
+        if 70 < a < 140 and 0 < b < 60:
+            points.append([b, a])
+        else:
+            points.append([a, b])
+    return points
+
+
+def _step_road_name(step: Dict[str, Any]) -> str:
+    name = (step.get("road_name") or step.get("instruction") or "").strip()
+    if not name or name == "无名路" or len(name) > 20:
+        return ""
+    return name
+
+
+def parse_route_geometry(route_obj: Dict[str, Any]) -> Tuple[List[List[float]], List[Dict[str, Any]]]:
+    """
+    单遍解析一条 route：返回 (整条路线点列, 带路名的分段 [{road_name, path}, ...])。
+    点数不足 2 的 step 只计入整条点列，不单独成段。
+    """
+    path: List[List[float]] = []
+    steps: List[Dict[str, Any]] = []
+    for step in route_obj.get("steps") or []:
+        path_str = step.get("path")
+        if not path_str:
+            continue
+        points = _parse_path_points(path_str)
+        path.extend(points)
+        if len(points) >= 2:
+            steps.append({"road_name": _step_road_name(step), "path": points})
+    return path, steps
+
+
+def clamp_zoom(zoom: Optional[float]) -> float:
+    """前端传来的缩放级别夹到有效范围；未传时按 DEFAULT_ZOOM。"""
+    return float(DEFAULT_ZOOM) if zoom is None else max(float(MIN_ZOOM), min(float(MAX_ZOOM), float(zoom)))
+
+
+def zoom_tolerance_meters(zoom: Optional[float], pixels: float = SIMPLIFY_PIXELS) -> float:
+    """
+    缩放级别对应的抽稀容差（米）：约 pixels 个像素的地面距离。
+    按某一级抽稀的几何只适合在该级及更粗的级别上画，放大后误差随之翻倍，前端须按更细的级别重新请求。
+    """
+    return max(0.0, float(pixels)) * 2.0 ** (18 - clamp_zoom(zoom))
+
+
+def simplify_path(points: List[List[float]], tolerance_m: float) -> List[List[float]]:
+    """
+    Douglas–Peucker 抽稀：保留首尾点，删除到所在弦距离不超过 tolerance_m 米的中间点。
+    经纬度先按首点纬度做等距投影换算为米（城市尺度误差可忽略）；用显式栈迭代，长路线不触发递归上限。
+    """
+    n = len(points)
+    if n <= 2 or tolerance_m <= 0:
+        return [list(p) for p in points]
+    arr = np.asarray(points, dtype=np.float64)
+    lat0 = math.radians(float(arr[0, 0]))
+    xy = np.column_stack((arr[:, 1] * _METERS_PER_DEG_LNG * math.cos(lat0), arr[:, 0] * _METERS_PER_DEG_LAT))
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    tol_sq = tolerance_m * tolerance_m
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        seg = xy[end] - xy[start]
+        rel = xy[start + 1 : end] - xy[start]
+        seg_len_sq = float(seg @ seg)
+        if seg_len_sq == 0.0:
+            dist_sq = np.einsum("ij,ij->i", rel, rel)
+        else:
+            # 点到线段（不是直线）的距离：投影参数截断到 [0, 1]
+            t = np.clip(rel @ seg / seg_len_sq, 0.0, 1.0)
+            diff = rel - np.outer(t, seg)
+            dist_sq = np.einsum("ij,ij->i", diff, diff)
+        i = int(np.argmax(dist_sq))
+        if dist_sq[i] > tol_sq:
+            mid = start + 1 + i
+            keep[mid] = True
+            stack.append((start, mid))
+            stack.append((mid, end))
+    return arr[keep].tolist()
+
+
+def simplify_route_geometry(
+    paths: List[List[List[float]]],
+    steps: List[Dict[str, Any]],
+    tolerance_m: float,
+) -> Tuple[List[List[List[float]]], List[Dict[str, Any]]]:
+    """按同一容差抽稀全部备选路线与分段；返回新列表，不修改入参（入参可能来自缓存）。"""
+    simple_paths = [simplify_path(p, tolerance_m) for p in paths]
+    simple_steps = [{**s, "path": simplify_path(s.get("path") or [], tolerance_m)} for s in steps]
+    return simple_paths, simple_steps
+
+
+def count_points(paths: List[List[List[float]]], steps: List[Dict[str, Any]]) -> int:
+    """路线与分段的总点数，用于记录抽稀前后的载荷规模。"""
+    return sum(len(p) for p in paths) + sum(len(s.get("path") or []) for s in steps)
+
+
+# encoded polyline 精度：5 位小数约 1 米，足够画线
+POLYLINE_PRECISION = 5
+
+
+def _encode_signed(value: int, out: List[str]) -> None:
+    v = ~(value << 1) if value < 0 else (value << 1)
+    while v >= 0x20:
+        out.append(chr((0x20 | (v & 0x1F)) + 63))
+        v >>= 5
+    out.append(chr(v + 63))
+
+
+def encode_polyline(points: List[List[float]], precision: int = POLYLINE_PRECISION) -> str:
+    """[lat, lng] 点列编码为 Google encoded polyline 字符串（相邻点差分，每个分量按 5 位一组变长编码）。"""
+    factor = 10 ** precision
+    out: List[str] = []
+    prev_lat = prev_lng = 0
+    for lat, lng in points:
+        ilat = int(round(lat * factor))
+        ilng = int(round(lng * factor))
+        _encode_signed(ilat - prev_lat, out)
+        _encode_signed(ilng - prev_lng, out)
+        prev_lat, prev_lng = ilat, ilng
+    return "".join(out)
+
+
+def decode_polyline(encoded: str, precision: int = POLYLINE_PRECISION) -> List[List[float]]:
+    """encode_polyline 的逆。"""
+    factor = float(10 ** precision)
+    points: List[List[float]] = []
+    index = lat = lng = 0
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                b = ord(encoded[index]) - 63
+                index += 1
+                result |= (b & 0x1F) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append([lat / factor, lng / factor])
+    return points
+
+
+def encode_route_geometry(
+    paths: List[List[List[float]]],
+    steps: List[Dict[str, Any]],
+    precision: int = POLYLINE_PRECISION,
+) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """把全部备选路线与分段的 path 换成 encoded polyline 字符串，分段其余字段（road_name）不变。"""
+    encoded_paths = [encode_polyline(p, precision) for p in paths]
+    encoded_steps = [{**s, "path": encode_polyline(s.get("path") or [], precision)} for s in steps]
+    return encoded_paths, encoded_steps
+
+
+def convert_route_geometry(
+    paths: List[List[List[float]]],
+    steps: List[Dict[str, Any]],
+    src: str,
+    dst: str,
+) -> Tuple[List[List[List[float]]], List[Dict[str, Any]]]:
+    """全部备选路线与分段的点拼成一个数组做一次坐标系转换，再按原长度切回；返回新列表。"""
+    if normalize_coord_type(src) == normalize_coord_type(dst):
+        return paths, steps
+    lengths = [len(p) for p in paths] + [len(s.get("path") or []) for s in steps]
+    flat = [pt for p in paths for pt in p] + [pt for s in steps for pt in (s.get("path") or [])]
+    converted = convert_points(flat, src, dst)
+    chunks: List[List[List[float]]] = []
+    pos = 0
+    for n in lengths:
+        chunks.append(converted[pos : pos + n])
+        pos += n
+    new_paths = chunks[: len(paths)]
+    new_steps = [{**s, "path": chunk} for s, chunk in zip(steps, chunks[len(paths) :])]
+    return new_paths, new_steps
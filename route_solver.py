@@ -0,0 +1,578 @@
+# -*- coding: utf-8 -*-
+"""
+路线求解层：带接送约束的开放路线（PDP，司机送完最后一站即结束，不回起点）。
+- 小规模（节点数 <= EXACT_SOLVER_MAX_NODES，司机 + 至多 4 位乘客）用状态压缩 DP 精确求解，毫秒级且必为最优；
+- 更大规模交给 OR-Tools 路由求解器；
+- 最便宜插入：在已有最优路线上 O(n²) 插入新单接/送两点，绕路是真实最优绕路的上界，
+  上界已在阈值内即可直接接受，远超阈值则直接拒绝，只有落在阈值附近时才升级为完整求解。
+求解函数统一返回 (路线节点索引, 总耗时秒数)，可选传入 stats 字典回填所用引擎、耗时与停止原因；
+矩阵可以是 DurationMatrix（NumPy int32）或二维列表，入口处统一转成原生 int 列表再逐元素访问；
+OR-Tools 按规模限时，并在解数量达上限或搜索停滞时提前结束，调用方可再传入本次请求的时延预算 budget_ms。
+"""
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+
+from duration_matrix import MatrixLike, as_array, as_rows
+
+# 节点数（含司机起点）不超过该值时走精确 DP；DP 状态数为 2^(n-1)·n，13 个节点约百万级运算；0 表示关闭精确 DP
+EXACT_SOLVER_MAX_NODES = 10
+EXACT_SOLVER_NODE_CAP = 13
+
+ENGINE_EXACT = "exact_dp"
+ENGINE_ORTOOLS = "ortools"
+
+# OR-Tools 自适应停止（毫秒）：时长上限 = BASE + PER_NODE × 节点数（封顶 MAX），解数量上限与停滞时长任一满足即提前结束
+SOLVER_TIME_BASE_MS = 200
+SOLVER_TIME_PER_NODE_MS = 60
+SOLVER_TIME_MAX_MS = 3000
+SOLVER_MIN_TIME_MS = 50
+SOLVER_RETRY_TIME_MAX_MS = 8000
+SOLVER_SOLUTION_LIMIT = 2000
+SOLVER_STAGNATION_MS = 400
+
+# 停止原因
+STOP_OPTIMAL = "optimal"
+STOP_LOCAL_OPTIMUM = "local_optimum"
+STOP_STAGNATION = "stagnation"
+STOP_SOLUTION_LIMIT = "solution_limit"
+STOP_TIME_LIMIT = "time_limit"
+STOP_BUDGET = "budget"
+STOP_NO_SOLUTION = "no_solution"
+
+# 预筛结论
+INSERTION_ACCEPT = "accept"
+INSERTION_REJECT = "reject"
+INSERTION_SOLVE = "solve"
+
+
+def configure(
+    exact_max_nodes: Optional[int] = None,
+    time_max_ms: Optional[int] = None,
+    solution_limit: Optional[int] = None,
+    stagnation_ms: Optional[int] = None,
+) -> None:
+    """运行时调整求解策略（app_config 加载后调用）。"""
+    global EXACT_SOLVER_MAX_NODES, SOLVER_TIME_MAX_MS, SOLVER_SOLUTION_LIMIT, SOLVER_STAGNATION_MS
+    if exact_max_nodes is not None:
+        EXACT_SOLVER_MAX_NODES = max(0, min(EXACT_SOLVER_NODE_CAP, int(exact_max_nodes)))
+    if time_max_ms is not None:
+        SOLVER_TIME_MAX_MS = max(SOLVER_MIN_TIME_MS, int(time_max_ms))
+    if solution_limit is not None:
+        SOLVER_SOLUTION_LIMIT = max(1, int(solution_limit))
+    if stagnation_ms is not None:
+        SOLVER_STAGNATION_MS = max(50, int(stagnation_ms))
+
+
+def solve_pdp_exact(
+    matrix: MatrixLike,
+    pickup_delivery_pairs: List[Tuple[int, int]],
+) -> Tuple[Optional[List[int]], int]:
+    """
+    状态压缩 DP 精确求解：从 0 出发访问全部其余节点一次的最短开放路线。
+    dp[mask][last] 为已访问集合 mask、停在 last 时的最小耗时；送客点只有在其接客点已访问后才可扩展。
+    不在 pair 中的节点（仅送、途经点）无先后约束。返回 (路线节点索引, 总耗时)；无可行顺序时 (None, 0)。
+    """
+    matrix = as_rows(matrix)
+    num_nodes = len(matrix)
+    if num_nodes <= 1:
+        return ([0] if num_nodes else [], 0)
+    k = num_nodes - 1
+    # need[j]：访问 j 之前必须已访问的节点位集合（节点 j 对应位 1 << (j-1)）
+    need = [0] * num_nodes
+    for pickup_node, delivery_node in pickup_delivery_pairs:
+        if not (1 <= pickup_node < num_nodes and 1 <= delivery_node < num_nodes) or pickup_node == delivery_node:
+            return None, 0
+        need[delivery_node] |= 1 << (pickup_node - 1)
+
+    inf = float("inf")
+    size = 1 << k
+    dp: List[Optional[List[float]]] = [None] * size
+    parent: List[Optional[List[int]]] = [None] * size
+    for j in range(1, num_nodes):
+        if need[j] == 0:
+            mask = 1 << (j - 1)
+            if dp[mask] is None:
+                dp[mask] = [inf] * num_nodes
+                parent[mask] = [0] * num_nodes
+            dp[mask][j] = int(matrix[0][j])
+
+    nodes = range(1, num_nodes)
+    for mask in range(1, size):
+        row = dp[mask]
+        if row is None:
+            continue
+        for last in nodes:
+            cost = row[last]
+            if cost == inf:
+                continue
+            arcs = matrix[last]
+            for j in nodes:
+                bit = 1 << (j - 1)
+                if mask & bit or (need[j] & mask) != need[j]:
+                    continue
+                nxt = mask | bit
+                new_cost = cost + int(arcs[j])
+                nrow = dp[nxt]
+                if nrow is None:
+                    nrow = dp[nxt] = [inf] * num_nodes
+                    parent[nxt] = [0] * num_nodes
+                if new_cost < nrow[j]:
+                    nrow[j] = new_cost
+                    parent[nxt][j] = last
+
+    full = size - 1
+    final = dp[full]
+    if final is None:
+        return None, 0
+    last = min(nodes, key=lambda j: final[j])
+    if final[last] == inf:
+        return None, 0
+    total = int(final[last])
+    route = [last]
+    mask = full
+    while True:
+        prev = parent[mask][last]
+        mask ^= 1 << (last - 1)
+        if prev == 0:
+            break
+        route.append(prev)
+        last = prev
+    route.append(0)
+    route.reverse()
+    return route, total
+
+
+def _use_exact_solver(num_nodes: int) -> bool:
+    """是否走精确 DP：EXACT_SOLVER_MAX_NODES 为 0 时关闭（只剩空路线 / 仅起点这种无需搜索的情形）。"""
+    if num_nodes <= 1:
+        return True
+    return EXACT_SOLVER_MAX_NODES > 0 and num_nodes <= EXACT_SOLVER_MAX_NODES
+
+
+def solver_time_limit_ms(num_nodes: int, budget_ms: Optional[float] = None) -> int:
+    """按规模给出 OR-Tools 搜索时长上限：BASE + PER_NODE × 节点数（封顶 MAX），再受本次请求剩余预算约束。"""
+    limit = min(SOLVER_TIME_MAX_MS, SOLVER_TIME_BASE_MS + SOLVER_TIME_PER_NODE_MS * max(0, num_nodes))
+    if budget_ms is not None:
+        limit = min(limit, max(SOLVER_MIN_TIME_MS, int(budget_ms)))
+    return int(limit)
+
+
+def solve_pdp_route(
+    matrix: MatrixLike,
+    num_pickup_delivery_pairs: int,
+    stats: Optional[Dict[str, Any]] = None,
+    budget_ms: Optional[float] = None,
+) -> Tuple[Optional[List[int]], int]:
+    """
+    带接送约束的车辆路径规划 (PDP)：节点 1..P 为接客点，P+1..2P 为对应送客点。
+    小规模走精确 DP，否则走 OR-Tools（budget_ms 为本次调用允许的最长求解毫秒数）。
+    返回：(最优路线节点索引列表, 总耗时秒数)；无解时 (None, 0)。
+    """
+    started = time.perf_counter()
+    run: Dict[str, Any] = {}
+    matrix = as_rows(matrix)
+    if _use_exact_solver(len(matrix)):
+        pairs = [(i + 1, i + 1 + num_pickup_delivery_pairs) for i in range(num_pickup_delivery_pairs)]
+        route_indices, total_time = solve_pdp_exact(matrix, pairs)
+        engine = ENGINE_EXACT
+        run["stop_reason"] = STOP_OPTIMAL if route_indices else STOP_NO_SOLUTION
+    else:
+        route_indices, total_time = _solve_pdp_route_ortools(matrix, num_pickup_delivery_pairs, budget_ms=budget_ms, run=run)
+        engine = ENGINE_ORTOOLS
+    _fill_stats(stats, engine, started, len(matrix), run)
+    return route_indices, total_time
+
+
+def solve_pdp_route_flexible(
+    matrix: MatrixLike,
+    pickup_delivery_pairs: List[Tuple[int, int]],
+    stats: Optional[Dict[str, Any]] = None,
+    budget_ms: Optional[float] = None,
+) -> Tuple[Optional[List[int]], int]:
+    """
+    支持「仅送」与途经点的 PDP：pickup_delivery_pairs 中每对 (接客点, 送客点) 先接后送，其余非起点节点全部必访。
+    小规模走精确 DP，否则走 OR-Tools（budget_ms 为本次调用允许的最长求解毫秒数）。
+    返回：(最优路线节点索引列表, 总耗时秒数)；无解时 (None, 0)。
+    """
+    started = time.perf_counter()
+    run: Dict[str, Any] = {}
+    matrix = as_rows(matrix)
+    if _use_exact_solver(len(matrix)):
+        route_indices, total_time = solve_pdp_exact(matrix, pickup_delivery_pairs)
+        engine = ENGINE_EXACT
+        run["stop_reason"] = STOP_OPTIMAL if route_indices else STOP_NO_SOLUTION
+    else:
+        route_indices, total_time = _solve_pdp_route_flexible_ortools(
+            matrix, pickup_delivery_pairs, budget_ms=budget_ms, run=run
+        )
+        engine = ENGINE_ORTOOLS
+    _fill_stats(stats, engine, started, len(matrix), run)
+    return route_indices, total_time
+
+
+def _fill_stats(
+    stats: Optional[Dict[str, Any]],
+    engine: str,
+    started: float,
+    num_nodes: int,
+    run: Dict[str, Any],
+) -> None:
+    if stats is None:
+        return
+    stats["engine"] = engine
+    stats["num_nodes"] = num_nodes
+    stats["solve_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    stats.update(run)
+
+
+def open_route_cost_matrix(matrix: List[List[int]]) -> List[List[int]]:
+    """求解用耗时矩阵：转为整数，并把「回到起点 0」的弧置 0（司机送到最后一站即结束）。"""
+    return [[0 if j == 0 else int(v) for j, v in enumerate(row)] for row in matrix]
+
+
+def _register_duration_transit(
+    routing: pywrapcp.RoutingModel,
+    manager: pywrapcp.RoutingIndexManager,
+    matrix: List[List[int]],
+    native_transit: bool = True,
+) -> int:
+    """
+    注册耗时转移函数并返回其索引。
+    默认用 RegisterTransitMatrix：矩阵一次性交给 C++，局部搜索中的上百万次弧代价查询不再回调 Python。
+    native_transit=False 保留 Python 回调写法，仅供 bench/ 对比基准使用。
+    """
+    cost = open_route_cost_matrix(matrix)
+    if native_transit:
+        return routing.RegisterTransitMatrix(cost)
+
+    def duration_callback(from_index: int, to_index: int) -> int:
+        return cost[manager.IndexToNode(from_index)][manager.IndexToNode(to_index)]
+
+    return routing.RegisterTransitCallback(duration_callback)
+
+
+def _build_pdp_model(
+    matrix: List[List[int]],
+    pickup_delivery_pairs: List[Tuple[int, int]],
+    max_route_seconds: int,
+    native_transit: bool,
+) -> Tuple[pywrapcp.RoutingIndexManager, pywrapcp.RoutingModel]:
+    """建单车开放路线模型：耗时为弧代价与 Time 维度，每对 (接客点, 送客点) 同车且先接后送。"""
+    num_nodes = len(matrix)
+    manager = pywrapcp.RoutingIndexManager(num_nodes, 1, 0)
+    routing = pywrapcp.RoutingModel(manager)
+
+    transit_callback_index = _register_duration_transit(routing, manager, matrix, native_transit)
+    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+    routing.AddDimension(transit_callback_index, 0, max_route_seconds, True, "Time")
+    time_dimension = routing.GetDimensionOrDie("Time")
+
+    # 注意：RoutingModel 默认非起点节点就是“必访”。
+    # 这里不能使用 AddDisjunction(..., 0)，否则语义会变成“可免费跳过”。
+    for pickup_node, delivery_node in pickup_delivery_pairs:
+        pickup_idx = manager.NodeToIndex(pickup_node)
+        delivery_idx = manager.NodeToIndex(delivery_node)
+        routing.AddPickupAndDelivery(pickup_idx, delivery_idx)
+        routing.solver().Add(
+            routing.VehicleVar(pickup_idx) == routing.VehicleVar(delivery_idx)
+        )
+        routing.solver().Add(
+            time_dimension.CumulVar(pickup_idx)
+            <= time_dimension.CumulVar(delivery_idx)
+        )
+    return manager, routing
+
+
+def _solve_with_adaptive_stop(
+    manager: pywrapcp.RoutingIndexManager,
+    routing: pywrapcp.RoutingModel,
+    first_solution_strategy: int,
+    local_search_metaheuristic: Optional[int],
+    time_limit_ms: int,
+    budget_bound: bool,
+    run: Dict[str, Any],
+) -> Tuple[Optional[List[int]], int]:
+    """
+    按自适应策略求解并记录停止原因：
+    - 时间上限（按规模给定，且不超过请求预算）；
+    - 解数量上限 SOLVER_SOLUTION_LIMIT；
+    - 停滞：连续 SOLVER_STAGNATION_MS 毫秒没有更优解即结束搜索；
+    - 无元启发时局部搜索到达局部最优自然结束。
+    """
+    state = {"solutions": 0, "best": None, "last_improved": time.perf_counter(), "stagnated": False}
+
+    def on_solution() -> None:
+        state["solutions"] += 1
+        cost = routing.CostVar().Value()
+        now = time.perf_counter()
+        if state["best"] is None or cost < state["best"]:
+            state["best"] = cost
+            state["last_improved"] = now
+        elif (now - state["last_improved"]) * 1000 >= SOLVER_STAGNATION_MS:
+            state["stagnated"] = True
+            routing.solver().FinishCurrentSearch()
+
+    routing.AddAtSolutionCallback(on_solution)
+    search_params = pywrapcp.DefaultRoutingSearchParameters()
+    search_params.first_solution_strategy = first_solution_strategy
+    if local_search_metaheuristic is not None:
+        search_params.local_search_metaheuristic = local_search_metaheuristic
+    search_params.time_limit.FromMilliseconds(int(time_limit_ms))
+    search_params.solution_limit = SOLVER_SOLUTION_LIMIT
+    started = time.perf_counter()
+    solution = routing.SolveWithParameters(search_params)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    if not solution:
+        reason = STOP_NO_SOLUTION
+    elif state["stagnated"]:
+        reason = STOP_STAGNATION
+    elif state["solutions"] >= SOLVER_SOLUTION_LIMIT:
+        reason = STOP_SOLUTION_LIMIT
+    elif elapsed_ms >= time_limit_ms * 0.95:
+        reason = STOP_BUDGET if budget_bound else STOP_TIME_LIMIT
+    else:
+        reason = STOP_LOCAL_OPTIMUM
+    run["stop_reason"] = reason
+    run["solutions"] = run.get("solutions", 0) + state["solutions"]
+    run["time_limit_ms"] = run.get("time_limit_ms", 0) + int(time_limit_ms)
+    run["rounds"] = run.get("rounds", 0) + 1
+    if not solution:
+        return None, 0
+
+    index = routing.Start(0)
+    route_indices: List[int] = []
+    total_time = 0
+    while not routing.IsEnd(index):
+        route_indices.append(manager.IndexToNode(index))
+        prev_index = index
+        index = solution.Value(routing.NextVar(index))
+        total_time += routing.GetArcCostForVehicle(prev_index, index, 0)
+    return route_indices, total_time
+
+
+def _solve_pdp_route_ortools(
+    matrix: List[List[int]],
+    num_pickup_delivery_pairs: int,
+    native_transit: bool = True,
+    budget_ms: Optional[float] = None,
+    run: Optional[Dict[str, Any]] = None,
+) -> Tuple[Optional[List[int]], int]:
+    """
+    OR-Tools 实现的 PDP：首解 + 局部搜索到局部最优（不加元启发）。
+    约束：同一订单先接后送、同一车完成；司机回到起点的弧耗时为 0。
+    返回：(最优路线节点索引列表, 总耗时秒数)；无解时 (None, 0)。
+    """
+    num_nodes = len(matrix)
+    pairs = [(i + 1, i + 1 + num_pickup_delivery_pairs) for i in range(num_pickup_delivery_pairs)]
+    manager, routing = _build_pdp_model(matrix, pairs, 300000, native_transit)
+    time_limit_ms = solver_time_limit_ms(num_nodes, budget_ms)
+    return _solve_with_adaptive_stop(
+        manager,
+        routing,
+        routing_enums_pb2.FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION,
+        None,
+        time_limit_ms,
+        budget_ms is not None and time_limit_ms < solver_time_limit_ms(num_nodes),
+        run if run is not None else {},
+    )
+
+
+def _solve_pdp_route_flexible_ortools(
+    matrix: List[List[int]],
+    pickup_delivery_pairs: List[Tuple[int, int]],
+    native_transit: bool = True,
+    budget_ms: Optional[float] = None,
+    run: Optional[Dict[str, Any]] = None,
+) -> Tuple[Optional[List[int]], int]:
+    """
+    OR-Tools 实现的「仅送」PDP：pickup_delivery_pairs 中每对 (接客点, 送客点) 先接后送；
+    未出现在 pair 中的非起点节点仍会全部访问（默认即必访）。
+    节点编号与 matrix 一致：0=司机起点，其余为途经点。
+    先按规模限时做 GLS（可因解数量或停滞提前结束）；无有效解且预算有剩余时再放宽可行域重试一轮。
+    返回：(最优路线节点索引列表, 总耗时秒数)；无解时 (None, 0)。
+    """
+    num_nodes = len(matrix)
+    if num_nodes <= 1:
+        return ([0] if num_nodes else [], 0)
+    run = run if run is not None else {}
+    started = time.perf_counter()
+
+    def _is_valid_route(route: Optional[List[int]]) -> bool:
+        # 单逻辑要求：存在待访问节点时，不能只返回司机起点 [0]
+        return bool(route) and (num_nodes <= 1 or len(route) > 1)
+
+    # 第一轮：快速求解（主流程）
+    time_limit_ms = solver_time_limit_ms(num_nodes, budget_ms)
+    manager, routing = _build_pdp_model(matrix, pickup_delivery_pairs, 300000, native_transit)
+    route_indices, total_time = _solve_with_adaptive_stop(
+        manager,
+        routing,
+        routing_enums_pb2.FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION,
+        routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH,
+        time_limit_ms,
+        budget_ms is not None and time_limit_ms < solver_time_limit_ms(num_nodes),
+        run,
+    )
+    if _is_valid_route(route_indices):
+        return route_indices, total_time
+
+    # 第二轮：同一算法框架下扩大可行域+延长搜索时间，尽量避免进入启发式兜底（受剩余预算约束）
+    retry_limit_ms = min(SOLVER_RETRY_TIME_MAX_MS, 2 * solver_time_limit_ms(num_nodes))
+    if budget_ms is not None:
+        remaining_ms = budget_ms - (time.perf_counter() - started) * 1000
+        if remaining_ms < SOLVER_MIN_TIME_MS:
+            run["stop_reason"] = STOP_BUDGET
+            return None, 0
+        retry_limit_ms = min(retry_limit_ms, int(remaining_ms))
+    manager, routing = _build_pdp_model(
+        matrix, pickup_delivery_pairs, 1209600, native_transit  # 14天上限，避免超长线路因上限过紧无解
+    )
+    route_indices, total_time = _solve_with_adaptive_stop(
+        manager,
+        routing,
+        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC,
+        routing_enums_pb2.LocalSearchMetaheuristic.AUTOMATIC,
+        retry_limit_ms,
+        budget_ms is not None,
+        run,
+    )
+    if _is_valid_route(route_indices):
+        return route_indices, total_time
+
+    return None, 0
+
+
+def solve_pdp_prize_collecting(
+    matrix: MatrixLike,
+    required_pairs: List[Tuple[int, int]],
+    optional_pairs: List[Tuple[int, int]],
+    penalties: List[int],
+    max_selected: int,
+    arrival_limits: Optional[Dict[int, int]] = None,
+    stats: Optional[Dict[str, Any]] = None,
+    budget_ms: Optional[float] = None,
+) -> Tuple[Optional[List[int]], int]:
+    """
+    带奖励的 PDP（k 选 N）：除 optional_pairs 外的非起点节点必访；optional_pairs 每对 (接客点, 送客点) 可整体放弃，
+    放弃第 i 对计惩罚 penalties[i]（秒，按收益折算），最多选中 max_selected 对。
+    目标 = 行驶总耗时 + 被放弃候选的惩罚之和，即只有「多绕的时间 < 其价值」的候选才会被选中，且一起选中时的相互冲突会计入。
+    arrival_limits 为 {节点: 最晚到达秒数}（如候选起点须 1 小时内到达），仅对被选中的节点生效。
+    返回：(路线节点索引, 行驶总耗时秒数，不含惩罚)；选中哪些候选由路线是否包含其接客点判断。无解时 (None, 0)。
+    """
+    started = time.perf_counter()
+    run: Dict[str, Any] = {}
+    matrix = as_rows(matrix)
+    num_nodes = len(matrix)
+    if num_nodes <= 1:
+        _fill_stats(stats, ENGINE_ORTOOLS, started, num_nodes, {"stop_reason": STOP_OPTIMAL})
+        return ([0] if num_nodes else [], 0)
+
+    manager, routing = _build_pdp_model(matrix, list(required_pairs) + list(optional_pairs), 1209600, True)
+    time_dimension = routing.GetDimensionOrDie("Time")
+    selectable = [0] * num_nodes
+    for (pickup_node, delivery_node), penalty in zip(optional_pairs, penalties):
+        pickup_idx = manager.NodeToIndex(pickup_node)
+        delivery_idx = manager.NodeToIndex(delivery_node)
+        # 惩罚只记在接客点；送客点与接客点同进同出（同车约束已在建模时加入，这里再显式绑定激活状态）
+        routing.AddDisjunction([pickup_idx], max(0, int(penalty)))
+        routing.AddDisjunction([delivery_idx], 0)
+        routing.solver().Add(routing.ActiveVar(pickup_idx) == routing.ActiveVar(delivery_idx))
+        selectable[pickup_node] = 1
+    # 选中数量维度：每经过一个候选接客点计 1，上限 max_selected
+    count_index = routing.RegisterUnaryTransitVector(selectable)
+    routing.AddDimension(count_index, 0, max(0, int(max_selected)), True, "Selected")
+    for node, limit in (arrival_limits or {}).items():
+        if 1 <= node < num_nodes:
+            time_dimension.CumulVar(manager.NodeToIndex(node)).SetMax(max(0, int(limit)))
+
+    time_limit_ms = solver_time_limit_ms(num_nodes, budget_ms)
+    route_indices, total_time = _solve_with_adaptive_stop(
+        manager,
+        routing,
+        routing_enums_pb2.FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION,
+        routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH,
+        time_limit_ms,
+        budget_ms is not None and time_limit_ms < solver_time_limit_ms(num_nodes),
+        run,
+    )
+    _fill_stats(stats, ENGINE_ORTOOLS, started, num_nodes, run)
+    return route_indices, total_time
+
+
+def route_duration(matrix: MatrixLike, route: List[int]) -> int:
+    """开放路线（不回起点）总耗时：依次累加相邻节点耗时。"""
+    if len(route) < 2:
+        return 0
+    arr = as_array(matrix)
+    return int(arr[route[:-1], route[1:]].sum())
+
+
+def best_insertion(
+    matrix: MatrixLike,
+    route: List[int],
+    pickup_node: int,
+    delivery_node: int,
+) -> Tuple[int, List[int]]:
+    """
+    把 (pickup_node, delivery_node) 插入开放路线 route（route[0] 为司机起点，保持不动）。
+    枚举接客插入位置 i（插在 route[i-1] 之后）与送客位置 j ≥ i（送客在接客之后），返回 (最小增加耗时, 插入后路线)。
+    到路线末尾的插入只计到达耗时（送完即结束，不回起点）。每个候选调用一次，直接按下标读数组，不整表转换。
+    """
+    arr = as_array(matrix)
+    n = len(route)
+    if n == 0:
+        route = [0]
+        n = 1
+
+    def arc(a: int, b: Optional[int]) -> int:
+        # b 为 None 表示路线末尾之后（无后继），不计耗时
+        return 0 if b is None else int(arr[a, b])
+
+    best_delta: Optional[int] = None
+    best_pos = (n, n)
+    for i in range(1, n + 1):
+        prev_p = route[i - 1]
+        next_p = route[i] if i < n else None
+        # 接客后紧接送客：prev_p → P → D → next_p
+        delta_adjacent = (
+            int(arr[prev_p, pickup_node])
+            + int(arr[pickup_node, delivery_node])
+            + arc(delivery_node, next_p)
+            - arc(prev_p, next_p)
+        )
+        if best_delta is None or delta_adjacent < best_delta:
+            best_delta = delta_adjacent
+            best_pos = (i, i)
+        if next_p is None:
+            continue
+        pickup_delta = int(arr[prev_p, pickup_node]) + int(arr[pickup_node, next_p]) - int(arr[prev_p, next_p])
+        # 送客插在 route[j-1] 与 route[j] 之间，j > i
+        for j in range(i + 1, n + 1):
+            prev_d = route[j - 1]
+            next_d = route[j] if j < n else None
+            delivery_delta = int(arr[prev_d, delivery_node]) + arc(delivery_node, next_d) - arc(prev_d, next_d)
+            delta = pickup_delta + delivery_delta
+            if delta < best_delta:
+                best_delta = delta
+                best_pos = (i, j)
+
+    i, j = best_pos
+    new_route = list(route[:i]) + [pickup_node] + list(route[i:j]) + [delivery_node] + list(route[j:])
+    return int(best_delta or 0), new_route
+
+
+def insertion_prefilter(detour_upper_seconds: int, threshold_seconds: float, margin_seconds: float) -> str:
+    """
+    按插入绕路（真实绕路的上界）给出预筛结论：
+    - 上界 <= 阈值：一定满足，直接接受（accept）；
+    - 上界 > 阈值 + 余量：重新优化也难以压回阈值内，直接拒绝（reject）；
+    - 其余落在阈值附近：升级为完整求解（solve）。
+    """
+    if detour_upper_seconds <= threshold_seconds:
+        return INSERTION_ACCEPT
+    if detour_upper_seconds > threshold_seconds + max(0.0, margin_seconds):
+        return INSERTION_REJECT
+    return INSERTION_SOLVE
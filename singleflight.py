@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+在途请求合并（singleflight）：同一个键的请求正在进行时，后到的调用方不再另发请求，而是等待同一个结果。
+- 协程：await flight.do(key, lambda: coro())，同一事件循环内同键只执行一次，结果 / 异常共享给所有等待方；
+  实际执行放在独立 Task 中，发起方被取消不会连带取消其余等待方；
+- 带统计：flight.do_with_stats(key, lambda call_stats: coro(call_stats), merge)，执行方把请求数、降级标记等写进 call_stats，
+  结束时（含失败）每个调用方都以同一份 call_stats 调 merge，合并进来的调用方不会因为没亲自发请求而丢掉降级标记；
+- 统计：calls（总调用）/ executed（实际执行）/ coalesced（被合并、未发请求的调用）/ in_flight。
+只合并「同时在途」的请求，不做缓存：结果返回后键即释放，下一次调用会重新执行。
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """按键合并并发调用；一个实例对应一类上游请求（如地理编码、路网矩阵），统计分开。"""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._lock = threading.Lock()
+        # 协程键带上事件循环，避免不同循环（如脚本多次 asyncio.run）之间共享 Task；值为 (Task, 执行方的 call_stats)
+        self._tasks: Dict[Tuple[int, Hashable], Tuple["asyncio.Task[Any]", Dict[str, Any]]] = {}
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """同键在途时等待已有结果，否则执行 fn() 并把结果共享给期间到达的同键调用。"""
+        return await self.do_with_stats(key, lambda _call_stats: fn(), lambda _call_stats, _leader: None)
+
+    async def do_with_stats(
+        self,
+        key: Hashable,
+        fn: Callable[[Dict[str, Any]], Awaitable[T]],
+        merge: Callable[[Dict[str, Any], bool], None],
+    ) -> T:
+        """
+        同 do，但 fn 接收本次执行的统计字典并自行回填；结束时（含异常）调用 merge(call_stats, 本次调用是否为执行方)。
+        由调用方决定并入哪些统计：计数类只应记给执行方，降级等标记合并进来的调用方同样适用。
+        """
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        with self._lock:
+            self.calls += 1
+            entry = self._tasks.get(flight_key)
+            leader = entry is None or entry[0].get_loop() is not loop or entry[0].done()
+            if leader:
+                self.executed += 1
+                call_stats: Dict[str, Any] = {}
+                task = loop.create_task(fn(call_stats))
+                self._tasks[flight_key] = (task, call_stats)
+                task.add_done_callback(lambda t, k=flight_key: self._release(k, t))
+            else:
+                self.coalesced += 1
+                task, call_stats = entry
+        try:
+            return await asyncio.shield(task)
+        finally:
+            merge(call_stats, leader)
+
+    def _release(self, flight_key: Tuple[int, Hashable], task: "asyncio.Task[Any]") -> None:
+        with self._lock:
+            entry = self._tasks.get(flight_key)
+            if entry is not None and entry[0] is task:
+                del self._tasks[flight_key]
+        # 没有等待方时也取走异常，避免 "Task exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._tasks),
+            }
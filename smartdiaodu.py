@@ -3,15 +3,16 @@
 顺风车智能调度系统 (Smart Dispatch Brain)
 核心：带多点接送约束的车辆路径规划 (PDP - Pickup and Delivery Problem)
 """
+import asyncio
 import hashlib
 import logging
-import math
 import os
 import re
 import time
 import traceback
 from datetime import date, datetime, timedelta
-from typing import Any, Dict, List, Optional, Set, Tuple
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+from urllib.parse import quote
 
 # 优先从项目根目录 .env 加载环境变量（含 SUPABASE_SERVICE_ROLE_KEY 等）
 try:
@@ -22,14 +23,62 @@ except ImportError:
 
 import bcrypt
 import jwt
-import requests
+import numpy as np
 from fastapi import Depends, FastAPI, File, Form, HTTPException, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from pydantic import BaseModel
-from ortools.constraint_solver import routing_enums_pb2
-from ortools.constraint_solver import pywrapcp
 from baidu_ocr_service import BaiduOcrClient, extract_passenger_candidates
+from baidu_quota import (
+    PRIORITY_NORMAL,
+    PRIORITY_REALTIME,
+    AkQuotaExhausted,
+    BaiduAkPool,
+    current_priority,
+    parse_ak_list,
+    parse_daily_quota,
+    quota_priority,
+)
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from coord_transform import BD09, WGS84, convert_point, convert_points, normalize_coord_type
+from duration_matrix import DurationMatrix
+from http_client import HTTPError, http, sync_request
+from map_cache import (
+    DurationLegCache,
+    GeocodeCache,
+    ReverseGeocodeCache,
+    RouteGeometryCache,
+    normalize_address,
+    normalize_coord,
+    time_bucket,
+)
+from map_fixtures import FixtureStore, RecordingMapProvider, ReplayMapProvider, parse_latency_spec
+from map_provider import (
+    FallbackMapProvider,
+    LazyMapProvider,
+    LocalMapProvider,
+    MapProvider,
+    MapProviderError,
+    RouteResult,
+    SpeedProfile,
+    default_should_fallback,
+    leg_samples,
+)
+import route_solver
+from route_geometry import (
+    MAX_ZOOM,
+    POLYLINE_PRECISION,
+    clamp_zoom,
+    convert_route_geometry,
+    count_points,
+    encode_route_geometry,
+    parse_route_geometry,
+    simplify_route_geometry,
+    zoom_tolerance_meters,
+)
+from route_solver import INSERTION_SOLVE, best_insertion, insertion_prefilter
+from singleflight import SingleFlight
+from solver_pool import solver_pool
 
 # ================= 日志配置：500 排错必备 =================
 logging.basicConfig(
@@ -67,6 +116,82 @@ MODE2_DETOUR_MINUTES_MAX = 60
 MODE2_HIGH_PROFIT_THRESHOLD = 100
 MODE3_MAX_MINUTES_TO_PICKUP = 30
 MODE3_MAX_DETOUR_MINUTES = 25
+# 地理编码缓存：内存 LRU + SQLite 落盘（路径仅从环境变量读，TTL/容量可由 app_config 覆盖）
+MAP_CACHE_DB_PATH = os.environ.get("MAP_CACHE_DB_PATH", "").strip() or "smartdiaodu_cache.sqlite3"
+GEOCODE_CACHE_TTL_SECONDS = 30 * 24 * 3600
+GEOCODE_CACHE_MAX_ENTRIES = 5000
+# 逆地理编码缓存：按 BD09 坐标所在网格单元（边长约 REVERSE_GEOCODE_CELL_METERS 米）缓存地址，停车 / 缓行时反复上报的定位不重复调百度
+REVERSE_GEOCODE_CACHE_TTL_SECONDS = 7 * 24 * 3600
+REVERSE_GEOCODE_CACHE_MAX_ENTRIES = 20000
+REVERSE_GEOCODE_CELL_METERS = 40
+# 批量逆地理编码（GPS 轨迹）单次最多点数
+REVERSE_GEOCODE_BATCH_MAX_POINTS = 500
+# 耗时腿缓存：按 (起点, 终点, tactics, 星期+小时桶) 缓存单条驾车耗时，矩阵只补缺失的行/列
+# 新鲜度按时段：白天默认 TTL，工作日早晚高峰更短，夜间更长
+DURATION_LEG_CACHE_TTL_SECONDS = 30 * 60
+DURATION_LEG_RUSH_TTL_SECONDS = 10 * 60
+DURATION_LEG_NIGHT_TTL_SECONDS = 6 * 3600
+DURATION_LEG_CACHE_MAX_ENTRIES = 50000
+# 热门腿后台刷新：每隔多少秒扫描一次（0=关闭）、提前多少秒刷新、每轮最多刷新条数、至少被查询多少次才算热门
+DURATION_REFRESH_INTERVAL_SECONDS = 60
+DURATION_REFRESH_AHEAD_SECONDS = 120
+DURATION_REFRESH_MAX_LEGS = 200
+DURATION_REFRESH_MIN_LOOKUPS = 3
+# 地图缓存预热：启动、循环计划变更与已分配订单变化时，后台对计划起终点、已分配订单起终点、司机当前位置预先地理编码并预取两两耗时腿。
+# 每隔多少秒检查一次已分配订单是否变化（0=只在启动与计划变更时预热）、单次最多预热的地址数、预取哪些 tactics（逗号分隔，0 按 11）
+MAP_WARMUP_INTERVAL_SECONDS = 120
+MAP_WARMUP_MAX_POINTS = 20
+MAP_WARMUP_TACTICS = "11"
+# 司机超过多少秒没有活动（计划变更、路线预览、人工推荐）就不再为其后台检查预热，避免为不活跃司机每个时段桶重取矩阵
+MAP_WARMUP_DRIVER_IDLE_SECONDS = 4 * 3600
+# 驾车路线几何缓存（路线预览画线用）：同一站点序列 + 策略 + 车牌在 TTL 内不再请求百度
+ROUTE_GEOMETRY_CACHE_TTL_SECONDS = 30 * 60
+ROUTE_GEOMETRY_CACHE_MAX_ENTRIES = 500
+# 路线预览折线抽稀容差（像素，按前端缩放级别换算为米；0=不抽稀）
+ROUTE_SIMPLIFY_PIXELS = 1.0
+# 路网服务：baidu（默认）/ local（离线估算，不调百度，供压测与基准）/ record（调百度并把结果录入 fixture）/
+# replay（只从 fixture 回放，不调百度）；环境变量 MAP_PROVIDER 给默认值，app_config map_provider 覆盖
+MAP_PROVIDER = (os.environ.get("MAP_PROVIDER", "").strip().lower() or "baidu")
+# 百度不可用（5xx / 网络异常 / 配额耗尽）时是否自动改用离线估算兜底
+MAP_LOCAL_FALLBACK = os.environ.get("MAP_LOCAL_FALLBACK", "").strip().lower() in ("1", "true", "yes")
+# 离线地名表 CSV（address,lat,lng，BD09；仅从环境变量读），可用 python map_provider.py 从地理编码缓存导出
+MAP_GAZETTEER_PATH = os.environ.get("MAP_GAZETTEER_PATH", "").strip() or "gazetteer.csv"
+# 录制 / 回放的 fixture 文件（gzip JSON）与回放注入延迟（毫秒，如 "geocode=20,routematrix=80,direction=150"），仅从环境变量读
+MAP_FIXTURE_PATH = os.environ.get("MAP_FIXTURE_PATH", "").strip() or "map_fixtures.json.gz"
+MAP_REPLAY_LATENCY_MS = os.environ.get("MAP_REPLAY_LATENCY_MS", "").strip()
+# 百度 AK 每个服务的 QPS 配额（令牌桶限流），批量地理编码的并发上限
+BAIDU_AK_QPS = 10.0
+GEOCODE_CONCURRENCY = 8
+# 百度 AK 池：BAIDU_AK 之外的备用 AK（逗号分隔）、每个 AK 的日配额（如 "5000" 或 "geocoding=5000,routematrix=3000"，空为不限）、
+# 为实时评估新单预留的日配额与 QPS 比例（人工推荐等其余调用只能用到 1 - 该比例）
+BAIDU_AK_POOL = ""
+BAIDU_AK_DAILY_QUOTA = ""
+BAIDU_AK_REALTIME_RESERVE = 0.2
+# 百度各接口的熔断：窗口内失败率 / 慢调用（>= 慢调用毫秒数）比例达到阈值且样本不少于最少调用数时熔断，熔断若干秒后放一个探测请求。
+# 熔断期间评估、路线预览等改用已缓存（含过期）的耗时腿与离线估算，响应带 degraded: true
+BAIDU_BREAKER_ERROR_RATE = 0.5
+BAIDU_BREAKER_SLOW_MS = 3000
+BAIDU_BREAKER_MIN_CALLS = 5
+BAIDU_BREAKER_OPEN_SECONDS = 30
+# 百度路网矩阵单次请求「起点数 × 终点数」上限，超出按块拆分并发请求；失败块单独重试的次数、并发块数
+ROUTEMATRIX_MAX_ELEMENTS = 50
+ROUTEMATRIX_TILE_RETRIES = 2
+ROUTEMATRIX_CONCURRENCY = 4
+# 最便宜插入预筛：插入绕路超出阈值该秒数以上直接拒绝，阈值附近才做完整求解
+INSERTION_ESCALATE_MARGIN_SECONDS = 300
+# 节点数（含司机）不超过该值时用精确 DP 求解，超过才用 OR-Tools；设为 0 关闭精确 DP
+EXACT_SOLVER_MAX_NODES = 10
+# OR-Tools 自适应停止：单次搜索时长上限、解数量上限、停滞多久即停（毫秒）
+SOLVER_TIME_MAX_MS = 3000
+SOLVER_SOLUTION_LIMIT = 2000
+SOLVER_STAGNATION_MS = 400
+# 各接口一次请求内路线求解的总时延预算（毫秒），逐次求解按剩余预算限时
+ROUTE_PREVIEW_SOLVE_BUDGET_MS = 2000
+MANUAL_RECOMMEND_SOLVE_BUDGET_MS = 6000
+# 求解进程池进程数（0=按 CPU 核数），路线求解不在事件循环内执行
+SOLVER_POOL_WORKERS = 0
+# 人工模式 k 选 N 联合求解：候选收益折算为「值得多绕的秒数」（每元），加在单人绕路上限之上作为放弃候选的惩罚
+MANUAL_PRICE_SECONDS_PER_YUAN = 30
 planned_trips: List[Dict[str, Any]] = []
 # 循环计划配置：首次起点、首次终点、去的时间、循环间隔（小时）、找单轮次（默认2=当天回程+次日去程）、是否已停止循环
 planned_trip_cycle_origin: str = ""
@@ -99,6 +224,22 @@ def _load_app_config_from_db() -> None:
     global DRIVER_MODE, MODE2_DETOUR_MINUTES_MIN, MODE2_DETOUR_MINUTES_MAX, MODE2_HIGH_PROFIT_THRESHOLD
     global MODE3_MAX_MINUTES_TO_PICKUP, MODE3_MAX_DETOUR_MINUTES
     global RESPONSE_TIMEOUT_SECONDS, RESPONSE_PAGE_BASE, DEFAULT_DRIVER_ID
+    global GEOCODE_CACHE_TTL_SECONDS, GEOCODE_CACHE_MAX_ENTRIES
+    global REVERSE_GEOCODE_CACHE_TTL_SECONDS, REVERSE_GEOCODE_CACHE_MAX_ENTRIES, REVERSE_GEOCODE_CELL_METERS
+    global DURATION_LEG_CACHE_TTL_SECONDS, DURATION_LEG_CACHE_MAX_ENTRIES
+    global DURATION_LEG_RUSH_TTL_SECONDS, DURATION_LEG_NIGHT_TTL_SECONDS
+    global DURATION_REFRESH_INTERVAL_SECONDS, DURATION_REFRESH_AHEAD_SECONDS
+    global DURATION_REFRESH_MAX_LEGS, DURATION_REFRESH_MIN_LOOKUPS
+    global MAP_WARMUP_INTERVAL_SECONDS, MAP_WARMUP_MAX_POINTS, MAP_WARMUP_TACTICS, MAP_WARMUP_DRIVER_IDLE_SECONDS
+    global ROUTE_GEOMETRY_CACHE_TTL_SECONDS, ROUTE_GEOMETRY_CACHE_MAX_ENTRIES, ROUTE_SIMPLIFY_PIXELS
+    global BAIDU_AK_QPS, GEOCODE_CONCURRENCY, INSERTION_ESCALATE_MARGIN_SECONDS, EXACT_SOLVER_MAX_NODES
+    global BAIDU_AK_POOL, BAIDU_AK_DAILY_QUOTA, BAIDU_AK_REALTIME_RESERVE
+    global BAIDU_BREAKER_ERROR_RATE, BAIDU_BREAKER_SLOW_MS, BAIDU_BREAKER_MIN_CALLS, BAIDU_BREAKER_OPEN_SECONDS
+    global SOLVER_TIME_MAX_MS, SOLVER_SOLUTION_LIMIT, SOLVER_STAGNATION_MS
+    global ROUTE_PREVIEW_SOLVE_BUDGET_MS, MANUAL_RECOMMEND_SOLVE_BUDGET_MS, SOLVER_POOL_WORKERS
+    global MANUAL_PRICE_SECONDS_PER_YUAN
+    global ROUTEMATRIX_MAX_ELEMENTS, ROUTEMATRIX_TILE_RETRIES, ROUTEMATRIX_CONCURRENCY
+    global MAP_PROVIDER, MAP_LOCAL_FALLBACK
     if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
         logger.warning("未配置 SUPABASE_URL/SUPABASE_SERVICE_ROLE_KEY，跳过从 DB 加载 app_config")
         return
@@ -109,7 +250,7 @@ def _load_app_config_from_db() -> None:
         "Content-Type": "application/json",
     }
     try:
-        resp = requests.get(url, headers=headers, timeout=10)
+        resp = sync_request("GET", url, headers=headers, timeout=10)
         if resp.status_code != 200:
             logger.warning("app_config 请求失败 status=%s", resp.status_code)
             return
@@ -175,7 +316,210 @@ def _load_app_config_from_db() -> None:
             RESPONSE_PAGE_BASE = cfg["response_page_base"] or ""
         if cfg.get("driver_id"):
             DEFAULT_DRIVER_ID = (cfg["driver_id"] or "").strip() or None
-        logger.info("已从 app_config 加载配置: baidu_ak=%s, driver_mode=%s, driver_id=%s", bool(BAIDU_AK), DRIVER_MODE, bool(DEFAULT_DRIVER_ID))
+        if cfg.get("geocode_cache_ttl_seconds"):
+            try:
+                GEOCODE_CACHE_TTL_SECONDS = max(60, int(cfg["geocode_cache_ttl_seconds"]))
+            except ValueError:
+                pass
+        if cfg.get("geocode_cache_max_entries"):
+            try:
+                GEOCODE_CACHE_MAX_ENTRIES = max(100, int(cfg["geocode_cache_max_entries"]))
+            except ValueError:
+                pass
+        if cfg.get("reverse_geocode_cache_ttl_seconds"):
+            try:
+                REVERSE_GEOCODE_CACHE_TTL_SECONDS = max(60, int(cfg["reverse_geocode_cache_ttl_seconds"]))
+            except ValueError:
+                pass
+        if cfg.get("reverse_geocode_cache_max_entries"):
+            try:
+                REVERSE_GEOCODE_CACHE_MAX_ENTRIES = max(100, int(cfg["reverse_geocode_cache_max_entries"]))
+            except ValueError:
+                pass
+        if cfg.get("reverse_geocode_cell_meters"):
+            try:
+                REVERSE_GEOCODE_CELL_METERS = max(5, min(500, int(cfg["reverse_geocode_cell_meters"])))
+            except ValueError:
+                pass
+        if cfg.get("duration_leg_cache_ttl_seconds"):
+            try:
+                DURATION_LEG_CACHE_TTL_SECONDS = max(60, int(cfg["duration_leg_cache_ttl_seconds"]))
+            except ValueError:
+                pass
+        if cfg.get("duration_leg_rush_ttl_seconds"):
+            try:
+                DURATION_LEG_RUSH_TTL_SECONDS = max(60, int(cfg["duration_leg_rush_ttl_seconds"]))
+            except ValueError:
+                pass
+        if cfg.get("duration_leg_night_ttl_seconds"):
+            try:
+                DURATION_LEG_NIGHT_TTL_SECONDS = max(60, int(cfg["duration_leg_night_ttl_seconds"]))
+            except ValueError:
+                pass
+        if cfg.get("duration_refresh_interval_seconds"):
+            try:
+                DURATION_REFRESH_INTERVAL_SECONDS = max(0, int(cfg["duration_refresh_interval_seconds"]))
+            except ValueError:
+                pass
+        if cfg.get("duration_refresh_ahead_seconds"):
+            try:
+                DURATION_REFRESH_AHEAD_SECONDS = max(0, int(cfg["duration_refresh_ahead_seconds"]))
+            except ValueError:
+                pass
+        if cfg.get("duration_refresh_max_legs"):
+            try:
+                DURATION_REFRESH_MAX_LEGS = max(1, int(cfg["duration_refresh_max_legs"]))
+            except ValueError:
+                pass
+        if cfg.get("duration_refresh_min_lookups"):
+            try:
+                DURATION_REFRESH_MIN_LOOKUPS = max(1, int(cfg["duration_refresh_min_lookups"]))
+            except ValueError:
+                pass
+        if cfg.get("map_warmup_interval_seconds"):
+            try:
+                MAP_WARMUP_INTERVAL_SECONDS = max(0, int(cfg["map_warmup_interval_seconds"]))
+            except ValueError:
+                pass
+        if cfg.get("map_warmup_max_points"):
+            try:
+                MAP_WARMUP_MAX_POINTS = max(2, min(60, int(cfg["map_warmup_max_points"])))
+            except ValueError:
+                pass
+        if cfg.get("map_warmup_tactics"):
+            MAP_WARMUP_TACTICS = cfg["map_warmup_tactics"]
+        if cfg.get("map_warmup_driver_idle_seconds"):
+            try:
+                MAP_WARMUP_DRIVER_IDLE_SECONDS = max(60, int(cfg["map_warmup_driver_idle_seconds"]))
+            except ValueError:
+                pass
+        if cfg.get("route_geometry_cache_ttl_seconds"):
+            try:
+                ROUTE_GEOMETRY_CACHE_TTL_SECONDS = max(60, int(cfg["route_geometry_cache_ttl_seconds"]))
+            except ValueError:
+                pass
+        if cfg.get("route_geometry_cache_max_entries"):
+            try:
+                ROUTE_GEOMETRY_CACHE_MAX_ENTRIES = max(10, int(cfg["route_geometry_cache_max_entries"]))
+            except ValueError:
+                pass
+        if cfg.get("route_simplify_pixels"):
+            try:
+                ROUTE_SIMPLIFY_PIXELS = max(0.0, float(cfg["route_simplify_pixels"]))
+            except ValueError:
+                pass
+        if cfg.get("duration_leg_cache_max_entries"):
+            try:
+                DURATION_LEG_CACHE_MAX_ENTRIES = max(1000, int(cfg["duration_leg_cache_max_entries"]))
+            except ValueError:
+                pass
+        if cfg.get("baidu_ak_qps"):
+            try:
+                BAIDU_AK_QPS = max(1.0, float(cfg["baidu_ak_qps"]))
+            except ValueError:
+                pass
+        if cfg.get("baidu_ak_pool"):
+            BAIDU_AK_POOL = cfg["baidu_ak_pool"]
+        if cfg.get("baidu_ak_daily_quota"):
+            BAIDU_AK_DAILY_QUOTA = cfg["baidu_ak_daily_quota"]
+        if cfg.get("baidu_ak_realtime_reserve"):
+            try:
+                BAIDU_AK_REALTIME_RESERVE = min(0.9, max(0.0, float(cfg["baidu_ak_realtime_reserve"])))
+            except ValueError:
+                pass
+        if cfg.get("baidu_breaker_error_rate"):
+            try:
+                BAIDU_BREAKER_ERROR_RATE = min(1.0, max(0.05, float(cfg["baidu_breaker_error_rate"])))
+            except ValueError:
+                pass
+        if cfg.get("baidu_breaker_slow_ms"):
+            try:
+                BAIDU_BREAKER_SLOW_MS = max(200, int(cfg["baidu_breaker_slow_ms"]))
+            except ValueError:
+                pass
+        if cfg.get("baidu_breaker_min_calls"):
+            try:
+                BAIDU_BREAKER_MIN_CALLS = max(1, int(cfg["baidu_breaker_min_calls"]))
+            except ValueError:
+                pass
+        if cfg.get("baidu_breaker_open_seconds"):
+            try:
+                BAIDU_BREAKER_OPEN_SECONDS = max(1, int(cfg["baidu_breaker_open_seconds"]))
+            except ValueError:
+                pass
+        if cfg.get("geocode_concurrency"):
+            try:
+                GEOCODE_CONCURRENCY = max(1, min(32, int(cfg["geocode_concurrency"])))
+            except ValueError:
+                pass
+        if cfg.get("routematrix_max_elements"):
+            try:
+                ROUTEMATRIX_MAX_ELEMENTS = max(1, int(cfg["routematrix_max_elements"]))
+            except ValueError:
+                pass
+        if cfg.get("routematrix_tile_retries"):
+            try:
+                ROUTEMATRIX_TILE_RETRIES = max(0, min(5, int(cfg["routematrix_tile_retries"])))
+            except ValueError:
+                pass
+        if cfg.get("routematrix_concurrency"):
+            try:
+                ROUTEMATRIX_CONCURRENCY = max(1, min(16, int(cfg["routematrix_concurrency"])))
+            except ValueError:
+                pass
+        if (cfg.get("map_provider") or "").lower() in ("baidu", "local", "record", "replay"):
+            MAP_PROVIDER = cfg["map_provider"].lower()
+        if cfg.get("map_local_fallback"):
+            MAP_LOCAL_FALLBACK = cfg["map_local_fallback"].lower() in ("1", "true", "yes")
+        if cfg.get("insertion_escalate_margin_seconds"):
+            try:
+                INSERTION_ESCALATE_MARGIN_SECONDS = max(0, int(cfg["insertion_escalate_margin_seconds"]))
+            except ValueError:
+                pass
+        if cfg.get("exact_solver_max_nodes"):
+            try:
+                EXACT_SOLVER_MAX_NODES = max(0, min(route_solver.EXACT_SOLVER_NODE_CAP, int(cfg["exact_solver_max_nodes"])))
+            except ValueError:
+                pass
+        if cfg.get("solver_time_max_ms"):
+            try:
+                SOLVER_TIME_MAX_MS = max(100, int(cfg["solver_time_max_ms"]))
+            except ValueError:
+                pass
+        if cfg.get("solver_solution_limit"):
+            try:
+                SOLVER_SOLUTION_LIMIT = max(1, int(cfg["solver_solution_limit"]))
+            except ValueError:
+                pass
+        if cfg.get("solver_stagnation_ms"):
+            try:
+                SOLVER_STAGNATION_MS = max(50, int(cfg["solver_stagnation_ms"]))
+            except ValueError:
+                pass
+        if cfg.get("route_preview_solve_budget_ms"):
+            try:
+                ROUTE_PREVIEW_SOLVE_BUDGET_MS = max(100, int(cfg["route_preview_solve_budget_ms"]))
+            except ValueError:
+                pass
+        if cfg.get("manual_recommend_solve_budget_ms"):
+            try:
+                MANUAL_RECOMMEND_SOLVE_BUDGET_MS = max(100, int(cfg["manual_recommend_solve_budget_ms"]))
+            except ValueError:
+                pass
+        if cfg.get("solver_pool_workers"):
+            try:
+                SOLVER_POOL_WORKERS = max(0, int(cfg["solver_pool_workers"]))
+            except ValueError:
+                pass
+        if cfg.get("manual_price_seconds_per_yuan"):
+            try:
+                MANUAL_PRICE_SECONDS_PER_YUAN = max(0.0, float(cfg["manual_price_seconds_per_yuan"]))
+            except ValueError:
+                pass
+        logger.info(
+            "已从 app_config 加载配置: baidu_ak=%s, driver_mode=%s, driver_id=%s, map_provider=%s",
+            bool(BAIDU_AK), DRIVER_MODE, bool(DEFAULT_DRIVER_ID), MAP_PROVIDER,
+        )
     except Exception as e:
         logger.warning("从 app_config 加载配置失败: %s，使用默认值", e)
 
@@ -192,7 +536,7 @@ def _get_driver_id(request: Optional[Request] = None) -> Optional[str]:
     return DEFAULT_DRIVER_ID
 
 
-def _load_planned_trip_from_db(driver_id: Optional[str] = None) -> None:
+async def _load_planned_trip_from_db(driver_id: Optional[str] = None) -> None:
     """从数据库加载循环计划配置与计划批次到内存。按 driver_id 过滤；无 driver_id 时兼容旧逻辑（config 取 id=1 或首行，plans 取全部或 driver_id 为空）。"""
     global planned_trips, planned_trip_cycle_origin, planned_trip_cycle_destination, planned_trip_cycle_departure_time
     global planned_trip_cycle_interval_hours, planned_trip_cycle_rounds, planned_trip_cycle_stopped
@@ -206,11 +550,11 @@ def _load_planned_trip_from_db(driver_id: Optional[str] = None) -> None:
     }
     try:
         if driver_id:
-            r = requests.get(f"{url}/rest/v1/planned_trip_cycle_config?driver_id=eq.{driver_id}&select=*", headers=headers, timeout=10)
+            r = await http.get(f"{url}/rest/v1/planned_trip_cycle_config?driver_id=eq.{driver_id}&select=*", headers=headers, timeout=10)
         else:
-            r = requests.get(f"{url}/rest/v1/planned_trip_cycle_config?select=*&order=id.asc&limit=1", headers=headers, timeout=10)
+            r = await http.get(f"{url}/rest/v1/planned_trip_cycle_config?select=*&order=id.asc&limit=1", headers=headers, timeout=10)
             if r.status_code == 200 and isinstance(r.json(), list) and len(r.json()) == 0:
-                r = requests.get(f"{url}/rest/v1/planned_trip_cycle_config?id=eq.1&select=*", headers=headers, timeout=10)
+                r = await http.get(f"{url}/rest/v1/planned_trip_cycle_config?id=eq.1&select=*", headers=headers, timeout=10)
         if r.status_code == 200 and isinstance(r.json(), list) and len(r.json()) > 0:
             row = r.json()[0]
             planned_trip_cycle_origin = (row.get("cycle_origin") or "").strip()
@@ -222,7 +566,7 @@ def _load_planned_trip_from_db(driver_id: Optional[str] = None) -> None:
         plans_url = f"{url}/rest/v1/planned_trip_plans?select=id,sort_order,origin,destination,departure_time,time_window_minutes,min_orders,max_orders,completed&order=completed.asc,sort_order.asc,departure_time.asc"
         if driver_id:
             plans_url += f"&driver_id=eq.{driver_id}"
-        r2 = requests.get(plans_url, headers=headers, timeout=10)
+        r2 = await http.get(plans_url, headers=headers, timeout=10)
         if r2.status_code == 200 and isinstance(r2.json(), list):
             rows = r2.json()
             planned_trips.clear()
@@ -242,7 +586,7 @@ def _load_planned_trip_from_db(driver_id: Optional[str] = None) -> None:
         logger.warning("从数据库加载循环计划失败: %s，使用内存默认值", e)
 
 
-def _save_planned_trip_config_to_db(driver_id: Optional[str] = None) -> None:
+async def _save_planned_trip_config_to_db(driver_id: Optional[str] = None) -> None:
     """将内存中的循环计划配置写入数据库。有 driver_id 时按 driver_id  upsert；无则按 id=1 兼容。"""
     global planned_trip_cycle_origin, planned_trip_cycle_destination, planned_trip_cycle_departure_time
     global planned_trip_cycle_interval_hours, planned_trip_cycle_rounds, planned_trip_cycle_stopped
@@ -266,14 +610,14 @@ def _save_planned_trip_config_to_db(driver_id: Optional[str] = None) -> None:
     try:
         if driver_id:
             payload["driver_id"] = driver_id
-            requests.post(url, json=payload, headers={**headers, "Prefer": "resolution=merge-duplicates,return=minimal"}, timeout=10)
+            await http.post(url, json=payload, headers={**headers, "Prefer": "resolution=merge-duplicates,return=minimal"}, timeout=10)
         else:
-            requests.patch(f"{url}?id=eq.1", json=payload, headers=headers, timeout=10)
+            await http.patch(f"{url}?id=eq.1", json=payload, headers=headers, timeout=10)
     except Exception as e:
         logger.warning("写入循环计划配置到数据库失败: %s", e)
 
 
-def _sync_planned_trip_plans_to_db(driver_id: Optional[str] = None) -> None:
+async def _sync_planned_trip_plans_to_db(driver_id: Optional[str] = None) -> None:
     """将内存中的计划批次同步到数据库：有 id 的 PATCH，无 id 的 INSERT 并回填 id；按 sort_order 写入；有 driver_id 时写入 driver_id。"""
     global planned_trips
     if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
@@ -302,9 +646,9 @@ def _sync_planned_trip_plans_to_db(driver_id: Optional[str] = None) -> None:
                 row["driver_id"] = driver_id
             pid = p.get("id")
             if pid:
-                requests.patch(f"{url}?id=eq.{pid}", json=row, headers={**headers, "Prefer": ""}, timeout=10)
+                await http.patch(f"{url}?id=eq.{pid}", json=row, headers={**headers, "Prefer": ""}, timeout=10)
             else:
-                r = requests.post(url, json=row, headers=headers, timeout=10)
+                r = await http.post(url, json=row, headers=headers, timeout=10)
                 if r.status_code in (200, 201) and isinstance(r.json(), list) and len(r.json()) > 0:
                     planned_trips[i]["id"] = r.json()[0].get("id")
     except Exception as e:
@@ -312,8 +656,83 @@ def _sync_planned_trip_plans_to_db(driver_id: Optional[str] = None) -> None:
 
 
 _load_app_config_from_db()
-_load_planned_trip_from_db(DEFAULT_DRIVER_ID)
 _baidu_ocr_client: Optional[BaiduOcrClient] = None
+_geocode_cache = GeocodeCache(
+    db_path=MAP_CACHE_DB_PATH,
+    ttl_seconds=GEOCODE_CACHE_TTL_SECONDS,
+    max_entries=GEOCODE_CACHE_MAX_ENTRIES,
+)
+_reverse_geocode_cache = ReverseGeocodeCache(
+    db_path=MAP_CACHE_DB_PATH,
+    ttl_seconds=REVERSE_GEOCODE_CACHE_TTL_SECONDS,
+    max_entries=REVERSE_GEOCODE_CACHE_MAX_ENTRIES,
+    cell_meters=REVERSE_GEOCODE_CELL_METERS,
+)
+_duration_leg_cache = DurationLegCache(
+    db_path=MAP_CACHE_DB_PATH,
+    ttl_seconds=DURATION_LEG_CACHE_TTL_SECONDS,
+    max_entries=DURATION_LEG_CACHE_MAX_ENTRIES,
+    rush_ttl_seconds=DURATION_LEG_RUSH_TTL_SECONDS,
+    night_ttl_seconds=DURATION_LEG_NIGHT_TTL_SECONDS,
+)
+_route_geometry_cache = RouteGeometryCache(
+    db_path=MAP_CACHE_DB_PATH,
+    ttl_seconds=ROUTE_GEOMETRY_CACHE_TTL_SECONDS,
+    max_entries=ROUTE_GEOMETRY_CACHE_MAX_ENTRIES,
+)
+_duration_refresh_task: Optional["asyncio.Task[None]"] = None
+# 地图缓存预热：按司机（无司机为 ""）记录最近活动时间（monotonic）、上次预热的地址指纹、在途任务与待重跑标记
+_map_warmup_drivers: Dict[str, float] = {}
+_map_warmup_fingerprints: Dict[str, str] = {}
+_map_warmup_tasks: Dict[str, "asyncio.Task[None]"] = {}
+_map_warmup_rerun: Set[str] = set()
+_map_warmup_loop_task: Optional["asyncio.Task[None]"] = None
+_map_warmup_stats: Dict[str, Any] = {
+    "runs": 0,
+    "unchanged": 0,
+    "errors": 0,
+    "addresses": 0,
+    "geocode_failed": 0,
+    "legs_from_cache": 0,
+    "legs_fetched": 0,
+    "last_ms": 0,
+}
+_baidu_ak_pool = BaiduAkPool(
+    [BAIDU_AK] + parse_ak_list(BAIDU_AK_POOL),
+    qps=BAIDU_AK_QPS,
+    daily_quota=parse_daily_quota(BAIDU_AK_DAILY_QUOTA),
+    realtime_reserve=BAIDU_AK_REALTIME_RESERVE,
+)
+_baidu_breakers: Dict[str, CircuitBreaker] = {
+    service: CircuitBreaker(
+        f"百度{label}",
+        error_rate=BAIDU_BREAKER_ERROR_RATE,
+        slow_ms=BAIDU_BREAKER_SLOW_MS,
+        min_calls=BAIDU_BREAKER_MIN_CALLS,
+        open_seconds=BAIDU_BREAKER_OPEN_SECONDS,
+    )
+    for service, label in (
+        ("geocoding", "地理编码"),
+        ("reverse_geocoding", "逆地理编码"),
+        ("routematrix", "路网矩阵"),
+        ("direction", "驾车路线"),
+    )
+}
+# 同一地址 / 同一矩阵块的并发百度请求只发一次（探子批量上报、网页与探子同时查路线时常见）；只在同一配额优先级内合并，见 _flight_key
+_geocode_flight = SingleFlight("geocoding")
+_routematrix_flight = SingleFlight("routematrix")
+_direction_flight = SingleFlight("direction")
+_reverse_geocode_flight = SingleFlight("reverse_geocoding")
+_map_provider: MapProvider  # 见下文 _build_map_provider()，百度请求函数定义之后创建
+solver_pool.configure(
+    max_workers=SOLVER_POOL_WORKERS,
+    solver_config={
+        "exact_max_nodes": EXACT_SOLVER_MAX_NODES,
+        "time_max_ms": SOLVER_TIME_MAX_MS,
+        "solution_limit": SOLVER_SOLUTION_LIMIT,
+        "stagnation_ms": SOLVER_STAGNATION_MS,
+    },
+)
 # ==========================================
 
 
@@ -403,9 +822,23 @@ class GeocodeBatchRequest(BaseModel):
 
 
 class ReverseGeocodeRequest(BaseModel):
-    """逆地理编码请求（经纬度 → 地址）"""
+    """逆地理编码请求（经纬度 → 地址）；coord_type：wgs84（默认，设备 GPS）/ gcj02 / bd09"""
     lat: float
     lng: float
+    coord_type: str = WGS84
+
+
+class ReverseGeocodeBatchRequest(BaseModel):
+    """批量逆地理编码请求：points 为 [[lat, lng], ...]（如一段 GPS 轨迹），coord_type 同 ReverseGeocodeRequest"""
+    points: List[List[float]]
+    coord_type: str = WGS84
+
+
+class CoordConvertRequest(BaseModel):
+    """批量坐标系转换请求：points 为 [[lat, lng], ...]，from_type / to_type 取 wgs84 / gcj02 / bd09"""
+    points: List[List[float]]
+    from_type: str = WGS84
+    to_type: str = BD09
 
 
 class LoginRequest(BaseModel):
@@ -446,7 +879,7 @@ class ManualRecommendRequest(BaseModel):
 # ---------------------------------------------------------------------------
 # 登录：从 Supabase app_users 校验并签发 JWT
 # ---------------------------------------------------------------------------
-def _get_user_by_username(username: str) -> Optional[dict]:
+async def _get_user_by_username(username: str) -> Optional[dict]:
     """从 Supabase app_users 表按用户名查 password_hash 与 driver_id，无则返回 None。"""
     if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
         return None
@@ -458,7 +891,7 @@ def _get_user_by_username(username: str) -> Optional[dict]:
         "Accept": "application/json",
     }
     try:
-        resp = requests.get(url, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
+        resp = await http.get(url, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
         if resp.status_code != 200:
             return None
         data = resp.json()
@@ -470,7 +903,7 @@ def _get_user_by_username(username: str) -> Optional[dict]:
         return None
 
 
-def _get_user_by_email(email: str) -> Optional[dict]:
+async def _get_user_by_email(email: str) -> Optional[dict]:
     """从 app_users 按邮箱查 username 与 driver_id，用于 /auth/exchange。"""
     if not email or not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
         return None
@@ -482,7 +915,7 @@ def _get_user_by_email(email: str) -> Optional[dict]:
         "Accept": "application/json",
     }
     try:
-        resp = requests.get(url, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
+        resp = await http.get(url, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
         if resp.status_code != 200:
             return None
         data = resp.json()
@@ -494,7 +927,7 @@ def _get_user_by_email(email: str) -> Optional[dict]:
         return None
 
 
-def _get_assigned_orders_for_driver(driver_id: str) -> List[Dict[str, str]]:
+async def _get_assigned_orders_for_driver(driver_id: str) -> List[Dict[str, str]]:
     """按司机从数据库读取已分配订单（只返回 pickup/delivery）。"""
     if not driver_id or not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
         return []
@@ -511,7 +944,7 @@ def _get_assigned_orders_for_driver(driver_id: str) -> List[Dict[str, str]]:
         "Accept": "application/json",
     }
     try:
-        resp = requests.get(url, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
+        resp = await http.get(url, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
         if resp.status_code != 200:
             logger.warning("读取 order_pool 失败: status=%s body=%s", resp.status_code, resp.text[:200])
             return []
@@ -530,7 +963,7 @@ def _get_assigned_orders_for_driver(driver_id: str) -> List[Dict[str, str]]:
         return []
 
 
-def _get_driver_current_loc(driver_id: str) -> Optional[str]:
+async def _get_driver_current_loc(driver_id: str) -> Optional[str]:
     """按司机从数据库读取当前位置。"""
     if not driver_id or not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
         return None
@@ -546,7 +979,7 @@ def _get_driver_current_loc(driver_id: str) -> Optional[str]:
         "Accept": "application/json",
     }
     try:
-        resp = requests.get(url, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
+        resp = await http.get(url, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
         if resp.status_code != 200:
             logger.warning("读取 driver_state 失败: status=%s body=%s", resp.status_code, resp.text[:200])
             return None
@@ -559,7 +992,7 @@ def _get_driver_current_loc(driver_id: str) -> Optional[str]:
         return None
 
 
-def _get_bark_key_for_driver(driver_id: Optional[str]) -> Optional[str]:
+async def _get_bark_key_for_driver(driver_id: Optional[str]) -> Optional[str]:
     """按司机从 app_users 表读取 bark_key；无或异常时返回 None。"""
     if not driver_id or not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
         return None
@@ -575,7 +1008,7 @@ def _get_bark_key_for_driver(driver_id: Optional[str]) -> Optional[str]:
         "Accept": "application/json",
     }
     try:
-        resp = requests.get(url, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
+        resp = await http.get(url, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
         if resp.status_code != 200:
             return None
         data = resp.json()
@@ -587,7 +1020,7 @@ def _get_bark_key_for_driver(driver_id: Optional[str]) -> Optional[str]:
         return None
 
 
-def _get_supabase_user_email_by_token(access_token: str) -> Optional[str]:
+async def _get_supabase_user_email_by_token(access_token: str) -> Optional[str]:
     """调 Supabase Auth 接口校验 token 并取邮箱，不依赖本地 JWT Secret。"""
     if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY or not access_token:
         return None
@@ -598,7 +1031,7 @@ def _get_supabase_user_email_by_token(access_token: str) -> Optional[str]:
         "Content-Type": "application/json",
     }
     try:
-        resp = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        resp = await http.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
         if resp.status_code != 200:
             return None
         data = resp.json()
@@ -634,6 +1067,39 @@ def _decode_token(token: str) -> Optional[str]:
 security = HTTPBearer(auto_error=False)
 
 
+@app.on_event("startup")
+async def _on_startup() -> None:
+    """
+    启动时按默认司机加载循环计划（app_config 已在导入时同步加载），预热求解进程池并启动热门耗时腿后台刷新；
+    计划加载后在后台预热该司机计划 / 已分配订单 / 当前位置的地图缓存，并启动已分配订单变化检查。
+    """
+    global _duration_refresh_task, _map_warmup_loop_task
+    await asyncio.gather(_load_planned_trip_from_db(DEFAULT_DRIVER_ID), solver_pool.warm_up())
+    if DURATION_REFRESH_INTERVAL_SECONDS > 0 and _duration_refresh_task is None:
+        _duration_refresh_task = asyncio.create_task(_duration_refresh_loop())
+    _on_planned_trips_changed(DEFAULT_DRIVER_ID)
+    if MAP_WARMUP_INTERVAL_SECONDS > 0 and _map_warmup_loop_task is None:
+        _map_warmup_loop_task = asyncio.create_task(_map_warmup_loop())
+
+
+@app.on_event("shutdown")
+async def _on_shutdown() -> None:
+    """停止后台刷新与地图缓存预热，关闭共享 HTTP 连接池与求解进程池，录制模式下把未落盘的 fixture 写盘。"""
+    global _duration_refresh_task, _map_warmup_loop_task
+    if _duration_refresh_task is not None:
+        _duration_refresh_task.cancel()
+        _duration_refresh_task = None
+    if _map_warmup_loop_task is not None:
+        _map_warmup_loop_task.cancel()
+        _map_warmup_loop_task = None
+    for task in list(_map_warmup_tasks.values()):
+        task.cancel()
+    await http.aclose()
+    solver_pool.shutdown()
+    if _map_fixture_store is not None:
+        _map_fixture_store.save()
+
+
 @app.get("/")
 async def root() -> dict:
     """根路径，便于浏览器访问 88 或 /api 时看到服务正常。"""
@@ -657,7 +1123,7 @@ async def login(body: LoginRequest) -> dict:
     password = body.password or ""
     if not username:
         raise HTTPException(status_code=400, detail="用户名不能为空")
-    user = _get_user_by_username(username)
+    user = await _get_user_by_username(username)
     if not user or not _verify_password(password, user.get("password_hash")):
         raise HTTPException(status_code=401, detail="用户名或密码错误")
     token = _create_token(username)
@@ -679,7 +1145,7 @@ async def auth_me(credentials: Optional[HTTPAuthorizationCredentials] = Depends(
     username = _decode_token(credentials.credentials)
     if not username:
         raise HTTPException(status_code=401, detail="登录已过期或无效")
-    user = _get_user_by_username(username)
+    user = await _get_user_by_username(username)
     driver_id = None
     if user and user.get("driver_id") is not None:
         driver_id = str(user["driver_id"]) if hasattr(user["driver_id"], "hex") else user["driver_id"]
@@ -689,14 +1155,14 @@ async def auth_me(credentials: Optional[HTTPAuthorizationCredentials] = Depends(
     return out
 
 
-def _require_driver_id_from_token(credentials: Optional[HTTPAuthorizationCredentials]) -> str:
+async def _require_driver_id_from_token(credentials: Optional[HTTPAuthorizationCredentials]) -> str:
     """强制鉴权并返回当前账号绑定的 driver_id。"""
     if not credentials or not credentials.credentials:
         raise HTTPException(status_code=401, detail="未提供登录凭证")
     username = _decode_token(credentials.credentials)
     if not username:
         raise HTTPException(status_code=401, detail="登录已过期或无效")
-    user = _get_user_by_username(username)
+    user = await _get_user_by_username(username)
     driver_id = str((user or {}).get("driver_id") or "").strip()
     if not driver_id:
         raise HTTPException(status_code=403, detail="当前账号未绑定司机")
@@ -713,13 +1179,13 @@ async def auth_exchange(body: AuthExchangeRequest) -> dict:
     """
     if not body.access_token or not body.access_token.strip():
         raise HTTPException(status_code=401, detail="未提供 access_token")
-    email = _get_supabase_user_email_by_token(body.access_token.strip())
+    email = await _get_supabase_user_email_by_token(body.access_token.strip())
     if not email:
         raise HTTPException(
             status_code=401,
             detail="Supabase 凭证无效或已过期（请确认 SUPABASE_URL、SUPABASE_SERVICE_ROLE_KEY 正确，且该邮箱已在 Supabase Auth 中注册）",
         )
-    user = _get_user_by_email(email)
+    user = await _get_user_by_email(email)
     if not user:
         raise HTTPException(status_code=403, detail="该邮箱未关联到控制台用户，请在 app_users 中绑定 email")
     username = user.get("username") or ""
@@ -738,18 +1204,142 @@ async def auth_exchange(body: AuthExchangeRequest) -> dict:
 # 二、外部依赖 - 百度地图 (Geocoding + Duration Matrix)
 # ---------------------------------------------------------------------------
 
-def geocode_address(address: str) -> str:
+def _flight_key(key: Hashable) -> Tuple[str, Hashable]:
+    """
+    在途合并键带上当前配额优先级：合并后的请求按发起方（leader）的优先级在 AK 池排队、计配额，
+    实时评估若去等普通优先级的在途请求，会在普通桶里排队、用普通配额，甚至因普通配额用尽而失败（优先级反转）。
+    """
+    return (current_priority(), key)
+
+
+def _merge_flight_stats(
+    stats: Optional[Dict[str, Any]],
+    call_stats: Dict[str, Any],
+    leader: bool,
+    counters: Tuple[str, ...] = (),
+    flags: Tuple[str, ...] = (),
+) -> None:
+    """
+    把在途合并执行方回填的 call_stats 并入本次调用的 stats：counters（实际发出的请求数）只累加给执行方，
+    flags（provider / degraded 等）合并进来的调用方同样拿到，它们用的就是执行方的结果。
+    """
+    if stats is None:
+        return
+    if leader:
+        for k in counters:
+            if call_stats.get(k):
+                stats[k] = stats.get(k, 0) + call_stats[k]
+    for k in flags:
+        if call_stats.get(k):
+            stats[k] = call_stats[k]
+
+
+async def geocode_address(address: str, stats: Optional[Dict[str, Any]] = None) -> str:
     """
     单地址地理编码，返回 "lat,lng"。
-    依赖：百度地图 Geocoding API。
+    先查地理编码缓存（按归一化地址），未命中再经路网服务解析（默认百度 Geocoding API，结果写回缓存）；
+    同一地址已有在途请求时直接等待其结果，不重复请求。
+    传入 stats 时累加 geocode_from_cache / geocode_requests（本次调用实际发出的百度请求数）。
+    """
+    cached = _geocode_cache.get_coord(address)
+    if cached:
+        if stats is not None:
+            stats["geocode_from_cache"] = stats.get("geocode_from_cache", 0) + 1
+        return cached
+    return await _geocode_flight.do_with_stats(
+        _flight_key(normalize_address(address)),
+        lambda call_stats: _geocode_via_provider(address, call_stats),
+        lambda call_stats, leader: _merge_flight_stats(
+            stats, call_stats, leader, counters=("geocode_requests",), flags=("degraded",)
+        ),
+    )
+
+
+async def _geocode_via_provider(address: str, call_stats: Dict[str, Any]) -> str:
+    """经路网服务解析单个地址，统计回填到 call_stats；结果可缓存（百度 / 回放）时写回地理编码缓存，离线估算的结果不写。"""
+    coord = await _map_call(_map_provider.geocode(address, call_stats))
+    if call_stats.get("cacheable", True):
+        _geocode_cache.set_coord(address, coord)
+    return coord
+
+
+async def _map_call(coro: Any) -> Any:
+    """等待路网服务调用；离线服务的 MapProviderError、熔断拒绝转成同状态码的 HTTPException，与百度实现的报错一致。"""
+    try:
+        return await coro
+    except (MapProviderError, CircuitOpenError) as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail) from e
+
+
+# 百度返回这些 status 表示 AK 无权限 / 配额或并发超限，按服务不可用（503）处理，可切离线兜底
+_BAIDU_UNAVAILABLE_STATUSES = frozenset((3, 4, 5, 101, 102, 401, 402))
+
+
+def _baidu_status_unavailable(status: Any) -> bool:
+    try:
+        code = int(status)
+    except (TypeError, ValueError):
+        return False
+    return code in _BAIDU_UNAVAILABLE_STATUSES or 200 <= code < 400
+
+
+async def _baidu_get(service: str, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    经 AK 池发出一次百度 GET，返回响应 JSON：按服务与当前优先级挑有余量的 AK 填入 params，响应状态回报给 AK 池；
+    该 AK 的配额 / 权限类失败（天配额超限、并发超限、AK 无效等）换下一个 AK 重试，都失败时返回最后一次响应。
+    每次请求的成败与耗时计入该接口的熔断器：熔断中直接抛 CircuitOpenError，不占配额、不等超时。
+    网络异常原样抛出 HTTPError，响应不是 JSON 对象时抛 ValueError（调用方与网络异常一样按服务不可用处理）；池中一开始就没有可用 AK 时抛 503。
     """
+    breaker = _baidu_breakers[service]
+    tried: List[str] = []
+    data: Optional[Dict[str, Any]] = None
+    while True:
+        permit = breaker.check()
+        try:
+            ak = await _baidu_ak_pool.acquire(service, exclude=tried)
+        except AkQuotaExhausted as e:
+            breaker.release(permit)
+            if data is not None:
+                return data
+            logger.warning("百度 AK 池无可用 AK: %s", e)
+            raise HTTPException(status_code=503, detail=str(e)) from e
+        tried.append(ak)
+        started = time.perf_counter()
+        try:
+            resp = await http.get(url, params={**params, "ak": ak}, timeout=REQUEST_TIMEOUT)
+            resp.raise_for_status()
+            data = resp.json()
+            if not isinstance(data, dict):
+                raise ValueError(f"百度返回非 JSON 对象: {type(data).__name__}")
+        except asyncio.CancelledError:
+            # 客户端断开、求解预算到期等取消与百度服务好坏无关：归还半开探测名额，不计入熔断统计，退回预占的 AK 当日用量
+            breaker.release(permit)
+            _baidu_ak_pool.refund(ak, service)
+            raise
+        except (HTTPError, ValueError):
+            # 网络异常与响应无法解析（HTML 错误页、截断的 JSON 等）同样计为该 AK 的一次失败
+            _baidu_ak_pool.record(ak, service, None)
+            breaker.record(permit, False, (time.perf_counter() - started) * 1000)
+            raise
+        except Exception:
+            breaker.record(permit, False, (time.perf_counter() - started) * 1000)
+            raise
+        # 百度 status 1 为服务端内部错误，计入熔断；其余非 0 状态是请求或 AK 层面的问题，服务本身可用
+        breaker.record(permit, data.get("status") != 1, (time.perf_counter() - started) * 1000)
+        if not _baidu_ak_pool.record(ak, service, data.get("status")):
+            return data
+        logger.warning("百度 AK %s*** 在 %s 上不可用(status=%s)，换 AK 重试", ak[:6], service, data.get("status"))
+
+
+async def _geocode_from_baidu(address: str, stats: Optional[Dict[str, Any]] = None) -> str:
+    """调百度地图 Geocoding API 解析单个地址（由 geocode_address 经在途合并、路网服务调用）。"""
     url = "https://api.map.baidu.com/geocoding/v3/"
-    params = {"address": address, "output": "json", "ak": BAIDU_AK}
+    params = {"address": address, "output": "json"}
+    if stats is not None:
+        stats["geocode_requests"] = stats.get("geocode_requests", 0) + 1
     try:
-        resp = requests.get(url, params=params, timeout=REQUEST_TIMEOUT)
-        resp.raise_for_status()
-        data = resp.json()
-    except requests.RequestException as e:
+        data = await _baidu_get("geocoding", url, params)
+    except (HTTPError, ValueError) as e:
         logger.error("百度地理编码请求异常: %s", e)
         raise HTTPException(
             status_code=503,
@@ -759,6 +1349,8 @@ def geocode_address(address: str) -> str:
     if data.get("status") != 0:
         msg = data.get("message", "未知错误")
         logger.warning("地址解析失败 [%s]: %s", address, msg)
+        if _baidu_status_unavailable(data.get("status")):
+            raise HTTPException(status_code=503, detail=f"地理编码服务不可用: {msg}")
         raise HTTPException(
             status_code=400,
             detail=f"地址无法解析: {address}，原因: {msg}",
@@ -768,23 +1360,52 @@ def geocode_address(address: str) -> str:
     return f"{loc['lat']},{loc['lng']}"
 
 
-def reverse_geocode(lat: float, lng: float) -> str:
+async def reverse_geocode(lat: float, lng: float, coord_type: str = WGS84) -> str:
     """
-    逆地理编码：WGS84 经纬度 → 地址字符串。
-    依赖：百度地图逆地理编码 API。
+    逆地理编码：经纬度 → 地址字符串。coord_type 为入参坐标系（默认 WGS84，即设备 GPS 原始坐标）。
+    本地先转成 BD09 再查缓存 / 交给路网服务（默认百度逆地理编码 API），不依赖百度对 wgs84ll 的解释。
     """
+    lat_bd, lng_bd = convert_point(lat, lng, coord_type, BD09)
+    return await reverse_geocode_bd09(lat_bd, lng_bd)
+
+
+async def reverse_geocode_bd09(lat_bd: float, lng_bd: float, stats: Optional[Dict[str, Any]] = None) -> str:
+    """
+    BD09 坐标逆地理编码：先按网格单元查逆地理编码缓存，未命中再经路网服务解析；同一单元已有在途请求时直接等待其结果。
+    传入 stats 时累加 from_cache / requests（本次调用实际发出的路网服务请求数）。
+    """
+    cached = _reverse_geocode_cache.get_address(lat_bd, lng_bd)
+    if cached:
+        if stats is not None:
+            stats["from_cache"] = stats.get("from_cache", 0) + 1
+        return cached
+    return await _reverse_geocode_flight.do_with_stats(
+        _flight_key(_reverse_geocode_cache.cell_key(lat_bd, lng_bd)),
+        lambda call_stats: _reverse_geocode_via_provider(lat_bd, lng_bd, call_stats),
+        lambda call_stats, leader: _merge_flight_stats(stats, call_stats, leader, counters=("requests",), flags=("degraded",)),
+    )
+
+
+async def _reverse_geocode_via_provider(lat_bd: float, lng_bd: float, call_stats: Dict[str, Any]) -> str:
+    """经路网服务逆地理编码，统计回填到 call_stats；结果可缓存（百度 / 回放）时按网格单元写回缓存，离线估算的「xx附近」不写。"""
+    address = await _map_call(_map_provider.reverse_geocode(lat_bd, lng_bd, call_stats))
+    call_stats["requests"] = call_stats.get("requests", 0) + 1
+    if call_stats.get("cacheable", True):
+        _reverse_geocode_cache.set_address(lat_bd, lng_bd, address)
+    return address
+
+
+async def _reverse_geocode_from_baidu(lat_bd: float, lng_bd: float) -> str:
+    """调百度逆地理编码 API（BD09 入参）。"""
     url = "https://api.map.baidu.com/reverse_geocoding/v3/"
     params = {
-        "ak": BAIDU_AK,
         "output": "json",
-        "coordtype": "wgs84ll",
-        "location": f"{lat},{lng}",
+        "coordtype": "bd09ll",
+        "location": f"{lat_bd:.7f},{lng_bd:.7f}",
     }
     try:
-        resp = requests.get(url, params=params, timeout=REQUEST_TIMEOUT)
-        resp.raise_for_status()
-        data = resp.json()
-    except requests.RequestException as e:
+        data = await _baidu_get("reverse_geocoding", url, params)
+    except (HTTPError, ValueError) as e:
         logger.error("百度逆地理编码请求异常: %s", e)
         raise HTTPException(
             status_code=503,
@@ -793,9 +1414,9 @@ def reverse_geocode(lat: float, lng: float) -> str:
 
     if data.get("status") != 0:
         msg = data.get("message", "未知错误")
-        logger.warning("逆地理编码失败 [%s,%s]: %s", lat, lng, msg)
+        logger.warning("逆地理编码失败 [%s,%s]: %s", lat_bd, lng_bd, msg)
         raise HTTPException(
-            status_code=400,
+            status_code=503 if _baidu_status_unavailable(data.get("status")) else 400,
             detail=f"逆地理编码失败: {msg}",
         )
 
@@ -811,56 +1432,197 @@ def reverse_geocode(lat: float, lng: float) -> str:
             ac.get("street_number"),
         ]
         formatted = "".join(p for p in parts if p)
-    return formatted or f"{lat:.5f},{lng:.5f}"
+    return formatted or f"{lat_bd:.5f},{lng_bd:.5f}"
 
 
-def geocode_addresses(addresses: List[str]) -> List[str]:
-    """批量地理编码，顺序与输入一致。任一失败即中止。"""
-    coords: List[str] = []
+async def geocode_addresses_detailed(
+    addresses: List[str],
+    stats: Optional[Dict[str, Any]] = None,
+) -> List[Tuple[Optional[str], Optional[Exception]]]:
+    """
+    批量地理编码（逐项结果）：返回与输入同序的 (坐标, 异常) 列表，成功项异常为 None，失败项坐标为 None。
+    同一批内归一化后相同的地址只解析一次；并发数受 GEOCODE_CONCURRENCY 限制，百度请求另受 AK 令牌桶限流。
+    """
+    unique: Dict[str, str] = {}
     for addr in addresses:
-        coords.append(geocode_address(addr))
+        key = normalize_address(addr)
+        if key not in unique:
+            unique[key] = addr
+    sem = asyncio.Semaphore(max(1, GEOCODE_CONCURRENCY))
+
+    async def _one(addr: str) -> str:
+        async with sem:
+            return await geocode_address(addr, stats=stats)
+
+    keys = list(unique.keys())
+    results = await asyncio.gather(*(_one(unique[k]) for k in keys), return_exceptions=True)
+    by_key: Dict[str, Tuple[Optional[str], Optional[Exception]]] = {}
+    for key, res in zip(keys, results):
+        if isinstance(res, Exception):
+            by_key[key] = (None, res)
+        elif isinstance(res, BaseException):
+            raise res
+        else:
+            by_key[key] = (res, None)
+    return [by_key[normalize_address(addr)] for addr in addresses]
+
+
+async def geocode_addresses(addresses: List[str], stats: Optional[Dict[str, Any]] = None) -> List[str]:
+    """批量地理编码，顺序与输入一致；并发解析，任一失败即抛出（按输入顺序的第一个失败项）。"""
+    coords: List[str] = []
+    for coord, err in await geocode_addresses_detailed(addresses, stats=stats):
+        if err is not None:
+            raise err
+        coords.append(coord or "")
     return coords
 
 
-def get_duration_matrix(coords: List[str], tactics: int = 11) -> List[List[int]]:
+def routematrix_tiles(num_origins: int, num_destinations: int, max_elements: int) -> List[Tuple[range, range]]:
     """
-    获取所有点两两之间的驾车耗时（秒）。
-    依赖：百度地图 Route Matrix API（驾车）。
-    返回：matrix[i][j] = 从点 i 到点 j 的秒数。
+    把 num_origins × num_destinations 拆成每块不超过 max_elements 个元素的矩形块，返回 (起点下标范围, 终点下标范围) 列表。
+    在所有可行的块形状里取块数最少的（同块数时取更接近正方形的），尽量少占百度配额。
+    """
+    if num_origins <= 0 or num_destinations <= 0:
+        return []
+    limit = max(1, int(max_elements))
+    best: Optional[Tuple[int, int, int, int]] = None
+    for dest_block in range(1, min(num_destinations, limit) + 1):
+        origin_block = min(num_origins, limit // dest_block)
+        count = -(-num_origins // origin_block) * -(-num_destinations // dest_block)
+        key = (count, abs(origin_block - dest_block), origin_block, dest_block)
+        if best is None or key < best:
+            best = key
+    _, _, origin_block, dest_block = best
+    return [
+        (range(o, min(o + origin_block, num_origins)), range(d, min(d + dest_block, num_destinations)))
+        for o in range(0, num_origins, origin_block)
+        for d in range(0, num_destinations, dest_block)
+    ]
+
+
+async def _fetch_routematrix(
+    origins: List[str],
+    destinations: List[str],
+    tactics: int,
+    stats: Optional[Dict[str, Any]] = None,
+) -> np.ndarray:
     """
-    points = "|".join(coords)
+    分块获取 origins × destinations 的驾车耗时（秒）：按 ROUTEMATRIX_MAX_ELEMENTS 拆块，
+    各块在 ROUTEMATRIX_CONCURRENCY 并发内同时请求（每次请求仍经 AK 池限流），结果按块写回一张 int32 数组。
+    失败的块单独重试（最多 ROUTEMATRIX_TILE_RETRIES 轮），仍失败时抛出最后一个错误；熔断拒绝不重试，直接抛出。
+    传入 stats 时累加 tiles / tile_retries / baidu_requests（实际发出的百度请求数，含策略降级重试）；
+    有分块因策略不支持降级为 11 时回填 tactics_fallback 并把 cacheable 置为 False：这些耗时不是所请求策略的结果，
+    不能按所请求的 tactics 写入耗时腿缓存或录入 fixture。
+    返回：rows[i, j] = 从 origins[i] 到 destinations[j] 的秒数（int32 数组）。
+    """
+    tiles = routematrix_tiles(len(origins), len(destinations), ROUTEMATRIX_MAX_ELEMENTS)
+    rows = np.zeros((len(origins), len(destinations)), dtype=np.int32)
+    sem = asyncio.Semaphore(max(1, ROUTEMATRIX_CONCURRENCY))
+    applied: Set[int] = set()
+
+    async def _one(tile: Tuple[range, range]) -> None:
+        origin_range, dest_range = tile
+        async with sem:
+            block, applied_tactics = await _fetch_routematrix_tile(
+                [origins[i] for i in origin_range], [destinations[j] for j in dest_range], tactics, stats
+            )
+        rows[origin_range.start : origin_range.stop, dest_range.start : dest_range.stop] = block
+        applied.add(applied_tactics)
+
+    pending = tiles
+    retries = 0
+    last_error: Optional[BaseException] = None
+    for attempt in range(max(0, ROUTEMATRIX_TILE_RETRIES) + 1):
+        if attempt > 0:
+            retries += len(pending)
+            logger.warning("路网矩阵 %s 个分块失败，单独重试(%s/%s)", len(pending), attempt, ROUTEMATRIX_TILE_RETRIES)
+        results = await asyncio.gather(*(_one(t) for t in pending), return_exceptions=True)
+        failed: List[Tuple[range, range]] = []
+        for tile, res in zip(pending, results):
+            if isinstance(res, CircuitOpenError):
+                # 熔断中重试也会被直接拒绝，交给调用方降级
+                raise res
+            if isinstance(res, Exception):
+                failed.append(tile)
+                last_error = res
+            elif isinstance(res, BaseException):
+                raise res
+        pending = failed
+        if not pending:
+            break
+    if stats is not None:
+        stats["tiles"] = stats.get("tiles", 0) + len(tiles)
+        stats["tile_retries"] = stats.get("tile_retries", 0) + retries
+    if pending and last_error is not None:
+        raise last_error
+    if applied - {tactics} and stats is not None:
+        stats["tactics_fallback"] = True
+        stats["cacheable"] = False
+    return rows
+
+
+async def _fetch_routematrix_tile(
+    origins: List[str],
+    destinations: List[str],
+    tactics: int,
+    stats: Optional[Dict[str, Any]] = None,
+) -> Tuple[np.ndarray, int]:
+    """
+    调百度 Route Matrix API（驾车）获取单块 origins × destinations 的耗时（秒），调用方保证元素数不超限。
+    同一块（起点、终点、tactics 均相同）已有在途请求时直接等待其结果。
+    返回：(rows, 实际生效的 tactics)，rows[i, j] = 从 origins[i] 到 destinations[j] 的秒数（int32 数组）；
+    所选策略矩阵接口不支持而降级为 11 时，实际生效的 tactics 与请求的不同。
+    """
+    key = (
+        tactics,
+        tuple(normalize_coord(c) for c in origins),
+        tuple(normalize_coord(c) for c in destinations),
+    )
+    return await _routematrix_flight.do_with_stats(
+        _flight_key(key),
+        lambda call_stats: _fetch_routematrix_tile_from_baidu(origins, destinations, tactics, call_stats),
+        lambda call_stats, leader: _merge_flight_stats(stats, call_stats, leader, counters=("baidu_requests",)),
+    )
+
+
+async def _fetch_routematrix_tile_from_baidu(
+    origins: List[str],
+    destinations: List[str],
+    tactics: int,
+    stats: Optional[Dict[str, Any]] = None,
+) -> Tuple[np.ndarray, int]:
+    """单块路网矩阵的实际百度请求（含策略降级重试），由 _fetch_routematrix_tile 经在途合并调用；返回 (耗时数组, 实际生效的 tactics)。"""
     url = "https://api.map.baidu.com/routematrix/v2/driving"
     # 先尝试前端所选策略；若矩阵接口不支持该策略，则按兼容策略重试，避免直接 502。
     # 注意：矩阵接口支持策略与驾车路径接口可能不完全一致。
-    # 实测 tactics=0 在矩阵接口会报 invalid，这里预先归一化到 11，避免噪声日志。
-    if tactics == 0:
-        tactics = 11
-
     tactic_candidates: List[int] = []
     for t in (tactics, 11):
         if t not in tactic_candidates:
             tactic_candidates.append(t)
 
     data: Optional[Dict[str, Any]] = None
+    applied_tactics = tactics
     last_error: Optional[str] = None
+    unavailable = True
     for t in tactic_candidates:
         params = {
-            "origins": points,
-            "destinations": points,
-            "ak": BAIDU_AK,
+            "origins": "|".join(origins),
+            "destinations": "|".join(destinations),
             "tactics": t,
         }
+        if stats is not None:
+            stats["baidu_requests"] = stats.get("baidu_requests", 0) + 1
         try:
-            resp = requests.get(url, params=params, timeout=REQUEST_TIMEOUT)
-            resp.raise_for_status()
-            trial = resp.json()
-        except requests.RequestException as e:
+            trial = await _baidu_get("routematrix", url, params)
+        except (HTTPError, ValueError) as e:
+            # 网络异常 / 超时与策略无关，换策略重试只会再等一次超时
             last_error = f"请求异常: {e!s}"
             logger.warning("百度路网矩阵请求失败，tactics=%s, err=%s", t, e)
-            continue
+            break
 
         if trial.get("status") == 0:
             data = trial
+            applied_tactics = t
             if t != tactics:
                 logger.warning(
                     "路网矩阵策略降级: requested_tactics=%s, applied_tactics=%s",
@@ -870,6 +1632,7 @@ def get_duration_matrix(coords: List[str], tactics: int = 11) -> List[List[int]]
             break
 
         last_error = trial.get("message", "未知错误")
+        unavailable = unavailable and _baidu_status_unavailable(trial.get("status"))
         logger.warning(
             "路网矩阵策略不可用，准备降级重试，tactics=%s, status=%s, msg=%s",
             t,
@@ -878,139 +1641,438 @@ def get_duration_matrix(coords: List[str], tactics: int = 11) -> List[List[int]]
         )
 
     if not data:
+        # 全部为网络异常 / 配额类错误时按服务不可用（503），否则为百度拒绝该请求（502）
         raise HTTPException(
-            status_code=502,
+            status_code=503 if unavailable else 502,
             detail=f"路网矩阵获取失败: {last_error or '未知错误'}",
         )
 
-    n = len(coords)
-    matrix: List[List[int]] = []
-    for i in range(n):
-        row: List[int] = []
-        for j in range(n):
-            idx = i * n + j
-            row.append(data["result"][idx]["duration"]["value"])
-        matrix.append(row)
-    return matrix
-
-
-def _bd09_to_wgs84(lat_bd: float, lng_bd: float) -> Tuple[float, float]:
-    """百度 BD09 转 WGS84。路线数据已统一用 BD09，此函数仅保留供需要 WGS84 输出的场景（如导出）使用。"""
-    x_pi = math.pi * 3000.0 / 180.0
-    x = lng_bd - 0.0065
-    y = lat_bd - 0.006
-    z = math.sqrt(x * x + y * y) - 0.00002 * math.sin(y * x_pi)
-    theta = math.atan2(y, x) - 0.000003 * math.cos(x * x_pi)
-    gcj_lng = z * math.cos(theta)
-    gcj_lat = z * math.sin(theta)
-    a, ee = 6378245.0, 0.00669342162296594323
-    dlat = 300.0 + gcj_lng + 2.0 * gcj_lat + 0.1 * gcj_lat * gcj_lat + 0.1 * gcj_lat * gcj_lng + 0.1 * math.sqrt(abs(gcj_lat))
-    dlat = 20.0 * math.sin(6.0 * gcj_lng * math.pi / 180.0) + 20.0 * math.sin(2.0 * gcj_lng * math.pi / 180.0) + dlat
-    dlat = 20.0 * math.sin(gcj_lng * math.pi / 180.0) + 40.0 * math.sin(gcj_lng / 3.0 * math.pi / 180.0) + dlat
-    dlat = 20.0 * math.sin(gcj_lng / 12.0 * math.pi / 180.0) * 2.0 / 3.0 + dlat
-    dlat = dlat * 2.0 / 3.0 + 100.0
-    dlng = 300.0 + gcj_lng + 2.0 * gcj_lat + 0.1 * gcj_lng * gcj_lng + 0.1 * gcj_lng * gcj_lat + 0.1 * math.sqrt(abs(gcj_lng))
-    dlng = 20.0 * math.sin(6.0 * gcj_lng * math.pi / 180.0) + 20.0 * math.sin(gcj_lng * math.pi / 180.0) + dlng
-    dlng = 20.0 * math.sin(gcj_lat * math.pi / 180.0) + 40.0 * math.sin(gcj_lat / 3.0 * math.pi / 180.0) + dlng
-    dlng = 160.0 * math.sin(gcj_lat / 12.0 * math.pi / 180.0) + dlng
-    dlng = dlng * 2.0 / 3.0 - 100.0
-    wgs_lat = gcj_lat - (dlat * 180.0) / (a * (1.0 - ee) / (math.pow(1.0 - ee * math.sin(gcj_lat * math.pi / 180.0), 1.5)) * math.pi)
-    wgs_lng = gcj_lng - (dlng * 180.0) / (a / math.sqrt(1.0 - ee * math.sin(gcj_lat * math.pi / 180.0) ** 2) * math.cos(gcj_lat * math.pi / 180.0) * math.pi)
-    return (wgs_lat, wgs_lng)
-
-
-def get_duration_between(origin_addr: str, dest_addr: str) -> int:
-    """两点间驾车耗时（秒）。用于模式3：当前位→新单起点 是否在时效内。"""
-    coords = geocode_addresses([origin_addr, dest_addr])
-    matrix = get_duration_matrix(coords)
-    return matrix[0][1]
+    count = len(origins) * len(destinations)
+    values = np.fromiter((item["duration"]["value"] for item in data["result"][:count]), dtype=np.int32, count=count)
+    return values.reshape(len(origins), len(destinations)), applied_tactics
 
 
-# 百度驾车 tactics：0 默认, 2 距离最短(不考虑限行), 5 躲避拥堵, 6 少收费, 12 距离优先(考虑限行), 13 时间优先
-BAIDU_TACTICS_LEAST_TIME = 13
-BAIDU_TACTICS_LEAST_DISTANCE = 12
-BAIDU_TACTICS_LEAST_FEE = 6
-BAIDU_TACTICS_AVOID_CONGESTION = 5
+async def get_duration_matrix(
+    coords: List[str],
+    tactics: int = 11,
+    stats: Optional[Dict[str, Any]] = None,
+) -> DurationMatrix:
+    """
+    获取所有点两两之间的驾车耗时（秒）。
+    先按 (起点坐标, 终点坐标, tactics, 时段桶) 从耗时腿缓存拼矩阵，只对缺失的行/列请求百度 Route Matrix：
+      1) 整行都缺的点（新点）按行请求：新点 → 全部点；
+      2) 其余缺失格子按「缺失起点 × 缺失终点」合并成一次请求（通常是旧点 → 新点这一列）。
+    缺失部分经路网服务（_map_provider）获取：百度实现超出元素上限时由 _fetch_routematrix 自动分块；离线估算结果不写缓存。
+    百度路网矩阵熔断中时，缺失的腿先用已过期的缓存值，仍缺的才请求路网服务（熔断时降级为离线估算）。
+    传入 stats 字典时回填本次统计：legs_total / legs_from_cache / legs_stale / legs_fetched / baidu_requests / tiles / tile_retries，
+    有缺失腿时另回填 provider（实际提供结果的服务），用了过期腿或降级兜底时回填 degraded，所选策略矩阵接口不支持、按 11 取得时回填 tactics_fallback。
+    返回：DurationMatrix，matrix[i, j] = 从点 i 到点 j 的秒数。
+    """
+    # 实测 tactics=0 在矩阵接口会报 invalid，这里预先归一化到 11，避免噪声日志。
+    if tactics == 0:
+        tactics = 11
+    n = len(coords)
+    bucket = time_bucket()
+    keys = [normalize_coord(c) for c in coords]
+    # 坐标相同的点之间耗时为 0；-1 表示待取
+    first_index: Dict[str, int] = {}
+    key_ids = np.array([first_index.setdefault(k, i) for i, k in enumerate(keys)], dtype=np.int32)
+    same = key_ids[:, None] == key_ids[None, :]
+    matrix = np.where(same, 0, -1).astype(np.int32)
+    legs_from_cache = 0
+    for i, j in zip(*np.nonzero(~same)):
+        cached = _duration_leg_cache.get_leg(keys[i], keys[j], tactics, bucket)
+        if cached is not None:
+            matrix[i, j] = cached
+            legs_from_cache += 1
+
+    fetch_stats: Dict[str, Any] = {}
+    # 百度路网矩阵熔断中：缺失的腿先用同时段桶已过期的缓存值（旧实测值比直线估算准），剩下的再交给路网服务降级估算
+    legs_stale = 0
+    if _baidu_breakers["routematrix"].is_open():
+        for i, j in zip(*np.nonzero(matrix < 0)):
+            stale = _duration_leg_cache.get_leg_stale(keys[i], keys[j], tactics, bucket)
+            if stale is not None:
+                matrix[i, j] = stale
+                legs_stale += 1
+        if legs_stale:
+            fetch_stats["degraded"] = True
+
+    async def _fill(origin_idx: List[int], dest_idx: List[int]) -> int:
+        call_stats: Dict[str, Any] = {}
+        rows = await _map_call(
+            _map_provider.routematrix(
+                [coords[i] for i in origin_idx], [coords[j] for j in dest_idx], tactics, stats=call_stats
+            )
+        )
+        for k in ("baidu_requests", "tiles", "tile_retries"):
+            fetch_stats[k] = fetch_stats.get(k, 0) + int(call_stats.get(k) or 0)
+        fetch_stats["provider"] = call_stats.get("provider")
+        if call_stats.get("degraded"):
+            fetch_stats["degraded"] = True
+        if call_stats.get("tactics_fallback"):
+            fetch_stats["tactics_fallback"] = True
+        block = np.ix_(origin_idx, dest_idx)
+        todo = matrix[block] < 0
+        matrix[block] = np.where(todo, rows, matrix[block])
+        # 离线估算 / 降级兜底 / 策略降级（实际按 11 取得）的结果只用于本次，不写入耗时腿缓存
+        if call_stats.get("cacheable", True):
+            for a, b in zip(*np.nonzero(todo)):
+                _duration_leg_cache.set_leg(keys[origin_idx[a]], keys[dest_idx[b]], tactics, bucket, int(rows[a, b]))
+        return int(np.count_nonzero(todo))
+
+    legs_fetched = 0
+    missing = matrix < 0
+    new_rows = np.nonzero(np.all(missing | same, axis=1) & np.any(missing, axis=1))[0].tolist()
+    if new_rows:
+        legs_fetched += await _fill(new_rows, list(range(n)))
+        missing = matrix < 0
+    missing_origins = np.nonzero(np.any(missing, axis=1))[0].tolist()
+    if missing_origins:
+        missing_dests = np.nonzero(np.any(missing[missing_origins], axis=0))[0].tolist()
+        legs_fetched += await _fill(missing_origins, missing_dests)
+    baidu_requests = int(fetch_stats.get("baidu_requests") or 0)
+
+    legs_total = int(np.count_nonzero(~same))
+    if stats is not None:
+        stats.update({
+            "legs_total": legs_total,
+            "legs_from_cache": legs_from_cache,
+            "legs_stale": legs_stale,
+            "legs_fetched": legs_fetched,
+            "baidu_requests": baidu_requests,
+            "tiles": int(fetch_stats.get("tiles") or 0),
+            "tile_retries": int(fetch_stats.get("tile_retries") or 0),
+        })
+        if fetch_stats.get("provider"):
+            stats["provider"] = fetch_stats["provider"]
+        if fetch_stats.get("degraded"):
+            stats["degraded"] = True
+        if fetch_stats.get("tactics_fallback"):
+            stats["tactics_fallback"] = True
+    logger.info(
+        "路网矩阵: n=%s tactics=%s 缓存命中 %s/%s 条腿, 百度请求 %s 次",
+        n, tactics, legs_from_cache, legs_total, baidu_requests,
+    )
+    return DurationMatrix(np.maximum(matrix, 0))
 
 
-def _parse_one_route_path(route_obj: dict) -> List[List[float]]:
-    """从单条 route 的 steps 解析出 path 点列 [lat, lng] BD09。"""
-    path_bd09: List[List[float]] = []
-    for step in route_obj.get("steps") or []:
-        path_str = step.get("path")
-        if not path_str:
+async def refresh_hot_duration_legs() -> int:
+    """
+    热门耗时腿过期前刷新：取当前时段桶内被频繁查询、即将过期（或刚过期）的腿，经路网服务（_map_provider）重新请求并写回缓存，
+    录制模式下这些请求同样录入 fixture。
+    同一 tactics 下起点 × 终点的并集不超过热门腿数的 2 倍时合成一次分块请求，否则按起点分别请求。
+    返回写回的腿数。
+    """
+    bucket = time_bucket()
+    due = _duration_leg_cache.hot_legs_due(
+        bucket, DURATION_REFRESH_AHEAD_SECONDS, DURATION_REFRESH_MAX_LEGS, DURATION_REFRESH_MIN_LOOKUPS
+    )
+    if not due:
+        return 0
+    by_tactics: Dict[int, List[Tuple[str, str]]] = {}
+    for origin, dest, tactics in due:
+        by_tactics.setdefault(tactics, []).append((origin, dest))
+
+    batches: List[Tuple[int, List[str], List[str]]] = []
+    for tactics, legs in by_tactics.items():
+        origins = sorted({o for o, _ in legs})
+        dests = sorted({d for _, d in legs})
+        if len(origins) * len(dests) <= 2 * len(legs):
+            batches.append((tactics, origins, dests))
             continue
-        for part in path_str.split(";"):
-            part = part.strip()
-            if not part:
-                continue
-            seg = part.split(",")
-            if len(seg) >= 2:
-                try:
-                    a, b = float(seg[0].strip()), float(seg[1].strip())
-                    if 70 < a < 140 and 0 < b < 60:
-                        lng_bd, lat_bd = a, b
-                    else:
-                        lat_bd, lng_bd = a, b
-                    path_bd09.append([lat_bd, lng_bd])
-                except (ValueError, TypeError):
-                    continue
-    return path_bd09
+        dests_by_origin: Dict[str, List[str]] = {}
+        for o, d in legs:
+            dests_by_origin.setdefault(o, []).append(d)
+        batches += [(tactics, [o], ds) for o, ds in dests_by_origin.items()]
+
+    refreshed = 0
+    for tactics, origins, dests in batches:
+        fetch_stats: Dict[str, Any] = {}
+        try:
+            rows = await _map_provider.routematrix(origins, dests, tactics, stats=fetch_stats)
+        except Exception as e:
+            logger.warning("热门耗时腿刷新失败（tactics=%s, %s×%s）: %s", tactics, len(origins), len(dests), e)
+            continue
+        if fetch_stats.get("tactics_fallback"):
+            # 策略降级后的耗时不是该 tactics 的结果，不写回；旧值到期后按正常路径重新获取
+            continue
+        if not fetch_stats.get("cacheable", True):
+            # 百度不可用时降级得到的离线估算同样不写回
+            continue
+        for a, origin in enumerate(origins):
+            for b, dest in enumerate(dests):
+                if origin != dest:
+                    _duration_leg_cache.set_leg(origin, dest, tactics, bucket, int(rows[a, b]))
+                    refreshed += 1
+    _duration_leg_cache.refreshed += refreshed
+    logger.info("热门耗时腿刷新: 时段=%s 到期热门 %s 条, 请求 %s 次, 写回 %s 条", bucket, len(due), len(batches), refreshed)
+    return refreshed
+
+
+async def _duration_refresh_loop() -> None:
+    """后台循环：每 DURATION_REFRESH_INTERVAL_SECONDS 秒刷新一次热门耗时腿。"""
+    while True:
+        await asyncio.sleep(max(1, DURATION_REFRESH_INTERVAL_SECONDS))
+        if not BAIDU_AK or MAP_PROVIDER in ("local", "replay"):
+            continue
+        try:
+            await refresh_hot_duration_legs()
+        except Exception as e:
+            logger.warning("热门耗时腿后台刷新异常: %s", e)
 
 
-def _parse_one_route_steps(route_obj: dict) -> List[Dict[str, Any]]:
-    """从单条 route 的 steps 解析出带道路名称的段落，供前端在路线上显示路名。返回 [{road_name, path}, ...]。"""
-    out: List[Dict[str, Any]] = []
-    for step in route_obj.get("steps") or []:
-        path_str = step.get("path")
-        if not path_str:
+def _map_warmup_tactics() -> List[int]:
+    """解析 MAP_WARMUP_TACTICS（逗号分隔）：非法项忽略，0 按矩阵接口实际使用的 11，去重保序；全部无效时为 [11]。"""
+    out: List[int] = []
+    for part in str(MAP_WARMUP_TACTICS or "").split(","):
+        part = part.strip()
+        if not part:
             continue
-        path_bd09: List[List[float]] = []
-        for part in path_str.split(";"):
-            part = part.strip()
-            if not part:
-                continue
-            seg = part.split(",")
-            if len(seg) >= 2:
-                try:
-                    a, b = float(seg[0].strip()), float(seg[1].strip())
-                    if 70 < a < 140 and 0 < b < 60:
-                        lng_bd, lat_bd = a, b
-                    else:
-                        lat_bd, lng_bd = a, b
-                    path_bd09.append([lat_bd, lng_bd])
-                except (ValueError, TypeError):
-                    continue
-        if len(path_bd09) < 2:
-            continue
-        name = (step.get("road_name") or step.get("instruction") or "").strip()
-        if not name or name == "无名路" or len(name) > 20:
-            name = ""
-        out.append({"road_name": name, "path": path_bd09})
+        t = _normalize_tactics(part) or 11
+        if t not in out:
+            out.append(t)
+    return out or [11]
+
+
+async def _get_planned_trip_addresses_for_driver(driver_id: Optional[str]) -> List[str]:
+    """
+    按司机从数据库读取循环配置与未完成计划批次的起终点（不改动内存中的循环计划，那里只是最近一次按某个司机加载的结果）。
+    未配置数据库或无 driver_id 时退回内存中的循环计划（单司机模式）。
+    """
+    if not driver_id or not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
+        addresses = [planned_trip_cycle_origin, planned_trip_cycle_destination]
+        for p in planned_trips:
+            if not p.get("completed"):
+                addresses += [p.get("origin") or "", p.get("destination") or ""]
+        return [a.strip() for a in addresses if (a or "").strip()]
+    url = SUPABASE_URL.rstrip("/")
+    headers = {
+        "apikey": SUPABASE_SERVICE_ROLE_KEY,
+        "Authorization": f"Bearer {SUPABASE_SERVICE_ROLE_KEY}",
+        "Accept": "application/json",
+    }
+    addresses: List[str] = []
+    try:
+        r = await http.get(
+            f"{url}/rest/v1/planned_trip_cycle_config",
+            params={"driver_id": f"eq.{driver_id}", "select": "cycle_origin,cycle_destination", "limit": "1"},
+            headers=headers,
+            timeout=REQUEST_TIMEOUT,
+        )
+        if r.status_code == 200 and isinstance(r.json(), list) and r.json():
+            row = r.json()[0] or {}
+            addresses += [row.get("cycle_origin") or "", row.get("cycle_destination") or ""]
+        r2 = await http.get(
+            f"{url}/rest/v1/planned_trip_plans",
+            params={"driver_id": f"eq.{driver_id}", "completed": "eq.false", "select": "origin,destination"},
+            headers=headers,
+            timeout=REQUEST_TIMEOUT,
+        )
+        if r2.status_code == 200 and isinstance(r2.json(), list):
+            for row in r2.json():
+                addresses += [(row or {}).get("origin") or "", (row or {}).get("destination") or ""]
+    except Exception as e:
+        logger.warning("预热读取循环计划失败(driver_id=%s): %s", driver_id, e)
+    return [str(a).strip() for a in addresses if str(a or "").strip()]
+
+
+async def warm_map_cache(driver_id: Optional[str], force: bool = False) -> Dict[str, Any]:
+    """
+    地图缓存预热：司机当前位置、已分配订单起终点与循环计划起终点去重后（至多 MAP_WARMUP_MAX_POINTS 个，按此顺序截取）
+    预先地理编码，再按 MAP_WARMUP_TACTICS 取解析成功各点两两之间的耗时矩阵，写入地理编码与耗时腿缓存，
+    让当天首次路线预览 / 评估直接命中缓存。
+    地址集合（不含司机位置，行驶中位置一直在变）与时段桶都未变时跳过，force=True 时总是执行；
+    百度路网矩阵熔断中只做地理编码，不记录指纹，下一轮再补耗时腿。返回本次统计。
+    """
+    started = time.perf_counter()
+    key = driver_id or ""
+    orders = await _get_assigned_orders_for_driver(driver_id) if driver_id else []
+    driver_loc = await _get_driver_current_loc(driver_id) if driver_id else None
+    order_addresses = [a for o in orders for a in (o.get("pickup", ""), o.get("delivery", "")) if a]
+    plan_addresses = await _get_planned_trip_addresses_for_driver(driver_id)
+    tactics_list = _map_warmup_tactics()
+    fingerprint = hashlib.sha1(
+        "|".join(
+            [time_bucket(), ",".join(str(t) for t in tactics_list)]
+            + sorted({normalize_address(a) for a in order_addresses + plan_addresses})
+        ).encode("utf-8")
+    ).hexdigest()
+    if not force and _map_warmup_fingerprints.get(key) == fingerprint:
+        _map_warmup_stats["unchanged"] += 1
+        return {"skipped": True}
+
+    addresses: List[str] = []
+    seen: Set[str] = set()
+    for addr in [driver_loc or ""] + order_addresses + plan_addresses:
+        norm = normalize_address(addr)
+        if norm and norm not in seen:
+            seen.add(norm)
+            addresses.append(addr)
+    addresses = addresses[: max(2, MAP_WARMUP_MAX_POINTS)]
+    results = await geocode_addresses_detailed(addresses)
+    coords = [c for c, err in results if err is None and c]
+    out: Dict[str, Any] = {
+        "addresses": len(addresses),
+        "geocode_failed": len(addresses) - len(coords),
+        "legs_from_cache": 0,
+        "legs_fetched": 0,
+    }
+    complete = True
+    if len(coords) >= 2:
+        if _baidu_breakers["routematrix"].is_open():
+            complete = False
+        else:
+            for tactics in tactics_list:
+                matrix_stats: Dict[str, Any] = {}
+                await get_duration_matrix(coords, tactics=tactics, stats=matrix_stats)
+                out["legs_from_cache"] += int(matrix_stats.get("legs_from_cache") or 0)
+                out["legs_fetched"] += int(matrix_stats.get("legs_fetched") or 0)
+    if complete:
+        _map_warmup_fingerprints[key] = fingerprint
+    for k, v in out.items():
+        _map_warmup_stats[k] += v
+    _map_warmup_stats["runs"] += 1
+    _map_warmup_stats["last_ms"] = int((time.perf_counter() - started) * 1000)
+    logger.info(
+        "地图缓存预热(driver_id=%s): 地址 %s 个（解析失败 %s）, 耗时腿命中 %s 条, 新取 %s 条, 用时 %s ms",
+        driver_id or "null", out["addresses"], out["geocode_failed"], out["legs_from_cache"], out["legs_fetched"],
+        _map_warmup_stats["last_ms"],
+    )
     return out
 
 
-def fetch_driving_route_path(
+async def _run_map_warmup(driver_id: Optional[str], force: bool) -> None:
+    """后台执行预热；执行期间又被安排时（见 _schedule_map_warmup）结束后再跑一轮（地址未变则按指纹跳过）。百度请求按普通优先级，不占实时评估预留。"""
+    key = driver_id or ""
+    try:
+        while True:
+            _map_warmup_rerun.discard(key)
+            try:
+                with quota_priority(PRIORITY_NORMAL):
+                    await warm_map_cache(driver_id, force=force)
+            except Exception as e:
+                _map_warmup_stats["errors"] += 1
+                logger.warning("地图缓存预热失败(driver_id=%s): %s", driver_id or "null", e)
+            if key not in _map_warmup_rerun:
+                break
+    finally:
+        _map_warmup_tasks.pop(key, None)
+
+
+def _schedule_map_warmup(driver_id: Optional[str], force: bool = False) -> None:
+    """为司机安排一次后台预热（不阻塞调用方）；同一司机已有预热在跑时只标记结束后重跑。离线估算服务不写缓存，不预热。"""
+    if MAP_PROVIDER == "local":
+        return
+    key = driver_id or ""
+    task = _map_warmup_tasks.get(key)
+    if task is not None and not task.done():
+        _map_warmup_rerun.add(key)
+        return
+    _map_warmup_tasks[key] = asyncio.create_task(_run_map_warmup(driver_id, force))
+
+
+def _touch_map_warmup_driver(driver_id: Optional[str]) -> None:
+    """记下司机最近活动时间（计划变更、路线预览、人工推荐），后台检查只覆盖 MAP_WARMUP_DRIVER_IDLE_SECONDS 内活动过的司机。"""
+    _map_warmup_drivers[driver_id or ""] = time.monotonic()
+
+
+def _on_planned_trips_changed(driver_id: Optional[str]) -> None:
+    """循环计划修改并落库后：记下司机活动并安排预热（预热时按司机从库读取计划地址）。"""
+    _touch_map_warmup_driver(driver_id)
+    _schedule_map_warmup(driver_id)
+
+
+def _prune_map_warmup_drivers() -> None:
+    """移除超过 MAP_WARMUP_DRIVER_IDLE_SECONDS 没有活动的司机及其指纹，不再为其后台预热。"""
+    cutoff = time.monotonic() - max(60, MAP_WARMUP_DRIVER_IDLE_SECONDS)
+    for key, last_active in list(_map_warmup_drivers.items()):
+        if last_active < cutoff:
+            _map_warmup_drivers.pop(key, None)
+            _map_warmup_fingerprints.pop(key, None)
+
+
+async def _map_warmup_loop() -> None:
+    """后台循环：每 MAP_WARMUP_INTERVAL_SECONDS 秒为近期活动过的司机检查一次，已分配订单 / 计划地址或时段桶变化时重新预热。"""
+    while True:
+        await asyncio.sleep(max(1, MAP_WARMUP_INTERVAL_SECONDS))
+        _prune_map_warmup_drivers()
+        for key in list(_map_warmup_drivers.keys()):
+            _schedule_map_warmup(key or None)
+
+
+# 百度驾车 tactics：0 默认, 2 距离最短(不考虑限行), 5 躲避拥堵, 6 少收费, 12 距离优先(考虑限行), 13 时间优先
+BAIDU_TACTICS_LEAST_TIME = 13
+BAIDU_TACTICS_LEAST_DISTANCE = 12
+BAIDU_TACTICS_LEAST_FEE = 6
+BAIDU_TACTICS_AVOID_CONGESTION = 5
+
+
+async def fetch_driving_route_path(
     route_coords_bd09: List[List[float]],
     plate_number: Optional[str] = None,
     cartype: Optional[int] = None,
     tactics: Optional[int] = None,
+    stats: Optional[Dict[str, Any]] = None,
 ) -> Tuple[List[List[List[float]]], List[int], List[Dict[str, Any]]]:
     """
     调用百度驾车路线规划 Web API（direction/v2/driving），一次请求返回多条可选路线。
-    返回 (所有路线的 path 列表, 每条路线的耗时秒数列表, 首条路线的 steps 含路名)。path 格式 [lat, lng] BD09。
+    返回 (所有路线的 path 列表, 每条路线的耗时秒数列表, 首条路线的 steps 含路名)。path 格式 [lat, lng] BD09，未抽稀。
+    先查路线几何缓存（站点序列 + tactics + 车牌 + cartype），未命中经路网服务（_map_provider）获取，同一路线的并发请求只发一次；
+    传入 stats 时回填 cached（是否命中缓存），未命中时另回填 provider / degraded。返回值可能直接来自缓存，调用方不要原地修改。
     """
     if not route_coords_bd09 or len(route_coords_bd09) < 2:
         return [], [], []
-    origin = f"{route_coords_bd09[0][0]},{route_coords_bd09[0][1]}"
-    destination = f"{route_coords_bd09[-1][0]},{route_coords_bd09[-1][1]}"
-    middle = route_coords_bd09[1:-1]
-    if len(middle) > 18:
-        middle = middle[:18]
+    # 百度途经点最多 18 个：保留起点、前 18 个途经点与终点
+    coords = route_coords_bd09 if len(route_coords_bd09) <= 20 else route_coords_bd09[:19] + [route_coords_bd09[-1]]
+    key = _route_geometry_cache.route_key([f"{c[0]},{c[1]}" for c in coords], tactics, plate_number, cartype)
+    cached = _route_geometry_cache.get_route(key)
+    if stats is not None:
+        stats["cached"] = cached is not None
+    if cached is not None:
+        return cached["paths"], cached["durations"], cached["steps"]
+    return await _direction_flight.do_with_stats(
+        _flight_key(key),
+        lambda call_stats: _driving_route_via_provider(key, coords, plate_number, cartype, tactics, call_stats),
+        lambda call_stats, leader: _merge_flight_stats(
+            stats, call_stats, leader, flags=("provider", "degraded", "degraded_reason")
+        ),
+    )
+
+
+async def _driving_route_via_provider(
+    key: str,
+    coords: List[List[float]],
+    plate_number: Optional[str],
+    cartype: Optional[int],
+    tactics: Optional[int],
+    call_stats: Dict[str, Any],
+) -> RouteResult:
+    """经路网服务规划驾车路线，统计回填到 call_stats；结果可缓存且解析出路线时写入路线几何缓存。"""
+    paths, durations, steps = await _map_call(
+        _map_provider.driving_route(coords, tactics=tactics, plate_number=plate_number, cartype=cartype, stats=call_stats)
+    )
+    if paths and call_stats.get("cacheable", True):
+        _route_geometry_cache.set_route(key, paths, durations, steps)
+    return paths, durations, steps
+
+
+async def _fetch_driving_route_from_baidu(
+    coords: List[List[float]],
+    plate_number: Optional[str],
+    cartype: Optional[int],
+    tactics: Optional[int],
+) -> RouteResult:
+    """
+    驾车路线规划的实际百度请求。
+    网络异常或配额类错误抛 503（可切离线兜底），其余失败返回空结果（前端改用站点折线或分段规划）。
+    """
+    origin = f"{coords[0][0]},{coords[0][1]}"
+    destination = f"{coords[-1][0]},{coords[-1][1]}"
+    middle = coords[1:-1]
     waypoints = "|".join(f"{c[0]},{c[1]}" for c in middle) if middle else None
     url = "https://api.map.baidu.com/direction/v2/driving"
     params: Dict[str, Any] = {
-        "ak": BAIDU_AK,
         "origin": origin,
         "destination": destination,
         "coord_type": "bd09ll",
@@ -1028,15 +2090,16 @@ def fetch_driving_route_path(
         if cartype is not None and cartype in (0, 1):
             params["cartype"] = cartype
     try:
-        resp = requests.get(url, params=params, timeout=REQUEST_TIMEOUT)
-        resp.raise_for_status()
-        data = resp.json()
-    except requests.RequestException as e:
+        data = await _baidu_get("direction", url, params)
+    except (HTTPError, ValueError) as e:
         logger.warning("百度驾车路线规划请求异常: %s", e)
-        return [], [], []
+        raise HTTPException(status_code=503, detail=f"驾车路线规划服务不可用: {e!s}") from e
 
     if data.get("status") != 0:
-        logger.warning("百度驾车路线规划失败: %s", data.get("message", "未知"))
+        msg = data.get("message", "未知")
+        logger.warning("百度驾车路线规划失败: %s", msg)
+        if _baidu_status_unavailable(data.get("status")):
+            raise HTTPException(status_code=503, detail=f"驾车路线规划服务不可用: {msg}")
         return [], [], []
 
     result = data.get("result") or {}
@@ -1048,7 +2111,7 @@ def fetch_driving_route_path(
     all_durations: List[int] = []
     route_steps_first: List[Dict[str, Any]] = []
     for idx, r in enumerate(routes):
-        path_bd09 = _parse_one_route_path(r)
+        path_bd09, steps = parse_route_geometry(r)
         if len(path_bd09) >= 2:
             all_paths.append(path_bd09)
             dur = r.get("duration")
@@ -1056,166 +2119,138 @@ def fetch_driving_route_path(
                 dur = dur["value"]
             all_durations.append(int(dur) if isinstance(dur, (int, float)) else 0)
             if idx == 0:
-                route_steps_first = _parse_one_route_steps(r)
+                route_steps_first = steps
     return all_paths, all_durations, route_steps_first
 
 
-# ---------------------------------------------------------------------------
-# 三、核心算法 - OR-Tools PDP 路径规划
-# ---------------------------------------------------------------------------
+class BaiduMapProvider(MapProvider):
+    """百度地图 Web API 路网服务：复用本模块的请求、AK 池调度、分块、策略降级与在途合并；缓存写回在路网服务层按 cacheable 进行。"""
 
-def solve_pdp_route(
-    matrix: List[List[int]],
-    num_pickup_delivery_pairs: int,
-) -> Tuple[Optional[List[int]], int]:
-    """
-    带接送约束的车辆路径规划 (PDP)。
-    约束：同一订单先接后送、同一车完成；司机回到起点的弧耗时为 0。
-    返回：(最优路线节点索引列表, 总耗时秒数)；无解时 (None, 0)。
-    """
-    num_nodes = len(matrix)
-    manager = pywrapcp.RoutingIndexManager(num_nodes, 1, 0)
-    routing = pywrapcp.RoutingModel(manager)
-
-    def duration_callback(from_index: int, to_index: int) -> int:
-        from_node = manager.IndexToNode(from_index)
-        to_node = manager.IndexToNode(to_index)
-        # 司机送到最后一站即结束，不计算返回起点的耗时
-        if to_node == 0:
-            return 0
-        return matrix[from_node][to_node]
-
-    transit_callback_index = routing.RegisterTransitCallback(duration_callback)
-    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
-    routing.AddDimension(transit_callback_index, 0, 300000, True, "Time")
-    time_dimension = routing.GetDimensionOrDie("Time")
-
-    for i in range(num_pickup_delivery_pairs):
-        pickup_idx = manager.NodeToIndex(i + 1)
-        delivery_idx = manager.NodeToIndex(i + 1 + num_pickup_delivery_pairs)
-        routing.AddPickupAndDelivery(pickup_idx, delivery_idx)
-        routing.solver().Add(
-            routing.VehicleVar(pickup_idx) == routing.VehicleVar(delivery_idx)
-        )
-        routing.solver().Add(
-            time_dimension.CumulVar(pickup_idx)
-            <= time_dimension.CumulVar(delivery_idx)
-        )
+    name = "baidu"
+    cacheable = True
 
-    search_params = pywrapcp.DefaultRoutingSearchParameters()
-    search_params.first_solution_strategy = (
-        routing_enums_pb2.FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION
-    )
-    solution = routing.SolveWithParameters(search_params)
+    async def geocode(self, address: str, stats: Optional[Dict[str, Any]] = None) -> str:
+        self._mark(stats)
+        return await _geocode_from_baidu(address, stats)
 
-    if not solution:
-        return None, 0
+    async def reverse_geocode(self, lat: float, lng: float, stats: Optional[Dict[str, Any]] = None) -> str:
+        self._mark(stats)
+        return await _reverse_geocode_from_baidu(lat, lng)
 
-    index = routing.Start(0)
-    route_indices: List[int] = []
-    total_time = 0
-    while not routing.IsEnd(index):
-        route_indices.append(manager.IndexToNode(index))
-        prev_index = index
-        index = solution.Value(routing.NextVar(index))
-        total_time += routing.GetArcCostForVehicle(prev_index, index, 0)
-    return route_indices, total_time
+    async def routematrix(
+        self,
+        origins: List[str],
+        destinations: List[str],
+        tactics: int,
+        stats: Optional[Dict[str, Any]] = None,
+    ) -> np.ndarray:
+        self._mark(stats)
+        return await _fetch_routematrix(origins, destinations, tactics, stats)
 
+    async def driving_route(
+        self,
+        coords: List[List[float]],
+        tactics: Optional[int] = None,
+        plate_number: Optional[str] = None,
+        cartype: Optional[int] = None,
+        stats: Optional[Dict[str, Any]] = None,
+    ) -> RouteResult:
+        self._mark(stats)
+        return await _fetch_driving_route_from_baidu(coords, plate_number, cartype, tactics)
 
-def solve_pdp_route_flexible(
-    matrix: List[List[int]],
-    pickup_delivery_pairs: List[Tuple[int, int]],
-) -> Tuple[Optional[List[int]], int]:
+
+def _build_map_provider() -> MapProvider:
     """
-    支持「仅送」的 PDP：pickup_delivery_pairs 中每对 (接客点, 送客点) 先接后送；
-    未出现在 pair 中的非起点节点仍会全部访问（默认即必访）。
-    节点编号与 matrix 一致：0=司机起点，其余为途经点。
-    返回：(最优路线节点索引列表, 总耗时秒数)；无解时 (None, 0)。
+    按 MAP_PROVIDER / MAP_LOCAL_FALLBACK 组装路网服务。离线服务的地名表 = 地名表文件 + 地理编码缓存（含已过期条目），
+    车速模型用耗时腿缓存中的百度实测耗时校准（样本不足时用默认值）。record / replay 的 fixture 见 MAP_FIXTURE_PATH。
+    百度各接口熔断时总是降级到离线服务（见 _should_degrade），不受 MAP_LOCAL_FALLBACK 限制。
+    离线服务只作兜底时按需构建（LazyMapProvider），百度正常时启动不加载地名表、不校准车速模型。
     """
-    num_nodes = len(matrix)
-    if num_nodes <= 1:
-        return ([0] if num_nodes else [], 0)
-
-    def _run_once(
-        max_route_seconds: int,
-        first_solution_strategy: int,
-        local_search_metaheuristic: int,
-        time_limit_seconds: int,
-    ) -> Tuple[Optional[List[int]], int]:
-        manager = pywrapcp.RoutingIndexManager(num_nodes, 1, 0)
-        routing = pywrapcp.RoutingModel(manager)
-
-        def duration_callback(from_index: int, to_index: int) -> int:
-            from_node = manager.IndexToNode(from_index)
-            to_node = manager.IndexToNode(to_index)
-            if to_node == 0:
-                return 0
-            return matrix[from_node][to_node]
-
-        transit_callback_index = routing.RegisterTransitCallback(duration_callback)
-        routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
-        routing.AddDimension(
-            transit_callback_index, 0, max_route_seconds, True, "Time"
+    global _map_fixture_store
+    if MAP_PROVIDER == "local":
+        local = _build_local_map_provider()
+        local_stats = local.stats()
+        logger.info(
+            "路网服务: 离线估算（地名 %s 条，车速模型样本 %s 条）",
+            local_stats["gazetteer_entries"], local.profile.samples,
         )
-        time_dimension = routing.GetDimensionOrDie("Time")
-
-        # 注意：RoutingModel 默认非起点节点就是“必访”。
-        # 这里不能使用 AddDisjunction(..., 0)，否则语义会变成“可免费跳过”。
-        for pickup_node, delivery_node in pickup_delivery_pairs:
-            pickup_idx = manager.NodeToIndex(pickup_node)
-            delivery_idx = manager.NodeToIndex(delivery_node)
-            routing.AddPickupAndDelivery(pickup_idx, delivery_idx)
-            routing.solver().Add(
-                routing.VehicleVar(pickup_idx) == routing.VehicleVar(delivery_idx)
-            )
-            routing.solver().Add(
-                time_dimension.CumulVar(pickup_idx)
-                <= time_dimension.CumulVar(delivery_idx)
-            )
-
-        search_params = pywrapcp.DefaultRoutingSearchParameters()
-        search_params.first_solution_strategy = first_solution_strategy
-        search_params.local_search_metaheuristic = local_search_metaheuristic
-        search_params.time_limit.seconds = time_limit_seconds
-        solution = routing.SolveWithParameters(search_params)
-        if not solution:
-            return None, 0
-
-        index = routing.Start(0)
-        route_indices: List[int] = []
-        total_time = 0
-        while not routing.IsEnd(index):
-            route_indices.append(manager.IndexToNode(index))
-            prev_index = index
-            index = solution.Value(routing.NextVar(index))
-            total_time += routing.GetArcCostForVehicle(prev_index, index, 0)
-        return route_indices, total_time
-
-    def _is_valid_route(route: Optional[List[int]]) -> bool:
-        # 单逻辑要求：存在待访问节点时，不能只返回司机起点 [0]
-        return bool(route) and (num_nodes <= 1 or len(route) > 1)
-
-    # 第一轮：快速求解（主流程）
-    route_indices, total_time = _run_once(
-        max_route_seconds=300000,
-        first_solution_strategy=routing_enums_pb2.FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION,
-        local_search_metaheuristic=routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH,
-        time_limit_seconds=3,
-    )
-    if _is_valid_route(route_indices):
-        return route_indices, total_time
-
-    # 第二轮：同一算法框架下扩大可行域+延长搜索时间，尽量避免进入启发式兜底
-    route_indices, total_time = _run_once(
-        max_route_seconds=1209600,  # 14天上限，避免超长线路因上限过紧无解
-        first_solution_strategy=routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC,
-        local_search_metaheuristic=routing_enums_pb2.LocalSearchMetaheuristic.AUTOMATIC,
-        time_limit_seconds=8,
+        return local
+    primary: MapProvider = BaiduMapProvider()
+    if MAP_PROVIDER in ("record", "replay"):
+        _map_fixture_store = FixtureStore(MAP_FIXTURE_PATH)
+        if MAP_PROVIDER == "record":
+            primary = RecordingMapProvider(primary, _map_fixture_store)
+        else:
+            primary = ReplayMapProvider(_map_fixture_store, latency_ms=parse_latency_spec(MAP_REPLAY_LATENCY_MS))
+        logger.info("路网服务: %s，fixture=%s %s", MAP_PROVIDER, MAP_FIXTURE_PATH, _map_fixture_store.stats()["entries"])
+    if MAP_PROVIDER == "replay" and not MAP_LOCAL_FALLBACK:
+        return primary
+    lazy_local = LazyMapProvider(_build_local_map_provider, name=LocalMapProvider.name)
+    if MAP_PROVIDER == "replay":
+        return FallbackMapProvider(primary, lazy_local)
+    # 百度（含录制）总是带离线兜底：熔断时一律降级；MAP_LOCAL_FALLBACK 时任何服务不可用都降级
+    return FallbackMapProvider(primary, lazy_local, should_fallback=_should_degrade)
+
+
+def _build_local_map_provider() -> LocalMapProvider:
+    """离线估算服务：地名表文件 + 地理编码缓存（含已过期条目）做地理编码，耗时腿缓存中的百度实测耗时校准车速模型。"""
+    return LocalMapProvider(
+        gazetteer_path=MAP_GAZETTEER_PATH,
+        extra_entries=_geocode_cache.iter_coords(include_expired=True),
+        profile=SpeedProfile.calibrate(
+            leg_samples((o, d, bucket, sec) for o, d, _, bucket, sec in _duration_leg_cache.iter_legs(include_expired=True))
+        ),
     )
-    if _is_valid_route(route_indices):
-        return route_indices, total_time
 
-    return None, 0
+
+def _should_degrade(error: BaseException) -> bool:
+    return isinstance(error, CircuitOpenError) or (MAP_LOCAL_FALLBACK and default_should_fallback(error))
+
+
+_map_fixture_store: Optional[FixtureStore] = None
+_map_provider = _build_map_provider()
+
+
+# ---------------------------------------------------------------------------
+# 三、核心算法 - PDP 路径规划（求解器见 route_solver.py：小规模精确 DP，大规模 OR-Tools；经 solver_pool 进程池执行）
+# ---------------------------------------------------------------------------
+
+async def solve_detour_with_insertion(
+    old_matrix: DurationMatrix,
+    new_matrix: DurationMatrix,
+    num_old_pairs: int,
+    threshold_seconds: float,
+) -> Tuple[Optional[List[int]], int, str]:
+    """
+    评估「接新单」相对「不接」多出的耗时，先走最便宜插入，必要时才做第二次 PDP 求解。
+    约定 new_matrix 节点布局为 [起点, 原接客点..., 新接客点, 原送客点..., 新送客点]（old_matrix 去掉两个新点）。
+    插入绕路是真实绕路的上界：<= 阈值直接采用插入路线；远超阈值（> 阈值 + INSERTION_ESCALATE_MARGIN_SECONDS）直接按插入结果拒绝；
+    只有落在阈值附近时才完整求解。返回 (接单后路线节点索引, 多出秒数, 判定方式 insertion/solver)；无解时路线为 None。
+    """
+    old_route, old_total = await solver_pool.solve_pdp_route(old_matrix, num_old_pairs)
+    new_pickup_node = 1 + num_old_pairs
+    new_delivery_node = len(new_matrix) - 1
+    insertion_route: Optional[List[int]] = None
+    insertion_detour = 0
+    if old_route:
+        # 原路线节点映射到 new_matrix：原接客点不变，原送客点因插入了新接客点后移一位
+        mapped = [n if n <= num_old_pairs else n + 1 for n in old_route]
+        insertion_detour, insertion_route = best_insertion(new_matrix, mapped, new_pickup_node, new_delivery_node)
+        decision = insertion_prefilter(insertion_detour, threshold_seconds, INSERTION_ESCALATE_MARGIN_SECONDS)
+        if decision != INSERTION_SOLVE:
+            logger.info("插入预筛: 绕路上界 %ss，阈值 %ss → %s，跳过完整求解", insertion_detour, int(threshold_seconds), decision)
+            return insertion_route, insertion_detour, "insertion"
+
+    new_route, new_total = await solver_pool.solve_pdp_route(new_matrix, num_old_pairs + 1)
+    if not new_route:
+        if insertion_route:
+            return insertion_route, insertion_detour, "insertion"
+        return None, 0, "solver"
+    extra = new_total - old_total
+    # 启发式求解偶尔不如插入路线，取两者较优
+    if insertion_route and insertion_detour < extra:
+        return insertion_route, insertion_detour, "insertion"
+    return new_route, extra, "solver"
 
 
 def _parse_coord_pair(coord_str: str) -> Tuple[float, float]:
@@ -1235,7 +2270,7 @@ def _geo_distance(a: Tuple[float, float], b: Tuple[float, float]) -> float:
 
 
 def build_fallback_route_indices_by_tactics(
-    matrix: List[List[int]],
+    matrix: DurationMatrix,
     coords: List[str],
     pickups: List[str],
     deliveries: List[str],
@@ -1274,7 +2309,7 @@ def build_fallback_route_indices_by_tactics(
         # 站点层策略：时间类用时长矩阵，距离/省费/不走高速类用几何距离优先
         if tactics in (12, 6, 3):
             return _geo_distance(coords_ll[current], coords_ll[next_node])
-        return float(matrix[current][next_node])
+        return float(matrix[current, next_node])
 
     while unvisited:
         candidates: List[int] = []
@@ -1298,7 +2333,7 @@ def build_fallback_route_indices_by_tactics(
 # 四、外部依赖 - Bark 推送 (极速强提醒，突破专注模式)
 # ---------------------------------------------------------------------------
 
-def push_to_bark(
+async def push_to_bark(
     pickup: str,
     delivery: str,
     price: str,
@@ -1322,7 +2357,8 @@ def push_to_bark(
         body += f"\n未在 {RESPONSE_TIMEOUT_SECONDS // 60} 分钟内操作将不再推送此单。接单/停推：{RESPONSE_PAGE_BASE.rstrip('/')}?fp={fingerprint}"
     elif fingerprint:
         body += "\n未在规定时间内操作将不再推送此单；接单或停推请打开网页操作。"
-    url = f"https://api.day.app/{bark_key}/{title}/{body}"
+    # 标题/正文作为路径段需整体编码，避免正文里的「/」「?」（如操作链接）被当成路径或查询参数
+    url = f"https://api.day.app/{bark_key}/{quote(title, safe='')}/{quote(body, safe='')}"
     params = {
         "sound": "minuet",
         "level": "timeSensitive",
@@ -1330,16 +2366,16 @@ def push_to_bark(
         "isArchive": "1",
     }
     try:
-        resp = requests.get(url, params=params, timeout=REQUEST_TIMEOUT)
+        resp = await http.get(url, params=params, timeout=REQUEST_TIMEOUT)
         if resp.status_code == 200:
             logger.info("✅ 已推送到 iPhone: 绕路 %s 分钟, 赚 %s 元", extra_mins, price)
         else:
             logger.warning("❌ Bark 返回非 200: %s %s", resp.status_code, resp.text)
-    except requests.RequestException as e:
+    except HTTPError as e:
         logger.error("❌ Bark 推送网络异常: %s", e)
 
 
-def push_to_supabase_realtime(
+async def push_to_supabase_realtime(
     pickup: str,
     delivery: str,
     price: str,
@@ -1371,12 +2407,12 @@ def push_to_supabase_realtime(
         "response_url": response_url,
     }
     try:
-        resp = requests.post(url, json=payload, headers=headers, timeout=REQUEST_TIMEOUT)
+        resp = await http.post(url, json=payload, headers=headers, timeout=REQUEST_TIMEOUT)
         if resp.status_code in (200, 201):
             logger.info("✅ 已写入 push_events，网页 Realtime 可收到")
         else:
             logger.warning("❌ Supabase push_events 写入失败: %s %s", resp.status_code, resp.text[:200])
-    except requests.RequestException as e:
+    except HTTPError as e:
         logger.error("❌ Supabase 写入异常: %s", e)
 
 
@@ -1418,7 +2454,7 @@ def _get_mode_config() -> dict:
     }
 
 
-def _get_driver_mode_from_db(driver_id: str) -> Optional[dict]:
+async def _get_driver_mode_from_db(driver_id: str) -> Optional[dict]:
     """从 driver_mode_config 表按 driver_id 读取 mode + config；无行或异常时返回 None。"""
     if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY or not driver_id:
         return None
@@ -1429,7 +2465,7 @@ def _get_driver_mode_from_db(driver_id: str) -> Optional[dict]:
         "Content-Type": "application/json",
     }
     try:
-        r = requests.get(url, headers=headers, timeout=10)
+        r = await http.get(url, headers=headers, timeout=10)
         if r.status_code == 200 and isinstance(r.json(), list) and len(r.json()) > 0:
             row = r.json()[0]
             return {
@@ -1449,7 +2485,7 @@ def _get_driver_mode_from_db(driver_id: str) -> Optional[dict]:
     return None
 
 
-def _set_driver_mode_to_db(driver_id: str, mode: str) -> None:
+async def _set_driver_mode_to_db(driver_id: str, mode: str) -> None:
     """将 mode 写入 driver_mode_config（upsert 该 driver_id 行）。"""
     if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY or not driver_id:
         return
@@ -1462,12 +2498,12 @@ def _set_driver_mode_to_db(driver_id: str, mode: str) -> None:
     }
     payload = {"driver_id": driver_id, "mode": mode, "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
     try:
-        requests.post(url, json=payload, headers=headers, timeout=10)
+        await http.post(url, json=payload, headers=headers, timeout=10)
     except Exception as e:
         logger.warning("写入 driver_mode_config(mode) 失败: %s", e)
 
 
-def _set_driver_mode_config_to_db(driver_id: str, body: ModeConfigUpdate) -> None:
+async def _set_driver_mode_config_to_db(driver_id: str, body: ModeConfigUpdate) -> None:
     """将模式参数写入 driver_mode_config（只更新传入的字段；无行则先插入默认行再 PATCH）。"""
     if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY or not driver_id:
         return
@@ -1491,10 +2527,10 @@ def _set_driver_mode_config_to_db(driver_id: str, body: ModeConfigUpdate) -> Non
     if len(payload) <= 1:
         return
     try:
-        r = requests.get(f"{base}/rest/v1/driver_mode_config?driver_id=eq.{driver_id}&select=driver_id", headers=headers, timeout=10)
+        r = await http.get(f"{base}/rest/v1/driver_mode_config?driver_id=eq.{driver_id}&select=driver_id", headers=headers, timeout=10)
         if r.status_code == 200 and isinstance(r.json(), list) and len(r.json()) == 0:
-            requests.post(f"{base}/rest/v1/driver_mode_config", json={"driver_id": driver_id}, headers={**headers, "Prefer": "return=minimal"}, timeout=10)
-        requests.patch(f"{base}/rest/v1/driver_mode_config?driver_id=eq.{driver_id}", json=payload, headers=headers, timeout=10)
+            await http.post(f"{base}/rest/v1/driver_mode_config", json={"driver_id": driver_id}, headers={**headers, "Prefer": "return=minimal"}, timeout=10)
+        await http.patch(f"{base}/rest/v1/driver_mode_config?driver_id=eq.{driver_id}", json=payload, headers=headers, timeout=10)
     except Exception as e:
         logger.warning("写入 driver_mode_config 参数失败: %s", e)
 
@@ -1504,7 +2540,7 @@ async def get_driver_mode(request: Request) -> dict:
     """获取当前调度模式及模式参数。按请求 driver_id 从 driver_mode_config 读；无 driver_id 用内存默认。"""
     driver_id = _get_driver_id(request)
     if driver_id:
-        row = _get_driver_mode_from_db(driver_id)
+        row = await _get_driver_mode_from_db(driver_id)
         if row:
             return {"mode": row["mode"], "config": row["config"]}
     return {"mode": DRIVER_MODE, "config": _get_mode_config()}
@@ -1518,7 +2554,7 @@ async def set_driver_mode(request: Request, body: DriverModeUpdate) -> dict:
     if m not in VALID_MODES:
         raise HTTPException(status_code=400, detail=f"mode 必须是 {VALID_MODES} 之一")
     if driver_id:
-        _set_driver_mode_to_db(driver_id, m)
+        await _set_driver_mode_to_db(driver_id, m)
         logger.info("调度模式已切换为: %s (driver_id=%s)", m, driver_id)
         return {"mode": m}
     global DRIVER_MODE
@@ -1532,7 +2568,7 @@ async def get_driver_mode_config(request: Request) -> dict:
     """仅获取当前模式参数（用于前端展示/编辑）。按 driver_id 从库读，无则内存默认。"""
     driver_id = _get_driver_id(request)
     if driver_id:
-        row = _get_driver_mode_from_db(driver_id)
+        row = await _get_driver_mode_from_db(driver_id)
         if row:
             return row["config"]
     return _get_mode_config()
@@ -1543,8 +2579,8 @@ async def set_driver_mode_config(request: Request, body: ModeConfigUpdate) -> di
     """更新模式参数（只更新传入的字段）。按 driver_id 落库，无则仅更新内存。"""
     driver_id = _get_driver_id(request)
     if driver_id:
-        _set_driver_mode_config_to_db(driver_id, body)
-        row = _get_driver_mode_from_db(driver_id)
+        await _set_driver_mode_config_to_db(driver_id, body)
+        row = await _get_driver_mode_from_db(driver_id)
         if row:
             return row["config"]
     global MODE2_DETOUR_MINUTES_MIN, MODE2_DETOUR_MINUTES_MAX
@@ -1749,10 +2785,10 @@ def _append_next_cycle_plan(reference_plan: dict) -> bool:
 async def get_planned_trip(request: Request) -> dict:
     """获取全部循环计划（多批次）及循环配置。按 driver_id 从库加载；出发时间已过的批自动结束找单并补足到轮次数。"""
     driver_id = _get_driver_id(request)
-    _load_planned_trip_from_db(driver_id)
+    await _load_planned_trip_from_db(driver_id)
     _sort_planned_trips()
     if _maybe_expire_past_plans():
-        _sync_planned_trip_plans_to_db(driver_id)
+        await _sync_planned_trip_plans_to_db(driver_id)
     return _planned_trip_response()
 
 
@@ -1775,7 +2811,7 @@ def _planned_trip_response() -> dict:
 async def set_planned_trip_cycle_config(request: Request, body: PlannedTripCycleConfig) -> dict:
     """保存循环计划配置：首次起点、终点、去的时间、循环间隔、找单轮次、是否停止循环。按 driver_id 落库。"""
     driver_id = _get_driver_id(request)
-    _load_planned_trip_from_db(driver_id)
+    await _load_planned_trip_from_db(driver_id)
     global planned_trip_cycle_origin, planned_trip_cycle_destination, planned_trip_cycle_departure_time, planned_trip_cycle_interval_hours, planned_trip_cycle_rounds, planned_trip_cycle_stopped
     if body.cycle_origin is not None:
         planned_trip_cycle_origin = (body.cycle_origin or "").strip()
@@ -1790,9 +2826,10 @@ async def set_planned_trip_cycle_config(request: Request, body: PlannedTripCycle
     if body.cycle_stopped is not None:
         planned_trip_cycle_stopped = bool(body.cycle_stopped)
     logger.info("循环计划配置已保存: 轮次=%s, 停止=%s (driver_id=%s)", planned_trip_cycle_rounds, planned_trip_cycle_stopped, driver_id)
-    _save_planned_trip_config_to_db(driver_id)
+    await _save_planned_trip_config_to_db(driver_id)
     _ensure_planned_trip_rounds()
-    _sync_planned_trip_plans_to_db(driver_id)
+    await _sync_planned_trip_plans_to_db(driver_id)
+    _on_planned_trips_changed(driver_id)
     return _planned_trip_response()
 
 
@@ -1800,7 +2837,7 @@ async def set_planned_trip_cycle_config(request: Request, body: PlannedTripCycle
 async def add_planned_trip(request: Request, body: PlannedTripUpdate) -> dict:
     """新增一条循环计划；若未停止循环且未完成数不足轮次，自动追加至轮次数。按 driver_id 落库。"""
     driver_id = _get_driver_id(request)
-    _load_planned_trip_from_db(driver_id)
+    await _load_planned_trip_from_db(driver_id)
     global planned_trips, planned_trip_cycle_stopped, planned_trip_cycle_rounds
     plan = {
         "origin": body.origin,
@@ -1820,7 +2857,8 @@ async def add_planned_trip(request: Request, body: PlannedTripUpdate) -> dict:
         if not _append_next_cycle_plan(last_plan):
             break
         n += 1
-    _sync_planned_trip_plans_to_db(driver_id)
+    await _sync_planned_trip_plans_to_db(driver_id)
+    _on_planned_trips_changed(driver_id)
     return _planned_trip_response()
 
 
@@ -1828,7 +2866,7 @@ async def add_planned_trip(request: Request, body: PlannedTripUpdate) -> dict:
 async def update_planned_trip(request: Request, body: PlannedTripUpdateWithIndex) -> dict:
     """更新指定索引的一条循环计划（索引为排序后顺序，0=当前优先找单的一批）。按 driver_id 落库。"""
     driver_id = _get_driver_id(request)
-    _load_planned_trip_from_db(driver_id)
+    await _load_planned_trip_from_db(driver_id)
     global planned_trips
     _sort_planned_trips()
     i = body.index
@@ -1845,7 +2883,8 @@ async def update_planned_trip(request: Request, body: PlannedTripUpdateWithIndex
     }
     _sort_planned_trips()
     logger.info("循环计划[%s]已更新: %s -> %s, 出发 %s", i, body.origin, body.destination, body.departure_time)
-    _sync_planned_trip_plans_to_db(driver_id)
+    await _sync_planned_trip_plans_to_db(driver_id)
+    _on_planned_trips_changed(driver_id)
     return _planned_trip_response()
 
 
@@ -1853,7 +2892,7 @@ async def update_planned_trip(request: Request, body: PlannedTripUpdateWithIndex
 async def complete_planned_trip(request: Request, index: int) -> dict:
     """结束指定索引的找单任务；若未停止循环且已配置循环计划，自动追加至轮次数（返程=去的时间+间隔，次日再去）。按 driver_id 落库。"""
     driver_id = _get_driver_id(request)
-    _load_planned_trip_from_db(driver_id)
+    await _load_planned_trip_from_db(driver_id)
     global planned_trips, planned_trip_cycle_stopped, planned_trip_cycle_rounds
     _sort_planned_trips()
     if index < 0 or index >= len(planned_trips):
@@ -1867,7 +2906,8 @@ async def complete_planned_trip(request: Request, index: int) -> dict:
             break
         n += 1
         completed = planned_trips[-1]
-    _sync_planned_trip_plans_to_db(driver_id)
+    await _sync_planned_trip_plans_to_db(driver_id)
+    _on_planned_trips_changed(driver_id)
     return _planned_trip_response()
 
 
@@ -1876,27 +2916,129 @@ async def complete_planned_trip(request: Request, index: int) -> dict:
 # ---------------------------------------------------------------------------
 @app.post("/geocode_batch")
 async def geocode_batch(body: GeocodeBatchRequest) -> list:
-    """批量地理编码，返回 [{ address, lat, lng }, ...]（BD09 百度坐标系），失败项省略。"""
+    """
+    批量地理编码（并发 + 批内去重 + AK 限流），按输入顺序逐项返回（空地址省略）：
+    成功项 { address, ok: true, lat, lng }（BD09 百度坐标系），失败项 { address, ok: false, error }，单项失败不影响其他项。
+    """
+    addrs = [(a or "").strip() for a in body.addresses]
+    addrs = [a for a in addrs if a]
     out: List[dict] = []
-    for addr in body.addresses:
-        addr = (addr or "").strip()
-        if not addr:
+    for addr, (coord_str, err) in zip(addrs, await geocode_addresses_detailed(addrs)):
+        if err is not None or not coord_str:
+            detail = err.detail if isinstance(err, HTTPException) else str(err)
+            logger.warning("地理编码失败 [%s]: %s", addr, detail)
+            out.append({"address": addr, "ok": False, "error": detail})
             continue
-        try:
-            coord_str = geocode_address(addr)
-            lat_s, lng_s = coord_str.split(",", 1)
-            lat_bd, lng_bd = float(lat_s), float(lng_s)
-            out.append({"address": addr, "lat": lat_bd, "lng": lng_bd})
-        except Exception as e:
-            logger.warning("地理编码跳过 [%s]: %s", addr, e)
+        lat_s, lng_s = coord_str.split(",", 1)
+        out.append({"address": addr, "ok": True, "lat": float(lat_s), "lng": float(lng_s)})
     return out
 
 
+@app.get("/cache_stats")
+async def cache_stats(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> dict:
+    """
+    地图缓存命中统计（命中/未命中/淘汰等）、在途请求合并次数、对外 HTTP 请求计数、求解进程池队列指标、地图缓存预热统计与百度 AK 池各服务当日用量，供排查与容量规划。
+    含 AK 前缀与用量，须带有效登录令牌。
+    """
+    await _require_driver_id_from_token(credentials)
+    return {
+        "geocode": _geocode_cache.stats(),
+        "duration_legs": _duration_leg_cache.stats(),
+        "route_geometry": _route_geometry_cache.stats(),
+        "reverse_geocode": _reverse_geocode_cache.stats(),
+        "singleflight": {
+            "geocoding": _geocode_flight.stats(),
+            "routematrix": _routematrix_flight.stats(),
+            "direction": _direction_flight.stats(),
+            "reverse_geocoding": _reverse_geocode_flight.stats(),
+        },
+        "http": http.stats(),
+        "solver_pool": solver_pool.stats(),
+        "map_warmup": {**_map_warmup_stats, "drivers": len(_map_warmup_drivers), "in_flight": len(_map_warmup_tasks)},
+        "baidu_quota": _baidu_ak_pool.stats(),
+        "baidu_circuit_breakers": {service: b.stats() for service, b in _baidu_breakers.items()},
+        "map_provider": _map_provider.stats(),
+    }
+
+
 @app.post("/reverse_geocode")
 async def reverse_geocode_endpoint(body: ReverseGeocodeRequest) -> dict:
-    """逆地理编码：WGS84 经纬度 → 地址，供网页「刷新 GPS」后填入当前位置。"""
-    address = reverse_geocode(body.lat, body.lng)
-    return {"address": address, "lat": body.lat, "lng": body.lng}
+    """逆地理编码：经纬度（默认 WGS84）→ 地址，供网页「刷新 GPS」后填入当前位置；同时返回对应的 BD09 坐标供地图打点。"""
+    try:
+        coord_type = normalize_coord_type(body.coord_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    address = await reverse_geocode(body.lat, body.lng, coord_type)
+    bd_lat, bd_lng = convert_point(body.lat, body.lng, coord_type, BD09)
+    return {"address": address, "lat": body.lat, "lng": body.lng, "bd_lat": bd_lat, "bd_lng": bd_lng}
+
+
+@app.post("/reverse_geocode_batch")
+async def reverse_geocode_batch(body: ReverseGeocodeBatchRequest) -> dict:
+    """
+    批量逆地理编码：一次解析整段 GPS 轨迹。坐标一次性转 BD09，按网格单元去重后先查缓存，
+    只对未命中的单元并发请求（并发数受 GEOCODE_CONCURRENCY 限制）；逐点返回，单点失败不影响其他点。
+    返回 { results: [{ lat, lng, bd_lat, bd_lng, ok, address | error }], stats: { points, cells, from_cache, requests, failed } }，顺序与输入一致。
+    """
+    if len(body.points) > REVERSE_GEOCODE_BATCH_MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"单次最多 {REVERSE_GEOCODE_BATCH_MAX_POINTS} 个点")
+    if any(len(p) != 2 for p in body.points):
+        raise HTTPException(status_code=400, detail="points 每项须为 [lat, lng]")
+    try:
+        coord_type = normalize_coord_type(body.coord_type)
+        bd_points = convert_points(body.points, coord_type, BD09)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    cells: Dict[str, Tuple[float, float]] = {}
+    point_cells: List[str] = []
+    for lat_bd, lng_bd in bd_points:
+        key = _reverse_geocode_cache.cell_key(lat_bd, lng_bd)
+        cells.setdefault(key, (lat_bd, lng_bd))
+        point_cells.append(key)
+    stats: Dict[str, Any] = {"from_cache": 0, "requests": 0}
+    sem = asyncio.Semaphore(max(1, GEOCODE_CONCURRENCY))
+
+    async def _one(point: Tuple[float, float]) -> str:
+        async with sem:
+            return await reverse_geocode_bd09(point[0], point[1], stats=stats)
+
+    keys = list(cells.keys())
+    resolved = await asyncio.gather(*(_one(cells[k]) for k in keys), return_exceptions=True)
+    by_cell: Dict[str, Any] = {}
+    for key, res in zip(keys, resolved):
+        if isinstance(res, BaseException) and not isinstance(res, Exception):
+            raise res
+        by_cell[key] = res
+
+    results: List[dict] = []
+    failed = 0
+    for (lat, lng), (lat_bd, lng_bd), key in zip(body.points, bd_points, point_cells):
+        item: Dict[str, Any] = {"lat": lat, "lng": lng, "bd_lat": lat_bd, "bd_lng": lng_bd}
+        res = by_cell[key]
+        if isinstance(res, Exception):
+            failed += 1
+            item.update({"ok": False, "error": res.detail if isinstance(res, HTTPException) else str(res)})
+        else:
+            item.update({"ok": True, "address": res})
+        results.append(item)
+    stats.update({"points": len(bd_points), "cells": len(keys), "failed": failed})
+    return {"results": results, "stats": stats}
+
+
+@app.post("/coord_convert")
+async def coord_convert(body: CoordConvertRequest) -> dict:
+    """
+    批量坐标系转换（NumPy 向量化，本地计算不调百度）：供探子 / 网页批量上报的 GPS 定位转 BD09，或路线导出转 WGS84 / GCJ02。
+    返回 { points: [[lat, lng], ...], from_type, to_type }，顺序与输入一致。
+    """
+    try:
+        from_type = normalize_coord_type(body.from_type)
+        to_type = normalize_coord_type(body.to_type)
+        points = convert_points(body.points, from_type, to_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    return {"points": points, "from_type": from_type, "to_type": to_type}
 
 
 def _normalize_tactics(value: Any) -> int:
@@ -1942,13 +3084,36 @@ def _parse_manual_departure_to_dt(
     return min(cands, key=lambda dt: abs((dt - base).total_seconds()))
 
 
-def _compute_route_summary(
+def _pickup_delivery_layout(pickups: List[str], n: int) -> Tuple[List[Tuple[int, int]], Dict[int, int]]:
+    """
+    按节点布局 0=司机, 1..k=有起点乘客的起点, 1+k..k+n=各乘客终点 生成接送配对与「乘客序号 → 起点节点」映射。
+    空起点表示乘客已上车，不建配对。
+    """
+    k = sum(1 for p in pickups if p)
+    pickup_delivery_pairs: List[Tuple[int, int]] = []
+    pickup_node_by_passenger: Dict[int, int] = {}
+    for i in range(n):
+        if pickups[i]:
+            pickup_node = 1 + len(pickup_node_by_passenger)
+            pickup_node_by_passenger[i] = pickup_node
+            pickup_delivery_pairs.append((pickup_node, 1 + k + i))
+    return pickup_delivery_pairs, pickup_node_by_passenger
+
+
+async def _build_manual_eval_context(
     driver_loc: str,
     pickups: List[str],
     deliveries: List[str],
     waypoints: List[str],
+    candidates: Dict[int, Tuple[str, str]],
     tactics: int,
 ) -> Dict[str, Any]:
+    """
+    人工模式评估上下文：基线站点与全部候选的起/终点合成一个并集，整批只做一次地理编码 + 一次路网矩阵。
+    并集节点：0..B-1 为基线布局（0=司机, 1..k=起点, 1+k..k+n=终点, 其后为途经点），之后每位候选依次占两个节点（起点、终点）。
+    坐标相同的节点在路网矩阵里只算一个点；各候选的矩阵由 _candidate_problem 从并集切出，不再请求百度。
+    候选地址解析失败只记入 candidate_errors，不影响其余候选；基线地址解析失败直接抛出。
+    """
     driver_loc = (driver_loc or "").strip()
     pickups = [str(p or "").strip() for p in (pickups or [])]
     deliveries = [str(d or "").strip() for d in (deliveries or [])]
@@ -1959,51 +3124,160 @@ def _compute_route_summary(
         raise HTTPException(status_code=400, detail="pickups 与 deliveries 数量须一致")
 
     n = len(deliveries)
-    m = len(waypoints)
-    if n == 0 and m == 0:
-        coord_str = geocode_address(driver_loc)
-        return {
-            "total_time_seconds": 0,
-            "route_indices": [0],
-            "matrix": [[0]],
-            "addresses": [driver_loc],
-            "coords": [coord_str],
-            "pickup_node_by_passenger": {},
-        }
-
     effective_pickups = [p for p in pickups if p]
-    k = len(effective_pickups)
-    addresses = [driver_loc] + list(effective_pickups) + list(deliveries) + list(waypoints)
-    coords = geocode_addresses(addresses)
-    matrix = get_duration_matrix(coords, tactics=tactics)
-
-    pickup_delivery_pairs: List[Tuple[int, int]] = []
-    for i in range(n):
-        if pickups[i]:
-            pickup_ord = sum(1 for j in range(i) if pickups[j])
-            pickup_node = 1 + pickup_ord
-            delivery_node = 1 + k + i
-            pickup_delivery_pairs.append((pickup_node, delivery_node))
-
-    route_indices, total_time = solve_pdp_route_flexible(matrix, pickup_delivery_pairs)
-    if not route_indices:
-        raise HTTPException(status_code=422, detail="OR-Tools 未求得可行路线")
-
-    passengers_with_pickup = [i for i in range(n) if pickups[i]]
-    pickup_node_by_passenger: Dict[int, int] = {}
-    for j, p_idx in enumerate(passengers_with_pickup):
-        pickup_node_by_passenger[p_idx] = 1 + j
+    base_addresses = [driver_loc] + effective_pickups + deliveries + waypoints
+    base_nodes = len(base_addresses)
+    cand_order = list(candidates.keys())
+    union_addresses = base_addresses + [a for idx in cand_order for a in candidates[idx]]
+    geocode_stats: Dict[str, Any] = {}
+    results = await geocode_addresses_detailed(union_addresses, stats=geocode_stats)
+    for _, err in results[:base_nodes]:
+        if err is not None:
+            raise err
+
+    coords: List[str] = [str(c) for c, _ in results[:base_nodes]]
+    candidate_nodes: Dict[int, Tuple[int, int]] = {}
+    candidate_errors: Dict[int, str] = {}
+    for j, idx in enumerate(cand_order):
+        (pickup_coord, pickup_err), (delivery_coord, delivery_err) = results[base_nodes + 2 * j : base_nodes + 2 * j + 2]
+        if pickup_err is not None or delivery_err is not None:
+            candidate_errors[idx] = str(pickup_err or delivery_err)
+            continue
+        candidate_nodes[idx] = (len(coords), len(coords) + 1)
+        coords += [str(pickup_coord), str(delivery_coord)]
+
+    # 同一坐标只进矩阵一次（多位候选同一上车点很常见），再按节点展开
+    point_by_key: Dict[str, int] = {}
+    points: List[str] = []
+    point_of_node: List[int] = []
+    for c in coords:
+        key = normalize_coord(c)
+        if key not in point_by_key:
+            point_by_key[key] = len(points)
+            points.append(c)
+        point_of_node.append(point_by_key[key])
+    matrix_stats: Dict[str, Any] = {}
+    if len(points) > 1:
+        points_matrix = await get_duration_matrix(points, tactics=tactics, stats=matrix_stats)
+    else:
+        points_matrix = DurationMatrix([[0]])
+    matrix = points_matrix.submatrix(point_of_node)
 
+    pickup_delivery_pairs, pickup_node_by_passenger = _pickup_delivery_layout(pickups, n)
+    geocode_requests = int(geocode_stats.get("geocode_requests") or 0)
+    matrix_requests = int(matrix_stats.get("baidu_requests") or 0)
     return {
-        "total_time_seconds": int(total_time),
-        "route_indices": list(route_indices),
         "matrix": matrix,
-        "addresses": addresses,
         "coords": coords,
+        "addresses": base_addresses,
+        "base_nodes": base_nodes,
+        "num_pickup_nodes": len(effective_pickups),
+        "num_deliveries": n,
+        "pickup_delivery_pairs": pickup_delivery_pairs,
         "pickup_node_by_passenger": pickup_node_by_passenger,
+        "candidate_nodes": candidate_nodes,
+        "candidate_errors": candidate_errors,
+        "baidu_calls": {
+            "geocode": geocode_requests,
+            "geocode_from_cache": int(geocode_stats.get("geocode_from_cache") or 0),
+            "routematrix": matrix_requests,
+            "total": geocode_requests + matrix_requests,
+            "matrix_points": len(points),
+            "matrix_legs_from_cache": int(matrix_stats.get("legs_from_cache") or 0),
+        },
+    }
+
+
+def _shift_baseline_node(node: int, num_pickup_nodes: int, num_deliveries: int) -> int:
+    """基线节点映射到「加入一位候选人」后的布局：候选起点排在原起点之后、候选终点排在原终点之后，其后节点依次后移。"""
+    if node <= num_pickup_nodes:
+        return node
+    if node <= num_pickup_nodes + num_deliveries:
+        return node + 1
+    return node + 2
+
+
+def _candidate_problem(ctx: Dict[str, Any], idx: int) -> Dict[str, Any]:
+    """从并集矩阵切出「基线 + 候选 idx」的求解输入（节点布局同 _build_manual_eval_context 的基线布局，乘客多一位）。"""
+    k = int(ctx["num_pickup_nodes"])
+    n = int(ctx["num_deliveries"])
+    base_nodes = int(ctx["base_nodes"])
+    cand_pickup, cand_delivery = ctx["candidate_nodes"][idx]
+    nodes = (
+        list(range(k + 1))
+        + [cand_pickup]
+        + list(range(k + 1, k + n + 1))
+        + [cand_delivery]
+        + list(range(k + n + 1, base_nodes))
+    )
+    pairs = [(_shift_baseline_node(p, k, n), _shift_baseline_node(d, k, n)) for p, d in ctx["pickup_delivery_pairs"]]
+    pairs.append((k + 1, k + n + 2))
+    return {
+        "matrix": ctx["matrix"].submatrix(nodes),
+        "pickup_delivery_pairs": pairs,
+        "pickup_node": k + 1,
+        "delivery_node": k + n + 2,
     }
 
 
+def _route_eta_to_node(matrix: DurationMatrix, route_indices: List[int], node: int) -> Optional[int]:
+    """沿路线累加耗时，返回到达 node 的秒数；路线不经过该点时返回 None。"""
+    acc = 0
+    for s in range(1, len(route_indices)):
+        a = route_indices[s - 1]
+        b = route_indices[s]
+        acc += matrix[a, b]
+        if b == node:
+            return acc
+    return None
+
+
+async def _select_candidates_jointly(
+    ctx: Dict[str, Any],
+    rows: List[Dict[str, Any]],
+    select_count: int,
+    max_detour: int,
+    pickup_deadlines: Dict[int, int],
+    budget_ms: float,
+) -> Tuple[Optional[List[int]], Dict[str, Any]]:
+    """
+    k 选 N 联合求解：从评估上下文的并集矩阵切出「基线站点 + 全部候选接/送点」，每位候选作为可放弃的接送对，
+    放弃惩罚 = max_detour + 1 + 价格 × MANUAL_PRICE_SECONDS_PER_YUAN：合格候选单独绕路不超过 max_detour，惩罚严格大于其绕路，
+    只有与其他候选一起接冲突（或超出 select_count）时才会被放弃；一次求解得出最多 select_count 位的最优组合。
+    返回 (被选中候选的 index 列表, 调试信息)；求解失败时列表为 None，由调用方退回按单人评分排序。
+    """
+    base_nodes = int(ctx["base_nodes"])
+    nodes = list(range(base_nodes))
+    optional_pairs: List[Tuple[int, int]] = []
+    penalties: List[int] = []
+    arrival_limits: Dict[int, int] = {}
+    for j, row in enumerate(rows):
+        pickup_node = base_nodes + 2 * j
+        nodes += list(ctx["candidate_nodes"][row["index"]])
+        optional_pairs.append((pickup_node, pickup_node + 1))
+        penalties.append(int(max_detour + 1 + max(0.0, float(row.get("price") or 0)) * MANUAL_PRICE_SECONDS_PER_YUAN))
+        arrival_limits[pickup_node] = min(3600, pickup_deadlines.get(row["index"], 3600))
+    matrix = ctx["matrix"].submatrix(nodes)
+    solver_stats: Dict[str, Any] = {}
+    route_indices, total_time = await solver_pool.solve_pdp_prize_collecting(
+        matrix,
+        ctx.get("pickup_delivery_pairs") or [],
+        optional_pairs,
+        penalties,
+        select_count,
+        arrival_limits=arrival_limits,
+        stats=solver_stats,
+        budget_ms=budget_ms,
+    )
+    debug: Dict[str, Any] = {"matrix_size": len(matrix), "solver_stats": solver_stats}
+    if not route_indices:
+        return None, debug
+    on_route = set(route_indices)
+    selected = [rows[j]["index"] for j, (pickup_node, _) in enumerate(optional_pairs) if pickup_node in on_route]
+    debug.update({"total_time_seconds": int(total_time), "selected_indexes": selected})
+    return selected, debug
+
+
 @app.post("/manual_ocr_extract")
 async def manual_ocr_extract(
     request: Request,
@@ -2012,8 +3286,8 @@ async def manual_ocr_extract(
     ocr_platform: Optional[str] = Form(default=None),
 ) -> dict:
     """人工模式：支持 multipart 多文件（优先）与 JSON(base64 兼容) 两种上传。"""
-    driver_id = _require_driver_id_from_token(credentials)
-    driver_loc = _get_driver_current_loc(driver_id) or ""
+    driver_id = await _require_driver_id_from_token(credentials)
+    driver_loc = await _get_driver_current_loc(driver_id) or ""
     client = _get_baidu_ocr_client()
     if not client.available():
         raise HTTPException(status_code=503, detail="未配置百度 OCR（baidu_ocr_api_key / baidu_ocr_secret_key）")
@@ -2043,7 +3317,7 @@ async def manual_ocr_extract(
                 total_bytes += len(raw)
                 if total_bytes > max_total_bytes:
                     raise HTTPException(status_code=400, detail="本次上传总大小过大，请减少图片数量或继续压缩后重试（建议 <= 30MB）")
-                lines = client.ocr_text_lines_from_bytes(raw)
+                lines = await client.ocr_text_lines_from_bytes(raw)
                 pairs = extract_passenger_candidates(lines, platform_hint=platform_hint, driver_loc=driver_loc)
                 image_results.append({"name": name, "lines": lines, "pairs": pairs})
                 for p in pairs:
@@ -2084,7 +3358,7 @@ async def manual_ocr_extract(
             name = (str((img or {}).get("name") or f"image_{i + 1}")).strip() or f"image_{i + 1}"
             b64 = (img or {}).get("content_base64") or ""
             try:
-                lines = client.ocr_text_lines(b64)
+                lines = await client.ocr_text_lines(b64)
                 pairs = extract_passenger_candidates(lines, platform_hint=platform_hint, driver_loc=driver_loc)
                 image_results.append({"name": name, "lines": lines, "pairs": pairs})
                 for p in pairs:
@@ -2132,68 +3406,145 @@ async def manual_candidates_recommend(
     body: ManualRecommendRequest,
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
 ) -> dict:
-    """人工模式：根据候选乘客，按到起点 <= 1 小时 + 顺路度 + 收益评分，挑选建议人数（1-4）并给出顺路备选。"""
-    driver_id = _require_driver_id_from_token(credentials)
-    db_orders = _get_assigned_orders_for_driver(driver_id)
+    """
+    人工模式：根据候选乘客，按到起点 <= 1 小时 + 顺路度 + 收益评分逐个评估，
+    再对合格候选做一次 k 选 N 联合求解，挑选建议人数（1-4）并给出顺路备选。
+    整个请求共用一个求解截止时间（MANUAL_RECOMMEND_SOLVE_BUDGET_MS，自请求开始计）：基线、候选完整求解与联合求解依次按剩余预算限时；
+    剩余不足 route_solver.SOLVER_MIN_TIME_MS 时不再做候选完整求解与联合求解，分别沿用插入结果、按单人评分排序。
+    """
+    solve_deadline = time.perf_counter() + MANUAL_RECOMMEND_SOLVE_BUDGET_MS / 1000
+
+    def _remaining_ms() -> float:
+        return (solve_deadline - time.perf_counter()) * 1000
+
+    driver_id = await _require_driver_id_from_token(credentials)
+    _touch_map_warmup_driver(driver_id)
+    db_orders = await _get_assigned_orders_for_driver(driver_id)
     db_pickups = [o.get("pickup", "") for o in db_orders]
     db_deliveries = [o.get("delivery", "") for o in db_orders]
-    driver_loc = _get_driver_current_loc(driver_id)
+    driver_loc = await _get_driver_current_loc(driver_id)
     if not driver_loc:
         raise HTTPException(status_code=400, detail="司机当前位置为空，请先在首页更新定位")
 
     tactics = _normalize_tactics(body.tactics)
     waypoints = [str(w or "").strip() for w in (body.waypoints or []) if str(w or "").strip()]
-    baseline = _compute_route_summary(driver_loc, db_pickups, db_deliveries, waypoints, tactics)
-    baseline_total = int(baseline["total_time_seconds"])
 
     select_count = max(1, min(4, int(body.select_count or 1)))
     evaluations: List[Dict[str, Any]] = []
-    base_n = len(db_deliveries)
-    now_dt = datetime.now()
-
+    valid_candidates: Dict[int, Tuple[str, str]] = {}
     for idx, cand in enumerate(body.candidates or []):
         pickup = (cand.pickup or "").strip()
         delivery = (cand.delivery or "").strip()
-        price = float(cand.price or 0)
-        departure_time = (cand.departure_time or "").strip()
-        toll_negotiable = cand.toll_negotiable
         row: Dict[str, Any] = {
             "index": idx,
             "pickup": pickup,
             "delivery": delivery,
-            "price": price,
-            "departure_time": departure_time,
-            "toll_negotiable": toll_negotiable,
+            "price": float(cand.price or 0),
+            "departure_time": (cand.departure_time or "").strip(),
+            "toll_negotiable": cand.toll_negotiable,
         }
         if not pickup or not delivery:
             row.update({"eligible": False, "reason": "缺少起点或终点", "score": -10**9})
-            evaluations.append(row)
-            continue
+        else:
+            valid_candidates[idx] = (pickup, delivery)
+        evaluations.append(row)
+
+    # 基线与全部候选共用一次地理编码 + 一次路网矩阵，逐候选只从并集矩阵切子矩阵
+    ctx = await _build_manual_eval_context(driver_loc, db_pickups, db_deliveries, waypoints, valid_candidates, tactics)
+    base_k = int(ctx["num_pickup_nodes"])
+    base_n = int(ctx["num_deliveries"])
+    baseline_matrix = ctx["matrix"].submatrix(list(range(int(ctx["base_nodes"]))))
+    baseline_solver_stats: Dict[str, Any] = {}
+    if len(baseline_matrix) > 1:
+        # 基线是后续评估的前提，预算已耗尽时也要求解（求解器按最短限时跑）
+        baseline_route, baseline_total = await solver_pool.solve_pdp_route_flexible(
+            baseline_matrix,
+            ctx["pickup_delivery_pairs"],
+            stats=baseline_solver_stats,
+            budget_ms=_remaining_ms(),
+        )
+        if not baseline_route:
+            raise HTTPException(status_code=422, detail="OR-Tools 未求得可行路线")
+    else:
+        baseline_route, baseline_total = [0], 0
+    baseline_total = int(baseline_total)
 
+    now_dt = datetime.now()
+    max_detour = max(15 * 60, MODE3_MAX_DETOUR_MINUTES * 60)
+    baseline_route_in_plus = [_shift_baseline_node(x, base_k, base_n) for x in baseline_route]
+
+    # 先把每位候选插入基线路线（O(n²)）：明显顺路/明显绕远时直接采用插入结果，阈值附近的才完整求解，且并行提交进程池
+    evaluated: Dict[int, Dict[str, Any]] = {}
+    escalated: List[int] = []
+    for idx in valid_candidates:
+        if idx in ctx["candidate_errors"]:
+            continue
+        plus = _candidate_problem(ctx, idx)
+        insertion_detour, route_indices = best_insertion(
+            plus["matrix"], baseline_route_in_plus, plus["pickup_node"], plus["delivery_node"]
+        )
+        plus.update(
+            {"route_indices": route_indices, "total": baseline_total + insertion_detour, "detour_method": "insertion"}
+        )
+        evaluated[idx] = plus
+        if insertion_prefilter(insertion_detour, max_detour, INSERTION_ESCALATE_MARGIN_SECONDS) == INSERTION_SOLVE:
+            escalated.append(idx)
+
+    async def _solve_candidate(idx: int, budget_ms: float) -> Tuple[Optional[List[int]], int, Dict[str, Any]]:
+        solver_stats: Dict[str, Any] = {}
+        solved_route, solved_total = await solver_pool.solve_pdp_route_flexible(
+            evaluated[idx]["matrix"],
+            evaluated[idx]["pickup_delivery_pairs"],
+            stats=solver_stats,
+            budget_ms=budget_ms,
+        )
+        return solved_route, int(solved_total), solver_stats
+
+    candidate_solve_ms = 0.0
+    stop_reasons: Dict[str, int] = {}
+    # 各候选并行求解，共用同一份剩余预算；预算已耗尽时不再提交，沿用插入结果
+    candidate_budget_ms = _remaining_ms()
+    skipped_solves = 0
+    if escalated and candidate_budget_ms < route_solver.SOLVER_MIN_TIME_MS:
+        skipped_solves = len(escalated)
+        stop_reasons[route_solver.STOP_BUDGET] = skipped_solves
+        logger.warning("人工模式求解预算已用尽，%s 位候选不做完整求解，沿用插入结果", skipped_solves)
+        escalated = []
+    solve_results = await asyncio.gather(
+        *[_solve_candidate(idx, candidate_budget_ms) for idx in escalated], return_exceptions=True
+    )
+    for idx, res in zip(escalated, solve_results):
+        if isinstance(res, BaseException):
+            logger.warning("人工模式候选 %s 完整求解失败，沿用插入结果: %s", idx, res)
+            continue
+        solved_route, solved_total, solver_stats = res
+        candidate_solve_ms += float(solver_stats.get("solve_ms") or 0)
+        reason_key = str(solver_stats.get("stop_reason") or "unknown")
+        stop_reasons[reason_key] = stop_reasons.get(reason_key, 0) + 1
+        if solved_route and solved_total < evaluated[idx]["total"]:
+            evaluated[idx].update({"route_indices": list(solved_route), "total": solved_total, "detour_method": "solver"})
+
+    # 候选起点最晚到达（秒）：有出发时间时不晚于出发后 30 分钟，供联合求解约束
+    pickup_deadlines: Dict[int, int] = {}
+    for row in evaluations:
+        idx = row["index"]
+        if idx not in valid_candidates:
+            continue
+        if idx in ctx["candidate_errors"]:
+            row.update({"eligible": False, "reason": f"不可行: {ctx['candidate_errors'][idx]}", "score": -10**9})
+            continue
+        price = row["price"]
+        departure_time = row["departure_time"]
+        toll_negotiable = row["toll_negotiable"]
+        plus = evaluated[idx]
+        matrix = plus["matrix"]
+        route_indices = plus["route_indices"]
+        plus_total = int(plus["total"])
         try:
-            plus_pickups = db_pickups + [pickup]
-            plus_deliveries = db_deliveries + [delivery]
-            summary = _compute_route_summary(driver_loc, plus_pickups, plus_deliveries, waypoints, tactics)
-            plus_total = int(summary["total_time_seconds"])
             detour_seconds = max(0, plus_total - baseline_total)
-
-            cand_passenger_idx = base_n
-            pickup_node = summary["pickup_node_by_passenger"].get(cand_passenger_idx)
-            pickup_eta_seconds: Optional[int] = None
-            if pickup_node is not None:
-                acc = 0
-                route_indices = summary["route_indices"]
-                matrix = summary["matrix"]
-                for s in range(1, len(route_indices)):
-                    a = route_indices[s - 1]
-                    b = route_indices[s]
-                    acc += int(matrix[a][b])
-                    if b == pickup_node:
-                        pickup_eta_seconds = acc
-                        break
+            pickup_eta_seconds = _route_eta_to_node(matrix, route_indices, plus["pickup_node"])
 
             eta_ok = pickup_eta_seconds is not None and pickup_eta_seconds <= 3600
-            max_detour = max(15 * 60, MODE3_MAX_DETOUR_MINUTES * 60)
             detour_ok = detour_seconds <= max_detour
             departure_window_ok = True
             departure_diff_seconds: Optional[int] = None
@@ -2211,6 +3562,7 @@ async def manual_candidates_recommend(
                     else:
                         departure_diff_seconds = int((eta_dt - dep_dt).total_seconds())
                         departure_window_ok = abs(departure_diff_seconds) <= 30 * 60
+                        pickup_deadlines[idx] = int((dep_dt - now_dt).total_seconds()) + 30 * 60
 
             base_for_ratio = baseline_total if baseline_total > 0 else max(1, plus_total)
             detour_ratio = detour_seconds / max(1, base_for_ratio)
@@ -2248,18 +3600,47 @@ async def manual_candidates_recommend(
                     "detour_seconds": detour_seconds,
                     "detour_ratio": round(detour_ratio, 4),
                     "total_time_seconds_if_added": plus_total,
+                    "detour_method": plus["detour_method"],
                     "score": score,
                 }
             )
         except Exception as e:
             row.update({"eligible": False, "reason": f"不可行: {e}", "score": -10**9})
-        evaluations.append(row)
 
     eligible = [r for r in evaluations if r.get("eligible")]
     eligible.sort(key=lambda x: x.get("score", -10**9), reverse=True)
-    recommended = eligible[:select_count]
     backup_limit = 5
-    backup_recommended = eligible[select_count : select_count + backup_limit]
+    # 单人评估合格的候选再做一次 k 选 N 联合求解：一起接时互相冲突的组合会被排除
+    joint_debug: Dict[str, Any] = {}
+    selected_indexes: Optional[List[int]] = None
+    if len(eligible) > 1 and _remaining_ms() < route_solver.SOLVER_MIN_TIME_MS:
+        joint_debug = {"fallback": "budget_exhausted"}
+    elif len(eligible) > 1:
+        try:
+            selected_indexes, joint_debug = await _select_candidates_jointly(
+                ctx,
+                eligible,
+                select_count,
+                max_detour,
+                pickup_deadlines,
+                _remaining_ms(),
+            )
+        except Exception as e:
+            logger.warning("人工模式联合求解失败，退回按单人评分排序: %s", e)
+            joint_debug = {"error": str(e)}
+    if selected_indexes is not None and not selected_indexes:
+        # 有单人合格的候选却一位都没选中（如求解提前停止），与单候选路径保持一致，退回按单人评分排序
+        joint_debug["fallback"] = "joint_selected_none"
+        selected_indexes = None
+    if selected_indexes is not None:
+        chosen = set(selected_indexes)
+        for r in eligible:
+            r["joint_selected"] = r["index"] in chosen
+        recommended = [r for r in eligible if r["index"] in chosen]
+        backup_recommended = [r for r in eligible if r["index"] not in chosen][:backup_limit]
+    else:
+        recommended = eligible[:select_count]
+        backup_recommended = eligible[select_count : select_count + backup_limit]
 
     return {
         "driver_id": driver_id,
@@ -2270,17 +3651,43 @@ async def manual_candidates_recommend(
         "requested_select_count": select_count,
         "selected_count": len(recommended),
         "backup_count": len(backup_recommended),
+        "baidu_calls": ctx["baidu_calls"]["total"],
+        "debug": {
+            "baseline_solver_stats": baseline_solver_stats,
+            "solver_calls": len(escalated),
+            "solver_calls_skipped": skipped_solves,
+            "candidate_solve_ms": round(candidate_solve_ms, 2),
+            "candidate_stop_reasons": stop_reasons,
+            "solve_budget_ms": MANUAL_RECOMMEND_SOLVE_BUDGET_MS,
+            "baidu_calls": ctx["baidu_calls"],
+            "joint": joint_debug,
+        },
     }
 
 
+# 路线几何紧凑格式：请求带 ?format=polyline 或 Accept 含该媒体类型时，route_paths / route_steps[].path 返回 encoded polyline 字符串
+POLYLINE_MEDIA_TYPE = "application/vnd.smartdiaodu.polyline+json"
+
+
+def _wants_encoded_polyline(request: Request) -> bool:
+    if (request.query_params.get("format") or "").strip().lower() == "polyline":
+        return True
+    return POLYLINE_MEDIA_TYPE in (request.headers.get("accept") or "").lower()
+
+
 @app.post("/current_route_preview")
 async def current_route_preview(
+    request: Request,
     req: dict,
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
 ) -> dict:
     """
     根据当前状态计算最优路线，返回途经点地址顺序及经纬度，供网页地图绘制。
-    请求体：{ "current_state": { "driver_loc", "pickups", "deliveries", "waypoints" } }, "tactics": 策略数字。
+    请求体：{ "current_state": { "driver_loc", "pickups", "deliveries", "waypoints" } }, "tactics": 策略数字, "zoom": 地图缩放级别。
+    路线几何按 zoom 抽稀，响应 simplify_zoom 为抽稀所用级别：地图放大到比它更细时，前端须按新级别重新请求几何。
+    请求带 ?format=polyline（或 Accept: application/vnd.smartdiaodu.polyline+json）时路线几何按 encoded polyline 返回，
+    响应附 path_encoding 字段；默认仍为 [lat, lng] 数组。
+    请求体 "coord_type": "wgs84" / "gcj02" 时 route_coords 与路线几何转换到该坐标系（供导出到其他地图），响应附 coord_type；默认 BD09。
     """
     try:
         state = req.get("current_state") or {}
@@ -2299,15 +3706,21 @@ async def current_route_preview(
         raise HTTPException(status_code=400, detail=f"请求体格式错误: {e}") from e
 
     tactics = _normalize_tactics(req.get("tactics", 0))
+    try:
+        out_coord_type = normalize_coord_type(req.get("coord_type") or BD09)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
 
     # 强制鉴权：仅允许已登录司机请求当前路线；driver_id 一律从 token 对应用户读取，忽略前端传入。
-    driver_id = _require_driver_id_from_token(credentials)
+    driver_id = await _require_driver_id_from_token(credentials)
+    # 记下司机活动：之后已分配订单变化时由后台预热检查提前把新地址与耗时腿放进缓存
+    _touch_map_warmup_driver(driver_id)
 
     # 只信数据库：按 token 绑定司机强制读取已分配订单与司机位置，不信任前端上传的乘客数组。
-    db_orders = _get_assigned_orders_for_driver(driver_id)
+    db_orders = await _get_assigned_orders_for_driver(driver_id)
     pickups = [o.get("pickup", "") for o in db_orders]
     deliveries = [o.get("delivery", "") for o in db_orders]
-    db_loc = _get_driver_current_loc(driver_id)
+    db_loc = await _get_driver_current_loc(driver_id)
     if db_loc:
         driver_loc = db_loc
     logger.info(
@@ -2326,7 +3739,7 @@ async def current_route_preview(
     m = len(waypoints)
     if n == 0 and m == 0:
         try:
-            coord_str = geocode_address(driver_loc)
+            coord_str = await geocode_address(driver_loc)
             lat_s, lng_s = coord_str.split(",", 1)
             lat_bd, lng_bd = float(lat_s), float(lng_s)
             return {
@@ -2343,8 +3756,9 @@ async def current_route_preview(
     effective_pickups = [p for p in pickups if (p or "").strip()]
     k = len(effective_pickups)
     addresses = [driver_loc] + list(effective_pickups) + list(deliveries) + list(waypoints)
-    coords = geocode_addresses(addresses)
-    matrix = get_duration_matrix(coords, tactics=tactics)
+    matrix_stats: Dict[str, Any] = {}
+    coords = await geocode_addresses(addresses, stats=matrix_stats)
+    matrix = await get_duration_matrix(coords, tactics=tactics, stats=matrix_stats)
     # 配对：仅对「未上车」的乘客建立接客->送客约束
     pickup_delivery_pairs: List[Tuple[int, int]] = []
     for i in range(n):
@@ -2353,22 +3767,17 @@ async def current_route_preview(
             pickup_node = 1 + pickup_ord
             delivery_node = 1 + k + i
             pickup_delivery_pairs.append((pickup_node, delivery_node))
-    route_indices, total_time = solve_pdp_route_flexible(matrix, pickup_delivery_pairs)
+    solver_stats: Dict[str, Any] = {}
+    route_indices, total_time = await solver_pool.solve_pdp_route_flexible(
+        matrix, pickup_delivery_pairs, stats=solver_stats, budget_ms=ROUTE_PREVIEW_SOLVE_BUDGET_MS
+    )
     if not route_indices:
         # 无解强诊断：快速判断是约束冲突还是矩阵异常（如大量 0/极值）
         n_nodes = len(matrix)
-        edge_values: List[int] = []
-        for i in range(n_nodes):
-            for j in range(n_nodes):
-                if i == j:
-                    continue
-                try:
-                    edge_values.append(int(matrix[i][j]))
-                except Exception:
-                    edge_values.append(0)
-        zero_edges = sum(1 for v in edge_values if v <= 0)
-        min_edge = min(edge_values) if edge_values else 0
-        max_edge = max(edge_values) if edge_values else 0
+        edge_stats = matrix.edge_stats()
+        zero_edges = edge_stats["zero_edges"]
+        min_edge = edge_stats["min_edge"]
+        max_edge = edge_stats["max_edge"]
         logger.error(
             "current_route_preview OR-Tools无解: driver_id=%s tactics=%s n_nodes=%s n_pairs=%s n_pickups=%s n_deliveries=%s n_waypoints=%s zero_edges=%s min_edge=%s max_edge=%s pickup_delivery_pairs=%s",
             driver_id,
@@ -2390,8 +3799,11 @@ async def current_route_preview(
 
     # 关键排查日志：明确本次是否兜底及触发原因
     logger.info(
-        "current_route_preview 求解结果: driver_id=%s used_fallback=%s reason=%s tactics=%s n_pickups=%s n_deliveries=%s n_waypoints=%s solver_route=%s final_route=%s total_time=%s",
+        "current_route_preview 求解结果: driver_id=%s engine=%s solve_ms=%s stop_reason=%s used_fallback=%s reason=%s tactics=%s n_pickups=%s n_deliveries=%s n_waypoints=%s solver_route=%s final_route=%s total_time=%s",
         driver_id,
+        solver_stats.get("engine"),
+        solver_stats.get("solve_ms"),
+        solver_stats.get("stop_reason"),
         used_fallback,
         fallback_reason,
         tactics,
@@ -2437,14 +3849,35 @@ async def current_route_preview(
     all_paths: List[List[List[float]]] = []
     route_durations: List[int] = []
     route_steps: List[Dict[str, Any]] = []
+    geometry_stats: Dict[str, Any] = {}
     try:
-        all_paths, route_durations, route_steps = fetch_driving_route_path(
-            route_coords, plate_number=plate_number, cartype=cartype, tactics=tactics
+        all_paths, route_durations, route_steps = await fetch_driving_route_path(
+            route_coords, plate_number=plate_number, cartype=cartype, tactics=tactics, stats=geometry_stats
         )
     except Exception as e:
         logger.warning("获取驾车路径失败（前端将用站点折线或分段规划）: %s", e)
-
-    return {
+    # 按前端缩放级别抽稀（约 ROUTE_SIMPLIFY_PIXELS 像素容差），画线观感不变、载荷小一个数量级；
+    # 响应带 simplify_zoom（几何可用的最细级别），前端放大超过该级时按新级别重新请求
+    raw_points = count_points(all_paths, route_steps)
+    zoom = req.get("zoom")
+    simplify_zoom = clamp_zoom(zoom if isinstance(zoom, (int, float)) else None)
+    tolerance_m = zoom_tolerance_meters(simplify_zoom, ROUTE_SIMPLIFY_PIXELS)
+    if tolerance_m > 0:
+        all_paths, route_steps = simplify_route_geometry(all_paths, route_steps, tolerance_m)
+    else:
+        simplify_zoom = float(MAX_ZOOM)
+    geometry_stats.update(
+        {"raw_points": raw_points, "points": count_points(all_paths, route_steps), "tolerance_m": round(tolerance_m, 2)}
+    )
+    if out_coord_type != BD09:
+        route_coords = convert_points(route_coords, BD09, out_coord_type)
+        all_paths, route_steps = convert_route_geometry(all_paths, route_steps, BD09, out_coord_type)
+    path_encoding: Optional[str] = None
+    if _wants_encoded_polyline(request):
+        all_paths, route_steps = encode_route_geometry(all_paths, route_steps, POLYLINE_PRECISION)
+        path_encoding = f"polyline{POLYLINE_PRECISION}"
+
+    out = {
         "route_addresses": route_addresses,
         "route_coords": route_coords,
         "route_paths": all_paths,
@@ -2453,6 +3886,7 @@ async def current_route_preview(
         "point_types": point_types,
         "point_labels": point_labels,
         "total_time_seconds": total_time,
+        "simplify_zoom": simplify_zoom,
         "debug": {
             "solver_route_indices": solver_route_indices,
             "final_route_indices": route_indices,
@@ -2460,8 +3894,18 @@ async def current_route_preview(
             "fallback_reason": fallback_reason,
             "pickup_delivery_pairs": pickup_delivery_pairs,
             "matrix_size": len(matrix),
+            "matrix_stats": matrix_stats,
+            "solver_stats": solver_stats,
+            "geometry_stats": geometry_stats,
         },
     }
+    if path_encoding:
+        out["path_encoding"] = path_encoding
+    if out_coord_type != BD09:
+        out["coord_type"] = out_coord_type
+    if matrix_stats.get("degraded") or geometry_stats.get("degraded"):
+        out["degraded"] = True
+    return out
 
 
 @app.post("/probe_publish_trip")
@@ -2474,7 +3918,7 @@ async def probe_publish_trip(req: dict) -> dict:
     """
     driver_id = (req.get("driver_id") or "").strip() or None
     if driver_id:
-        _load_planned_trip_from_db(driver_id)
+        await _load_planned_trip_from_db(driver_id)
     try:
         state = req.get("current_state") or {}
         driver_loc = (state.get("driver_loc") or "").strip()
@@ -2539,9 +3983,9 @@ async def probe_publish_trip(req: dict) -> dict:
         return _resp(driver_loc, driver_loc, "", "当前无已接单，起点=终点=司机位置；探针可暂不发布或按需填写")
 
     addresses = [driver_loc] + list(pickups) + list(deliveries)
-    coords = geocode_addresses(addresses)
-    matrix = get_duration_matrix(coords)
-    route_indices, _ = solve_pdp_route(matrix, len(pickups))
+    coords = await geocode_addresses(addresses)
+    matrix = await get_duration_matrix(coords)
+    route_indices, _ = await solver_pool.solve_pdp_route(matrix, len(pickups))
     if not route_indices:
         raise HTTPException(status_code=422, detail="无法规划出路线")
 
@@ -2623,7 +4067,19 @@ async def evaluate_new_order(req: EvaluateRequest) -> dict:
     """
     评估新订单是否值得接：绕路时间 <= 阈值则视为顺路单并推送 Bark。
     请求体可带 driver_id：多司机时按该司机的模式与参数决定是否推送、用哪档绕路/高收益阈值。
+    抢单时效敏感，评估中的百度请求按实时优先级调度，可用 AK 池为其预留的配额。
+    百度熔断期间改用过期缓存腿 / 离线估算照常评估与推送，响应带 degraded: true 与 degraded_reason。
     """
+    map_stats: Dict[str, Any] = {}
+    with quota_priority(PRIORITY_REALTIME):
+        result = await _evaluate_new_order(req, map_stats)
+    if map_stats.get("degraded"):
+        result["degraded"] = True
+        result["degraded_reason"] = "百度地图服务异常，耗时为缓存或离线估算值"
+    return result
+
+
+async def _evaluate_new_order(req: EvaluateRequest, map_stats: Dict[str, Any]) -> dict:
     current = req.current_state
     new_order = req.new_order
     driver_id = (req.driver_id or "").strip() or None
@@ -2631,11 +4087,11 @@ async def evaluate_new_order(req: EvaluateRequest) -> dict:
     cfg = _get_mode_config()
     driver_bark_key: Optional[str] = None
     if driver_id:
-        row = _get_driver_mode_from_db(driver_id)
+        row = await _get_driver_mode_from_db(driver_id)
         if row:
             driver_mode = row["mode"]
             cfg = row["config"]
-        driver_bark_key = _get_bark_key_for_driver(driver_id)
+        driver_bark_key = await _get_bark_key_for_driver(driver_id)
 
     # ---------- 0. 调度模式（按该司机设置） ----------
     if driver_mode == "pause":
@@ -2666,23 +4122,34 @@ async def evaluate_new_order(req: EvaluateRequest) -> dict:
             new_order.price,
         )
 
+        # ---------- 2. 地理编码 + 耗时矩阵：整单只做一次 ----------
+        # 并集节点：0=司机, 1..P=已接单起点, 1+P..P+D=已接单终点, 末两位=新单起点/终点。
+        # 不接/接新单两条路线（以及模式3 的送客点、时效判断）都从这张超集矩阵切子矩阵，每次评估至多一次矩阵调用。
+        num_pickups = len(current.pickups)
+        num_deliveries = len(current.deliveries)
+        union_addresses = [current.driver_loc] + current.pickups + current.deliveries + [new_order.pickup, new_order.delivery]
+        union_coords = await geocode_addresses(union_addresses, stats=map_stats)
+        union_matrix = await get_duration_matrix(union_coords, stats=map_stats)
+        pickup_nodes = [1 + i for i in range(num_pickups)]
+        delivery_nodes = [1 + num_pickups + i for i in range(num_deliveries)]
+        new_pickup_node = 1 + num_pickups + num_deliveries
+        new_delivery_node = new_pickup_node + 1
+
         # ---------- 模式3 专用：预估下一送客点 → 周边时效 + 剩余路线耽误（可串行：每次送客前都按此规则找单） ----------
         mode3_max_pickup = int(cfg.get("mode3_max_minutes_to_pickup") or MODE3_MAX_MINUTES_TO_PICKUP)
         mode3_max_detour = int(cfg.get("mode3_max_detour_minutes") or MODE3_MAX_DETOUR_MINUTES)
-        if driver_mode == "mode3" and len(current.deliveries) >= 1:
+        if driver_mode == "mode3" and num_deliveries >= 1:
             # 根据当前位到各送客点耗时，预估「即将放下客人」的地点（取最近的一个）
-            addr_eta = [current.driver_loc] + current.deliveries
-            coords_eta = geocode_addresses(addr_eta)
-            matrix_eta = get_duration_matrix(coords_eta)
-            j = min(range(len(current.deliveries)), key=lambda i: matrix_eta[0][i + 1])
+            j = min(range(num_deliveries), key=lambda i: union_matrix[0, delivery_nodes[i]])
+            drop_node = delivery_nodes[j]
             drop_location = current.deliveries[j]
-            eta_seconds = matrix_eta[0][j + 1]
+            eta_seconds = union_matrix[0, drop_node]
             eta_minutes = round(eta_seconds / 60, 1)
             remaining_pickups = [p for i, p in enumerate(current.pickups) if i != j]
             remaining_deliveries = [d for i, d in enumerate(current.deliveries) if i != j]
 
             # 新单起点须在「预估送客点」周边时效内（不是当前位）
-            to_pickup_seconds = get_duration_between(drop_location, new_order.pickup)
+            to_pickup_seconds = union_matrix[drop_node, new_pickup_node]
             to_pickup_minutes = to_pickup_seconds / 60
             if to_pickup_minutes > mode3_max_pickup:
                 return {
@@ -2691,17 +4158,18 @@ async def evaluate_new_order(req: EvaluateRequest) -> dict:
                 }
 
             # 剩余路线：不接 vs 接该单，看耽误是否在「不能耽误太久」内
-            old_addr = [drop_location] + remaining_pickups + remaining_deliveries
+            remaining_pickup_nodes = [n for i, n in enumerate(pickup_nodes) if i != j]
+            remaining_delivery_nodes = [n for i, n in enumerate(delivery_nodes) if i != j]
             new_addr = [drop_location] + remaining_pickups + [new_order.pickup] + remaining_deliveries + [new_order.delivery]
-            old_coords = geocode_addresses(old_addr)
-            new_coords = geocode_addresses(new_addr)
-            old_matrix = get_duration_matrix(old_coords)
-            new_matrix = get_duration_matrix(new_coords)
-            _, old_total = solve_pdp_route(old_matrix, len(remaining_pickups))
-            new_route_idx, new_total = solve_pdp_route(new_matrix, len(remaining_pickups) + 1)
+            old_matrix = union_matrix.submatrix([drop_node] + remaining_pickup_nodes + remaining_delivery_nodes)
+            new_matrix = union_matrix.submatrix(
+                [drop_node] + remaining_pickup_nodes + [new_pickup_node] + remaining_delivery_nodes + [new_delivery_node],
+            )
+            new_route_idx, extra_seconds, detour_method = await solve_detour_with_insertion(
+                old_matrix, new_matrix, len(remaining_pickups), mode3_max_detour * 60
+            )
             if not new_route_idx:
                 return {"status": "rejected", "reason": "接入该单后剩余路线无法规划出合理顺序"}
-            extra_seconds = new_total - old_total
             extra_minutes = round(extra_seconds / 60, 1)
             if extra_seconds > mode3_max_detour * 60:
                 return {
@@ -2711,20 +4179,23 @@ async def evaluate_new_order(req: EvaluateRequest) -> dict:
 
             pushed_orders_cache[fingerprint] = now
             pending_response[fingerprint] = now
-            push_to_bark(
-                new_order.pickup,
-                new_order.delivery,
-                new_order.price,
-                extra_minutes,
-                fingerprint,
-                driver_bark_key=driver_bark_key,
-            )
-            push_to_supabase_realtime(
-                new_order.pickup,
-                new_order.delivery,
-                new_order.price,
-                extra_minutes,
-                fingerprint,
+            # Bark 与 Realtime 两路推送并发发出
+            await asyncio.gather(
+                push_to_bark(
+                    new_order.pickup,
+                    new_order.delivery,
+                    new_order.price,
+                    extra_minutes,
+                    fingerprint,
+                    driver_bark_key=driver_bark_key,
+                ),
+                push_to_supabase_realtime(
+                    new_order.pickup,
+                    new_order.delivery,
+                    new_order.price,
+                    extra_minutes,
+                    fingerprint,
+                ),
             )
             route_preview = [new_addr[i] for i in new_route_idx]
             return {
@@ -2735,25 +4206,35 @@ async def evaluate_new_order(req: EvaluateRequest) -> dict:
                 "new_route_preview": route_preview,
                 "eta_minutes_to_next_drop": eta_minutes,
                 "next_drop_address": drop_location,
+                "detour_method": detour_method,
             }
 
-        # ---------- 2. 地理编码（当前行程 + 新单） ----------
-        old_addresses = [current.driver_loc] + current.pickups + current.deliveries
-        old_coords = geocode_addresses(old_addresses)
-
+        # ---------- 3. 从超集矩阵切出「不接 / 接新单」两张子矩阵 ----------
         new_pickups = current.pickups + [new_order.pickup]
         new_deliveries = current.deliveries + [new_order.delivery]
         new_addresses = [current.driver_loc] + new_pickups + new_deliveries
-        new_coords = geocode_addresses(new_addresses)
+        old_matrix = union_matrix.submatrix([0] + pickup_nodes + delivery_nodes)
+        new_matrix = union_matrix.submatrix([0] + pickup_nodes + [new_pickup_node] + delivery_nodes + [new_delivery_node])
 
-        # ---------- 3. 耗时矩阵 ----------
-        old_matrix = get_duration_matrix(old_coords)
-        new_matrix = get_duration_matrix(new_coords)
+        # 模式2：规定耽误时间内可接；超过 detour_min 只在高收益时放宽到 detour_max（按该司机配置）
+        mode2_detour_min = int(cfg.get("mode2_detour_min") or MODE2_DETOUR_MINUTES_MIN)
+        mode2_detour_max = int(cfg.get("mode2_detour_max") or MODE2_DETOUR_MINUTES_MAX)
+        mode2_profit = float(cfg.get("mode2_high_profit_threshold") or MODE2_HIGH_PROFIT_THRESHOLD)
+        try:
+            price_val = float(new_order.price)
+        except (TypeError, ValueError):
+            price_val = 0
+        # 本单适用的绕路阈值（秒），供插入预筛判断是否需要完整求解
+        if driver_mode == "mode2":
+            detour_threshold_seconds = (mode2_detour_max if price_val >= mode2_profit else mode2_detour_min) * 60
+        elif driver_mode == "mode3":
+            detour_threshold_seconds = float("inf")
+        else:
+            detour_threshold_seconds = MAX_DETOUR_SECONDS
 
-        # ---------- 4. 运筹学路径规划：不接新单 vs 接新单 ----------
-        _, old_total_time = solve_pdp_route(old_matrix, len(current.pickups))
-        new_route_indices, new_total_time = solve_pdp_route(
-            new_matrix, len(new_pickups)
+        # ---------- 4. 运筹学路径规划：不接新单 vs 接新单（先插入预筛，阈值附近才完整求解） ----------
+        new_route_indices, extra_time_seconds, detour_method = await solve_detour_with_insertion(
+            old_matrix, new_matrix, len(current.pickups), detour_threshold_seconds
         )
 
         if not new_route_indices:
@@ -2761,22 +4242,17 @@ async def evaluate_new_order(req: EvaluateRequest) -> dict:
             return {"status": "rejected", "reason": "无法规划出符合逻辑的合并路线"}
 
         # ---------- 5. 商业决策：绕路/时效判定（模式2 或 模式3 无待送客时） ----------
-        extra_time_seconds = new_total_time - old_total_time
         extra_time_minutes = round(extra_time_seconds / 60, 1)
 
         # 模式3 且当前没有待送客：按「当前位→新单起点」时效卡
-        if driver_mode == "mode3" and len(current.deliveries) == 0:
-            to_pickup_seconds = get_duration_between(current.driver_loc, new_order.pickup)
+        if driver_mode == "mode3" and num_deliveries == 0:
+            to_pickup_seconds = union_matrix[0, new_pickup_node]
             if to_pickup_seconds > mode3_max_pickup * 60:
                 return {
                     "status": "rejected",
                     "reason": f"新单起点距当前位置约 {round(to_pickup_seconds/60, 1)} 分钟，超过设定时效 {mode3_max_pickup} 分钟",
                 }
 
-        # 模式2：规定耽误时间内可接；超过 detour_min 只在高收益时放宽到 detour_max（按该司机配置）
-        mode2_detour_min = int(cfg.get("mode2_detour_min") or MODE2_DETOUR_MINUTES_MIN)
-        mode2_detour_max = int(cfg.get("mode2_detour_max") or MODE2_DETOUR_MINUTES_MAX)
-        mode2_profit = float(cfg.get("mode2_high_profit_threshold") or MODE2_HIGH_PROFIT_THRESHOLD)
         if driver_mode == "mode2":
             detour_max_seconds = mode2_detour_max * 60
             detour_min_seconds = mode2_detour_min * 60
@@ -2786,10 +4262,6 @@ async def evaluate_new_order(req: EvaluateRequest) -> dict:
                     "reason": f"绕路将增加 {extra_time_minutes} 分钟，超过最大允许 {mode2_detour_max} 分钟",
                 }
             if extra_time_seconds > detour_min_seconds:
-                try:
-                    price_val = float(new_order.price)
-                except (TypeError, ValueError):
-                    price_val = 0
                 if price_val < mode2_profit:
                     return {
                         "status": "rejected",
@@ -2805,20 +4277,23 @@ async def evaluate_new_order(req: EvaluateRequest) -> dict:
         # ---------- 6. 接单：写缓存 + 待响应 + Bark 推送 ----------
         pushed_orders_cache[fingerprint] = now
         pending_response[fingerprint] = now
-        push_to_bark(
-            new_order.pickup,
-            new_order.delivery,
-            new_order.price,
-            extra_time_minutes,
-            fingerprint,
-            driver_bark_key=driver_bark_key,
-        )
-        push_to_supabase_realtime(
-            new_order.pickup,
-            new_order.delivery,
-            new_order.price,
-            extra_time_minutes,
-            fingerprint,
+        # Bark 与 Realtime 两路推送并发发出
+        await asyncio.gather(
+            push_to_bark(
+                new_order.pickup,
+                new_order.delivery,
+                new_order.price,
+                extra_time_minutes,
+                fingerprint,
+                driver_bark_key=driver_bark_key,
+            ),
+            push_to_supabase_realtime(
+                new_order.pickup,
+                new_order.delivery,
+                new_order.price,
+                extra_time_minutes,
+                fingerprint,
+            ),
         )
         route_preview = [new_addresses[i] for i in new_route_indices]
 
@@ -2828,6 +4303,7 @@ async def evaluate_new_order(req: EvaluateRequest) -> dict:
             "detour_minutes": extra_time_minutes,
             "profit": new_order.price,
             "new_route_preview": route_preview,
+            "detour_method": detour_method,
         }
 
     except HTTPException:
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+路线求解进程池：OR-Tools / 精确 DP 求解放到独立进程执行，不占用 uvicorn 事件循环。
+- 进程数默认按 CPU 核数，多司机预览、探子评估可在多核上并行求解；
+- 异步提交：await solver_pool.solve_pdp_route_flexible(...)，返回值与 route_solver 同名函数一致；
+  矩阵传 DurationMatrix 时按一整块 int32 内存序列化给子进程，不再逐元素序列化 Python int；
+- 每个任务有超时（默认按求解预算 + 宽限），超时按无解 (None, 0) 返回并计数；
+- 统计：提交/完成/失败/超时次数、在途任务数与峰值、排队与执行耗时，供 /cache_stats 展示。
+进程以 spawn 方式启动（不继承主进程的线程与连接），经 uvicorn 启动时子进程只导入本模块与 route_solver。
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+import route_solver
+from duration_matrix import MatrixLike
+
+logger = logging.getLogger(__name__)
+
+# 未给求解预算时的任务超时；给了预算时超时 = 预算 + 宽限
+JOB_TIMEOUT_SECONDS = 20.0
+JOB_TIMEOUT_GRACE_SECONDS = 5.0
+
+
+def _init_worker(solver_config: Dict[str, Any]) -> None:
+    """子进程初始化：同步主进程的求解策略配置。"""
+    route_solver.configure(**solver_config)
+
+
+def _run_solver_job(name: str, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Tuple[Any, Dict[str, Any], float]:
+    """在子进程内执行 route_solver 的求解函数，返回 (结果, 求解统计, 执行毫秒)。"""
+    started = time.perf_counter()
+    stats: Dict[str, Any] = {}
+    result = getattr(route_solver, name)(*args, stats=stats, **kwargs)
+    return result, stats, (time.perf_counter() - started) * 1000
+
+
+class SolverPool:
+    """
+    求解进程池（懒创建）。进程池异常退出（如子进程被 OOM 杀掉）时自动重建，
+    本次任务退回到线程池执行，仍不阻塞事件循环。
+    """
+
+    def __init__(self, max_workers: int = 0, job_timeout_seconds: float = JOB_TIMEOUT_SECONDS) -> None:
+        self.max_workers = self._resolve_workers(max_workers)
+        self.job_timeout_seconds = max(1.0, float(job_timeout_seconds))
+        self.solver_config: Dict[str, Any] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.restarts = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.queue_wait_ms_total = 0.0
+        self.exec_ms_total = 0.0
+
+    @staticmethod
+    def _resolve_workers(max_workers: int) -> int:
+        # 0 表示按 CPU 核数
+        return max(1, int(max_workers) if max_workers and int(max_workers) > 0 else (os.cpu_count() or 1))
+
+    def configure(
+        self,
+        max_workers: Optional[int] = None,
+        job_timeout_seconds: Optional[float] = None,
+        solver_config: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """调整进程数 / 超时 / 求解策略；进程数或策略变化时下次提交重建进程池。"""
+        rebuild = False
+        if max_workers is not None:
+            workers = self._resolve_workers(max_workers)
+            rebuild = rebuild or workers != self.max_workers
+            self.max_workers = workers
+        if job_timeout_seconds is not None:
+            self.job_timeout_seconds = max(1.0, float(job_timeout_seconds))
+        if solver_config is not None:
+            rebuild = rebuild or solver_config != self.solver_config
+            self.solver_config = dict(solver_config)
+            route_solver.configure(**self.solver_config)
+        if rebuild and self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _ensure_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.solver_config,),
+            )
+        return self._executor
+
+    async def submit(self, name: str, *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> Tuple[Any, Dict[str, Any]]:
+        """
+        提交 route_solver.<name> 到进程池并等待结果，返回 (结果, 求解统计)。
+        超时抛 asyncio.TimeoutError（子进程中的任务会继续跑完，但结果被丢弃）。
+        """
+        loop = asyncio.get_running_loop()
+        self.submitted += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        started = time.perf_counter()
+        try:
+            try:
+                future = loop.run_in_executor(self._ensure_executor(), _run_solver_job, name, args, kwargs)
+                result, stats, exec_ms = await asyncio.wait_for(future, timeout or self.job_timeout_seconds)
+            except BrokenProcessPool:
+                logger.warning("求解进程池异常退出，重建进程池，本次任务改在线程中执行")
+                self.restarts += 1
+                self._executor = None
+                future = loop.run_in_executor(None, _run_solver_job, name, args, kwargs)
+                result, stats, exec_ms = await asyncio.wait_for(future, timeout or self.job_timeout_seconds)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+        self.completed += 1
+        self.exec_ms_total += exec_ms
+        self.queue_wait_ms_total += max(0.0, (time.perf_counter() - started) * 1000 - exec_ms)
+        return result, stats
+
+    def _job_timeout(self, budget_ms: Optional[float]) -> float:
+        if budget_ms is None:
+            return self.job_timeout_seconds
+        return max(0.0, float(budget_ms)) / 1000 + JOB_TIMEOUT_GRACE_SECONDS
+
+    async def _solve(
+        self,
+        name: str,
+        matrix: MatrixLike,
+        arg: Any,
+        stats: Optional[Dict[str, Any]],
+        budget_ms: Optional[float],
+    ) -> Tuple[Optional[List[int]], int]:
+        try:
+            (route_indices, total_time), job_stats = await self.submit(
+                name, matrix, arg, budget_ms=budget_ms, timeout=self._job_timeout(budget_ms)
+            )
+        except asyncio.TimeoutError:
+            logger.warning("求解任务 %s 超时（节点数=%s），按无解处理", name, len(matrix))
+            route_indices, total_time, job_stats = None, 0, {"stop_reason": "job_timeout", "num_nodes": len(matrix)}
+        if stats is not None:
+            stats.update(job_stats)
+        return route_indices, total_time
+
+    async def solve_pdp_route(
+        self,
+        matrix: MatrixLike,
+        num_pickup_delivery_pairs: int,
+        stats: Optional[Dict[str, Any]] = None,
+        budget_ms: Optional[float] = None,
+    ) -> Tuple[Optional[List[int]], int]:
+        """进程池版 route_solver.solve_pdp_route。"""
+        return await self._solve("solve_pdp_route", matrix, num_pickup_delivery_pairs, stats, budget_ms)
+
+    async def solve_pdp_route_flexible(
+        self,
+        matrix: MatrixLike,
+        pickup_delivery_pairs: List[Tuple[int, int]],
+        stats: Optional[Dict[str, Any]] = None,
+        budget_ms: Optional[float] = None,
+    ) -> Tuple[Optional[List[int]], int]:
+        """进程池版 route_solver.solve_pdp_route_flexible。"""
+        return await self._solve("solve_pdp_route_flexible", matrix, pickup_delivery_pairs, stats, budget_ms)
+
+    async def solve_pdp_prize_collecting(
+        self,
+        matrix: MatrixLike,
+        required_pairs: List[Tuple[int, int]],
+        optional_pairs: List[Tuple[int, int]],
+        penalties: List[int],
+        max_selected: int,
+        arrival_limits: Optional[Dict[int, int]] = None,
+        stats: Optional[Dict[str, Any]] = None,
+        budget_ms: Optional[float] = None,
+    ) -> Tuple[Optional[List[int]], int]:
+        """进程池版 route_solver.solve_pdp_prize_collecting。"""
+        try:
+            (route_indices, total_time), job_stats = await self.submit(
+                "solve_pdp_prize_collecting",
+                matrix,
+                required_pairs,
+                optional_pairs,
+                penalties,
+                max_selected,
+                arrival_limits=arrival_limits,
+                budget_ms=budget_ms,
+                timeout=self._job_timeout(budget_ms),
+            )
+        except asyncio.TimeoutError:
+            logger.warning("k 选 N 求解超时（节点数=%s），按无解处理", len(matrix))
+            route_indices, total_time, job_stats = None, 0, {"stop_reason": "job_timeout", "num_nodes": len(matrix)}
+        if stats is not None:
+            stats.update(job_stats)
+        return route_indices, total_time
+
+    async def warm_up(self) -> None:
+        """启动时预热：拉起全部子进程并完成 OR-Tools 导入，避免首个请求承担进程启动耗时。"""
+        try:
+            await asyncio.gather(*[self.submit("solve_pdp_route", [[0]], 0) for _ in range(self.max_workers)])
+        except Exception as e:
+            logger.warning("求解进程池预热失败: %s", e)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        done = self.completed
+        return {
+            "workers": self.max_workers,
+            "started": self._executor is not None,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "restarts": self.restarts,
+            "in_flight": self.in_flight,
+            "queue_depth": max(0, self.in_flight - self.max_workers),
+            "max_in_flight": self.max_in_flight,
+            "avg_queue_wait_ms": round(self.queue_wait_ms_total / done, 2) if done else 0.0,
+            "avg_exec_ms": round(self.exec_ms_total / done, 2) if done else 0.0,
+        }
+
+
+solver_pool = SolverPool()
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""测试直接导入仓库根目录下的模块（smartdiaodu 等均为顶层模块，未打包安装）。"""
+import importlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def sd(tmp_path_factory):
+    """导入 smartdiaodu 主模块；地图缓存库放到临时目录，不碰工作目录下的 smartdiaodu_cache.sqlite3。"""
+    os.environ.setdefault("MAP_CACHE_DB_PATH", str(tmp_path_factory.mktemp("map_cache") / "cache.sqlite3"))
+    return importlib.import_module("smartdiaodu")
+
+
+class FakeClock:
+    """可手动拨动的 time.monotonic 替身。"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    """fake_clock(module)：把 module.time.monotonic 换成 FakeClock 并返回该时钟，测试里拨动 clock.now。"""
+
+    def install(module):
+        clock = FakeClock()
+        monkeypatch.setattr(module.time, "monotonic", clock)
+        return clock
+
+    return install
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""baidu_quota：令牌桶 QPS 计量、按优先级的日配额、AK 级失败停用与退回预占用量。"""
+import asyncio
+
+import pytest
+
+import baidu_quota
+from baidu_quota import (
+    PRIORITY_NORMAL,
+    PRIORITY_REALTIME,
+    AkQuotaExhausted,
+    BaiduAkPool,
+    TokenBucket,
+    current_priority,
+    parse_ak_list,
+    parse_daily_quota,
+    quota_priority,
+)
+
+
+@pytest.fixture
+def clock(fake_clock):
+    return fake_clock(baidu_quota)
+
+
+def test_token_bucket_burst_then_queue(clock):
+    bucket = TokenBucket(rate=5, capacity=2)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    # 突发用完后按到达顺序排队：欠 1 个令牌等 0.2 秒，欠 2 个等 0.4 秒
+    assert bucket.reserve() == pytest.approx(0.2)
+    assert bucket.reserve() == pytest.approx(0.4)
+    assert bucket.stats()["throttled"] == 2
+    clock.now += 1.0
+    # 1 秒补 5 个，抵掉欠额后余 3，但不超过容量 2
+    assert bucket.wait_time() == 0.0
+    assert bucket.stats()["available_tokens"] == 2
+
+
+def test_token_bucket_drain(clock):
+    bucket = TokenBucket(rate=10)
+    bucket.drain(1.0)
+    assert bucket.wait_time() == pytest.approx(1.1)
+    clock.now += 1.1
+    assert bucket.wait_time() == pytest.approx(0.0)
+
+
+def _acquire(pool, service, priority=None, exclude=()):
+    return asyncio.run(pool.acquire(service, priority=priority, exclude=exclude))
+
+
+def test_daily_quota_reserves_share_for_realtime():
+    pool = BaiduAkPool(["AK_ONE_0001"], qps=1000, daily_quota={"geocoding": 10}, realtime_reserve=0.2)
+    for _ in range(8):
+        _acquire(pool, "geocoding", PRIORITY_NORMAL)
+    with pytest.raises(AkQuotaExhausted):
+        _acquire(pool, "geocoding", PRIORITY_NORMAL)
+    # 实时评估还能用到预留的 20%
+    _acquire(pool, "geocoding", PRIORITY_REALTIME)
+    _acquire(pool, "geocoding", PRIORITY_REALTIME)
+    with pytest.raises(AkQuotaExhausted):
+        _acquire(pool, "geocoding", PRIORITY_REALTIME)
+    usage = pool.stats()["usage"]["AK_ONE***/geocoding"]
+    assert usage["used_today"] == 10
+    assert usage["used_by_priority"] == {"realtime": 2, "normal": 8}
+    assert usage["remaining"] == 0
+    assert pool.stats()["rejected"] == {"realtime": 1, "normal": 1}
+
+
+def test_services_are_metered_separately():
+    pool = BaiduAkPool(["AK_ONE_0001"], qps=1000, daily_quota=parse_daily_quota("geocoding=1"), realtime_reserve=0.0)
+    _acquire(pool, "geocoding")
+    with pytest.raises(AkQuotaExhausted):
+        _acquire(pool, "geocoding")
+    # 未配置配额的服务不限
+    for _ in range(5):
+        _acquire(pool, "routematrix")
+
+
+def test_acquire_balances_by_usage_ratio():
+    pool = BaiduAkPool(["AK_ONE_0001", "AK_TWO_0002"], qps=1000, daily_quota={"*": 100}, realtime_reserve=0.0)
+    picked = [_acquire(pool, "routematrix") for _ in range(6)]
+    assert picked.count("AK_ONE_0001") == picked.count("AK_TWO_0002") == 3
+
+
+def test_network_error_and_unparsable_status_refund():
+    pool = BaiduAkPool(["AK_ONE_0001"], qps=1000, daily_quota={"*": 100})
+    ak = _acquire(pool, "geocoding")
+    assert pool.record(ak, "geocoding", None) is False
+    ak = _acquire(pool, "geocoding")
+    assert pool.record(ak, "geocoding", "oops") is False
+    usage = pool.stats()["usage"]["AK_ONE***/geocoding"]
+    assert usage["used_today"] == 0 and usage["errors"] == 2
+
+
+def test_business_failure_still_counts():
+    pool = BaiduAkPool(["AK_ONE_0001"], qps=1000, daily_quota={"*": 100})
+    ak = _acquire(pool, "geocoding")
+    assert pool.record(ak, "geocoding", 1) is False
+    ak = _acquire(pool, "geocoding")
+    assert pool.record(ak, "geocoding", 0) is False
+    usage = pool.stats()["usage"]["AK_ONE***/geocoding"]
+    assert usage["used_today"] == 2 and usage["ok"] == 1 and usage["failures"] == {"1": 1}
+
+
+def test_daily_quota_status_blocks_ak_and_fails_over():
+    pool = BaiduAkPool(["AK_ONE_0001", "AK_TWO_0002"], qps=1000)
+    ak = _acquire(pool, "routematrix")
+    assert ak == "AK_ONE_0001"
+    # 百度报天配额超限：该 AK 在该服务上停到次日零点，预占退回，调用方换 AK
+    assert pool.record(ak, "routematrix", 302) is True
+    assert _acquire(pool, "routematrix", exclude=[ak]) == "AK_TWO_0002"
+    assert _acquire(pool, "routematrix") == "AK_TWO_0002"
+    usage = pool.stats()["usage"]["AK_ONE***/routematrix"]
+    assert usage["used_today"] == 0 and usage["blocked_reason"] == "daily_quota" and usage["blocked_seconds"] > 0
+    # 其他服务不受影响
+    assert _acquire(pool, "geocoding") == "AK_ONE_0001"
+
+
+def test_denied_and_qps_exceeded_statuses():
+    pool = BaiduAkPool(["AK_ONE_0001"], qps=1000)
+    ak = _acquire(pool, "geocoding")
+    assert pool.record(ak, "geocoding", 401) is True
+    # 并发超限只冷却令牌桶，不停用
+    assert pool.stats()["usage"]["AK_ONE***/geocoding"]["blocked_reason"] == ""
+    ak = _acquire(pool, "direction")
+    assert pool.record(ak, "direction", 101) is True
+    assert pool.stats()["usage"]["AK_ONE***/direction"]["blocked_reason"] == "denied"
+    with pytest.raises(AkQuotaExhausted):
+        _acquire(pool, "direction")
+
+
+def test_refund_uses_acquire_priority():
+    pool = BaiduAkPool(["AK_ONE_0001"], qps=1000)
+    with quota_priority(PRIORITY_REALTIME):
+        ak = _acquire(pool, "geocoding")
+    pool.refund(ak, "geocoding", PRIORITY_REALTIME)
+    assert pool.stats()["usage"]["AK_ONE***/geocoding"]["used_by_priority"] == {"realtime": 0, "normal": 0}
+
+
+def test_day_rollover_resets_usage_and_quota_block():
+    pool = BaiduAkPool(["AK_ONE_0001"], qps=1000, daily_quota={"*": 1}, realtime_reserve=0.0)
+    ak = _acquire(pool, "geocoding")
+    pool.record(ak, "geocoding", 4)
+    with pytest.raises(AkQuotaExhausted):
+        _acquire(pool, "geocoding")
+    pool._day = "2000-01-01"
+    assert _acquire(pool, "geocoding") == "AK_ONE_0001"
+
+
+def test_normal_priority_uses_reduced_qps():
+    pool = BaiduAkPool(["AK_ONE_0001"], qps=10, realtime_reserve=0.5)
+    usage = pool._get_usage("AK_ONE_0001", "geocoding")
+    assert usage.bucket.rate == 10 and usage.normal_bucket.rate == 5
+
+
+def test_quota_priority_context():
+    assert current_priority() == PRIORITY_NORMAL
+    with quota_priority(PRIORITY_REALTIME):
+        assert current_priority() == PRIORITY_REALTIME
+        with quota_priority("bogus"):
+            assert current_priority() == PRIORITY_NORMAL
+    assert current_priority() == PRIORITY_NORMAL
+
+
+def test_parse_helpers():
+    assert parse_ak_list(" a1, b2;c3  a1 ") == ["a1", "b2", "c3", "a1"]
+    assert parse_daily_quota("5000") == {"*": 5000}
+    assert parse_daily_quota("geocoding=10, routematrix=x, =3, direction=-1") == {"geocoding": 10, "direction": 0}
+    assert parse_daily_quota("") == {}
+
+
+def test_stats_masks_ak():
+    pool = BaiduAkPool(["SECRETAK123456", "SECRETAK123456"], qps=1000)
+    _acquire(pool, "geocoding")
+    stats = pool.stats()
+    assert stats["aks"] == 1
+    assert list(stats["usage"]) == ["SECRET***/geocoding"]
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""circuit_breaker：closed → open → half_open → closed / open 的状态转换与通行证代数。"""
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture
+def clock(fake_clock):
+    return fake_clock(circuit_breaker)
+
+
+def _breaker(**kwargs):
+    options = dict(error_rate=0.5, slow_ms=1000, slow_rate=0.5, min_calls=4, window_seconds=30, open_seconds=10, probe_calls=1)
+    options.update(kwargs)
+    return CircuitBreaker("routematrix", **options)
+
+
+def _call(breaker, ok=True, elapsed_ms=10):
+    breaker.record(breaker.check(), ok, elapsed_ms)
+
+
+def _trip(breaker):
+    for _ in range(breaker.min_calls):
+        _call(breaker, ok=False)
+    assert breaker.state == OPEN
+
+
+def test_stays_closed_below_min_calls(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        _call(breaker, ok=False)
+    assert breaker.state == CLOSED
+
+
+def test_opens_on_error_rate(clock):
+    breaker = _breaker()
+    _call(breaker)
+    _call(breaker)
+    _call(breaker, ok=False)
+    assert breaker.state == CLOSED
+    _call(breaker, ok=False)
+    assert breaker.state == OPEN
+    assert breaker.stats()["last_open_reason"] == "失败率 2/4"
+    with pytest.raises(CircuitOpenError) as exc:
+        breaker.check()
+    assert exc.value.status_code == 503 and exc.value.retry_after == pytest.approx(10)
+    assert breaker.is_open()
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_opens_on_slow_rate(clock):
+    breaker = _breaker()
+    for _ in range(4):
+        _call(breaker, ok=True, elapsed_ms=1500)
+    assert breaker.state == OPEN
+    assert breaker.stats()["last_open_reason"].startswith("慢调用率 4/4")
+
+
+def test_window_expires_old_calls(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        _call(breaker, ok=False)
+    clock.now += 31
+    _call(breaker, ok=False)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 1
+
+
+def test_half_open_probe_success_closes(clock):
+    breaker = _breaker()
+    _trip(breaker)
+    clock.now += 10
+    assert breaker.state == HALF_OPEN
+    # 有探测名额时不算打开，调用方照常请求
+    assert not breaker.is_open()
+    permit = breaker.check()
+    assert permit.probe
+    # 名额占满后其余调用被拒绝
+    assert breaker.is_open()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    breaker.record(permit, True, 10)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 0
+
+
+def test_half_open_probe_failure_or_slow_reopens(clock):
+    breaker = _breaker()
+    _trip(breaker)
+    clock.now += 10
+    breaker.record(breaker.check(), False, 10)
+    assert breaker.state == OPEN and breaker.stats()["opened"] == 2
+    clock.now += 10
+    breaker.record(breaker.check(), True, 2000)
+    assert breaker.state == OPEN and breaker.stats()["last_open_reason"] == "探测耗时 2000 ms"
+
+
+def test_half_open_needs_all_probes(clock):
+    breaker = _breaker(probe_calls=2)
+    _trip(breaker)
+    clock.now += 10
+    first, second = breaker.check(), breaker.check()
+    breaker.record(first, True, 10)
+    assert breaker.state == HALF_OPEN
+    breaker.record(second, True, 10)
+    assert breaker.state == CLOSED
+
+
+def test_release_returns_probe_slot(clock):
+    breaker = _breaker()
+    _trip(breaker)
+    clock.now += 10
+    permit = breaker.check()
+    breaker.release(permit)
+    assert breaker.state == HALF_OPEN
+    assert breaker.check().probe
+
+
+def test_stale_closed_permit_is_not_a_probe(clock):
+    breaker = _breaker()
+    # closed 时放行的慢请求，在熔断、转半开之后才结束：结果丢弃，不能当成探测成功把熔断器闭合
+    stale = breaker.check()
+    _trip(breaker)
+    clock.now += 10
+    assert breaker.state == HALF_OPEN
+    breaker.record(stale, True, 10)
+    assert breaker.state == HALF_OPEN
+    assert breaker.check().probe
+
+
+def test_stale_result_not_counted_after_reclose(clock):
+    breaker = _breaker()
+    stale = breaker.check()
+    _trip(breaker)
+    clock.now += 10
+    breaker.record(breaker.check(), True, 10)
+    assert breaker.state == CLOSED
+    breaker.record(stale, False, 10)
+    assert breaker.stats()["window_calls"] == 0
+
+
+def test_configure_clamps_values():
+    breaker = CircuitBreaker("geocoding", error_rate=5, min_calls=0, probe_calls=0, open_seconds=0)
+    assert breaker.error_rate == 1.0
+    assert breaker.min_calls == 1
+    assert breaker.probe_calls == 1
+    assert breaker.open_seconds == 0.1
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""coord_transform：六个方向的往返误差、境外不偏移、批量与单点一致。"""
+import itertools
+
+import numpy as np
+import pytest
+
+from coord_transform import (
+    BD09,
+    COORD_TYPES,
+    GCJ02,
+    WGS84,
+    convert_array,
+    convert_point,
+    convert_points,
+    normalize_coord_type,
+)
+
+# 约 0.1 米
+ROUND_TRIP_TOLERANCE_DEG = 1e-6
+
+
+def _china_points(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack((rng.uniform(18.5, 53.0, n), rng.uniform(74.0, 134.5, n)))
+
+
+@pytest.mark.parametrize("src,dst", list(itertools.permutations(COORD_TYPES, 2)))
+def test_round_trip_error(src, dst):
+    points = _china_points()
+    back = convert_array(convert_array(points, src, dst), dst, src)
+    assert float(np.max(np.abs(back - points))) < ROUND_TRIP_TOLERANCE_DEG
+
+
+@pytest.mark.parametrize("src,dst", list(itertools.permutations(COORD_TYPES, 2)))
+def test_conversion_moves_points(src, dst):
+    # 境内 GCJ02 偏移量级为数百米，BD09 再偏约 0.006 度；转换后不应与原坐标相同
+    points = _china_points(50, seed=1)
+    assert float(np.min(np.abs(convert_array(points, src, dst) - points).sum(axis=1))) > 1e-4
+
+
+def test_outside_china_has_no_gcj02_offset():
+    points = np.array([[48.8566, 2.3522], [35.6762, 139.6503], [-33.8688, 151.2093]])
+    assert np.array_equal(convert_array(points, WGS84, GCJ02), points)
+    assert np.array_equal(convert_array(points, GCJ02, WGS84), points)
+
+
+def test_batch_matches_single_point():
+    points = _china_points(20, seed=2).tolist()
+    batch = convert_points(points, WGS84, BD09)
+    for (lat, lng), expected in zip(points, batch):
+        assert convert_point(lat, lng, WGS84, BD09) == pytest.approx(tuple(expected), abs=1e-12)
+
+
+def test_same_system_and_empty_input():
+    points = _china_points(3)
+    out = convert_array(points, "bd09ll", "baidu")
+    assert np.array_equal(out, points) and out is not points
+    assert convert_points([], GCJ02, BD09) == []
+
+
+def test_normalize_coord_type_aliases():
+    assert normalize_coord_type(" GPS ") == WGS84
+    assert normalize_coord_type("gcj02ll") == GCJ02
+    assert normalize_coord_type("amap") == GCJ02
+    assert normalize_coord_type("BD09LL") == BD09
+    with pytest.raises(ValueError):
+        normalize_coord_type("mercator")
+
+
+def test_rejects_bad_shape():
+    with pytest.raises(ValueError):
+        convert_array(np.zeros((3, 3)), WGS84, GCJ02)
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""get_duration_matrix：按耗时腿缓存增量拼装，只请求缺失的行与列。"""
+import asyncio
+
+import numpy as np
+import pytest
+
+from map_cache import DurationLegCache
+from map_provider import MapProvider
+
+A, B, C, D = "32.00000,120.90000", "32.10000,121.00000", "32.20000,121.10000", "32.30000,121.20000"
+
+
+def _seconds(origin, dest):
+    """确定性的假耗时：起终点不同则不同。"""
+    (la, ga), (lb, gb) = (tuple(map(float, c.split(","))) for c in (origin, dest))
+    return int(round(abs(la - lb) * 10000 + abs(ga - gb) * 7000)) + 60
+
+
+class RecordingProvider(MapProvider):
+    """记录每次路网矩阵请求的起终点，按 _seconds 返回耗时。"""
+
+    name = "stub"
+
+    def __init__(self, cacheable=True):
+        self.cacheable = cacheable
+        self.requests = []
+
+    async def geocode(self, address, stats=None):
+        raise NotImplementedError
+
+    async def reverse_geocode(self, lat, lng, stats=None):
+        raise NotImplementedError
+
+    async def routematrix(self, origins, destinations, tactics, stats=None):
+        self._mark(stats)
+        self.requests.append((list(origins), list(destinations), tactics))
+        if stats is not None:
+            stats["baidu_requests"] = stats.get("baidu_requests", 0) + 1
+        return np.array([[_seconds(o, d) for d in destinations] for o in origins], dtype=np.int32)
+
+    async def driving_route(self, coords, tactics=None, plate_number=None, cartype=None, stats=None):
+        raise NotImplementedError
+
+
+@pytest.fixture
+def provider(sd, monkeypatch):
+    stub = RecordingProvider()
+    monkeypatch.setattr(sd, "_map_provider", stub)
+    monkeypatch.setattr(sd, "_duration_leg_cache", DurationLegCache())
+    return stub
+
+
+def _matrix(sd, coords, tactics=11):
+    stats = {}
+    matrix = asyncio.run(sd.get_duration_matrix(coords, tactics, stats=stats))
+    return matrix, stats
+
+
+def _expected(coords):
+    return [[0 if o == d else _seconds(o, d) for d in coords] for o in coords]
+
+
+def test_cold_fetches_all_rows_in_one_request(sd, provider):
+    matrix, stats = _matrix(sd, [A, B, C])
+    assert matrix.tolist() == _expected([A, B, C])
+    assert provider.requests == [([A, B, C], [A, B, C], 11)]
+    assert stats["legs_total"] == 6 and stats["legs_fetched"] == 6 and stats["legs_from_cache"] == 0
+    assert stats["provider"] == "stub"
+
+
+def test_warm_reuses_cached_legs(sd, provider):
+    _matrix(sd, [A, B, C])
+    provider.requests.clear()
+    matrix, stats = _matrix(sd, [C, A, B])
+    assert matrix.tolist() == _expected([C, A, B])
+    assert provider.requests == []
+    assert stats["legs_from_cache"] == 6 and stats["legs_fetched"] == 0 and stats["baidu_requests"] == 0
+
+
+def test_new_point_fetches_only_its_row_and_column(sd, provider):
+    _matrix(sd, [A, B, C])
+    provider.requests.clear()
+    matrix, stats = _matrix(sd, [A, B, C, D])
+    assert matrix.tolist() == _expected([A, B, C, D])
+    # 新点整行按行请求；旧点 → 新点这一列合并为一次请求，已缓存的 6 条腿不再请求
+    assert provider.requests == [([D], [A, B, C, D], 11), ([A, B, C], [D], 11)]
+    assert stats["legs_from_cache"] == 6 and stats["legs_fetched"] == 6
+    assert stats["baidu_requests"] == 2
+
+
+def test_single_missing_leg(sd, provider, monkeypatch):
+    _matrix(sd, [A, B, C])
+    # 缓存里只缺 B → C 这一条腿：只请求这一格
+    cache = DurationLegCache()
+    for o in (A, B, C):
+        for d in (A, B, C):
+            if o != d and (o, d) != (B, C):
+                cache.set_leg(o, d, 11, sd.time_bucket(), _seconds(o, d))
+    monkeypatch.setattr(sd, "_duration_leg_cache", cache)
+    provider.requests.clear()
+    matrix, stats = _matrix(sd, [A, B, C])
+    assert matrix.tolist() == _expected([A, B, C])
+    assert provider.requests == [([B], [C], 11)]
+    assert stats["legs_fetched"] == 1 and stats["legs_from_cache"] == 5
+
+
+def test_duplicate_coords_are_zero_without_request(sd, provider):
+    matrix, stats = _matrix(sd, [A, A])
+    assert matrix.tolist() == [[0, 0], [0, 0]]
+    assert provider.requests == [] and stats["legs_total"] == 0
+
+
+def test_tactics_are_part_of_the_leg_key(sd, provider):
+    _matrix(sd, [A, B], tactics=11)
+    _matrix(sd, [A, B], tactics=13)
+    # 策略 0 在矩阵接口按 11 请求，命中 11 的缓存
+    _matrix(sd, [A, B], tactics=0)
+    assert [r[2] for r in provider.requests] == [11, 13]
+
+
+def test_non_cacheable_result_not_stored(sd, provider):
+    provider.cacheable = False
+    _matrix(sd, [A, B])
+    _matrix(sd, [A, B])
+    # 离线估算 / 降级结果只用于本次，下次仍要请求
+    assert len(provider.requests) == 2
+
+
+def _due(sd, monkeypatch, legs):
+    cache = sd._duration_leg_cache
+    monkeypatch.setattr(cache, "hot_legs_due", lambda *args: list(legs))
+    return cache
+
+
+def test_refresh_hot_legs_goes_through_map_provider(sd, provider, monkeypatch):
+    cache = _due(sd, monkeypatch, [(A, B, 11), (B, A, 11)])
+    assert asyncio.run(sd.refresh_hot_duration_legs()) == 2
+    # 经 _map_provider 请求（录制模式下同样录入 fixture），起终点并集合成一次请求
+    assert provider.requests == [([A, B], [A, B], 11)]
+    assert cache.get_leg(A, B, 11, sd.time_bucket()) == _seconds(A, B)
+
+
+def test_refresh_hot_legs_skips_non_cacheable(sd, provider, monkeypatch):
+    provider.cacheable = False
+    cache = _due(sd, monkeypatch, [(A, B, 11)])
+    assert asyncio.run(sd.refresh_hot_duration_legs()) == 0
+    assert len(provider.requests) == 1
+    assert cache.get_leg(A, B, 11, sd.time_bucket()) is None
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""duration_matrix：DurationMatrix 的构造、子矩阵切片、边统计、内容哈希与序列化。"""
+import pickle
+
+import numpy as np
+import pytest
+
+from duration_matrix import DurationMatrix, as_array, as_rows
+
+ROWS = [
+    [0, 10, 20, 30],
+    [11, 0, 21, 31],
+    [12, 22, 0, 32],
+    [13, 23, 33, 0],
+]
+
+
+def test_construct_from_rows_and_legacy_access():
+    m = DurationMatrix(ROWS)
+    assert m.size == len(m) == 4
+    assert m.array.dtype == np.int32
+    assert m[1, 2] == 21 and isinstance(m[1, 2], int)
+    assert m[1][2] == 21
+    assert list(m) == ROWS and m.tolist() == ROWS
+    with pytest.raises(ValueError):
+        m.array[0, 0] = 5
+
+
+def test_int32_array_not_copied():
+    arr = np.ascontiguousarray(ROWS, dtype=np.int32)
+    m = DurationMatrix(arr)
+    assert m.array is arr
+    assert not arr.flags.writeable
+
+
+def test_rejects_non_square():
+    with pytest.raises(ValueError):
+        DurationMatrix([[0, 1, 2], [1, 0, 2]])
+
+
+def test_empty_matrix():
+    m = DurationMatrix([])
+    assert m.size == 0
+    assert m.edge_stats() == {"zero_edges": 0, "min_edge": 0, "max_edge": 0}
+
+
+def test_submatrix_picks_rows_and_columns_in_order():
+    m = DurationMatrix(ROWS)
+    sub = m.submatrix([3, 0, 2])
+    assert sub.tolist() == [
+        [0, 13, 33],
+        [30, 0, 20],
+        [32, 12, 0],
+    ]
+    # sub[a, b] == m[nodes[a], nodes[b]]
+    nodes = [3, 0, 2]
+    assert all(sub[a, b] == m[nodes[a], nodes[b]] for a in range(3) for b in range(3))
+    assert m.submatrix([]).size == 0
+
+
+def test_submatrix_with_repeated_node():
+    sub = DurationMatrix(ROWS).submatrix([1, 1])
+    assert sub.tolist() == [[0, 0], [0, 0]]
+    assert sub.edge_stats()["zero_edges"] == 2
+
+
+def test_edge_stats_ignores_diagonal():
+    stats = DurationMatrix(ROWS).edge_stats()
+    assert stats == {"zero_edges": 0, "min_edge": 10, "max_edge": 33}
+
+
+def test_edge_stats_counts_non_positive_edges():
+    rows = [row[:] for row in ROWS]
+    rows[0][1] = 0
+    rows[2][3] = -1
+    rows[1][1] = 99  # 对角线不计入
+    stats = DurationMatrix(rows).edge_stats()
+    assert stats == {"zero_edges": 2, "min_edge": -1, "max_edge": 33}
+
+
+def test_digest_equality_and_hash():
+    a = DurationMatrix(ROWS)
+    b = DurationMatrix(np.array(ROWS, dtype=np.int64))
+    assert a == b and hash(a) == hash(b) and a.digest() == b.digest()
+    c = DurationMatrix([[0, 1], [1, 0]])
+    assert a != c and a.digest() != c.digest()
+    assert {a: 1}[b] == 1
+
+
+def test_pickle_round_trip():
+    m = DurationMatrix(ROWS)
+    restored = pickle.loads(pickle.dumps(m))
+    assert restored == m and restored.digest() == m.digest()
+
+
+def test_as_rows_and_as_array():
+    m = DurationMatrix(ROWS)
+    assert as_rows(m) == ROWS
+    assert as_rows(ROWS) is ROWS
+    assert as_array(m) is m.array
+    arr = as_array(ROWS)
+    assert arr.dtype == np.int32 and arr.tolist() == ROWS
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""map_cache.grid_cell 与逆地理编码缓存：网格键稳定、同单元命中、跨单元不串用。"""
+import math
+import random
+
+import pytest
+
+from map_cache import ReverseGeocodeCache, grid_cell
+
+METERS_PER_DEG = 111320.0
+
+
+@pytest.mark.parametrize(
+    "lat,lng,cell_meters,key",
+    [
+        (31.2304, 121.4737, 40, "40:86914:289072"),
+        (32.3719, 120.5706, 40, "40:90090:283401"),
+        (39.9042, 116.4074, 100, "100:44421:99406"),
+        (-33.8688, 151.2093, 40, "40:-94257:349410"),
+        (0.0, 0.0, 40, "40:0:0"),
+    ],
+)
+def test_grid_cell_keys_are_stable(lat, lng, cell_meters, key):
+    # 键会持久化到磁盘缓存，算法变动会让已有缓存全部失效，这里固定几个样例
+    assert grid_cell(lat, lng, cell_meters) == key
+
+
+def _cell_center(lat, lng, cell_meters):
+    dlat = cell_meters / METERS_PER_DEG
+    row = math.floor(lat / dlat)
+    center_lat = (row + 0.5) * dlat
+    dlng = cell_meters / (METERS_PER_DEG * math.cos(math.radians(center_lat)))
+    return center_lat, (math.floor(lng / dlng) + 0.5) * dlng
+
+
+def test_jitter_inside_cell_keeps_key():
+    rng = random.Random(0)
+    for _ in range(200):
+        lat, lng = _cell_center(rng.uniform(18, 53), rng.uniform(74, 134), 40)
+        key = grid_cell(lat, lng, 40)
+        # 中心附近 ±15 米（小于半个单元）的抖动仍落在同一单元
+        jlat = lat + rng.uniform(-15, 15) / METERS_PER_DEG
+        jlng = lng + rng.uniform(-15, 15) / (METERS_PER_DEG * math.cos(math.radians(lat)))
+        assert grid_cell(jlat, jlng, 40) == key
+
+
+def test_points_a_cell_apart_differ():
+    lat, lng = _cell_center(32.0, 120.5, 40)
+    key = grid_cell(lat, lng, 40)
+    step_lat = 40 / METERS_PER_DEG
+    step_lng = 40 / (METERS_PER_DEG * math.cos(math.radians(lat)))
+    neighbours = {
+        grid_cell(lat + step_lat, lng, 40),
+        grid_cell(lat - step_lat, lng, 40),
+        grid_cell(lat, lng + step_lng, 40),
+        grid_cell(lat, lng - step_lng, 40),
+    }
+    assert key not in neighbours and len(neighbours) == 4
+
+
+def test_cell_size_is_part_of_key():
+    assert grid_cell(32.0, 120.5, 40).startswith("40:")
+    assert grid_cell(32.0, 120.5, 40) != grid_cell(32.0, 120.5, 80)
+    # 过小的边长按 1 米计
+    assert grid_cell(32.0, 120.5, 0) == grid_cell(32.0, 120.5, 1)
+
+
+def test_reverse_geocode_cache_hits_within_cell():
+    cache = ReverseGeocodeCache(cell_meters=40)
+    lat, lng = _cell_center(32.0, 120.5, 40)
+    cache.set_address(lat, lng, "人民路 1 号")
+    assert cache.get_address(lat + 5 / METERS_PER_DEG, lng) == "人民路 1 号"
+    assert cache.get_address(lat + 40 / METERS_PER_DEG, lng) is None
+    cache.set_address(lat, lng, "")
+    assert cache.get_address(lat, lng) == "人民路 1 号"
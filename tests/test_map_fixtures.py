@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""map_fixtures：录制后回放结果与录制一致、与请求拆分方式无关，注入延迟按种子确定。"""
+import asyncio
+
+import numpy as np
+import pytest
+
+import map_fixtures
+from map_fixtures import FixtureStore, RecordingMapProvider, ReplayMapProvider, parse_latency_spec
+from map_provider import MapProvider, MapProviderError
+
+COORDS = ["32.10000,120.10000", "32.20000,120.20000", "32.30000,120.30000"]
+ROUTE = [[32.1, 120.1], [32.2, 120.2], [32.3, 120.3]]
+
+
+class FakeBaidu(MapProvider):
+    """确定性的假上游：耗时由起终点下标算出，记录被调用次数。"""
+
+    name = "baidu"
+
+    def __init__(self, tactics_fallback=False):
+        self.calls = 0
+        self.tactics_fallback = tactics_fallback
+
+    async def geocode(self, address, stats=None):
+        self.calls += 1
+        self._mark(stats)
+        return f"32.{len(address):05d},120.00000"
+
+    async def reverse_geocode(self, lat, lng, stats=None):
+        self.calls += 1
+        self._mark(stats)
+        return f"路{lat:.3f}_{lng:.3f}"
+
+    async def routematrix(self, origins, destinations, tactics, stats=None):
+        self.calls += 1
+        self._mark(stats)
+        if stats is not None and self.tactics_fallback:
+            stats["tactics_fallback"] = True
+        return np.array(
+            [[0 if o == d else 100 * COORDS.index(o) + 10 * COORDS.index(d) + tactics for d in destinations] for o in origins],
+            dtype=np.int32,
+        )
+
+    async def driving_route(self, coords, tactics=None, plate_number=None, cartype=None, stats=None):
+        self.calls += 1
+        self._mark(stats)
+        return [list(coords)], [600], [{"road_name": "人民路", "path": list(coords)}]
+
+
+def _record(path, inner=None):
+    inner = inner or FakeBaidu()
+    store = FixtureStore(str(path), flush_every=10000)
+    recorder = RecordingMapProvider(inner, store)
+
+    async def run():
+        out = {
+            "geocode": await recorder.geocode("南通 站"),
+            "reverse": await recorder.reverse_geocode(32.1234567, 120.7654321),
+            "matrix": await recorder.routematrix(COORDS, COORDS, 13),
+            "route": await recorder.driving_route(ROUTE, tactics=13, plate_number="苏F12345"),
+        }
+        store.save()
+        return out
+
+    return asyncio.run(run()), inner
+
+
+def test_replay_matches_recording(tmp_path):
+    path = tmp_path / "fixtures.json.gz"
+    recorded, _ = _record(path)
+    replay = ReplayMapProvider(FixtureStore(str(path)))
+
+    async def run():
+        return {
+            # 归一化后相同的地址命中同一条记录
+            "geocode": await replay.geocode("南通站"),
+            "reverse": await replay.reverse_geocode(32.1234567, 120.7654321),
+            "matrix": await replay.routematrix(COORDS, COORDS, 13),
+            "route": await replay.driving_route(ROUTE, tactics=13, plate_number="苏F12345"),
+        }
+
+    replayed = asyncio.run(run())
+    assert replayed["geocode"] == recorded["geocode"]
+    assert replayed["reverse"] == recorded["reverse"]
+    assert np.array_equal(replayed["matrix"], recorded["matrix"])
+    assert replayed["route"] == recorded["route"]
+    assert replay.stats()["misses"] == {"geocode": 0, "reverse_geocode": 0, "routematrix": 0, "direction": 0}
+
+
+def test_replay_matrix_independent_of_tiling(tmp_path):
+    path = tmp_path / "fixtures.json.gz"
+    recorded, _ = _record(path)
+    replay = ReplayMapProvider(FixtureStore(str(path)))
+    # 录制时是一整块 3×3，回放按不同的起终点子集分块请求，拼出的腿一致
+    block = asyncio.run(replay.routematrix(COORDS[2:], COORDS[:2], 13))
+    assert np.array_equal(block, recorded["matrix"][2:, :2])
+    single = asyncio.run(replay.routematrix([COORDS[1]], [COORDS[0]], 13))
+    assert int(single[0, 0]) == int(recorded["matrix"][1, 0])
+
+
+def test_replay_is_repeatable(tmp_path):
+    path = tmp_path / "fixtures.json.gz"
+    _record(path)
+    runs = []
+    for _ in range(2):
+        replay = ReplayMapProvider(FixtureStore(str(path)))
+        runs.append(asyncio.run(replay.routematrix(COORDS, COORDS, 13)).tolist())
+    assert runs[0] == runs[1]
+
+
+def test_replay_miss_is_503(tmp_path):
+    path = tmp_path / "fixtures.json.gz"
+    _record(path)
+    replay = ReplayMapProvider(FixtureStore(str(path)))
+    with pytest.raises(MapProviderError) as exc:
+        asyncio.run(replay.routematrix(COORDS, COORDS, 11))
+    assert exc.value.status_code == 503
+    with pytest.raises(MapProviderError):
+        asyncio.run(replay.geocode("没录过的地址"))
+    assert replay.stats()["misses"]["routematrix"] == 1
+
+
+def test_tactics_fallback_is_not_recorded(tmp_path):
+    path = tmp_path / "fixtures.json.gz"
+    _record(path, FakeBaidu(tactics_fallback=True))
+    assert FixtureStore(str(path)).keys("routematrix") == []
+
+
+def test_jitter_is_deterministic_per_seed(monkeypatch, tmp_path):
+    path = tmp_path / "fixtures.json.gz"
+    _record(path)
+    delays = []
+
+    async def fake_sleep(seconds):
+        delays.append(seconds)
+
+    monkeypatch.setattr(map_fixtures.asyncio, "sleep", fake_sleep)
+
+    def run(seed):
+        delays.clear()
+        replay = ReplayMapProvider(FixtureStore(str(path)), latency_ms={"routematrix": 50}, jitter_ms=20, seed=seed)
+        for _ in range(5):
+            asyncio.run(replay.routematrix(COORDS, COORDS, 13))
+        return list(delays)
+
+    first = run(7)
+    assert run(7) == first
+    assert run(8) != first
+    assert all(0.05 <= d <= 0.07 for d in first)
+
+
+def test_parse_latency_spec():
+    assert parse_latency_spec("30") == {"geocode": 30.0, "reverse_geocode": 30.0, "routematrix": 30.0, "direction": 30.0}
+    assert parse_latency_spec("routematrix=80, direction=x, bogus=1") == {
+        "geocode": 0.0,
+        "reverse_geocode": 0.0,
+        "routematrix": 80.0,
+        "direction": 0.0,
+    }
+    assert parse_latency_spec("") == {"geocode": 0.0, "reverse_geocode": 0.0, "routematrix": 0.0, "direction": 0.0}
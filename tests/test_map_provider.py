@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""map_provider：主备降级、按需构建、离线地名匹配与车速模型校准。"""
+import asyncio
+import random
+
+import numpy as np
+import pytest
+
+from map_provider import (
+    GAZETTEER_MIN_MATCH_CHARS,
+    FallbackMapProvider,
+    LazyMapProvider,
+    LocalMapProvider,
+    MapProvider,
+    MapProviderError,
+    SpeedProfile,
+    haversine_matrix,
+)
+
+
+class StubProvider(MapProvider):
+    """按预设返回结果或抛异常的路网服务。"""
+
+    def __init__(self, name, error=None, coord="32.0,120.9", cacheable=True):
+        self.name = name
+        self.cacheable = cacheable
+        self.error = error
+        self.coord = coord
+        self.calls = 0
+
+    async def _answer(self, stats, value):
+        self.calls += 1
+        self._mark(stats)
+        if self.error is not None:
+            raise self.error
+        return value
+
+    async def geocode(self, address, stats=None):
+        return await self._answer(stats, self.coord)
+
+    async def reverse_geocode(self, lat, lng, stats=None):
+        return await self._answer(stats, "某地")
+
+    async def routematrix(self, origins, destinations, tactics, stats=None):
+        return await self._answer(stats, np.zeros((len(origins), len(destinations)), dtype=np.int32))
+
+    async def driving_route(self, coords, tactics=None, plate_number=None, cartype=None, stats=None):
+        return await self._answer(stats, ([], [], []))
+
+
+def _geocode(provider, address="南通站"):
+    stats = {}
+    coord = asyncio.run(provider.geocode(address, stats=stats))
+    return coord, stats
+
+
+# ---------- FallbackMapProvider ----------
+
+
+def test_fallback_on_5xx_marks_degraded():
+    primary = StubProvider("baidu", error=MapProviderError(502, "百度服务暂不可用"))
+    backup = StubProvider("local", coord="31.0,121.0", cacheable=False)
+    provider = FallbackMapProvider(primary, backup)
+    coord, stats = _geocode(provider)
+    assert coord == "31.0,121.0"
+    assert stats["degraded"] is True and stats["degraded_reason"] == "百度服务暂不可用"
+    # 实际提供结果的是备用服务，估算值不可缓存
+    assert stats["provider"] == "local" and stats["cacheable"] is False
+    assert provider.fallbacks["geocode"] == 1
+
+
+def test_fallback_on_network_error():
+    provider = FallbackMapProvider(StubProvider("baidu", error=ConnectionError("reset")), StubProvider("local"))
+    _, stats = _geocode(provider)
+    assert stats["degraded"] is True and stats["degraded_reason"] == "reset"
+
+
+def test_4xx_reraised_without_fallback():
+    backup = StubProvider("local")
+    provider = FallbackMapProvider(StubProvider("baidu", error=MapProviderError(400, "地址无法解析")), backup)
+    with pytest.raises(MapProviderError) as exc:
+        _geocode(provider)
+    assert exc.value.status_code == 400
+    assert backup.calls == 0 and provider.fallbacks["geocode"] == 0
+
+
+def test_fallback_4xx_becomes_503():
+    provider = FallbackMapProvider(
+        StubProvider("baidu", error=MapProviderError(503, "配额耗尽")),
+        StubProvider("local", error=MapProviderError(400, "离线地名表中无此地址")),
+    )
+    stats = {}
+    with pytest.raises(MapProviderError) as exc:
+        asyncio.run(provider.geocode("某小区", stats=stats))
+    # 主服务不可用时备用答不上来，不代表请求本身无解
+    assert exc.value.status_code == 503
+    assert "配额耗尽" in exc.value.detail and "离线地名表中无此地址" in exc.value.detail
+    assert "degraded" not in stats
+
+
+def test_fallback_5xx_reraised_as_is():
+    provider = FallbackMapProvider(
+        StubProvider("baidu", error=MapProviderError(502, "a")),
+        StubProvider("local", error=MapProviderError(500, "b")),
+    )
+    with pytest.raises(MapProviderError) as exc:
+        _geocode(provider)
+    assert exc.value.status_code == 500 and exc.value.detail == "b"
+
+
+def test_custom_should_fallback():
+    provider = FallbackMapProvider(
+        StubProvider("baidu", error=MapProviderError(429, "QPS 超限")),
+        StubProvider("local", coord="30.0,120.0"),
+        should_fallback=lambda e: getattr(e, "status_code", 0) == 429,
+    )
+    coord, stats = _geocode(provider)
+    assert coord == "30.0,120.0" and stats["degraded"] is True
+
+
+# ---------- LazyMapProvider ----------
+
+
+def test_lazy_builds_inner_once():
+    built = []
+
+    def factory():
+        built.append(1)
+        return StubProvider("local")
+
+    lazy = LazyMapProvider(factory, name="local")
+    assert lazy.stats() == {"name": "local", "built": False}
+    assert built == []
+
+    async def main():
+        await asyncio.gather(*(lazy.geocode("a") for _ in range(5)))
+        await lazy.routematrix(["32.0,120.0"], ["32.1,120.1"], 0)
+
+    asyncio.run(main())
+    assert built == [1]
+    assert lazy.get().calls == 6
+    assert lazy.stats() == {"name": "local"}
+
+
+# ---------- LocalMapProvider.lookup ----------
+
+
+@pytest.fixture
+def local():
+    return LocalMapProvider(
+        extra_entries=[
+            ("南通", "32.0,120.9"),
+            ("如东县掘港镇", "32.31,121.18"),
+            ("荣生豪景花园小区", "32.32,121.19"),
+            ("坏坐标", "not-a-coord"),
+        ],
+        hour=12,
+    )
+
+
+def test_lookup_exact_and_normalized(local):
+    assert local.lookup("荣生豪景花园小区") == "32.32,121.19"
+    assert local.lookup(" 荣生豪景花园小区 ") == "32.32,121.19"
+    # 过短的地名只能完全匹配
+    assert local.lookup("南通") == "32.0,120.9"
+    assert local.lookup("") is None
+    assert local.lookup("坏坐标") is None
+
+
+def test_lookup_contains_prefers_longest(local):
+    assert local.lookup("如东县掘港镇荣生豪景花园小区3号楼") == "32.32,121.19"
+    assert local.lookup("如东县掘港镇人民路") == "32.31,121.18"
+
+
+def test_lookup_rejects_short_names(local):
+    assert len("南通") < GAZETTEER_MIN_MATCH_CHARS
+    assert local.lookup("南通市崇川区工农路") is None
+
+
+def test_lookup_rejects_low_ratio(local):
+    # 「如东县掘港镇」6 字，占地址不足 30%
+    address = "江苏省南通市如东县掘港镇青园北路一百八十八号东方大厦"
+    assert len("如东县掘港镇") < len(address) * 0.3
+    assert local.lookup(address) is None
+
+
+def test_geocode_miss_is_400(local):
+    with pytest.raises(MapProviderError) as exc:
+        asyncio.run(local.geocode("不存在的地方"))
+    assert exc.value.status_code == 400
+    assert local.geocode_misses == 1
+
+
+# ---------- SpeedProfile.calibrate ----------
+
+TRUE_SPEEDS = (4.0, 7.0, 11.0, 16.0)
+
+
+def _samples(rng, count, hour_factor=lambda h: 1.0, hours=range(24)):
+    truth = SpeedProfile(bands=[(limit, s) for (limit, _), s in zip(SpeedProfile.DEFAULT_BANDS, TRUE_SPEEDS)], hour_factors=[1.0] * 24)
+    spans = [(200.0, 1900.0), (2100.0, 7900.0), (8100.0, 29000.0), (31000.0, 90000.0)]
+    out = []
+    for k in range(count):
+        lo, hi = spans[k % len(spans)]
+        meters = rng.uniform(lo, hi)
+        hour = list(hours)[k % len(hours)]
+        seconds = float(truth.estimate(np.array([meters]), 12)[0]) * hour_factor(hour)
+        out.append((meters, seconds, hour))
+    return out
+
+
+def test_calibrate_recovers_band_speeds():
+    rng = random.Random(3)
+    profile = SpeedProfile.calibrate(_samples(rng, 480))
+    assert profile.samples == 480
+    for (_, fitted), true in zip(profile.bands, TRUE_SPEEDS):
+        assert fitted == pytest.approx(true, rel=0.02)
+    assert all(f == pytest.approx(1.0, abs=0.02) for f in profile.hour_factors)
+
+
+def test_calibrate_fits_hour_factor_and_clips():
+    rng = random.Random(5)
+    samples = _samples(rng, 480)
+    samples += _samples(rng, 40, hour_factor=lambda h: 1.5, hours=[8])
+    samples += _samples(rng, 40, hour_factor=lambda h: 3.0, hours=[9])
+    profile = SpeedProfile.calibrate(samples)
+    assert profile.hour_factors[8] == pytest.approx(1.5, rel=0.03)
+    assert profile.hour_factors[9] == 2.0
+
+
+def test_calibrate_too_few_samples_keeps_default():
+    rng = random.Random(7)
+    # 过短距离与不超过起步耗时的样本不计入
+    samples = _samples(rng, 20) + [(50.0, 300.0, 8), (5000.0, 30.0, 8)]
+    profile = SpeedProfile.calibrate(samples)
+    default = SpeedProfile()
+    assert profile.samples == 20
+    assert profile.bands == default.bands and profile.hour_factors == default.hour_factors
+
+
+def test_calibrate_sparse_band_keeps_default_speed():
+    rng = random.Random(9)
+    # 只有前两段有样本，后两段沿用默认车速
+    samples = [s for s in _samples(rng, 400) if s[0] < 8000.0]
+    profile = SpeedProfile.calibrate(samples)
+    default = SpeedProfile()
+    assert profile.bands[0][1] == pytest.approx(TRUE_SPEEDS[0], rel=0.02)
+    assert profile.bands[2] == default.bands[2] and profile.bands[3] == default.bands[3]
+
+
+def test_local_routematrix_uses_profile():
+    profile = SpeedProfile()
+    local = LocalMapProvider(profile=profile, hour=12)
+    origins, dests = ["32.0,120.9", "32.1,121.0"], ["32.0,120.9", "32.3,121.2"]
+    stats = {}
+    rows = asyncio.run(local.routematrix(origins, dests, 0, stats=stats))
+    meters = haversine_matrix(np.array([[32.0, 120.9], [32.1, 121.0]]), np.array([[32.0, 120.9], [32.3, 121.2]]))
+    assert rows.tolist() == profile.estimate(meters, 12).tolist()
+    assert rows[0, 0] == 0
+    assert stats == {"provider": "local", "cacheable": False}
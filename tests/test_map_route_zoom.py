@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""路线几何按缩放级别抽稀：粗级别取回的几何不能在细级别上复用（后端容差 + 前端放大重取逻辑）。"""
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+
+import pytest
+
+from route_geometry import simplify_path, zoom_tolerance_meters
+
+WEB_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "web")
+
+
+def _max_deviation_m(points, kept):
+    """被删点到所在弦的最大距离（米，局部平面近似）。"""
+    lat0 = points[0][0]
+
+    def xy(p):
+        return (p[1] * 111320.0 * math.cos(math.radians(lat0)), p[0] * 110540.0)
+
+    idx = [points.index(p) for p in kept]
+    worst = 0.0
+    for a, b in zip(idx, idx[1:]):
+        (ax, ay), (bx, by) = xy(points[a]), xy(points[b])
+        dx, dy = bx - ax, by - ay
+        seg_sq = dx * dx + dy * dy
+        for k in range(a + 1, b):
+            px, py = xy(points[k])
+            t = 0.0 if seg_sq == 0 else max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / seg_sq))
+            worst = max(worst, math.hypot(px - ax - t * dx, py - ay - t * dy))
+    return worst
+
+
+def test_coarse_zoom_geometry_too_lossy_for_fine_zoom():
+    rng = random.Random(7)
+    lat, lng = 32.0, 120.5
+    points = []
+    for _ in range(2000):
+        lat += rng.uniform(-1, 2) * 1e-4
+        lng += rng.uniform(-1, 2) * 1e-4
+        points.append([lat, lng])
+    coarse = simplify_path(points, zoom_tolerance_meters(10))
+    # 按 10 级抽稀的误差远超 17 级的像素容差：放大到 17 级必须重新请求
+    assert _max_deviation_m(points, coarse) > zoom_tolerance_meters(17)
+    fine = simplify_path(points, zoom_tolerance_meters(17))
+    assert _max_deviation_m(points, fine) <= zoom_tolerance_meters(17) + 1e-6
+
+
+_NODE_HARNESS = r"""
+var fs = require("fs"), vm = require("vm"), path = require("path");
+var web = process.argv[process.argv.length - 1];
+// map-config.js 提供的配置加载在此置空，避免 onLoad 自动规划
+var win = { SmartDiaoduMap: { loadAppConfig: function () {} }, addEventListener: function () {}, location: { protocol: "http:" } };
+win.top = win;
+var ctx = {
+  window: win,
+  document: {
+    getElementById: function (id) { return id === "map" ? {} : null; },
+    addEventListener: function () {}
+  }
+};
+vm.createContext(ctx);
+["map-state.js", "map-ui.js"].forEach(function (f) {
+  vm.runInContext(fs.readFileSync(path.join(web, f), "utf8"), ctx, { filename: f });
+});
+var M = win.SmartDiaoduMap;
+var zoom = 10, fetches = [], draws = [], inits = 0;
+M.bmap = { getZoom: function () { return zoom; } };
+M.drawRouteFromIndex = function (idx, keep) { draws.push(!!keep); };
+M.initMap = function () { inits++; };
+M.updateNavPanel = function () {};
+M.loadAndDraw = function (opts) { fetches.push(opts || null); };
+var out = {
+  covers: [M.routeGeometryCoversZoom(10, 17), M.routeGeometryCoversZoom(17, 10), M.routeGeometryCoversZoom(null, 17)]
+};
+M.applyRouteData({ route_addresses: ["A", "B"], route_paths: [[[32, 120], [32.1, 120.1]]], simplify_zoom: 10 });
+inits = 0;
+M.redrawRouteOnZoomChange();
+out.sameZoom = fetches.length;
+zoom = 17;
+M.redrawRouteOnZoomChange();
+out.zoomedIn = fetches.slice();
+M.applyRouteGeometry({ route_addresses: ["A", "B"], route_paths: [[[32, 120], [32.05, 120.04], [32.1, 120.1]]], simplify_zoom: 17 });
+out.afterRefetch = { lastRouteZoom: M.lastRouteZoom, points: M.route_path.length, inits: inits, keepViewport: draws[draws.length - 1] };
+zoom = 12;
+fetches = [];
+M.redrawRouteOnZoomChange();
+out.zoomedOut = fetches.length;
+console.log(JSON.stringify(out));
+"""
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="需要 node 运行前端脚本")
+def test_frontend_refetches_geometry_when_zooming_past_fetched_level():
+    proc = subprocess.run(["node", "-e", _NODE_HARNESS, WEB_DIR], capture_output=True, text=True, timeout=30)
+    assert proc.returncode == 0, proc.stderr
+    out = json.loads(proc.stdout.strip().splitlines()[-1])
+    assert out["covers"] == [False, True, True]
+    # 同级重绘复用已有几何；放大到 17 级则按几何模式重新请求
+    assert out["sameZoom"] == 0
+    assert out["zoomedIn"] == [{"geometryOnly": True}]
+    # 重取的几何原地替换，不重建地图、保留视野
+    assert out["afterRefetch"] == {"lastRouteZoom": 17, "points": 3, "inits": 0, "keepViewport": True}
+    # 缩小回粗级别时细几何仍可用，不再请求
+    assert out["zoomedOut"] == 0
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""route_geometry：路线单遍解析、Douglas–Peucker 抽稀与 encoded polyline 编解码。"""
+import math
+import random
+
+import pytest
+
+from route_geometry import (
+    decode_polyline,
+    encode_polyline,
+    encode_route_geometry,
+    parse_route_geometry,
+    simplify_path,
+    zoom_tolerance_meters,
+)
+
+
+def _to_xy(point, lat0):
+    return (point[1] * 111320.0 * math.cos(math.radians(lat0)), point[0] * 110540.0)
+
+
+def _segment_distance(p, a, b):
+    px, py = p
+    ax, ay = a
+    bx, by = b
+    dx, dy = bx - ax, by - ay
+    seg_sq = dx * dx + dy * dy
+    t = 0.0 if seg_sq == 0 else max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / seg_sq))
+    return math.hypot(px - ax - t * dx, py - ay - t * dy)
+
+
+def test_parse_route_geometry_single_pass():
+    route = {
+        "steps": [
+            {"road_name": "人民路", "path": "120.1,32.1;120.2,32.2"},
+            {"road_name": "无名路", "path": "120.2,32.2;120.3,32.3;bad"},
+            {"road_name": "短", "path": "120.3,32.3"},
+            {"road_name": "空", "path": ""},
+        ]
+    }
+    path, steps = parse_route_geometry(route)
+    assert path == [[32.1, 120.1], [32.2, 120.2], [32.2, 120.2], [32.3, 120.3], [32.3, 120.3]]
+    assert [s["road_name"] for s in steps] == ["人民路", ""]
+    assert steps[1]["path"] == [[32.2, 120.2], [32.3, 120.3]]
+
+
+def test_simplify_collinear_keeps_endpoints_only():
+    points = [[32.0 + i * 1e-4, 120.0 + i * 1e-4] for i in range(200)]
+    assert simplify_path(points, 1.0) == [points[0], points[-1]]
+
+
+def test_simplify_zero_tolerance_returns_copy():
+    points = [[32.0, 120.0], [32.001, 120.003], [32.002, 120.0]]
+    out = simplify_path(points, 0)
+    assert out == points and out[0] is not points[0]
+
+
+@pytest.mark.parametrize("tolerance_m", [2.0, 16.0, 64.0])
+def test_simplify_stays_within_tolerance(tolerance_m):
+    rng = random.Random(int(tolerance_m))
+    lat, lng = 32.0, 120.5
+    points = []
+    for _ in range(500):
+        lat += rng.uniform(-1, 2) * 1e-4
+        lng += rng.uniform(-1, 2) * 1e-4
+        points.append([lat, lng])
+    out = simplify_path(points, tolerance_m)
+    assert out[0] == points[0] and out[-1] == points[-1]
+    assert len(out) < len(points)
+    # 保留点是原点列的有序子序列，且每个被删掉的点到所在弦的距离不超过容差
+    idx = [points.index(p) for p in out]
+    assert idx == sorted(idx)
+    lat0 = points[0][0]
+    xy = [_to_xy(p, lat0) for p in points]
+    for a, b in zip(idx, idx[1:]):
+        for k in range(a + 1, b):
+            assert _segment_distance(xy[k], xy[a], xy[b]) <= tolerance_m + 1e-6
+
+
+def test_zoom_tolerance_halves_per_level():
+    assert zoom_tolerance_meters(18) == 1.0
+    assert zoom_tolerance_meters(17) == 2.0
+    assert zoom_tolerance_meters(99) == zoom_tolerance_meters(21)
+    assert zoom_tolerance_meters(None) == zoom_tolerance_meters(14)
+
+
+def test_encode_polyline_reference_value():
+    # Google 文档中的示例点列
+    points = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]
+    assert encode_polyline(points) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert decode_polyline("_p~iF~ps|U_ulLnnqC_mqNvxq`@") == points
+
+
+@pytest.mark.parametrize("precision", [5, 6])
+def test_polyline_round_trip(precision):
+    rng = random.Random(precision)
+    points = [[rng.uniform(18.0, 53.0), rng.uniform(73.0, 135.0)] for _ in range(300)]
+    points.append(points[-1])
+    decoded = decode_polyline(encode_polyline(points, precision), precision)
+    assert len(decoded) == len(points)
+    half_step = 0.5 / 10 ** precision + 1e-12
+    for (lat, lng), (dlat, dlng) in zip(points, decoded):
+        assert abs(lat - dlat) <= half_step and abs(lng - dlng) <= half_step
+    # 已对齐到精度网格的点列编解码无损
+    assert decode_polyline(encode_polyline(decoded, precision), precision) == decoded
+
+
+def test_polyline_empty():
+    assert encode_polyline([]) == ""
+    assert decode_polyline("") == []
+
+
+def test_encode_route_geometry_keeps_road_names():
+    paths = [[[32.1, 120.1], [32.2, 120.2]]]
+    steps = [{"road_name": "人民路", "path": [[32.1, 120.1], [32.2, 120.2]]}]
+    encoded_paths, encoded_steps = encode_route_geometry(paths, steps)
+    assert decode_polyline(encoded_paths[0]) == paths[0]
+    assert encoded_steps == [{"road_name": "人民路", "path": encoded_paths[0]}]
+    assert isinstance(steps[0]["path"], list)
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""route_solver：精确 DP 与最便宜插入在小规模随机实例上对照暴力枚举。"""
+import itertools
+import random
+from typing import List, Optional, Tuple
+
+import pytest
+
+import route_solver
+from duration_matrix import DurationMatrix
+from route_solver import best_insertion, route_duration, solve_pdp_exact
+
+
+def _random_matrix(rng: random.Random, n: int) -> List[List[int]]:
+    return [[0 if i == j else rng.randint(1, 900) for j in range(n)] for i in range(n)]
+
+
+def _brute_force(matrix: List[List[int]], pairs: List[Tuple[int, int]]) -> Optional[int]:
+    """枚举 1..n-1 的全部访问顺序，取满足先接后送的最短开放路线耗时；无可行顺序返回 None。"""
+    best = None
+    for order in itertools.permutations(range(1, len(matrix))):
+        pos = {node: i for i, node in enumerate(order)}
+        if any(pos[p] > pos[d] for p, d in pairs):
+            continue
+        total = route_duration(matrix, [0] + list(order))
+        if best is None or total < best:
+            best = total
+    return best
+
+
+def _random_pairs(rng: random.Random, n: int) -> List[Tuple[int, int]]:
+    nodes = list(range(1, n))
+    rng.shuffle(nodes)
+    num_pairs = rng.randint(0, len(nodes) // 2)
+    return [(nodes[2 * i], nodes[2 * i + 1]) for i in range(num_pairs)]
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_exact_dp_matches_brute_force(seed):
+    rng = random.Random(seed)
+    n = rng.randint(2, 7)
+    matrix = _random_matrix(rng, n)
+    pairs = _random_pairs(rng, n)
+    route, total = solve_pdp_exact(matrix, pairs)
+    assert route is not None
+    assert route[0] == 0 and sorted(route) == list(range(n))
+    pos = {node: i for i, node in enumerate(route)}
+    assert all(pos[p] < pos[d] for p, d in pairs)
+    assert total == route_duration(matrix, route) == _brute_force(matrix, pairs)
+
+
+def test_exact_dp_accepts_duration_matrix():
+    rng = random.Random(7)
+    matrix = _random_matrix(rng, 6)
+    pairs = [(1, 3), (2, 4)]
+    assert solve_pdp_exact(DurationMatrix(matrix), pairs) == solve_pdp_exact(matrix, pairs)
+
+
+def test_exact_dp_rejects_invalid_pairs():
+    matrix = _random_matrix(random.Random(1), 4)
+    assert solve_pdp_exact(matrix, [(1, 1)]) == (None, 0)
+    assert solve_pdp_exact(matrix, [(1, 9)]) == (None, 0)
+
+
+def _brute_force_insertion(matrix: List[List[int]], route: List[int], pickup: int, delivery: int) -> int:
+    """枚举接客位置 i 与送客位置 j >= i（起点不动），取最小增加耗时。"""
+    base = route_duration(matrix, route)
+    best = None
+    for i in range(1, len(route) + 1):
+        for j in range(i, len(route) + 1):
+            candidate = route[:i] + [pickup] + route[i:j] + [delivery] + route[j:]
+            delta = route_duration(matrix, candidate) - base
+            if best is None or delta < best:
+                best = delta
+    return best
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_best_insertion_matches_brute_force(seed):
+    rng = random.Random(1000 + seed)
+    n = rng.randint(3, 9)
+    matrix = _random_matrix(rng, n)
+    pickup, delivery = n - 2, n - 1
+    stops = list(range(1, n - 2))
+    rng.shuffle(stops)
+    route = [0] + stops[: rng.randint(0, len(stops))]
+    delta, new_route = best_insertion(DurationMatrix(matrix), route, pickup, delivery)
+    assert delta == _brute_force_insertion(matrix, route, pickup, delivery)
+    assert new_route.index(pickup) < new_route.index(delivery)
+    assert [x for x in new_route if x not in (pickup, delivery)] == route
+    assert route_duration(matrix, new_route) - route_duration(matrix, route) == delta
+
+
+def test_exact_solver_disabled_with_zero(monkeypatch):
+    monkeypatch.setattr(route_solver, "EXACT_SOLVER_MAX_NODES", 0)
+    matrix = _random_matrix(random.Random(3), 5)
+    stats = {}
+    route, total = route_solver.solve_pdp_route(matrix, 2, stats=stats, budget_ms=200)
+    assert stats["engine"] == route_solver.ENGINE_ORTOOLS
+    assert route is not None and total == route_duration(matrix, route)
+    # 平凡情形（仅起点）不需要搜索，仍直接返回
+    assert route_solver.solve_pdp_route([[0]], 0) == ([0], 0)
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""路网矩阵分块：按元素上限拆块、各块拼回整表，失败块单独重试。"""
+import asyncio
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from circuit_breaker import CircuitOpenError
+
+
+@pytest.mark.parametrize(
+    "origins,destinations,limit,count",
+    [(10, 10, 50, 2), (1, 120, 50, 3), (7, 7, 50, 1), (50, 50, 50, 50), (3, 4, 1, 12), (13, 9, 25, 6)],
+)
+def test_tiles_cover_every_cell_once_within_limit(sd, origins, destinations, limit, count):
+    tiles = sd.routematrix_tiles(origins, destinations, limit)
+    assert len(tiles) == count
+    seen = np.zeros((origins, destinations), dtype=np.int32)
+    for origin_range, dest_range in tiles:
+        assert len(origin_range) * len(dest_range) <= limit
+        seen[origin_range.start : origin_range.stop, dest_range.start : dest_range.stop] += 1
+    assert (seen == 1).all()
+
+
+def test_tiles_empty_and_non_positive_limit(sd):
+    assert sd.routematrix_tiles(0, 5, 50) == []
+    assert sd.routematrix_tiles(5, 0, 50) == []
+    # 上限非正时按每块 1 个元素
+    assert len(sd.routematrix_tiles(2, 2, 0)) == 4
+
+
+def test_tiles_prefer_square_blocks(sd):
+    # 8×8、上限 16：4 块中取 4×4 而不是 2×8 / 8×2
+    tiles = sd.routematrix_tiles(8, 8, 16)
+    assert len(tiles) == 4
+    assert all(len(o) == 4 and len(d) == 4 for o, d in tiles)
+
+
+def _coords(n, base=32.0):
+    return [f"{base + i / 100:.5f},{120.0 + i / 100:.5f}" for i in range(n)]
+
+
+def _seconds(origin, dest):
+    return int(float(origin.split(",")[0]) * 1000) % 997 + int(float(dest.split(",")[1]) * 1000) % 991
+
+
+class FakeTiles:
+    """替代 _fetch_routematrix_tile：记录每块请求，按 fail 指定的块首个起点下标让其前若干次失败。"""
+
+    def __init__(self, origins, fail=None, error=None, applied=None):
+        self.origins = origins
+        self.fail = dict(fail or {})
+        self.error = error or HTTPException(status_code=503, detail="路网矩阵获取失败: 请求异常")
+        self.applied = applied or {}
+        self.calls = []
+
+    async def __call__(self, origins, destinations, tactics, stats=None):
+        start = self.origins.index(origins[0])
+        self.calls.append(start)
+        await asyncio.sleep(0)
+        if self.fail.get(start, 0) > 0:
+            self.fail[start] -= 1
+            raise self.error
+        if stats is not None:
+            stats["baidu_requests"] = stats.get("baidu_requests", 0) + 1
+        block = np.array([[_seconds(o, d) for d in destinations] for o in origins], dtype=np.int32)
+        return block, self.applied.get(start, tactics)
+
+
+@pytest.fixture
+def tiles(sd, monkeypatch):
+    monkeypatch.setattr(sd, "ROUTEMATRIX_MAX_ELEMENTS", 50)
+    monkeypatch.setattr(sd, "ROUTEMATRIX_TILE_RETRIES", 2)
+
+    def install(origins, **kwargs):
+        fake = FakeTiles(origins, **kwargs)
+        monkeypatch.setattr(sd, "_fetch_routematrix_tile", fake)
+        return fake
+
+    return install
+
+
+def _fetch(sd, origins, destinations, tactics=11):
+    stats = {}
+    rows = asyncio.run(sd._fetch_routematrix(origins, destinations, tactics, stats))
+    return rows, stats
+
+
+def test_fetch_assembles_tiles(sd, tiles):
+    origins = _coords(10)
+    fake = tiles(origins)
+    rows, stats = _fetch(sd, origins, origins)
+    assert rows.tolist() == [[_seconds(o, d) for d in origins] for o in origins]
+    assert sorted(fake.calls) == [0, 5]
+    assert stats == {"tiles": 2, "tile_retries": 0, "baidu_requests": 2}
+
+
+def test_failed_tile_retried_alone(sd, tiles):
+    origins = _coords(10)
+    fake = tiles(origins, fail={5: 1})
+    rows, stats = _fetch(sd, origins, origins)
+    assert rows.tolist() == [[_seconds(o, d) for d in origins] for o in origins]
+    # 只有失败的块重新请求，成功的块不重复占配额
+    assert sorted(fake.calls) == [0, 5, 5]
+    assert stats["tiles"] == 2 and stats["tile_retries"] == 1 and stats["baidu_requests"] == 2
+
+
+def test_tile_failing_every_retry_raises(sd, tiles):
+    origins = _coords(10)
+    fake = tiles(origins, fail={5: 10})
+    with pytest.raises(HTTPException) as exc:
+        _fetch(sd, origins, origins)
+    assert exc.value.status_code == 503
+    # 首轮 + ROUTEMATRIX_TILE_RETRIES 轮
+    assert fake.calls.count(5) == 3 and fake.calls.count(0) == 1
+
+
+def test_circuit_open_not_retried(sd, tiles):
+    origins = _coords(10)
+    fake = tiles(origins, fail={5: 10}, error=CircuitOpenError("百度路网矩阵", 10))
+    with pytest.raises(CircuitOpenError):
+        _fetch(sd, origins, origins)
+    assert fake.calls.count(5) == 1
+
+
+def test_tactics_fallback_marks_not_cacheable(sd, tiles):
+    origins = _coords(10)
+    tiles(origins, applied={5: 11})
+    _, stats = _fetch(sd, origins, origins, tactics=13)
+    assert stats["tactics_fallback"] is True and stats["cacheable"] is False
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""singleflight：同键并发调用只执行一次，统计回填与异常共享给所有等待方。"""
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight("geocode")
+    executed = []
+
+    async def fetch():
+        executed.append(1)
+        await asyncio.sleep(0.01)
+        return {"lat": 32.0}
+
+    async def main():
+        return await asyncio.gather(*(flight.do("南通站", fetch) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert len(executed) == 1
+    assert results == [{"lat": 32.0}] * 5
+    # 共享的是同一个结果对象
+    assert all(r is results[0] for r in results)
+    assert flight.stats() == {"calls": 5, "executed": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_different_keys_not_coalesced():
+    flight = SingleFlight("geocode")
+
+    async def main():
+        return await asyncio.gather(flight.do("a", lambda: asyncio.sleep(0.01, "A")), flight.do("b", lambda: asyncio.sleep(0.01, "B")))
+
+    assert asyncio.run(main()) == ["A", "B"]
+    assert flight.stats()["executed"] == 2 and flight.stats()["coalesced"] == 0
+
+
+def test_key_released_after_completion():
+    flight = SingleFlight("geocode")
+
+    async def main():
+        first = await flight.do("k", lambda: asyncio.sleep(0, 1))
+        second = await flight.do("k", lambda: asyncio.sleep(0, 2))
+        return first, second
+
+    # 只合并同时在途的请求，不做缓存
+    assert asyncio.run(main()) == (1, 2)
+    assert flight.stats() == {"calls": 2, "executed": 2, "coalesced": 0, "in_flight": 0}
+
+
+def test_do_with_stats_merges_for_every_caller():
+    flight = SingleFlight("routematrix")
+    merged = []
+
+    async def fetch(call_stats):
+        await asyncio.sleep(0.01)
+        call_stats["requests"] = 3
+        call_stats["degraded"] = True
+        return "ok"
+
+    def merge(call_stats, leader):
+        merged.append((leader, dict(call_stats)))
+
+    async def main():
+        return await asyncio.gather(*(flight.do_with_stats("tile", fetch, merge) for _ in range(3)))
+
+    assert asyncio.run(main()) == ["ok"] * 3
+    # 每个调用方都拿到执行方回填的同一份统计，只有一个是执行方
+    assert sorted(leader for leader, _ in merged) == [False, False, True]
+    assert all(stats == {"requests": 3, "degraded": True} for _, stats in merged)
+    assert flight.stats()["coalesced"] == 2
+
+
+def test_exception_propagates_to_every_waiter():
+    flight = SingleFlight("routematrix")
+    merged = []
+
+    async def fetch(call_stats):
+        call_stats["requests"] = 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("百度 5xx")
+
+    async def main():
+        return await asyncio.gather(
+            *(flight.do_with_stats("tile", fetch, lambda s, leader: merged.append((leader, dict(s)))) for _ in range(3)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(main())
+    assert len(results) == 3
+    assert all(isinstance(r, RuntimeError) and str(r) == "百度 5xx" for r in results)
+    # 失败时 merge 同样对每个调用方执行，执行方已发出的请求数不会丢
+    assert sorted(leader for leader, _ in merged) == [False, False, True]
+    assert all(stats == {"requests": 1} for _, stats in merged)
+    assert flight.stats() == {"calls": 3, "executed": 1, "coalesced": 2, "in_flight": 0}
+
+
+def test_cancelled_caller_does_not_cancel_others():
+    flight = SingleFlight("geocode")
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(flight.do("k", fetch))
+        second = asyncio.ensure_future(flight.do("k", fetch))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "done"
+
+
+def test_separate_event_loops_do_not_share_tasks():
+    flight = SingleFlight("geocode")
+    assert asyncio.run(flight.do("k", lambda: asyncio.sleep(0, 1))) == 1
+    assert asyncio.run(flight.do("k", lambda: asyncio.sleep(0, 2))) == 2
+    assert flight.stats()["executed"] == 2
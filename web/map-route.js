@@ -532,6 +532,45 @@
     if (M.showRestrictionHintIfNeeded) M.showRestrictionHintIfNeeded();
   };
 
+  /** 解码 Google encoded polyline（后端 ?format=polyline 返回）为 [[lat, lng], ...]，precision 为小数位数，默认 5。 */
+  M.decodePolyline = function (str, precision) {
+    var factor = Math.pow(10, precision != null ? precision : 5);
+    var points = [], index = 0, lat = 0, lng = 0, len = (str || "").length;
+    function next() {
+      var result = 0, shift = 0, b;
+      do {
+        b = str.charCodeAt(index++) - 63;
+        result |= (b & 0x1f) << shift;
+        shift += 5;
+      } while (b >= 0x20 && index < len);
+      return (result & 1) ? ~(result >> 1) : (result >> 1);
+    }
+    while (index < len) {
+      lat += next();
+      lng += next();
+      points.push([lat / factor, lng / factor]);
+    }
+    return points;
+  };
+
+  /** 路线接口返回 path_encoding = "polyline5" 等时，把 route_paths / route_steps[].path 解码回点列；未编码则原样返回。 */
+  M.decodeRoutePayload = function (data) {
+    var enc = data && data.path_encoding;
+    if (typeof enc !== "string" || enc.indexOf("polyline") !== 0) return data;
+    var precision = parseInt(enc.slice("polyline".length), 10);
+    if (isNaN(precision)) precision = 5;
+    var decode = function (p) { return typeof p === "string" ? M.decodePolyline(p, precision) : p; };
+    if (Array.isArray(data.route_paths)) data.route_paths = data.route_paths.map(decode);
+    if (Array.isArray(data.route_steps)) {
+      data.route_steps = data.route_steps.map(function (s) {
+        if (s && typeof s.path === "string") s.path = decode(s.path);
+        return s;
+      });
+    }
+    delete data.path_encoding;
+    return data;
+  };
+
   M.collectViewportPointsFromSegments = function (basePoints) {
     var out = basePoints.slice();
     if (!M.lastSegmentResults || !M.lastSegmentResults.length) return out;
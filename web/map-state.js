@@ -33,6 +33,14 @@
   };
   M.zoomRedrawTimer = null;
   M.lastRedrawZoom = null;
+  /** 当前路线几何在后端抽稀时所用的缩放级别（响应 simplify_zoom）；未知时为 null */
+  M.lastRouteZoom = null;
+
+  /** 按 fetchedZoom 抽稀的几何能否在 zoom 级别下画：只能用于同级或更粗的级别，放大后须重新请求。级别未知时不重新请求。 */
+  M.routeGeometryCoversZoom = function (fetchedZoom, zoom) {
+    if (typeof fetchedZoom !== "number" || typeof zoom !== "number") return true;
+    return zoom <= fetchedZoom;
+  };
 
   /** 供路线 API 使用：从 localStorage 取完整起终点与途经点，再按 onboard 置空已上车乘客的 pickup */
   M.getCurrentState = function () {
@@ -98,6 +106,7 @@
   };
 
   M.applyRouteData = function (data) {
+    if (M.decodeRoutePayload) data = M.decodeRoutePayload(data);
     M.route_addresses = data.route_addresses || [];
     M.route_coords = data.route_coords || [];
     M.point_types = data.point_types || [];
@@ -107,6 +116,7 @@
     M.route_durations = Array.isArray(data.route_durations) ? data.route_durations : [];
     M.route_steps = Array.isArray(data.route_steps) ? data.route_steps : [];
     M.lastRouteData = data;
+    M.lastRouteZoom = typeof data.simplify_zoom === "number" ? data.simplify_zoom : null;
     // 每次规划新路线时从第一站开始展示，不再沿用上次的停靠进度，避免长期停在「全部送达」状态。
     M.currentStopIndex = 0;
     if (typeof localStorage !== "undefined") {
@@ -122,6 +132,25 @@
     if (M.bmap && typeof M.bmap.invalidateSize === "function") M.bmap.invalidateSize();
   };
 
+  /**
+   * 放大后按新缩放级别重新取回的路线：站点顺序不变时只替换路线几何并原地重绘（不重建地图、不改变中心/缩放），
+   * 站点顺序变了（期间计划有变动）则按新路线完整应用。
+   */
+  M.applyRouteGeometry = function (data) {
+    if (M.decodeRoutePayload) data = M.decodeRoutePayload(data);
+    if ((data.route_addresses || []).join("|") !== M.route_addresses.join("|")) {
+      M.applyRouteData(data);
+      return;
+    }
+    M.route_paths = Array.isArray(data.route_paths) ? data.route_paths : [];
+    M.route_path = (M.route_paths.length > 0 && M.route_paths[0]) ? M.route_paths[0] : [];
+    M.route_durations = Array.isArray(data.route_durations) ? data.route_durations : [];
+    M.route_steps = Array.isArray(data.route_steps) ? data.route_steps : [];
+    M.lastRouteData = data;
+    M.lastRouteZoom = typeof data.simplify_zoom === "number" ? data.simplify_zoom : null;
+    if (M.drawRouteFromIndex) M.drawRouteFromIndex(M.currentStopIndex, true);
+  };
+
   M.saveRouteSnapshot = function (data) {
     var sup = M.getSupabaseClient();
     if (!sup || !data || !(data.route_addresses && data.route_addresses.length)) return;
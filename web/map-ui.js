@@ -130,6 +130,10 @@
       M.redrawFromStoredSegments(true);
     } else {
       M.drawRouteFromIndex(M.currentStopIndex, true);
+      /* 几何按更粗的级别抽稀过，放大后先用旧线占位，再按当前级别重新取几何 */
+      if (!M.routeGeometryCoversZoom(M.lastRouteZoom, M.lastRedrawZoom) && M.loadAndDraw) {
+        M.loadAndDraw({ geometryOnly: true });
+      }
     }
   };
 
@@ -138,8 +142,11 @@
     if (M.loadAndDraw) M.loadAndDraw();
   };
 
-  M.loadAndDraw = function () {
+  /** opts.geometryOnly：仅按当前缩放级别重新取路线几何（放大后用），不改状态栏、不重建地图、不受冷却限制 */
+  M.loadAndDraw = function (opts) {
+    var geometryOnly = !!(opts && opts.geometryOnly);
     var base = M.getApiBase();
+    if (geometryOnly && !base) return;
     var statusEl = document.getElementById("routeInfo");
     if (!base) {
       M.initMap();
@@ -153,7 +160,7 @@
       });
       return;
     }
-    statusEl.textContent = "从数据库加载计划…";
+    if (!geometryOnly) statusEl.textContent = "从数据库加载计划…";
     M.loadStateFromSupabase(function (state) {
       state = state || {};
       // 只信数据库：请求时明确携带 driver_id，后端可据此二次按库兜底查询。
@@ -170,6 +177,7 @@
           var first = state2.pickups[0] && String(state2.pickups[0]).trim();
           if (first) { state2.driver_loc = first; driverLoc = first; }
         }
+        if (geometryOnly && (!driverLoc || !state2.pickups || !state2.pickups.length)) return;
         if (!driverLoc) {
           statusEl.textContent = "请先在控制台设置当前位置（刷新 GPS 或输入地址）后点「更新路线」";
           M.initMap();
@@ -191,7 +199,7 @@
           "AVOID_HIGHWAY": 3
         };
         var currentTactics = tacticsMap[M.routePolicyKey || "DEFAULT"] || 0;
-        statusEl.textContent = "规划路线中…";
+        if (!geometryOnly) statusEl.textContent = "规划路线中…";
         var headers = Object.assign({ "Content-Type": "application/json" }, (M.getAuthHeaders && M.getAuthHeaders()) || {});
         updateDebug({ planningWithPickups: state2.pickups.length, planningDriverLoc: driverLoc });
         var now = Date.now();
@@ -199,16 +207,21 @@
           updateDebug({ requestSkipped: "in_flight" });
           return;
         }
-        if (M._routeReqLastAt && now - M._routeReqLastAt < 1200) {
+        if (!geometryOnly && M._routeReqLastAt && now - M._routeReqLastAt < 1200) {
           updateDebug({ requestSkipped: "cooldown" });
           return;
         }
         M._routeReqInFlight = true;
-        M._routeReqLastAt = now;
-        fetch(base + "/current_route_preview", {
+        if (!geometryOnly) M._routeReqLastAt = now;
+        var applied = false;
+        fetch(base + "/current_route_preview?format=polyline", {
           method: "POST",
           headers: headers,
-          body: JSON.stringify({ current_state: state2, tactics: currentTactics })
+          body: JSON.stringify({
+            current_state: state2,
+            tactics: currentTactics,
+            zoom: (M.bmap && typeof M.bmap.getZoom === "function") ? M.bmap.getZoom() : null
+          })
         })
       .then(function (r) {
         var status = r.status;
@@ -223,6 +236,11 @@
         return r.json();
       })
       .then(function (data) {
+        applied = true;
+        if (geometryOnly) {
+          M.applyRouteGeometry(data);
+          return;
+        }
         M.applyRouteData(data);
         M.saveRouteSnapshot(data);
         updateDebug({ routeAddrCount: (data.route_addresses && data.route_addresses.length) || 0 });
@@ -231,6 +249,7 @@
       })
       .catch(function (e) {
         updateDebug({ routeFetchError: (e && e.message) || String(e) });
+        if (geometryOnly) return;
         document.getElementById("navPanel").style.display = "none";
         var restrictionEl = document.getElementById("restrictionHint");
         if (restrictionEl) restrictionEl.style.display = "none";
@@ -246,6 +265,9 @@
       })
       .then(function () {
         M._routeReqInFlight = false;
+        /* 请求期间又放大过：按最新级别再取一次（失败时不重试，等下次缩放） */
+        var zoomNow = (M.bmap && typeof M.bmap.getZoom === "function") ? M.bmap.getZoom() : null;
+        if (applied && M.lastRouteData && !M.routeGeometryCoversZoom(M.lastRouteZoom, zoomNow)) M.loadAndDraw({ geometryOnly: true });
       });
       });
     });